@@ -5,98 +5,57 @@ This module contains the business logic for creating snapshots and comparing the
 """
 
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 import logging
 
+from .snapshot_diff import SnapshotDiff
+from .transaction_index import TransactionIndex, snapshot_period
+
 logger = logging.getLogger(__name__)
 
 
 def find_matching_transactions_for_sell(
-    transactions: List[Dict[str, Any]],
+    transactions: Union[TransactionIndex, List[Dict[str, Any]]],
     asset_name: str,
-    previous_date: str,
-    current_date: str
+    previous_date: Union[str, float],
+    current_date: Union[str, float]
 ) -> List[Dict[str, Any]]:
     """
     Find transactions matching asset name within date range.
     
     Args:
-        transactions: List of all parsed transactions
+        transactions: TransactionIndex over the sell transactions (or the
+            list of parsed transactions, indexed on the fly)
         asset_name: Asset name to match (case-sensitive exact match)
-        previous_date: Start of period (ISO format, exclusive)
-        current_date: End of period (ISO format, inclusive)
+        previous_date: Start of period (ISO format or POSIX seconds, exclusive)
+        current_date: End of period (ISO format or POSIX seconds, inclusive)
     
     Returns:
         List of matching transaction dicts
     """
-    # Parse date strings
-    prev_dt = datetime.fromisoformat(previous_date.replace('Z', '+00:00'))
-    curr_dt = datetime.fromisoformat(current_date.replace('Z', '+00:00'))
-    
-    matching = []
-    for txn in transactions:
-        # Exact name match (case-sensitive)
-        if txn.get("asset_name") != asset_name:
-            continue
-        
-        # Date range: previous < txn_date <= current
-        txn_date_str = txn.get("date")
-        if not txn_date_str:
-            continue
-        
-        try:
-            txn_date = datetime.fromisoformat(txn_date_str.replace('Z', '+00:00'))
-        except (ValueError, AttributeError):
-            continue
-        
-        if prev_dt < txn_date <= curr_dt:
-            matching.append(txn)
-    
-    return matching
+    return TransactionIndex.of(transactions).find(asset_name, previous_date, current_date)
 
 
 def find_matching_transactions_for_buy(
-    transactions: List[Dict[str, Any]],
+    transactions: Union[TransactionIndex, List[Dict[str, Any]]],
     asset_name: str,
-    previous_date: str,
-    current_date: str
+    previous_date: Union[str, float],
+    current_date: Union[str, float]
 ) -> List[Dict[str, Any]]:
     """
     Find buy transactions matching asset name within date range.
     
     Args:
-        transactions: List of all parsed buy transactions
+        transactions: TransactionIndex over the buy transactions (or the
+            list of parsed buy transactions, indexed on the fly)
         asset_name: Asset name to match (case-sensitive exact match)
-        previous_date: Start of period (ISO format, exclusive)
-        current_date: End of period (ISO format, inclusive)
+        previous_date: Start of period (ISO format or POSIX seconds, exclusive)
+        current_date: End of period (ISO format or POSIX seconds, inclusive)
     
     Returns:
         List of matching buy transaction dicts
     """
-    # Parse date strings
-    prev_dt = datetime.fromisoformat(previous_date.replace('Z', '+00:00'))
-    curr_dt = datetime.fromisoformat(current_date.replace('Z', '+00:00'))
-    
-    matching = []
-    for txn in transactions:
-        # Exact name match (case-sensitive)
-        if txn.get("asset_name") != asset_name:
-            continue
-        
-        # Date range: previous < txn_date <= current
-        txn_date_str = txn.get("date")
-        if not txn_date_str:
-            continue
-        
-        try:
-            txn_date = datetime.fromisoformat(txn_date_str.replace('Z', '+00:00'))
-        except (ValueError, AttributeError):
-            continue
-        
-        if prev_dt < txn_date <= curr_dt:
-            matching.append(txn)
-    
-    return matching
+    return TransactionIndex.of(transactions, "buy transaction").find(asset_name, previous_date, current_date)
 
 
 def create_portfolio_snapshot(normalized_data: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -110,6 +69,7 @@ def create_portfolio_snapshot(normalized_data: List[Dict[str, Any]]) -> Dict[str
         dict: Snapshot conforming to the Snapshot JSON Schema:
         {
             "timestamp": "YYYY-MM-DDTHH:MM:SSZ",
+            "epoch": 1735725600.0,  # timestamp as POSIX seconds
             "total_value_eur": 123456.78,
             "assets": [
                 {
@@ -123,8 +83,10 @@ def create_portfolio_snapshot(normalized_data: List[Dict[str, Any]]) -> Dict[str
         }
     """
     try:
-        # Generate current UTC timestamp in ISO 8601 format
-        timestamp = datetime.now(timezone.utc).isoformat()
+        # Generate current UTC timestamp in ISO 8601 format (and as POSIX
+        # seconds, so time lookups don't have to parse it)
+        now = datetime.now(timezone.utc)
+        timestamp = now.isoformat()
 
         # Calculate total value by summing current_value_eur of all assets
         total_value_eur = sum(
@@ -134,6 +96,7 @@ def create_portfolio_snapshot(normalized_data: List[Dict[str, Any]]) -> Dict[str
         # Create snapshot
         snapshot = {
             "timestamp": timestamp,
+            "epoch": now.timestamp(),
             "total_value_eur": round(total_value_eur, 2),
             "assets": normalized_data.copy(),
         }
@@ -151,8 +114,9 @@ def create_portfolio_snapshot(normalized_data: List[Dict[str, Any]]) -> Dict[str
 def compare_snapshots(
     current_snapshot: Dict[str, Any],
     previous_snapshot: Dict[str, Any],
-    sell_transactions: List[Dict[str, Any]],
-    buy_transactions: List[Dict[str, Any]]
+    sell_transactions: Union[TransactionIndex, List[Dict[str, Any]]],
+    buy_transactions: Union[TransactionIndex, List[Dict[str, Any]]],
+    diff: Optional[SnapshotDiff] = None
 ) -> Dict[str, Any]:
     """
     Performs week-over-week comparison and generates a structured report object.
@@ -160,8 +124,9 @@ def compare_snapshots(
     Args:
         current_snapshot: Current snapshot dictionary
         previous_snapshot: Previous snapshot dictionary
-        sell_transactions: List of parsed sell transactions
-        buy_transactions: List of parsed buy transactions
+        sell_transactions: Parsed sell transactions (list or TransactionIndex)
+        buy_transactions: Parsed buy transactions (list or TransactionIndex)
+        diff: SnapshotDiff of the two snapshots, if already computed
 
     Returns:
         dict: Analysis report with schema:
@@ -175,39 +140,41 @@ def compare_snapshots(
         }
     """
     try:
-        # Create sets of asset names for efficient comparison
-        current_assets = {
-            asset["name"]: asset for asset in current_snapshot.get("assets", [])
-        }
-        previous_assets = {
-            asset["name"]: asset for asset in previous_snapshot.get("assets", [])
-        }
-
-        current_names = set(current_assets.keys())
-        previous_names = set(previous_assets.keys())
-
-        # Identify asset categories
-        held_names = current_names & previous_names
-        new_names = current_names - previous_names
-        sold_names = previous_names - current_names
+        # Index transactions once; every changed asset is looked up below
+        sell_transactions = TransactionIndex.of(sell_transactions)
+        buy_transactions = TransactionIndex.of(buy_transactions, "buy transaction")
+        period_start, period_end = snapshot_period(previous_snapshot, current_snapshot)
+
+        # Match assets by name once (or reuse the caller's diff)
+        diff = SnapshotDiff.of(current_snapshot, previous_snapshot, diff)
+        current_assets = diff.current_assets
+        previous_assets = diff.previous_assets
+        held_names = diff.held_names
+        new_names = diff.new_names
+        sold_names = diff.sold_names
 
         logger.info(
             f"Portfolio comparison: {len(held_names)} held, {len(new_names)} new, {len(sold_names)} sold"
         )
 
-        # Analyze held assets
+        # Analyze held assets: value changes and quantity changes in one pass
         asset_changes = []
+        quantity_changes = []
+        QUANTITY_CHANGE_THRESHOLD = 0.01  # Ignore changes < 0.01 shares
+
         for name in held_names:
-            current_asset = current_assets[name]
-            previous_asset = previous_assets[name]
+            change = diff.changes[name]
+            current_asset = change.current
+            previous_asset = change.previous
 
-            current_value = current_asset.get("current_value_eur", 0.0)
-            previous_value = previous_asset.get("current_value_eur", 0.0)
-            current_qty = current_asset.get("quantity", 0.0)
-            previous_qty = previous_asset.get("quantity", 0.0)
+            current_value = change.current_value
+            previous_value = change.previous_value
+            current_qty = change.current_quantity
+            previous_qty = change.previous_quantity
+            qty_change = change.quantity_change
 
             # Check if quantity changed
-            if abs(current_qty - previous_qty) > 0.01:
+            if abs(qty_change) > 0.01:
                 # Normalize value change to account for quantity change
                 # Calculate what the current value would be if quantity hadn't changed
                 if current_qty > 0 and previous_qty > 0:
@@ -223,37 +190,8 @@ def compare_snapshots(
 
             asset_changes.append({"name": name, "change_eur": round(change_eur, 2)})
 
-        # Sort by absolute change to find top movers
-        asset_changes.sort(key=lambda x: abs(x["change_eur"]), reverse=True)
-
-        # Get top 5 gainers and top 5 losers
-        positive_changes = [
-            change for change in asset_changes if change["change_eur"] > 0
-        ]
-        negative_changes = [
-            change for change in asset_changes if change["change_eur"] < 0
-        ]
-
-        top_movers = positive_changes[:5] if positive_changes else []
-        bottom_movers = negative_changes[:5] if negative_changes else []
-
-        # Track quantity changes for held positions
-        quantity_changes = []
-        QUANTITY_CHANGE_THRESHOLD = 0.01  # Ignore changes < 0.01 shares
-
-        for name in held_names:
-            current_asset = current_assets[name]
-            previous_asset = previous_assets[name]
-
-            current_qty = current_asset.get("quantity", 0.0)
-            previous_qty = previous_asset.get("quantity", 0.0)
-            qty_change = current_qty - previous_qty
-
-            # Only track significant quantity changes
+            # Track significant quantity changes
             if abs(qty_change) > QUANTITY_CHANGE_THRESHOLD:
-                current_value = current_asset.get("current_value_eur", 0.0)
-                previous_value = previous_asset.get("current_value_eur", 0.0)
-
                 # Calculate price per share
                 current_price_per_share = (
                     current_value / current_qty if current_qty > 0 else 0
@@ -280,8 +218,8 @@ def compare_snapshots(
                     matching_txns = find_matching_transactions_for_sell(
                         transactions=sell_transactions,
                         asset_name=name,
-                        previous_date=previous_snapshot["timestamp"],
-                        current_date=current_snapshot["timestamp"]
+                        previous_date=period_start,
+                        current_date=period_end
                     )
                     
                     if matching_txns:
@@ -307,8 +245,8 @@ def compare_snapshots(
                     matching_buy_txns = find_matching_transactions_for_buy(
                         transactions=buy_transactions,
                         asset_name=name,
-                        previous_date=previous_snapshot["timestamp"],
-                        current_date=current_snapshot["timestamp"]
+                        previous_date=period_start,
+                        current_date=period_end
                     )
                     
                     if matching_buy_txns:
@@ -324,6 +262,20 @@ def compare_snapshots(
                 
                 quantity_changes.append(change_info)
 
+        # Sort by absolute change to find top movers
+        asset_changes.sort(key=lambda x: abs(x["change_eur"]), reverse=True)
+
+        # Get top 5 gainers and top 5 losers
+        positive_changes = [
+            change for change in asset_changes if change["change_eur"] > 0
+        ]
+        negative_changes = [
+            change for change in asset_changes if change["change_eur"] < 0
+        ]
+
+        top_movers = positive_changes[:5] if positive_changes else []
+        bottom_movers = negative_changes[:5] if negative_changes else []
+
         # Sort quantity changes: purchases first (by quantity desc), then sales (by abs quantity desc)
         quantity_changes.sort(
             key=lambda x: (x["change_type"] == "sale", -abs(x["quantity_change"]))
@@ -340,8 +292,8 @@ def compare_snapshots(
             matching_buy_txns = find_matching_transactions_for_buy(
                 transactions=buy_transactions,
                 asset_name=name,
-                previous_date=previous_snapshot["timestamp"],
-                current_date=current_snapshot["timestamp"]
+                previous_date=period_start,
+                current_date=period_end
             )
             
             position_info = {
@@ -374,8 +326,8 @@ def compare_snapshots(
             matching_txns = find_matching_transactions_for_sell(
                 transactions=sell_transactions,
                 asset_name=name,
-                previous_date=previous_snapshot["timestamp"],
-                current_date=current_snapshot["timestamp"]
+                previous_date=period_start,
+                current_date=period_end
             )
             
             # Use explicit sell prices from transactions
@@ -0,0 +1,462 @@
+"""
+Materialized Asset Panel
+
+Dense time × asset matrices of the snapshot history, so dashboard charts
+slice arrays instead of rebuilding time series from snapshot dicts:
+
+- values / quantities: one row per snapshot (history order), one column
+  per asset name; NaN where the snapshot doesn't hold the asset
+- category_values: one row per snapshot, one column per category; the
+  snapshot's assets summed by their category at that time, NaN where the
+  snapshot holds nothing in the category
+- timestamps, epochs, totals, value_squares, hashes: one entry per row
+- names, categories: one label per asset column; category_names: one
+  label per category column (in order of first appearance)
+
+Per-asset columns follow the per-asset dashboard charts: a snapshot listing
+a name twice keeps the last entry, unnamed assets get no column, and the
+column's category is the most recent one. Per-row aggregates (category
+totals, sum of squared values for the HHI) are taken over every asset
+entry as listed, so they match summing the snapshot dicts.
+
+The storage facade persists the panel next to the local history
+(PANEL_FILE, an uncompressed .npz). A save doesn't rewrite that file: it
+writes just the new rows to a small chunk file named after their first row
+(see append_rows); load stacks the chunks onto the panel, and save folds
+them back in. The facade rebuilds the panel when its row hashes no longer
+match the snapshot index.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .storage_backend import compute_snapshot_hash, snapshot_epoch
+
+logger = logging.getLogger(__name__)
+
+PANEL_FILE = "portfolio_panel.npz"
+
+# Chunk files of appended rows: portfolio_panel.rows-<first row>.npz
+PANEL_CHUNK_PREFIX = "portfolio_panel.rows-"
+PANEL_CHUNK_SUFFIX = ".npz"
+
+# Chunks read before load callers fold them into the panel file
+MAX_PANEL_CHUNKS = 64
+
+# Bumped when the persisted arrays change meaning; older files are rebuilt
+PANEL_FORMAT = 2
+
+# Currency exposure assumed per category (snapshots carry no currency)
+CURRENCY_BY_CATEGORY = {
+    "US Stocks": "USD",
+    "EU Stocks": "EUR",
+    "Bonds": "EUR",
+    "ETFs": "Mixed",
+    "Pension": "EUR",
+    "Cash": "EUR"
+}
+
+
+def _latest_assets(snapshot: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Named assets of a snapshot by name (last entry wins)."""
+    return {asset["name"]: asset for asset in snapshot.get("assets", []) if asset.get("name")}
+
+
+def _category_totals(snapshot: Dict[str, Any]) -> Dict[str, float]:
+    """Asset values of a snapshot summed by category, over every asset entry."""
+    totals: Dict[str, float] = {}
+    for asset in snapshot.get("assets", []):
+        category = asset.get("category", "Other")
+        totals[category] = totals.get(category, 0.0) + asset.get("current_value_eur", 0.0)
+    return totals
+
+
+def _columns(labels: Iterable[str], columns: Dict[str, int]) -> List[int]:
+    """Column positions of labels, adding unseen labels at the end."""
+    return [columns.setdefault(label, len(columns)) for label in labels]
+
+
+class AssetPanel:
+    """Value and quantity matrices (snapshots × assets) with row and column labels."""
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        epochs: np.ndarray,
+        totals: np.ndarray,
+        value_squares: np.ndarray,
+        hashes: np.ndarray,
+        names: np.ndarray,
+        categories: np.ndarray,
+        category_names: np.ndarray,
+        values: np.ndarray,
+        quantities: np.ndarray,
+        category_values: np.ndarray
+    ):
+        """
+        Wrap panel arrays (use from_snapshots or load to build one).
+
+        Args:
+            timestamps: ISO timestamp per row
+            epochs: POSIX seconds per row (NaN if unparseable)
+            totals: total_value_eur per row
+            value_squares: Sum of squared current_value_eur per row
+            hashes: Snapshot content hash per row
+            names: Asset name per column
+            categories: Latest category per asset column
+            category_names: Category per category column
+            values: current_value_eur, shape (rows, asset columns)
+            quantities: quantity, shape (rows, asset columns)
+            category_values: Summed current_value_eur, shape (rows, category columns)
+        """
+        self.timestamps = timestamps
+        self.epochs = epochs
+        self.totals = totals
+        self.value_squares = value_squares
+        self.hashes = hashes
+        self.names = names
+        self.categories = categories
+        self.category_names = category_names
+        self.values = values
+        self.quantities = quantities
+        self.category_values = category_values
+
+    @classmethod
+    def empty(cls) -> "AssetPanel":
+        """Create a panel with no rows and no columns."""
+        return cls.from_snapshots([])
+
+    @classmethod
+    def from_snapshots(
+        cls,
+        snapshots: Iterable[Dict[str, Any]],
+        hashes: Optional[Sequence[str]] = None
+    ) -> "AssetPanel":
+        """
+        Build a panel from snapshots in history order.
+
+        Args:
+            snapshots: Snapshots, one row each
+            hashes: Precomputed content hashes (computed if omitted)
+
+        Returns:
+            AssetPanel: New panel
+        """
+        snapshots = list(snapshots)
+        if hashes is None:
+            hashes = [compute_snapshot_hash(snapshot) for snapshot in snapshots]
+
+        rows = [_latest_assets(snapshot) for snapshot in snapshots]
+        columns: Dict[str, int] = {}
+        categories: List[str] = []
+        for assets in rows:
+            for name, asset in assets.items():
+                category = asset.get("category", "Other")
+                if name not in columns:
+                    columns[name] = len(categories)
+                    categories.append(category)
+                else:
+                    categories[columns[name]] = category
+
+        values = np.full((len(rows), len(columns)), np.nan)
+        quantities = np.full((len(rows), len(columns)), np.nan)
+        for row, assets in enumerate(rows):
+            for name, asset in assets.items():
+                values[row, columns[name]] = asset.get("current_value_eur", 0.0)
+                quantities[row, columns[name]] = asset.get("quantity", 0.0)
+
+        category_rows = [_category_totals(snapshot) for snapshot in snapshots]
+        category_columns: Dict[str, int] = {}
+        for totals in category_rows:
+            _columns(totals, category_columns)
+        category_values = np.full((len(rows), len(category_columns)), np.nan)
+        for row, totals in enumerate(category_rows):
+            for category, total in totals.items():
+                category_values[row, category_columns[category]] = total
+
+        return cls(
+            np.array([str(s.get("timestamp", "")) for s in snapshots], dtype=str),
+            np.array([
+                np.nan if epoch is None else epoch
+                for epoch in (snapshot_epoch(s) for s in snapshots)
+            ], dtype=np.float64),
+            np.array([s.get("total_value_eur", 0.0) for s in snapshots], dtype=np.float64),
+            np.array([
+                sum(asset.get("current_value_eur", 0.0) ** 2 for asset in s.get("assets", []))
+                for s in snapshots
+            ], dtype=np.float64),
+            np.array(list(hashes), dtype=str),
+            np.array(list(columns), dtype=str),
+            np.array(categories, dtype=str),
+            np.array(list(category_columns), dtype=str),
+            values,
+            quantities,
+            category_values
+        )
+
+    @classmethod
+    def concat(cls, panels: Sequence["AssetPanel"]) -> "AssetPanel":
+        """
+        Stack panels row-wise, matching columns by label.
+
+        A column's category comes from the last panel holding it.
+
+        Args:
+            panels: Panels in history order
+
+        Returns:
+            AssetPanel: New panel with every row of every panel
+        """
+        columns: Dict[str, int] = {}
+        category_columns: Dict[str, int] = {}
+        for panel in panels:
+            _columns(panel.names.tolist(), columns)
+            _columns(panel.category_names.tolist(), category_columns)
+        categories = [""] * len(columns)
+
+        rows = sum(len(panel) for panel in panels)
+        values = np.full((rows, len(columns)), np.nan)
+        quantities = np.full((rows, len(columns)), np.nan)
+        category_values = np.full((rows, len(category_columns)), np.nan)
+
+        start = 0
+        for panel in panels:
+            stop = start + len(panel)
+            held = [columns[name] for name in panel.names.tolist()]
+            values[start:stop, held] = panel.values
+            quantities[start:stop, held] = panel.quantities
+            category_values[start:stop, [category_columns[c] for c in panel.category_names.tolist()]] = panel.category_values
+            for column, category in zip(held, panel.categories.tolist()):
+                categories[column] = category
+            start = stop
+
+        def stacked(field: str) -> np.ndarray:
+            return np.concatenate([getattr(panel, field) for panel in panels])
+
+        return cls(
+            stacked("timestamps"),
+            stacked("epochs"),
+            stacked("totals"),
+            stacked("value_squares"),
+            stacked("hashes"),
+            np.array(list(columns), dtype=str),
+            np.array(categories, dtype=str),
+            np.array(list(category_columns), dtype=str),
+            values,
+            quantities,
+            category_values
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def extend(
+        self,
+        snapshots: Iterable[Dict[str, Any]],
+        hashes: Optional[Sequence[str]] = None
+    ) -> None:
+        """
+        Append one row per snapshot, adding columns for new asset names and categories.
+
+        Args:
+            snapshots: Snapshots in history order
+            hashes: Precomputed content hashes (computed if omitted)
+        """
+        snapshots = list(snapshots)
+        if not snapshots:
+            return
+        vars(self).update(vars(AssetPanel.concat([self, AssetPanel.from_snapshots(snapshots, hashes)])))
+
+    def matches(self, hashes: Sequence[str]) -> bool:
+        """Whether the panel rows are exactly the snapshots with these content hashes."""
+        return self.hashes.tolist() == list(hashes)
+
+    def take(self, rows: np.ndarray) -> "AssetPanel":
+        """
+        Select rows, keeping only the columns held in at least one of them.
+
+        Args:
+            rows: Row positions, in the order wanted
+
+        Returns:
+            AssetPanel: New panel sharing no arrays with this one
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        values = self.values[rows]
+        held = ~np.isnan(values).all(axis=0)
+        category_values = self.category_values[rows]
+        held_categories = ~np.isnan(category_values).all(axis=0)
+        return AssetPanel(
+            self.timestamps[rows],
+            self.epochs[rows],
+            self.totals[rows],
+            self.value_squares[rows],
+            self.hashes[rows],
+            self.names[held],
+            self.categories[held],
+            self.category_names[held_categories],
+            values[:, held],
+            self.quantities[rows][:, held],
+            category_values[:, held_categories]
+        )
+
+    def since(self, epoch: float) -> "AssetPanel":
+        """Rows taken at or after a POSIX time, in chronological order."""
+        rows = np.flatnonzero(self.epochs >= epoch)
+        return self.take(rows[np.argsort(self.epochs[rows], kind="stable")])
+
+    def tail(self, count: int) -> "AssetPanel":
+        """The last count rows."""
+        return self.take(np.arange(max(0, len(self) - count), len(self)))
+
+    def filled_values(self) -> np.ndarray:
+        """Value matrix with 0 where an asset isn't held."""
+        return np.nan_to_num(self.values, nan=0.0)
+
+    def filled_quantities(self) -> np.ndarray:
+        """Quantity matrix with 0 where an asset isn't held."""
+        return np.nan_to_num(self.quantities, nan=0.0)
+
+    def filled_category_values(self) -> np.ndarray:
+        """Category total matrix with 0 where a snapshot holds nothing in the category."""
+        return np.nan_to_num(self.category_values, nan=0.0)
+
+    def save(self, path: str) -> None:
+        """
+        Write the whole panel to an .npz file, replacing its chunk files.
+
+        Args:
+            path: Destination file
+        """
+        self._write(path)
+        for _, chunk in list_chunks(path):
+            try:
+                os.remove(chunk)
+            except FileNotFoundError:
+                pass
+
+    def _write(self, path: str) -> None:
+        """Write the panel arrays to one .npz file atomically (temp file + rename)."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                format=np.array(PANEL_FORMAT),
+                timestamps=self.timestamps,
+                epochs=self.epochs,
+                totals=self.totals,
+                value_squares=self.value_squares,
+                hashes=self.hashes,
+                names=self.names,
+                categories=self.categories,
+                category_names=self.category_names,
+                values=self.values,
+                quantities=self.quantities,
+                category_values=self.category_values
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def _read(cls, path: str) -> Optional["AssetPanel"]:
+        """Read one .npz file written by _write (None if in an older format)."""
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format"]) != PANEL_FORMAT:
+                return None
+            return cls(
+                data["timestamps"], data["epochs"], data["totals"], data["value_squares"],
+                data["hashes"], data["names"], data["categories"], data["category_names"],
+                data["values"], data["quantities"], data["category_values"]
+            )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["AssetPanel"]:
+        """
+        Read a panel written by save, with the rows appended since.
+
+        Chunks starting before the end of the panel were already folded in
+        (left behind by an interrupted save) and are skipped.
+
+        Args:
+            path: Panel file
+
+        Returns:
+            AssetPanel: The panel, or None if the file is missing, unreadable,
+                        in an older format or missing appended rows
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            panel = cls._read(path)
+            if panel is None:
+                return None
+            parts = [panel]
+            rows = len(panel)
+            for offset, chunk in list_chunks(path):
+                if offset < rows:
+                    continue
+                part = cls._read(chunk) if offset == rows else None
+                if part is None:
+                    logger.debug(f"Asset panel chunk {chunk} doesn't follow row {rows}")
+                    return None
+                parts.append(part)
+                rows += len(part)
+            return cls.concat(parts) if len(parts) > 1 else panel
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable asset panel {path}: {e}")
+            return None
+
+
+def chunk_path(path: str, offset: int) -> str:
+    """Chunk file holding the rows appended at a row offset of the panel in path."""
+    return os.path.join(os.path.dirname(path), f"{PANEL_CHUNK_PREFIX}{offset:010d}{PANEL_CHUNK_SUFFIX}")
+
+
+def list_chunks(path: str) -> List[Tuple[int, str]]:
+    """Chunk files of the panel in path as (first row, file), by first row."""
+    directory = os.path.dirname(path) or "."
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    chunks = []
+    for filename in filenames:
+        if filename.startswith(PANEL_CHUNK_PREFIX) and filename.endswith(PANEL_CHUNK_SUFFIX):
+            offset = filename[len(PANEL_CHUNK_PREFIX):-len(PANEL_CHUNK_SUFFIX)]
+            if offset.isdigit():
+                chunks.append((int(offset), os.path.join(directory, filename)))
+    return sorted(chunks)
+
+
+def append_rows(
+    path: str,
+    offset: int,
+    snapshots: Sequence[Dict[str, Any]],
+    hashes: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Persist rows appended to the panel in path without rewriting it.
+
+    Writes only the new rows, as a chunk file that load stacks onto the
+    panel. Whether the panel really ended at offset is checked on load (by
+    row hashes), not here.
+
+    Args:
+        path: Panel file
+        offset: Row position of the first snapshot
+        snapshots: Snapshots in history order
+        hashes: Precomputed content hashes (computed if omitted)
+    """
+    AssetPanel.from_snapshots(snapshots, hashes)._write(chunk_path(path, offset))
+
+
+def panel_path(data_dir: Optional[str]) -> Optional[str]:
+    """Panel file location in a backend's data directory (None keeps it in memory only)."""
+    return os.path.join(data_dir, PANEL_FILE) if data_dir else None
+
+
+def hashes_of(index: List[Dict[str, Any]]) -> List[str]:
+    """Content hashes of snapshot index entries, in history order."""
+    return [entry["hash"] for entry in index]
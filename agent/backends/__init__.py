@@ -5,10 +5,12 @@ Available backends:
 - LocalFileBackend: Local JSON file storage
 - GCPStorageBackend: Google Cloud Storage
 - HybridStorageBackend: Primary + fallback with automatic retry
+- SQLiteStorageBackend: SQLite database with indexed snapshot/asset tables
 """
 
 from .local_storage import LocalFileBackend
 from .gcp_storage import GCPStorageBackend
 from .hybrid_storage import HybridStorageBackend
+from .sqlite_storage import SQLiteStorageBackend
 
-__all__ = ["LocalFileBackend", "GCPStorageBackend", "HybridStorageBackend"]
+__all__ = ["LocalFileBackend", "GCPStorageBackend", "HybridStorageBackend", "SQLiteStorageBackend"]
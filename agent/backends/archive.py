@@ -0,0 +1,163 @@
+"""
+Per-year archives of full-resolution snapshot history.
+
+Retention (see agent/retention.py) thins out old snapshots in the hot
+history. Before it does, every snapshot of the affected years is copied to
+a cold archive holding one year each:
+
+    archive/portfolio_history.<year>.json.gz
+
+An archive is a gzip-compressed JSON array in timestamp order. Writing
+merges with the archive already stored for that year (by content hash), so
+archiving the same snapshots twice adds nothing.
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from ..json_codec import dumps, loads
+from ..storage_backend import compute_snapshot_hash, snapshot_epoch
+from .compression import compress_payload, decompress_payload
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_NAME_PATTERN = re.compile(r"^portfolio_history\.(\d{4})\.json\.gz$")
+
+
+def archive_name(year: int) -> str:
+    """Return the file/object name of a year's archive."""
+    return f"portfolio_history.{year}.json.gz"
+
+
+def snapshot_year(snapshot: Dict[str, Any]) -> Optional[int]:
+    """Return the UTC year of a snapshot's timestamp (None if it can't be parsed)."""
+    epoch = snapshot_epoch(snapshot)
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).year
+
+
+def group_by_year(snapshots: Sequence[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Group snapshots by year, keeping their order.
+
+    Snapshots without a parseable timestamp are left out (retention never
+    drops them, so they never need archiving).
+    """
+    years: Dict[int, List[Dict[str, Any]]] = {}
+    for snapshot in snapshots:
+        year = snapshot_year(snapshot)
+        if year is not None:
+            years.setdefault(year, []).append(snapshot)
+    return years
+
+
+def merge_archive(
+    existing: List[Dict[str, Any]],
+    snapshots: Sequence[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Add snapshots to an archive, skipping ones it already holds.
+
+    Args:
+        existing: Snapshots currently in the archive
+        snapshots: Snapshots to add
+
+    Returns:
+        tuple: (merged archive in timestamp order, number of snapshots added)
+    """
+    known = {compute_snapshot_hash(snapshot) for snapshot in existing}
+    merged = list(existing)
+    for snapshot in snapshots:
+        content_hash = compute_snapshot_hash(snapshot)
+        if content_hash not in known:
+            known.add(content_hash)
+            merged.append(snapshot)
+    merged.sort(key=lambda s: snapshot_epoch(s) or 0.0)
+    return merged, len(merged) - len(existing)
+
+
+def encode_archive(snapshots: List[Dict[str, Any]]) -> bytes:
+    """Serialize an archive (always gzip: archives are cold data)."""
+    return compress_payload(dumps(snapshots), "gzip")
+
+
+def decode_archive(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Parse a stored archive.
+
+    Raises:
+        ValueError: If the archive is not a JSON array
+    """
+    snapshots = loads(decompress_payload(data))
+    if not isinstance(snapshots, list):
+        raise ValueError(f"Archive has invalid format: expected list, got {type(snapshots).__name__}")
+    return snapshots
+
+
+class FileArchive:
+    """Per-year archives stored as files in a directory."""
+
+    def __init__(self, archive_dir: str):
+        """
+        Initialize the archive (the directory is created on first write).
+
+        Args:
+            archive_dir: Directory holding the per-year archive files
+        """
+        self.archive_dir = archive_dir
+
+    def write(self, snapshots: Sequence[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Merge snapshots into their years' archives.
+
+        Args:
+            snapshots: Snapshots to archive
+
+        Returns:
+            dict: {year: snapshots added}
+
+        Raises:
+            ValueError: If an existing archive can't be parsed
+            IOError: If an archive can't be written
+        """
+        added = {}
+        for year, year_snapshots in sorted(group_by_year(snapshots).items()):
+            merged, added[year] = merge_archive(self.read(year), year_snapshots)
+            if not added[year]:
+                continue
+
+            path = os.path.join(self.archive_dir, archive_name(year))
+            temp_path = f"{path}.tmp"
+            os.makedirs(self.archive_dir, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                f.write(encode_archive(merged))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            logger.info(f"FileArchive: Archived {added[year]} snapshots to {path}")
+        return added
+
+    def read(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return the archived snapshots of a year (empty if there is no archive).
+
+        Raises:
+            ValueError: If the archive can't be parsed
+        """
+        path = os.path.join(self.archive_dir, archive_name(year))
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            return decode_archive(f.read())
+
+    def years(self) -> List[int]:
+        """Return the years that have an archive, oldest first."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        matches = (ARCHIVE_NAME_PATTERN.match(name) for name in os.listdir(self.archive_dir))
+        return sorted(int(match.group(1)) for match in matches if match)
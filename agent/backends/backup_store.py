@@ -0,0 +1,324 @@
+"""
+Content-addressed backup store for snapshot history.
+
+Every snapshot is stored once, named by its content hash, and a backup is a
+small manifest listing the hashes of the history at that moment:
+
+    backup/objects/<ab>/<hash>.json          one snapshot (optionally gzip)
+    backup/manifests/<backup id>.json        ordered hashes of one backup
+
+Creating a backup only writes the snapshots the store doesn't hold yet plus
+the manifest, so its cost is proportional to the new data. A manifest keeps
+the exact order of the history and, for backups taken before deleted
+snapshots are dropped (compaction, deletes), which of its snapshots were
+deleted, so restores are point-in-time exact.
+
+Retention keeps the `keep` most recent backups plus any younger than
+`keep_days`; snapshots no remaining backup references are removed.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import logging
+
+from ..json_codec import dumps, loads
+from ..storage_backend import DEFAULT_KEEP_BACKUPS, compute_snapshot_hash
+from .compression import compress_payload, decompress_payload, validate_compression
+
+logger = logging.getLogger(__name__)
+
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+MANIFEST_VERSION = 1
+
+
+def object_name(content_hash: str) -> str:
+    """Return the file name part of a "sha256:<hex>" content hash."""
+    return content_hash.split(":", 1)[-1]
+
+
+class BackupStore:
+    """Deduplicating, content-addressed store of history backups."""
+
+    def __init__(
+        self,
+        backup_dir: str,
+        compression: str = "none",
+        keep: int = DEFAULT_KEEP_BACKUPS,
+        keep_days: float = 0,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize the store (directories are created on first write).
+
+        Args:
+            backup_dir: Directory holding objects/ and manifests/
+            compression: "none" or "gzip" for stored snapshots
+            keep: Most recent backups kept by retention
+            keep_days: Backups younger than this are kept as well (0: count only)
+            clock: Wall-clock time source (replaceable in tests)
+        """
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, OBJECTS_DIR)
+        self.manifests_dir = os.path.join(backup_dir, MANIFESTS_DIR)
+        self.compression = validate_compression(compression)
+        self.keep = keep
+        self.keep_days = keep_days
+        self._clock = clock
+
+    def has_object(self, content_hash: str) -> bool:
+        """Return True if the snapshot with this hash is stored."""
+        return os.path.exists(self._object_path(content_hash))
+
+    def put(self, snapshot: Dict[str, Any], content_hash: Optional[str] = None) -> str:
+        """
+        Store a snapshot unless an identical one is stored already.
+
+        Args:
+            snapshot: Snapshot dictionary
+            content_hash: Precomputed compute_snapshot_hash() value (optional)
+
+        Returns:
+            str: The snapshot's content hash
+
+        Raises:
+            IOError: If the object can't be written
+        """
+        content_hash = content_hash or compute_snapshot_hash(snapshot)
+        path = self._object_path(content_hash)
+        if not os.path.exists(path):
+            payload = dumps(snapshot)
+            self._write_atomic(path, compress_payload(payload, self.compression))
+        return content_hash
+
+    def get(self, content_hash: str) -> Dict[str, Any]:
+        """
+        Read a stored snapshot and verify its contents.
+
+        Args:
+            content_hash: Content hash of the snapshot
+
+        Returns:
+            dict: The snapshot
+
+        Raises:
+            FileNotFoundError: If the snapshot isn't stored
+            ValueError: If the stored snapshot doesn't match its hash
+        """
+        with open(self._object_path(content_hash), "rb") as f:
+            snapshot = loads(decompress_payload(f.read()))
+        if compute_snapshot_hash(snapshot) != content_hash:
+            raise ValueError(f"Backup object {object_name(content_hash)} is corrupted (hash mismatch)")
+        return snapshot
+
+    def create_backup(
+        self,
+        hashes: Sequence[str],
+        fetch: Callable[[List[str]], Iterable[Dict[str, Any]]],
+        deleted: Sequence[int] = (),
+        reason: str = "manual",
+        source: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Record a backup of a history given as content hashes.
+
+        Only snapshots the store doesn't hold yet are requested from fetch
+        and written; then the manifest is written and retention applied.
+
+        Args:
+            hashes: Content hashes of the stored history, in order
+            fetch: Returns the snapshots for a list of missing hashes
+            deleted: Positions (in hashes) of snapshots deleted at backup time
+            reason: Operation that triggered the backup (e.g. "compact")
+            source: Name of the backed-up history (for listings)
+
+        Returns:
+            dict: Backup summary (see list_backups) plus "new_objects"
+
+        Raises:
+            ValueError: If fetch didn't return every missing snapshot
+            IOError: If an object or the manifest can't be written
+        """
+        # Step 1: Store snapshots not backed up before
+        missing = [h for h in dict.fromkeys(hashes) if not self.has_object(h)]
+        if missing:
+            wanted = set(missing)
+            for snapshot in fetch(missing):
+                content_hash = compute_snapshot_hash(snapshot)
+                if content_hash in wanted:
+                    self.put(snapshot, content_hash)
+                    wanted.discard(content_hash)
+            if wanted:
+                raise ValueError(f"{len(wanted)} snapshots to back up could not be read")
+
+        # Step 2: Write the manifest
+        now = self._clock()
+        created = datetime.fromtimestamp(now, tz=timezone.utc)
+        backup_id = f"{created.strftime('%Y%m%d-%H%M%S-%f')}-{reason}"
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": backup_id,
+            "created_at": created.isoformat(),
+            "reason": reason,
+            "source": source,
+            "snapshots": list(hashes),
+            "deleted": sorted(deleted),
+        }
+        self._write_atomic(
+            os.path.join(self.manifests_dir, f"{backup_id}.json"),
+            dumps(manifest)
+        )
+        logger.info(
+            f"BackupStore: Created backup {backup_id} ({len(hashes)} snapshots, "
+            f"{len(missing)} new)"
+        )
+
+        # Step 3: Apply retention
+        self.prune(self.keep, self.keep_days)
+
+        return {**self._summary(manifest), "new_objects": len(missing)}
+
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """
+        List backups, newest first.
+
+        Returns:
+            list: {"id", "created_at", "reason", "source", "count",
+                   "deleted_count"} per backup
+        """
+        return [self._summary(manifest) for manifest in self._read_manifests()]
+
+    def load_backup(self, backup_id: str, include_deleted: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return the history recorded by a backup.
+
+        Args:
+            backup_id: Backup to load (see list_backups)
+            include_deleted: Also return snapshots that were deleted (but not
+                             yet dropped) when the backup was taken
+
+        Returns:
+            list: Snapshots in their original order
+
+        Raises:
+            KeyError: If the backup doesn't exist
+            FileNotFoundError, ValueError: If a snapshot is missing or corrupted
+        """
+        manifest = self._read_manifest(backup_id)
+        if manifest is None:
+            raise KeyError(f"Backup not found: {backup_id}")
+
+        deleted = set() if include_deleted else set(manifest.get("deleted") or [])
+        return [
+            self.get(content_hash)
+            for position, content_hash in enumerate(manifest["snapshots"])
+            if position not in deleted
+        ]
+
+    def prune(self, keep: int, keep_days: float = 0) -> Dict[str, int]:
+        """
+        Apply the retention policy and remove unreferenced snapshots.
+
+        Args:
+            keep: Most recent backups to keep
+            keep_days: Backups younger than this many days are kept too
+
+        Returns:
+            dict: {"backups_removed", "objects_removed", "bytes_freed"}
+        """
+        manifests = self._read_manifests()
+        cutoff = self._clock() - keep_days * 86400
+
+        kept = []
+        backups_removed = 0
+        for position, manifest in enumerate(manifests):
+            created = datetime.fromisoformat(manifest["created_at"]).timestamp()
+            if position < max(keep, 0) or (keep_days > 0 and created >= cutoff):
+                kept.append(manifest)
+                continue
+            try:
+                os.remove(os.path.join(self.manifests_dir, f"{manifest['id']}.json"))
+                backups_removed += 1
+            except OSError as e:
+                logger.warning(f"BackupStore: Failed to remove backup {manifest['id']}: {e}")
+                kept.append(manifest)
+
+        # Mark and sweep: objects no kept manifest refers to
+        referenced = {object_name(h) for manifest in kept for h in manifest["snapshots"]}
+        objects_removed = 0
+        bytes_freed = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    if name.endswith(".json") and name[:-len(".json")] not in referenced:
+                        path = os.path.join(prefix_dir, name)
+                        try:
+                            size = os.path.getsize(path)
+                            os.remove(path)
+                            objects_removed += 1
+                            bytes_freed += size
+                        except OSError as e:
+                            logger.warning(f"BackupStore: Failed to remove backup object {path}: {e}")
+
+        if backups_removed or objects_removed:
+            logger.info(
+                f"BackupStore: Removed {backups_removed} backups and {objects_removed} "
+                f"unreferenced snapshots ({bytes_freed} bytes)"
+            )
+        return {"backups_removed": backups_removed, "objects_removed": objects_removed, "bytes_freed": bytes_freed}
+
+    def _object_path(self, content_hash: str) -> str:
+        """Return the path of a stored snapshot (fanned out by hash prefix)."""
+        name = object_name(content_hash)
+        return os.path.join(self.objects_dir, name[:2], f"{name}.json")
+
+    def _read_manifest(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        """Read one manifest (None if missing or unreadable)."""
+        if os.path.basename(backup_id) != backup_id:
+            return None
+        try:
+            with open(os.path.join(self.manifests_dir, f"{backup_id}.json"), "rb") as f:
+                manifest = loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) and isinstance(manifest.get("snapshots"), list) else None
+
+    def _read_manifests(self) -> List[Dict[str, Any]]:
+        """Read all readable manifests, newest first."""
+        if not os.path.isdir(self.manifests_dir):
+            return []
+
+        manifests = []
+        for name in sorted(os.listdir(self.manifests_dir), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            manifest = self._read_manifest(name[:-len(".json")])
+            if manifest is None:
+                logger.warning(f"BackupStore: Skipping unreadable backup manifest {name}")
+                continue
+            manifests.append(manifest)
+        return manifests
+
+    def _summary(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Describe a manifest without its hash list."""
+        return {
+            "id": manifest["id"],
+            "created_at": manifest.get("created_at"),
+            "reason": manifest.get("reason"),
+            "source": manifest.get("source"),
+            "count": len(manifest["snapshots"]) - len(manifest.get("deleted") or []),
+            "deleted_count": len(manifest.get("deleted") or []),
+        }
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """Write a file via temp file + rename, creating its directory."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
@@ -0,0 +1,112 @@
+"""
+Payload compression shared by storage backends.
+
+Compression is opt-in (storage.compression in config.yaml). Readers don't
+need to know how a payload was written: gzip data is recognised by its
+magic bytes and anything else is treated as plain JSON.
+"""
+
+import codecs
+import gzip
+import zlib
+from typing import Iterator, Optional
+
+COMPRESSIONS = ("none", "gzip")
+GZIP_MAGIC = b"\x1f\x8b"
+TEXT_CHUNK_SIZE = 64 * 1024
+
+
+def validate_compression(compression: str) -> str:
+    """
+    Check that a compression setting is supported.
+
+    Args:
+        compression: "none" or "gzip"
+
+    Returns:
+        str: The validated setting
+
+    Raises:
+        ValueError: If the setting is unknown
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (expected one of {COMPRESSIONS})")
+    return compression
+
+
+def is_compressed(data: bytes) -> bool:
+    """Return True if the payload starts with the gzip magic bytes."""
+    return data[:2] == GZIP_MAGIC
+
+
+def compress_payload(data: bytes, compression: str) -> bytes:
+    """
+    Compress a payload according to the compression setting.
+
+    Output is deterministic (no timestamp in the gzip header), so equal
+    inputs produce equal bytes.
+
+    Args:
+        data: Plain payload
+        compression: "none" or "gzip"
+
+    Returns:
+        bytes: Payload as it should be written
+    """
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def decompress_payload(data: bytes) -> bytes:
+    """
+    Return the plain payload, decompressing it if it is gzip data.
+
+    Args:
+        data: Payload as read from storage
+
+    Returns:
+        bytes: Plain payload
+    """
+    if is_compressed(data):
+        return gzip.decompress(data)
+    return data
+
+
+def content_encoding(compression: str) -> Optional[str]:
+    """Return the HTTP Content-Encoding for a compression setting (None if plain)."""
+    return "gzip" if compression == "gzip" else None
+
+
+def iter_text_chunks(data: bytes, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Decode a (possibly gzip-compressed) UTF-8 payload in chunks.
+
+    Neither the decompressed bytes nor the decoded text of the whole payload
+    is held in memory at once.
+
+    Args:
+        data: Payload as read from storage
+        chunk_size: Number of input bytes processed per chunk
+
+    Yields:
+        str: Consecutive pieces of the decoded text
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(data)
+    decompressor = zlib.decompressobj(wbits=31) if is_compressed(data) else None
+
+    for position in range(0, len(view), chunk_size):
+        chunk = view[position:position + chunk_size]
+        raw = decompressor.decompress(chunk) if decompressor else bytes(chunk)
+        text = decoder.decode(raw)
+        if text:
+            yield text
+
+    if decompressor:
+        text = decoder.decode(decompressor.flush())
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
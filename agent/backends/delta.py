@@ -0,0 +1,202 @@
+"""
+Delta encoding of consecutive snapshots.
+
+Consecutive snapshots hold the same assets with a few changed fields, so a
+snapshot can be stored as the difference from the one before it:
+
+    {"timestamp": "...", "_delta": {
+        "fields": {...},          top-level fields that changed
+        "order": [...],           top-level key order (only if it changed)
+        "assets": {
+            "base": [...],        base asset index per asset, null if stored
+                                  whole (omitted if the assets didn't move)
+            "whole": [...],       assets stored whole, in order
+            "fields": {...}}}}    per changed asset field, its values for
+                                  every diffed asset (a list), or only the
+                                  changed ones ({"<diffed asset #>": value})
+
+Only assets matched by name with the same keys (in the same order) are
+diffed; anything else is stored whole. Storing a moving field as one list
+of values keeps a typical delta to little more than the changed numbers.
+Values are compared by type as well as value, so decoding reproduces the
+snapshot exactly (same content hash, same key order).
+
+Delta records keep the snapshot timestamp as their first key, so readers
+can still skip them by timestamp without decoding.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from ..json_codec import dumps
+
+DELTA_KEY = "_delta"
+
+# Delta records as written by encode_delta(): {"timestamp": "...", "_delta": ...}
+DELTA_RECORD_PATTERN = re.compile(rb'^\{"timestamp":\s*"[^"\\]*",\s*"_delta":')
+
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def is_delta(record: Dict[str, Any]) -> bool:
+    """Return True if a decoded record is a delta (not a whole snapshot)."""
+    return DELTA_KEY in record
+
+
+def encode_delta(base: Dict[str, Any], snapshot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Encode a snapshot as the difference from the snapshot before it.
+
+    Args:
+        base: Previous snapshot in the history
+        snapshot: Snapshot to encode
+
+    Returns:
+        dict: Delta record, or None if the snapshot must be stored whole
+              (no string timestamp, or it uses the reserved "_delta" key)
+    """
+    if not isinstance(snapshot.get("timestamp"), str) or DELTA_KEY in snapshot:
+        return None
+
+    delta: Dict[str, Any] = {}
+    if list(snapshot) != list(base):
+        delta["order"] = list(snapshot)
+
+    assets = _encode_assets(base.get("assets"), snapshot.get("assets"))
+    fields = {
+        key: value for key, value in snapshot.items()
+        if key != "timestamp"
+        and not (key == "assets" and assets is not None)
+        and (key not in base or not _same(base[key], value))
+    }
+    if fields:
+        delta["fields"] = fields
+    if assets is not None:
+        delta["assets"] = assets
+
+    return {"timestamp": snapshot["timestamp"], DELTA_KEY: delta}
+
+
+def apply_delta(base: Optional[Dict[str, Any]], record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuild a snapshot from the previous snapshot and a log record.
+
+    Args:
+        base: Previous snapshot (None at the start of the history)
+        record: Whole snapshot or delta record
+
+    Returns:
+        dict: The snapshot (the record itself if it isn't a delta)
+
+    Raises:
+        ValueError: If a delta has no base or doesn't match it
+    """
+    if not is_delta(record):
+        return record
+    if base is None:
+        raise ValueError("delta record without a preceding snapshot")
+
+    delta = record[DELTA_KEY]
+    fields = delta.get("fields", {})
+    snapshot = {}
+    try:
+        for key in delta.get("order") or base:
+            if key == "timestamp":
+                snapshot[key] = record["timestamp"]
+            elif key == "assets" and "assets" in delta:
+                snapshot[key] = _apply_assets(base["assets"], delta["assets"])
+            elif key in fields:
+                snapshot[key] = fields[key]
+            else:
+                snapshot[key] = base[key]
+    except (KeyError, IndexError, TypeError, StopIteration) as e:
+        raise ValueError(f"delta record doesn't match its base snapshot: {e!r}")
+    return snapshot
+
+
+def _encode_assets(base_assets: Any, assets: Any) -> Optional[Dict[str, Any]]:
+    """Diff two asset lists (None if they aren't both lists of dicts)."""
+    if not _is_asset_list(base_assets) or not _is_asset_list(assets):
+        return None
+
+    unused: Dict[str, List[int]] = {}
+    for index, asset in enumerate(base_assets):
+        if isinstance(asset.get("name"), str):
+            unused.setdefault(asset["name"], []).append(index)
+
+    bases: List[Optional[int]] = []
+    whole = []
+    diffed = []
+    for asset in assets:
+        candidates = unused.get(asset["name"]) if isinstance(asset.get("name"), str) else None
+        if candidates and list(base_assets[candidates[0]]) == list(asset):
+            bases.append(candidates.pop(0))
+            diffed.append(asset)
+        else:
+            bases.append(None)
+            whole.append(asset)
+
+    changes: Dict[str, Dict[str, Any]] = {}
+    for ordinal, (index, asset) in enumerate(zip((b for b in bases if b is not None), diffed)):
+        base_asset = base_assets[index]
+        for key, value in asset.items():
+            if not _same(base_asset[key], value):
+                changes.setdefault(key, {})[str(ordinal)] = value
+
+    fields = {}
+    for key, changed in changes.items():
+        if len(changed) * 2 > len(diffed):
+            fields[key] = [asset[key] for asset in diffed]
+        else:
+            fields[key] = changed
+
+    encoded: Dict[str, Any] = {}
+    if bases != list(range(len(base_assets))):
+        encoded["base"] = bases
+    if whole:
+        encoded["whole"] = whole
+    if fields:
+        encoded["fields"] = fields
+    return encoded
+
+
+def _apply_assets(base_assets: List[Dict[str, Any]], encoded: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild an asset list encoded by _encode_assets."""
+    bases = encoded.get("base", range(len(base_assets)))
+    whole = iter(encoded.get("whole", []))
+    fields = encoded.get("fields", {})
+
+    assets = []
+    ordinal = 0
+    for index in bases:
+        if index is None:
+            assets.append(next(whole))
+            continue
+        base_asset = base_assets[index]
+        asset = {}
+        for key, value in base_asset.items():
+            column = fields.get(key)
+            if isinstance(column, list):
+                value = column[ordinal]
+            elif column is not None:
+                value = column.get(str(ordinal), value)
+            asset[key] = value
+        assets.append(asset)
+        ordinal += 1
+    return assets
+
+
+def _is_asset_list(value: Any) -> bool:
+    """Return True for a list whose items are all dicts."""
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Compare two JSON values by type and value (1 and 1.0, 0.0 and -0.0 differ)."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float):
+        return repr(a) == repr(b)
+    if isinstance(a, SCALAR_TYPES):
+        return a == b
+    return dumps(a) == dumps(b)
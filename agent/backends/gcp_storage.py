@@ -2,47 +2,373 @@
 Google Cloud Storage backend for portfolio history.
 
 Uses GCS bucket to store portfolio_history.json for cross-machine sync.
+A small portfolio_history.latest.json blob holds a copy of the latest
+snapshot, tagged with the history generation it belongs to, so "current
+state" reads don't download the full history. portfolio_history.index.json
+holds the snapshot metadata index for listing tools, tagged the same way.
+
+The last downloaded history is kept (in memory and, optionally, on disk)
+together with its generation. Reads revalidate it with a conditional
+download, so an unchanged history costs one request and no payload.
+
+Sharded layout (layout="sharded"):
+    snapshots/manifest.json                       ordered list of shards
+    snapshots/<year>/<timestamp>-<hash>.json      one object per snapshot
+
+A save uploads one small shard and updates the manifest, whose entries also
+carry the metadata index fields; reads fetch only
+the shards they need (downloaded in parallel, cached by name since shards
+are immutable). Range and point-in-time queries select shards from the
+manifest, so a week of history costs a week of shards. Existing monolithic histories are migrated on first use
+or explicitly with migrate_to_sharded().
+
+With compression="gzip", history, shard and transaction uploads are gzip
+compressed and tagged Content-Encoding: gzip. Downloads are recognised as
+compressed or plain by their contents, so either setting reads both.
+
+Deletes are logical. In the monolithic layout they are recorded in
+portfolio_history.tombstones.json (see make_tombstone) and the history blob
+is left alone; in the sharded layout the manifest entry is marked with
+"deleted_at". compact_history() drops deleted snapshots once, backs up what
+it removes and prunes old backups under backup/.
+
+archive_snapshots() keeps full-resolution copies of thinned-out history
+(see agent/retention.py) in one object per year,
+archive/portfolio_history.<year>.json.gz, uploaded gzip compressed with
+storage class COLDLINE since they are rarely read.
+
+is_available() answers from a cached health state (see health.py) that is
+refreshed by the outcome of real operations, so offline runs don't pay a
+network timeout on every call.
 """
 
 import json
-from typing import Dict, List, Optional, Any
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Any, Iterable, Iterator, Sequence, Union
 import logging
 
 from google.cloud import storage
 from google.api_core import exceptions as gcp_exceptions
 
-from ..storage_backend import StorageBackend
+from ..json_codec import dumps, loads
+from ..storage_backend import (
+    StorageBackend,
+    bound_to_epoch,
+    DEFAULT_KEEP_BACKUPS,
+    compute_snapshot_hash,
+    drop_tombstoned,
+    epoch_in_range,
+    latest_at_or_before,
+    live_to_position,
+    make_tombstone,
+    project_snapshot,
+    select_snapshots,
+    snapshot_index_entry,
+    timestamp_to_epoch,
+    tombstoned_positions,
+)
+from .health import (
+    CircuitBreaker,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_RESET_TIMEOUT,
+    DEFAULT_TTL,
+)
+from .archive import (
+    ARCHIVE_DIR,
+    ARCHIVE_NAME_PATTERN,
+    archive_name,
+    decode_archive,
+    encode_archive,
+    group_by_year,
+    merge_archive,
+)
+from .compression import (
+    compress_payload,
+    content_encoding,
+    decompress_payload,
+    iter_text_chunks,
+    validate_compression,
+)
 
 logger = logging.getLogger(__name__)
 
 BLOB_NAME = "portfolio_history.json"
+LATEST_BLOB_NAME = "portfolio_history.latest.json"
+INDEX_BLOB_NAME = "portfolio_history.index.json"
+TOMBSTONES_BLOB_NAME = "portfolio_history.tombstones.json"
 TRANSACTIONS_BLOB_NAME = "transactions.json"
 
+LAYOUTS = ("monolithic", "sharded")
+SHARD_PREFIX = "snapshots/"
+MANIFEST_BLOB_NAME = "snapshots/manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_UPDATE_ATTEMPTS = 5
+DEFAULT_DOWNLOAD_WORKERS = 8
+ARCHIVE_STORAGE_CLASS = "COLDLINE"
+
+# Errors that mean GCS answered (so it is reachable), even though the call failed
+RESPONSE_ERRORS = (
+    gcp_exceptions.NotFound,
+    gcp_exceptions.NotModified,
+    gcp_exceptions.PreconditionFailed,
+    gcp_exceptions.BadRequest,
+    gcp_exceptions.Forbidden,
+    gcp_exceptions.Unauthorized,
+)
+
+
+def is_connectivity_error(error: Exception) -> bool:
+    """
+    Check whether an error means GCS could not be reached or is failing.
+    
+    Server errors, rate limiting, timeouts and transport failures count;
+    client errors (GCS answered) and local errors such as invalid JSON
+    don't.
+    
+    Args:
+        error: Exception raised by a storage operation
+    
+    Returns:
+        bool: True if the error should count against availability
+    """
+    if isinstance(error, RESPONSE_ERRORS):
+        return False
+    if isinstance(error, (gcp_exceptions.ServerError, gcp_exceptions.TooManyRequests, gcp_exceptions.RetryError)):
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    
+    # Transport errors of the HTTP stack underneath the client library
+    try:
+        from google.auth.exceptions import TransportError
+        from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+    except ImportError:
+        return False
+    return isinstance(error, (TransportError, RequestsConnectionError, Timeout))
+
+
+def shard_blob_name(snapshot: Dict[str, Any], content_hash: str) -> str:
+    """
+    Build the object name of a snapshot shard.
+    
+    Names sort chronologically under a per-year prefix, e.g.
+    snapshots/2025/20250101T100000000000-3f2a9c0d1b7e.json. The short
+    content hash keeps names unique when two snapshots share a timestamp.
+    
+    Args:
+        snapshot: Snapshot dictionary
+        content_hash: Hash from compute_snapshot_hash()
+    
+    Returns:
+        str: Shard object name
+    """
+    timestamp = str(snapshot.get("timestamp", ""))
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        year = parsed.strftime("%Y")
+        stamp = parsed.strftime("%Y%m%dT%H%M%S%f")
+    except ValueError:
+        year = "unknown"
+        stamp = re.sub(r"[^0-9A-Za-z]", "", timestamp) or "unknown"
+    
+    digest = content_hash.split(":", 1)[-1][:12]
+    return f"{SHARD_PREFIX}{year}/{stamp}-{digest}.json"
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array from text chunks.
+    
+    Elements are yielded as soon as they are complete, so memory use is
+    bounded by the largest element plus one chunk rather than the whole
+    document. An empty document yields nothing.
+    
+    Args:
+        chunks: Consecutive pieces of the JSON text
+    
+    Yields:
+        Each array element, in order
+        
+    Raises:
+        ValueError: If the text is not a well-formed JSON array
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    started = False
+    exhausted = False
+    
+    while True:
+        # Skip whitespace, the opening bracket and separators
+        while position < len(buffer):
+            char = buffer[position]
+            if char in " \t\r\n":
+                position += 1
+            elif not started:
+                if char != "[":
+                    raise ValueError("History document is not a JSON array")
+                started = True
+                position += 1
+            elif char == ",":
+                position += 1
+            elif char == "]":
+                return
+            else:
+                break
+        
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # A number at the buffer edge (or cut inside, e.g. "1." or "1e")
+                # may continue in the next chunk; other values are delimited
+                complete = (
+                    exhausted
+                    or isinstance(item, (dict, list, str))
+                    or (end < len(buffer) and buffer[end] not in "0123456789+-.eE")
+                )
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                complete = False
+            if complete:
+                yield item
+                position = end
+                continue
+        elif exhausted:
+            if started:
+                raise ValueError("History document ended before the closing bracket")
+            return
+        
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def manifest_entry(snapshot: Dict[str, Any], name: str, content_hash: str) -> Dict[str, Any]:
+    """
+    Build the manifest entry for a shard.
+    
+    Besides locating the shard, entries carry the metadata needed for the
+    snapshot index, so listing the history needs only the manifest.
+    
+    Args:
+        snapshot: Snapshot dictionary
+        name: Shard object name
+        content_hash: Hash from compute_snapshot_hash()
+    
+    Returns:
+        dict: {name, timestamp, hash, total_value_eur, asset_count}
+    """
+    return {
+        "name": name,
+        "timestamp": snapshot.get("timestamp"),
+        "hash": content_hash,
+        "total_value_eur": snapshot.get("total_value_eur", 0.0),
+        "asset_count": len(snapshot.get("assets") or []),
+    }
+
+
+def live_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the manifest entries not marked as deleted, in order."""
+    return [entry for entry in entries if not entry.get("deleted_at")]
+
 
 class GCPStorageBackend(StorageBackend):
     """Google Cloud Storage backend."""
     
-    def __init__(self, bucket_name: str, credentials_dict: Dict[str, Any]):
+    def __init__(
+        self,
+        bucket_name: str,
+        credentials_dict: Dict[str, Any],
+        client: Optional[storage.Client] = None,
+        cache_dir: Optional[str] = None,
+        layout: str = "monolithic",
+        download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        compression: str = "none",
+        availability_ttl: float = DEFAULT_TTL,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        circuit_reset_timeout: float = DEFAULT_RESET_TIMEOUT
+    ):
         """
         Initialize GCP storage backend.
         
         Args:
             bucket_name: GCS bucket name (e.g., "investment_snapshots")
             credentials_dict: Service account credentials dictionary
+            client: Pre-built storage client (optional; credentials_dict is
+                    ignored when provided)
+            cache_dir: Directory for the persistent copy of the last
+                       downloaded history and of fetched shards (optional;
+                       in-memory only if None)
+            layout: "monolithic" (single history blob) or "sharded"
+                    (one object per snapshot plus a manifest)
+            download_workers: Parallel downloads for full-history reads
+                              in the sharded layout
+            compression: "none" or "gzip" for uploaded payloads
+            availability_ttl: Seconds a known availability state is reused
+            failure_threshold: Consecutive failures before calls stop
+                               reaching GCS (circuit open)
+            circuit_reset_timeout: Seconds before an open circuit probes again
         """
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown GCS layout '{layout}' (expected one of {LAYOUTS})")
+        
         self.bucket_name = bucket_name
+        self.layout = layout
+        self.compression = validate_compression(compression)
+        self.download_workers = max(1, download_workers)
         self.blob_name = BLOB_NAME
+        self.latest_blob_name = LATEST_BLOB_NAME
+        self.index_blob_name = INDEX_BLOB_NAME
+        self.tombstones_blob_name = TOMBSTONES_BLOB_NAME
+        self._history_generation: Optional[int] = None
+        
+        # Monolithic layout: last read tombstones and their generation
+        self._tombstones_generation: Optional[int] = None
+        self._tombstones: List[Dict[str, Any]] = []
+        
+        # Last downloaded history payload and its generation
+        self.cache_dir = cache_dir
+        self._cached_generation: Optional[int] = None
+        self._cached_content: Optional[bytes] = None
+        self._cache_loaded = False
+        
+        # Sharded layout: last read manifest and raw shard payloads by name
+        self.manifest_blob_name = MANIFEST_BLOB_NAME
+        self._manifest_generation: Optional[int] = None
+        self._manifest_entries: List[Dict[str, Any]] = []
+        self._shard_cache: Dict[str, bytes] = {}
+        
+        # Cached availability, fed by probes and by real operations
+        self._health = CircuitBreaker(
+            "GCPStorageBackend",
+            ttl=availability_ttl,
+            failure_threshold=failure_threshold,
+            reset_timeout=circuit_reset_timeout
+        )
         
         try:
-            from google.oauth2 import service_account
-            
-            # Create credentials from dictionary
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_dict
-            )
+            if client is None:
+                from google.oauth2 import service_account
+                
+                # Create credentials from dictionary
+                credentials = service_account.Credentials.from_service_account_info(
+                    credentials_dict
+                )
+                
+                # Initialize GCS client
+                client = storage.Client(credentials=credentials)
             
-            # Initialize GCS client
-            self.client = storage.Client(credentials=credentials)
+            self.client = client
             self.bucket = self.client.bucket(bucket_name)
             
             logger.info(f"GCPStorageBackend initialized for bucket: {bucket_name}")
@@ -60,6 +386,7 @@ class GCPStorageBackend(StorageBackend):
         2. Append new snapshot
         3. Upload updated history
         4. Use atomic uploads
+        5. Update latest-snapshot blob and metadata index
         
         Args:
             snapshot_data: Snapshot dictionary
@@ -67,6 +394,9 @@ class GCPStorageBackend(StorageBackend):
         Returns:
             bool: True if save successful, False otherwise
         """
+        if self.layout == "sharded":
+            return self._save_snapshot_sharded(snapshot_data)
+        
         try:
             # Step 1: Get current history
             history = self._download_history()
@@ -75,44 +405,128 @@ class GCPStorageBackend(StorageBackend):
             history.append(snapshot_data)
             
             # Step 3: Validate serialization
-            json_content = json.dumps(history, indent=2, ensure_ascii=False)
+            payload = dumps(history)
             
             # Step 4: Upload with atomic write
             blob = self.bucket.blob(self.blob_name)
-            blob.upload_from_string(
-                json_content,
-                content_type="application/json",
-                if_generation_match=None  # Allow overwrites
-            )
+            self._upload_payload(blob, payload, if_generation_match=None)  # Allow overwrites
+            self._store_cached_history(blob.generation, payload)
+            
+            # Step 5: Point the latest-snapshot blob and index at the new generation
+            live = list(drop_tombstoned(history, self._read_tombstones()))
+            self._write_latest_blob(snapshot_data, blob.generation)
+            self._write_index_blob(self._build_index(live), blob.generation)
             
-            logger.info(f"GCPStorageBackend: Snapshot saved to gs://{self.bucket_name}/{self.blob_name} ({len(history)} total)")
+            logger.info(f"GCPStorageBackend: Snapshot saved to gs://{self.bucket_name}/{self.blob_name} ({len(live)} total)")
             return True
             
         except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: GCP API error saving snapshot: {e}")
             return False
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to save snapshot to GCS: {e}")
             return False
     
+    def save_snapshots(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Save several snapshots with a single history update.
+        
+        Snapshots whose content hash is already in the (live) history are
+        skipped, so replaying a batch is idempotent. Monolithic layout: one history
+        download and one upload for the whole batch. Sharded layout: shards
+        are uploaded in parallel and published in one manifest update.
+        
+        Args:
+            snapshots: Snapshots in chronological order
+            
+        Returns:
+            bool: True if every snapshot is now stored
+        """
+        if not snapshots:
+            return True
+        
+        if self.layout == "sharded":
+            return self._save_snapshots_sharded(snapshots)
+        
+        try:
+            # Step 1: Get current history and the hashes of its live snapshots
+            history = self._download_history()
+            tombstones = self._read_tombstones()
+            existing = {compute_snapshot_hash(snapshot) for snapshot in drop_tombstoned(history, tombstones)}
+            
+            # Step 2: Append snapshots not stored yet
+            added = 0
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                if content_hash not in existing:
+                    history.append(snapshot)
+                    existing.add(content_hash)
+                    added += 1
+            
+            if not added:
+                logger.info(f"GCPStorageBackend: All {len(snapshots)} snapshots already stored")
+                return True
+            
+            # Step 3: Upload once
+            blob = self.bucket.blob(self.blob_name)
+            payload = dumps(history)
+            self._upload_payload(blob, payload, if_generation_match=None)  # Allow overwrites
+            self._store_cached_history(blob.generation, payload)
+            
+            # Step 4: Point the latest-snapshot blob and index at the new generation
+            live = list(drop_tombstoned(history, tombstones))
+            self._write_latest_blob(live[-1], blob.generation)
+            self._write_index_blob(self._build_index(live), blob.generation)
+            
+            logger.info(
+                f"GCPStorageBackend: Saved {added} of {len(snapshots)} snapshots to "
+                f"gs://{self.bucket_name}/{self.blob_name} ({len(live)} total)"
+            )
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error saving snapshots: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to save snapshots to GCS: {e}")
+            return False
+    
     def get_latest_snapshot(self) -> Optional[Dict[str, Any]]:
         """
         Get latest snapshot from GCS.
         
+        Reads the small latest-snapshot blob and checks it against the
+        history blob's generation (metadata only). Falls back to downloading
+        the full history if the latest blob is missing or stale.
+        
         Returns:
             dict: Latest snapshot or None if unavailable
         """
+        if self.layout == "sharded":
+            return self._get_latest_snapshot_sharded()
+        
         try:
-            history = self._download_history()
+            found, latest = self._read_latest_blob()
+            
+            if not found:
+                logger.debug("GCPStorageBackend: Latest-snapshot blob missing or stale, downloading history")
+                history = self._download_live_history()
+                latest = history[-1] if history else None
+                if self._history_generation is not None:
+                    self._write_latest_blob(latest, self._history_generation)
             
-            if not history:
+            if not latest:
                 return None
             
-            latest = history[-1]
             logger.debug(f"GCPStorageBackend: Retrieved latest snapshot from {latest.get('timestamp', 'unknown')}")
             return latest
             
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to get latest snapshot from GCS: {e}")
             return None
     
@@ -124,27 +538,188 @@ class GCPStorageBackend(StorageBackend):
             list: All snapshots or empty list
         """
         try:
-            history = self._download_history()
+            if self.layout == "sharded":
+                history = self._load_sharded_history()
+            else:
+                history = self._download_live_history()
             logger.debug(f"GCPStorageBackend: Retrieved {len(history)} snapshots from GCS")
             return history
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to get all snapshots from GCS: {e}")
             return []
     
+    def iter_snapshots(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream snapshots from GCS.
+        
+        Monolithic layout: the history payload is decoded in chunks by an
+        incremental JSON array parser, so only one snapshot is decoded at a
+        time. Sharded layout: the range is applied to manifest timestamps and
+        only matching shards are fetched, a batch of download_workers at a
+        time. Iteration stops (with an error logged) on a read failure.
+        
+        Args:
+            start: Inclusive lower timestamp bound
+            end: Inclusive upper timestamp bound
+            fields: Top-level fields to return (None for whole snapshots)
+        
+        Yields:
+            dict: Matching snapshots in history order
+        """
+        start_epoch = bound_to_epoch(start)
+        end_epoch = bound_to_epoch(end)
+        
+        try:
+            if self.layout == "sharded":
+                entries = [
+                    entry for entry in self._read_live_manifest()
+                    if epoch_in_range(timestamp_to_epoch(entry.get("timestamp")), start_epoch, end_epoch)
+                ]
+                for batch_start in range(0, len(entries), self.download_workers):
+                    batch = entries[batch_start:batch_start + self.download_workers]
+                    for snapshot in self._fetch_shards(batch):
+                        if snapshot is not None:
+                            yield project_snapshot(snapshot, fields)
+                return
+            
+            content = self._fetch_history_payload()
+            if content is None:
+                return
+            stored = iter_json_array(iter_text_chunks(content))
+            yield from select_snapshots(drop_tombstoned(stored, self._read_tombstones()), start, end, fields)
+        
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to stream snapshots from GCS: {e}")
+    
+    def get_snapshot_at_or_before(self, timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest snapshot taken at or before a timestamp.
+        
+        Sharded layout: the snapshot is picked from the manifest and only its
+        shard is fetched. Monolithic layout: picked from the index blob; if
+        it is the latest snapshot, only the latest-snapshot blob is read,
+        otherwise the history is streamed up to the timestamp.
+        
+        Args:
+            timestamp: ISO 8601 timestamp or datetime (naive = UTC)
+        
+        Returns:
+            dict: The snapshot, or None if there is none (or on error)
+        
+        Raises:
+            ValueError: If the timestamp can't be parsed
+        """
+        epoch = bound_to_epoch(timestamp)
+        try:
+            if self.layout == "sharded":
+                entry = latest_at_or_before(self._read_live_manifest(), epoch)
+                return self._fetch_shards([entry])[0] if entry is not None else None
+            
+            found, entries = self._read_index_blob()
+            if found:
+                entry = latest_at_or_before(entries, epoch)
+                if entry is None:
+                    return None
+                if entry is entries[-1]:
+                    return self.get_latest_snapshot()
+        
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to find snapshot at {timestamp} in GCS: {e}")
+            return None
+        
+        return latest_at_or_before(self.iter_snapshots(end=timestamp), epoch)
+    
+    def get_snapshot_index(self) -> List[Dict[str, Any]]:
+        """
+        Get metadata for every snapshot without downloading asset payloads.
+        
+        Monolithic layout: reads the index blob, checked against the history
+        generation (metadata only); if it is missing or stale it is rebuilt
+        from the history and re-uploaded. Sharded layout: built from the
+        manifest entries.
+        
+        Returns:
+            list: Index entries in history order, or empty list on error
+        """
+        try:
+            if self.layout == "sharded":
+                return self._get_snapshot_index_sharded()
+            
+            found, entries = self._read_index_blob()
+            if not found:
+                logger.debug("GCPStorageBackend: Index blob missing or stale, downloading history")
+                entries = self._build_index(self._download_live_history())
+                if self._history_generation is not None:
+                    self._write_index_blob(entries, self._history_generation)
+            return entries
+            
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to get snapshot index from GCS: {e}")
+            return []
+    
     def is_available(self) -> bool:
         """
         Check if GCS is available.
         
+        Answers from the cached health state; the bucket is only probed
+        when the state has expired (availability_ttl) or, with the circuit
+        open, once circuit_reset_timeout has passed.
+        
+        Returns:
+            bool: True if GCS is considered reachable
+        """
+        return self._health.is_available(self._probe_bucket)
+    
+    def get_health_status(self) -> Dict[str, Any]:
+        """
+        Describe the cached availability state.
+        
+        Returns:
+            dict: Circuit breaker state (see CircuitBreaker.get_status)
+        """
+        return self._health.get_status()
+    
+    def get_history_version(self) -> Optional[int]:
+        """
+        Return the history blob's generation as a version token.
+        
+        Uses metadata-only requests; no history payload is downloaded.
+        In the sharded layout the manifest generation is used. In the
+        monolithic layout the tombstones generation is added once
+        snapshots have been deleted.
+        
         Returns:
-            bool: True if GCS is reachable
+            int or tuple: Blob generation (0 if the blob doesn't exist),
+                          paired with the tombstones generation if there
+                          are tombstones, or None on error
         """
         try:
-            # Try to check if bucket exists (lightweight operation)
-            self.bucket.exists()
-            return True
+            name = self.manifest_blob_name if self.layout == "sharded" else self.blob_name
+            blob = self.bucket.get_blob(name)
+            generation = blob.generation if blob is not None else 0
+            if self.layout != "sharded":
+                tombstones_blob = self.bucket.get_blob(self.tombstones_blob_name)
+                if tombstones_blob is not None:
+                    generation = (generation, tombstones_blob.generation)
+            self._health.record_success()
+            return generation
         except Exception as e:
-            logger.warning(f"GCPStorageBackend: GCS unavailable: {e}")
-            return False
+            self._record_failure(e)
+            logger.warning(f"GCPStorageBackend: Failed to read history generation: {e}")
+            return None
+    
+    def get_data_dir(self) -> Optional[str]:
+        """Return the local cache directory (None if caching is disabled)."""
+        return self.cache_dir
     
     def save_transactions(self, transaction_data: Dict[str, Any]) -> bool:
         """
@@ -158,12 +733,7 @@ class GCPStorageBackend(StorageBackend):
         """
         try:
             blob = self.bucket.blob(TRANSACTIONS_BLOB_NAME)
-            json_content = json.dumps(transaction_data, indent=2, ensure_ascii=False)
-            
-            blob.upload_from_string(
-                json_content,
-                content_type="application/json"
-            )
+            self._upload_payload(blob, dumps(transaction_data, pretty=True))
             
             sell_count = transaction_data.get("metadata", {}).get("sell_count", 0)
             buy_count = transaction_data.get("metadata", {}).get("buy_count", 0)
@@ -175,9 +745,11 @@ class GCPStorageBackend(StorageBackend):
             return True
             
         except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: GCP API error saving transactions: {e}")
             return False
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to save transactions: {e}")
             return False
     
@@ -198,8 +770,9 @@ class GCPStorageBackend(StorageBackend):
                 )
                 return None
             
-            content = blob.download_as_text()
-            data = json.loads(content)
+            content = decompress_payload(blob.download_as_bytes())
+            self._health.record_success()
+            data = loads(content)
             
             sell_count = data.get("metadata", {}).get("sell_count", 0)
             buy_count = data.get("metadata", {}).get("buy_count", 0)
@@ -217,9 +790,11 @@ class GCPStorageBackend(StorageBackend):
             logger.error(f"GCPStorageBackend: Invalid JSON in transactions blob: {e}")
             return None
         except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: GCP API error loading transactions: {e}")
             return None
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to load transactions: {e}")
             return None
     
@@ -227,8 +802,9 @@ class GCPStorageBackend(StorageBackend):
         """
         Delete snapshot by index from GCS.
         
-        Creates backup blob before deletion.
-        Downloads, modifies, and re-uploads entire history.
+        Records a tombstone instead of rewriting the history blob; the
+        snapshot is removed (and backed up) by compact_history(). Only the
+        small tombstones, latest-snapshot and index blobs are uploaded.
         
         Args:
             index: Zero-based index of snapshot to delete
@@ -236,79 +812,280 @@ class GCPStorageBackend(StorageBackend):
         Returns:
             bool: True if deletion succeeded, False otherwise
         """
+        if self.layout == "sharded":
+            return self._delete_snapshot_sharded(index)
+        
         try:
-            # Step 1: Download current history
+            # Step 1: Get current history (usually a 304 from the cached copy)
             history = self._download_history()
+            live = list(drop_tombstoned(history, self._read_tombstones()))
             
-            if not history:
+            if not live:
                 logger.error("GCPStorageBackend: No history to delete from")
                 return False
             
             # Step 2: Validate index
-            if index < 0 or index >= len(history):
+            if index < 0 or index >= len(live):
                 logger.error(
                     f"GCPStorageBackend: Index {index} out of range "
-                    f"(valid: 0-{len(history)-1})"
+                    f"(valid: 0-{len(live)-1})"
                 )
                 return False
             
-            # Step 3: Create timestamped backup blob in backup/ folder
-            from datetime import datetime as dt
-            timestamp = dt.now().strftime("%Y%m%d-%H%M%S")
-            backup_blob_name = f"backup/{self.blob_name}.bak.{timestamp}"
+            target = snapshot_index_entry(live[index], index)
+            history_generation = self._history_generation
             
-            try:
-                # Copy current blob to backup
-                blob = self.bucket.blob(self.blob_name)
-                backup_blob = self.bucket.blob(backup_blob_name)
-                
-                # Use copy operation
-                backup_blob.upload_from_string(
-                    blob.download_as_text(),
+            logger.info(
+                f"GCPStorageBackend: Deleting snapshot at index {index}: "
+                f"{target['timestamp'] or 'unknown'} (€{target['total_value_eur'] or 0.0:,.2f})"
+            )
+            
+            # Step 3: Record the tombstone
+            def add_tombstone(tombstones: List[Dict[str, Any]]) -> None:
+                dead = tombstoned_positions(tombstones)
+                position = live_to_position(index, dead)
+                if position >= len(history) or compute_snapshot_hash(history[position]) != target["hash"]:
+                    raise RuntimeError(f"Snapshot at index {index} changed concurrently")
+                tombstones.append(make_tombstone(position, target))
+            
+            self._update_tombstones(add_tombstone)
+            
+            # Step 4: Point the latest-snapshot blob and index at the live history
+            live.pop(index)
+            self._write_latest_blob(live[-1] if live else None, history_generation)
+            self._write_index_blob(self._build_index(live), history_generation)
+            
+            logger.info(
+                f"GCPStorageBackend: Successfully deleted snapshot. "
+                f"Remaining snapshots: {len(live)}"
+            )
+            return True
+        
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error during deletion: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Unexpected error deleting snapshot: {e}", exc_info=True)
+            return False
+    
+    def compact_history(self, keep_backups: int = DEFAULT_KEEP_BACKUPS) -> Dict[str, Any]:
+        """
+        Drop deleted snapshots from GCS and prune old backups.
+        
+        Monolithic layout: if there are tombstones, the history blob is
+        backed up, re-uploaded without the deleted snapshots and the
+        tombstones blob removed. Sharded layout: marked entries are dropped
+        from the manifest and their shards (if no live entry references
+        them) are backed up and deleted. Afterwards only the backups of the
+        keep_backups most recent compactions are kept.
+        
+        Args:
+            keep_backups: Number of most recent backups to keep
+            
+        Returns:
+            dict: {"success", "removed_snapshots", "snapshots", "backups_removed"}
+                  or {"success": False, "error"}
+        """
+        try:
+            if self.layout == "sharded":
+                removed, remaining = self._compact_sharded()
+                backups_removed = self._prune_backups(f"backup/{SHARD_PREFIX}", keep_backups)
+            else:
+                removed, remaining = self._compact_monolithic()
+                backups_removed = self._prune_backups(f"backup/{self.blob_name}.bak.", keep_backups)
+            
+            logger.info(
+                f"GCPStorageBackend: Compacted history ({removed} deleted snapshots dropped, "
+                f"{backups_removed} old backups removed)"
+            )
+            return {
+                "success": True,
+                "removed_snapshots": removed,
+                "snapshots": remaining,
+                "backups_removed": backups_removed,
+            }
+        
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to compact history: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def count_tombstones(self) -> int:
+        """
+        Return the number of deleted snapshots awaiting compaction.
+        
+        Returns:
+            int: Tombstones (monolithic) or marked manifest entries (sharded),
+                 0 on error
+        """
+        try:
+            if self.layout == "sharded":
+                return sum(1 for entry in self._read_manifest() if entry.get("deleted_at"))
+            return len(self._read_tombstones())
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to read tombstones: {e}")
+            return 0
+    
+    def archive_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Copy snapshots to per-year archive objects under archive/.
+        
+        Each year's object is merged with the snapshots it already holds
+        and re-uploaded (gzip, storage class COLDLINE) only if something
+        was added. Uploads are conditional on the generation that was read,
+        so concurrent archiving of the same year is retried, not lost.
+        
+        Args:
+            snapshots: Snapshots to archive (full resolution)
+        
+        Returns:
+            dict: {"success", "years": {year: snapshots added}} or
+                  {"success": False, "error"}
+        """
+        added = {}
+        try:
+            for year, year_snapshots in sorted(group_by_year(snapshots).items()):
+                name = f"{ARCHIVE_DIR}/{archive_name(year)}"
+                for attempt in range(MANIFEST_UPDATE_ATTEMPTS):
+                    # Step 1: Read the year's archive (and its generation)
+                    blob = self.bucket.blob(name)
+                    try:
+                        existing = decode_archive(blob.download_as_bytes())
+                        generation = blob.generation
+                    except gcp_exceptions.NotFound:
+                        existing, generation = [], 0
+                    
+                    # Step 2: Merge and upload if anything is new
+                    merged, added[year] = merge_archive(existing, year_snapshots)
+                    if not added[year]:
+                        break
+                    blob = self.bucket.blob(name)
+                    blob.content_encoding = "gzip"
+                    blob.storage_class = ARCHIVE_STORAGE_CLASS
+                    try:
+                        blob.upload_from_string(
+                            encode_archive(merged),
+                            content_type="application/json",
+                            if_generation_match=generation
+                        )
+                    except gcp_exceptions.PreconditionFailed:
+                        logger.info(f"GCPStorageBackend: Archive {name} changed concurrently, retrying (attempt {attempt + 1})")
+                        continue
+                    logger.info(
+                        f"GCPStorageBackend: Archived {added[year]} snapshots to "
+                        f"gs://{self.bucket_name}/{name}"
+                    )
+                    break
+                else:
+                    raise RuntimeError(f"Archive update failed after {MANIFEST_UPDATE_ATTEMPTS} attempts")
+            self._health.record_success()
+            return {"success": True, "years": added}
+        
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to archive snapshots: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def get_archived_snapshots(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return the archived snapshots of a year, in timestamp order.
+        
+        Args:
+            year: Archive year
+        
+        Returns:
+            list: Archived snapshots (empty if there is no archive or it can't be read)
+        """
+        try:
+            snapshots = decode_archive(self.bucket.blob(f"{ARCHIVE_DIR}/{archive_name(year)}").download_as_bytes())
+            self._health.record_success()
+            return snapshots
+        except gcp_exceptions.NotFound:
+            return []
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to read {year} archive: {e}")
+            return []
+    
+    def list_archive_years(self) -> List[int]:
+        """
+        Return the years that have an archive, oldest first.
+        
+        Returns:
+            list: Archive years (empty on error)
+        """
+        try:
+            names = [blob.name.rsplit("/", 1)[-1] for blob in self.bucket.list_blobs(prefix=f"{ARCHIVE_DIR}/")]
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to list archives: {e}")
+            return []
+        matches = (ARCHIVE_NAME_PATTERN.match(name) for name in names)
+        return sorted(int(match.group(1)) for match in matches if match)
+    
+    def replace_history(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Replace the history in GCS with the given snapshots.
+        
+        Monolithic layout: the current history blob is backed up and
+        overwritten. Sharded layout: only shards not stored yet are
+        uploaded and the manifest is rewritten; shards dropped from the
+        manifest are kept (they are immutable and act as the backup).
+        
+        Args:
+            snapshots: New history, in order
+            
+        Returns:
+            bool: True if the history was replaced, False otherwise
+        """
+        if self.layout == "sharded":
+            return self._replace_history_sharded(snapshots)
+        
+        try:
+            # Step 1: Back up the current history blob
+            history = self._download_history()
+            blob = self.bucket.blob(self.blob_name)
+            if history:
+                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+                backup_blob_name = f"backup/{self.blob_name}.bak.{timestamp}"
+                self.bucket.blob(backup_blob_name).upload_from_string(
+                    self._cached_content,
                     content_type="application/json"
                 )
                 logger.info(
                     f"GCPStorageBackend: Created backup at "
                     f"gs://{self.bucket_name}/{backup_blob_name}"
                 )
-            except gcp_exceptions.GoogleAPIError as e:
-                logger.error(f"GCPStorageBackend: Failed to create backup: {e}")
-                return False
             
-            # Step 4: Remove snapshot at index
-            deleted_snapshot = history.pop(index)
-            deleted_timestamp = deleted_snapshot.get("timestamp", "unknown")
-            deleted_value = deleted_snapshot.get("total_value_eur", 0.0)
+            # Step 2: Upload the new history
+            history = list(snapshots)
+            payload = dumps(history)
+            self._upload_payload(blob, payload)
+            self._store_cached_history(blob.generation, payload)
+            
+            # Step 3: Tombstones referred to the old history
+            self._clear_tombstones()
+            
+            # Step 4: Point the latest-snapshot blob and index at the new generation
+            self._write_latest_blob(history[-1] if history else None, blob.generation)
+            self._write_index_blob(self._build_index(history), blob.generation)
             
             logger.info(
-                f"GCPStorageBackend: Deleting snapshot at index {index}: "
-                f"{deleted_timestamp} (€{deleted_value:,.2f})"
+                f"GCPStorageBackend: Replaced gs://{self.bucket_name}/{self.blob_name} "
+                f"with {len(history)} snapshots"
             )
+            return True
             
-            # Step 5: Upload updated history
-            try:
-                json_content = json.dumps(history, indent=2, ensure_ascii=False)
-                
-                blob.upload_from_string(
-                    json_content,
-                    content_type="application/json"
-                )
-                
-                logger.info(
-                    f"GCPStorageBackend: Successfully deleted snapshot. "
-                    f"Remaining snapshots: {len(history)}"
-                )
-                return True
-                
-            except gcp_exceptions.GoogleAPIError as e:
-                logger.error(f"GCPStorageBackend: Failed to upload updated history: {e}")
-                return False
-        
         except gcp_exceptions.GoogleAPIError as e:
-            logger.error(f"GCPStorageBackend: GCP API error during deletion: {e}")
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error replacing history: {e}")
             return False
         except Exception as e:
-            logger.error(f"GCPStorageBackend: Unexpected error deleting snapshot: {e}", exc_info=True)
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to replace history in GCS: {e}")
             return False
     
     def delete_all_snapshots(self) -> bool:
@@ -321,6 +1098,9 @@ class GCPStorageBackend(StorageBackend):
         Returns:
             bool: True if deletion succeeded or file didn't exist, False on error
         """
+        if self.layout == "sharded":
+            return self._delete_all_snapshots_sharded()
+        
         try:
             blob = self.bucket.blob(self.blob_name)
             
@@ -329,6 +1109,15 @@ class GCPStorageBackend(StorageBackend):
                 return True
             
             blob.delete()
+            self._store_cached_history(None, None)
+            self._clear_tombstones()
+            
+            latest_blob = self.bucket.blob(self.latest_blob_name)
+            try:
+                latest_blob.delete()
+            except gcp_exceptions.NotFound:
+                pass
+            
             logger.info(f"GCPStorageBackend: Deleted all snapshots from gs://{self.bucket_name}/{self.blob_name}")
             return True
             
@@ -337,15 +1126,21 @@ class GCPStorageBackend(StorageBackend):
             logger.debug("GCPStorageBackend: Blob not found (already deleted)")
             return True
         except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: GCP API error deleting snapshots: {e}")
             return False
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"GCPStorageBackend: Failed to delete snapshots from GCS: {e}")
             return False
     
     def _download_history(self) -> List[Dict[str, Any]]:
         """
-        Download history from GCS.
+        Download history from GCS, reusing the cached copy when unchanged.
+        
+        Sends a single conditional download (if_generation_not_match) when a
+        cached copy exists: GCS answers 304 Not Modified without a payload
+        if the history hasn't changed since it was cached.
         
         Returns:
             list: History array or empty list if file doesn't exist
@@ -354,33 +1149,1048 @@ class GCPStorageBackend(StorageBackend):
             Exception: If download fails for reasons other than file not found
         """
         try:
-            blob = self.bucket.blob(self.blob_name)
-            
-            if not blob.exists():
-                logger.debug("No history file in GCS yet (first run)")
+            content = self._fetch_history_payload()
+            if content is None:
                 return []
             
-            content = blob.download_as_text()
+            text = decompress_payload(content).decode("utf-8")
             
-            if not content.strip():
+            if not text.strip():
                 logger.debug("History file in GCS is empty")
                 return []
             
-            history = json.loads(content)
+            history = loads(text)
             
             if not isinstance(history, list):
                 logger.error("History file in GCS has invalid format (not a list)")
                 return []
             
-            logger.debug(f"Downloaded {len(history)} snapshots from GCS")
+            logger.debug(f"Loaded {len(history)} snapshots from GCS")
             return history
             
-        except gcp_exceptions.NotFound:
-            logger.debug("History file not found in GCS (first run)")
-            return []
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError, EOFError) as e:
             logger.error(f"Invalid JSON in GCS history file: {e}")
             return []
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"Failed to download history from GCS: {e}")
             raise
+    
+    def _fetch_history_payload(self) -> Optional[bytes]:
+        """
+        Return the raw history payload, revalidating the cached copy.
+        
+        Returns:
+            bytes: Payload as stored (possibly compressed), or None if the
+                   history blob doesn't exist
+            
+        Raises:
+            Exception: If download fails for reasons other than file not found
+        """
+        self._load_cached_history()
+        blob = self.bucket.blob(self.blob_name)
+        
+        try:
+            if self._cached_generation is not None:
+                content = blob.download_as_bytes(if_generation_not_match=self._cached_generation)
+            else:
+                content = blob.download_as_bytes()
+            self._store_cached_history(blob.generation, content)
+            logger.debug(f"Downloaded history from GCS (generation {blob.generation}, {len(content)} bytes)")
+        except gcp_exceptions.NotModified:
+            content = self._cached_content
+            logger.debug(f"History in GCS unchanged (generation {self._cached_generation}), using cached copy")
+        except gcp_exceptions.NotFound:
+            logger.debug("History file not found in GCS (first run)")
+            self._health.record_success()
+            self._store_cached_history(None, None)
+            self._history_generation = None
+            return None
+        
+        self._health.record_success()
+        self._history_generation = self._cached_generation
+        return content
+    
+    def _download_live_history(self) -> List[Dict[str, Any]]:
+        """
+        Download history without the snapshots deleted by tombstones.
+        
+        Returns:
+            list: Live snapshots in history order
+        """
+        history = self._download_history()
+        return list(drop_tombstoned(history, self._read_tombstones())) if history else history
+    
+    def _read_tombstones(self) -> List[Dict[str, Any]]:
+        """
+        Read the tombstones blob, revalidating the cached copy by generation.
+        
+        Returns:
+            list: Tombstones (copy; empty if the blob doesn't exist)
+            
+        Raises:
+            ValueError: If the blob has an invalid format
+            Exception: If the download fails for other reasons
+        """
+        blob = self.bucket.blob(self.tombstones_blob_name)
+        try:
+            if self._tombstones_generation is not None:
+                content = blob.download_as_bytes(if_generation_not_match=self._tombstones_generation)
+            else:
+                content = blob.download_as_bytes()
+        except gcp_exceptions.NotModified:
+            return list(self._tombstones)
+        except gcp_exceptions.NotFound:
+            self._tombstones_generation = None
+            self._tombstones = []
+            return []
+        
+        data = loads(content)
+        tombstones = data.get("tombstones") if isinstance(data, dict) else None
+        if not isinstance(tombstones, list):
+            raise ValueError("Tombstones blob in GCS has invalid format (no tombstone list)")
+        
+        self._tombstones_generation = blob.generation
+        self._tombstones = tombstones
+        return list(tombstones)
+    
+    def _update_tombstones(self, modify: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """
+        Apply a change to the tombstones blob with optimistic concurrency.
+        
+        Args:
+            modify: Function modifying the tombstone list in place (may raise to abort)
+            
+        Raises:
+            RuntimeError: If the blob kept changing for every attempt
+        """
+        for attempt in range(MANIFEST_UPDATE_ATTEMPTS):
+            tombstones = self._read_tombstones()
+            modify(tombstones)
+            blob = self.bucket.blob(self.tombstones_blob_name)
+            try:
+                blob.upload_from_string(
+                    dumps({"tombstones": tombstones}),
+                    content_type="application/json",
+                    if_generation_match=self._tombstones_generation or 0
+                )
+            except gcp_exceptions.PreconditionFailed:
+                logger.info(f"GCPStorageBackend: Tombstones changed concurrently, retrying (attempt {attempt + 1})")
+                continue
+            self._tombstones_generation = blob.generation
+            self._tombstones = list(tombstones)
+            return
+        
+        raise RuntimeError(f"Tombstones update failed after {MANIFEST_UPDATE_ATTEMPTS} attempts")
+    
+    def _clear_tombstones(self) -> None:
+        """Remove the tombstones blob (after the history it refers to was rewritten)."""
+        try:
+            self.bucket.blob(self.tombstones_blob_name).delete()
+        except gcp_exceptions.NotFound:
+            pass
+        self._tombstones_generation = None
+        self._tombstones = []
+    
+    def _compact_monolithic(self):
+        """
+        Back up the history blob and re-upload it without deleted snapshots.
+        
+        Returns:
+            tuple: (snapshots removed, snapshots remaining)
+        """
+        history = self._download_history()
+        tombstones = self._read_tombstones()
+        if not tombstones:
+            return 0, len(history)
+        
+        live = list(drop_tombstoned(history, tombstones))
+        
+        # Step 1: Back up the history (it still contains the deleted snapshots)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        backup_blob_name = f"backup/{self.blob_name}.bak.{timestamp}"
+        self.bucket.blob(backup_blob_name).upload_from_string(
+            self._cached_content,
+            content_type="application/json"
+        )
+        logger.info(f"GCPStorageBackend: Created backup at gs://{self.bucket_name}/{backup_blob_name}")
+        
+        # Step 2: Upload the live history, then drop the tombstones
+        blob = self.bucket.blob(self.blob_name)
+        payload = dumps(live)
+        self._upload_payload(blob, payload)
+        self._store_cached_history(blob.generation, payload)
+        self._clear_tombstones()
+        
+        self._write_latest_blob(live[-1] if live else None, blob.generation)
+        self._write_index_blob(self._build_index(live), blob.generation)
+        return len(history) - len(live), len(live)
+    
+    def _prune_backups(self, prefix: str, keep: int) -> int:
+        """
+        Delete backups except those of the keep most recent compactions.
+        
+        Backups made by one compaction share their ".bak.<timestamp>" suffix.
+        
+        Args:
+            prefix: Backup blob name prefix
+            keep: Number of backup timestamps to keep
+            
+        Returns:
+            int: Number of backup blobs deleted
+        """
+        backups = {}
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            if ".bak." in blob.name:
+                backups.setdefault(blob.name.rsplit(".bak.", 1)[1], []).append(blob.name)
+        
+        removed = 0
+        for timestamp in sorted(backups, reverse=True)[max(keep, 0):]:
+            for name in backups[timestamp]:
+                try:
+                    self.bucket.blob(name).delete()
+                    removed += 1
+                except gcp_exceptions.NotFound:
+                    pass
+        return removed
+    
+    def _cache_paths(self):
+        """Return (content path, metadata path) of the persistent history copy."""
+        content_path = os.path.join(self.cache_dir, self.blob_name)
+        return content_path, content_path + ".meta.json"
+    
+    def _load_cached_history(self) -> None:
+        """
+        Load the persistent history copy into memory (once per process).
+        
+        The copy is only trusted if it belongs to this bucket and its size
+        matches the recorded metadata; otherwise it is ignored and the next
+        read downloads the history in full.
+        """
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        
+        if not self.cache_dir:
+            return
+        
+        content_path, meta_path = self._cache_paths()
+        try:
+            with open(meta_path, "rb") as f:
+                meta = loads(f.read())
+            with open(content_path, "rb") as f:
+                content = f.read()
+        except (IOError, OSError, json.JSONDecodeError):
+            return
+        
+        if meta.get("bucket") != self.bucket_name or meta.get("size") != len(content):
+            logger.debug("GCPStorageBackend: Ignoring stale local history cache")
+            return
+        
+        self._cached_generation = meta.get("generation")
+        self._cached_content = content
+        logger.debug(f"GCPStorageBackend: Loaded local history cache (generation {self._cached_generation})")
+    
+    def _store_cached_history(self, generation: Optional[int], content: Optional[bytes]) -> None:
+        """
+        Remember the history payload for a given generation.
+        
+        Updates the in-memory copy and, if a cache directory is configured,
+        the persistent copy (content first, then metadata, so a torn write
+        is detected by the size check). Failures only cost a re-download.
+        
+        Args:
+            generation: History blob generation (None to clear the cache)
+            content: Raw history payload (None to clear the cache)
+        """
+        self._cache_loaded = True
+        self._cached_generation = generation
+        self._cached_content = content
+        
+        if not self.cache_dir:
+            return
+        
+        content_path, meta_path = self._cache_paths()
+        try:
+            if generation is None or content is None:
+                for path in (meta_path, content_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(content_path + ".tmp", "wb") as f:
+                f.write(content)
+            os.replace(content_path + ".tmp", content_path)
+            
+            meta = {"bucket": self.bucket_name, "generation": generation, "size": len(content)}
+            with open(meta_path + ".tmp", "wb") as f:
+                f.write(dumps(meta))
+            os.replace(meta_path + ".tmp", meta_path)
+        except (IOError, OSError) as e:
+            logger.warning(f"GCPStorageBackend: Failed to update local history cache: {e}")
+    
+    def _write_latest_blob(self, snapshot: Optional[Dict[str, Any]], history_generation: Optional[int]) -> None:
+        """
+        Upload the latest-snapshot blob.
+        
+        The blob is a derived cache tagged with the history (and tombstones)
+        generation it was written for; readers ignore it when they differ. Failing
+        to write it is logged but does not fail the calling operation.
+        
+        Args:
+            snapshot: Latest snapshot (None if history is empty)
+            history_generation: Generation of the history blob it describes
+        """
+        try:
+            content = dumps({
+                "history_generation": history_generation,
+                "tombstones_generation": self._tombstones_generation,
+                "snapshot": snapshot,
+            })
+            self.bucket.blob(self.latest_blob_name).upload_from_string(
+                content,
+                content_type="application/json"
+            )
+        except Exception as e:
+            self._record_failure(e)
+            logger.warning(f"GCPStorageBackend: Failed to update latest-snapshot blob: {e}")
+    
+    def _read_latest_blob(self):
+        """
+        Read the latest snapshot from the latest-snapshot blob.
+        
+        Returns:
+            tuple: (found, snapshot). found is False if the blob is missing or
+                   its generations don't match the current history and
+                   tombstones blobs.
+        """
+        try:
+            content = self.bucket.blob(self.latest_blob_name).download_as_bytes()
+            pointer = loads(content)
+        except gcp_exceptions.NotFound:
+            return False, None
+        except json.JSONDecodeError:
+            logger.warning("GCPStorageBackend: Invalid JSON in latest-snapshot blob")
+            return False, None
+        
+        if not self._is_current(pointer):
+            return False, None
+        
+        return True, pointer.get("snapshot")
+
+    def _is_current(self, derived: Dict[str, Any]) -> bool:
+        """
+        Check a derived blob's generation tags against the history and tombstones.
+        
+        Metadata-only requests: no history payload is downloaded.
+        """
+        history_blob = self.bucket.get_blob(self.blob_name)
+        if history_blob is None or history_blob.generation != derived.get("history_generation"):
+            return False
+        
+        tombstones_blob = self.bucket.get_blob(self.tombstones_blob_name)
+        tombstones_generation = tombstones_blob.generation if tombstones_blob is not None else None
+        return tombstones_generation == derived.get("tombstones_generation")
+    
+    def _probe_bucket(self) -> bool:
+        """Live availability check (lightweight bucket metadata request)."""
+        self.bucket.exists()
+        return True
+    
+    def _record_failure(self, error: Exception) -> None:
+        """Count a failed operation against availability if GCS couldn't be reached."""
+        if is_connectivity_error(error):
+            self._health.record_failure()
+    
+    def _build_index(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build index entries for a full history."""
+        return [snapshot_index_entry(snapshot, i) for i, snapshot in enumerate(history)]
+    
+    def _write_index_blob(self, entries: List[Dict[str, Any]], history_generation: Optional[int]) -> None:
+        """
+        Upload the metadata index blob.
+        
+        Like the latest-snapshot blob, it is a derived cache tagged with the
+        history generation it describes; failing to write it is logged but
+        does not fail the calling operation.
+        
+        Args:
+            entries: Index entries for the whole history
+            history_generation: Generation of the history blob they describe
+        """
+        try:
+            content = dumps({
+                "history_generation": history_generation,
+                "tombstones_generation": self._tombstones_generation,
+                "entries": entries,
+            })
+            self.bucket.blob(self.index_blob_name).upload_from_string(
+                content,
+                content_type="application/json"
+            )
+        except Exception as e:
+            self._record_failure(e)
+            logger.warning(f"GCPStorageBackend: Failed to update index blob: {e}")
+    
+    def _read_index_blob(self):
+        """
+        Read the metadata index from the index blob.
+        
+        Returns:
+            tuple: (found, entries). found is False if the blob is missing or
+                   its generations don't match the current history and
+                   tombstones blobs.
+        """
+        try:
+            content = self.bucket.blob(self.index_blob_name).download_as_bytes()
+            index = loads(content)
+        except gcp_exceptions.NotFound:
+            return False, None
+        except json.JSONDecodeError:
+            logger.warning("GCPStorageBackend: Invalid JSON in index blob")
+            return False, None
+        
+        if not self._is_current(index):
+            return False, None
+        
+        entries = index.get("entries")
+        return (True, entries) if isinstance(entries, list) else (False, None)
+    
+    def _get_snapshot_index_sharded(self) -> List[Dict[str, Any]]:
+        """
+        Build the metadata index from the manifest.
+        
+        Entries written before the manifest carried index metadata are
+        completed by fetching their shards.
+        
+        Returns:
+            list: Index entries in manifest order
+        """
+        entries = self._read_live_manifest()
+        
+        incomplete = [e for e in entries if "total_value_eur" not in e or "asset_count" not in e]
+        if incomplete:
+            logger.debug(f"GCPStorageBackend: Fetching {len(incomplete)} shard(s) for index metadata")
+            snapshots = dict(zip((e["name"] for e in incomplete), self._fetch_shards(incomplete)))
+        
+        index = []
+        for i, entry in enumerate(entries):
+            if "total_value_eur" in entry and "asset_count" in entry:
+                index.append({
+                    "index": i,
+                    "timestamp": entry.get("timestamp"),
+                    "epoch": timestamp_to_epoch(entry.get("timestamp")),
+                    "total_value_eur": entry["total_value_eur"],
+                    "asset_count": entry["asset_count"],
+                    "hash": entry.get("hash"),
+                })
+            elif snapshots.get(entry["name"]) is not None:
+                index.append(snapshot_index_entry(snapshots[entry["name"]], i, entry.get("hash")))
+        return index
+    
+    def migrate_to_sharded(self) -> Dict[str, Any]:
+        """
+        Migrate the monolithic history blob to the sharded layout.
+        
+        Uploads one shard per snapshot (in parallel), keeps a copy of the
+        monolithic blob under backup/ and writes the manifest last, so an
+        interrupted migration leaves the sharded layout unpublished. The
+        monolithic blob itself is left untouched (it is no longer updated
+        once the sharded layout is in use). Safe to run more than once.
+        
+        Returns:
+            dict: {"success", "migrated", "already_sharded"} or {"success": False, "error"}
+        """
+        try:
+            if self.bucket.get_blob(self.manifest_blob_name) is not None:
+                logger.info("GCPStorageBackend: History is already sharded, nothing to migrate")
+                return {"success": True, "migrated": 0, "already_sharded": True}
+            
+            migrated = self._migrate_monolithic()
+            return {"success": True, "migrated": migrated, "already_sharded": False}
+            
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to migrate history to sharded layout: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _migrate_monolithic(self) -> int:
+        """
+        Copy every snapshot of the monolithic blob into its own shard.
+        
+        Returns:
+            int: Number of snapshots migrated
+            
+        Raises:
+            ValueError: If the monolithic blob exists but can't be parsed
+            Exception: If an upload fails
+        """
+        history = self._download_live_history()
+        if not history and self._cached_content and self._cached_content.strip():
+            try:
+                loads(decompress_payload(self._cached_content))
+            except (ValueError, OSError, EOFError):
+                raise ValueError("Monolithic history could not be parsed; refusing to migrate")
+        
+        entries = []
+        payloads = {}
+        for snapshot in history:
+            content_hash = compute_snapshot_hash(snapshot)
+            name = shard_blob_name(snapshot, content_hash)
+            entries.append(manifest_entry(snapshot, name, content_hash))
+            payloads[name] = dumps(snapshot)
+        
+        self._upload_shards(payloads)
+        
+        if self._cached_content is not None:
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            backup_blob_name = f"backup/{self.blob_name}.pre-sharding.{timestamp}"
+            self.bucket.blob(backup_blob_name).upload_from_string(
+                self._cached_content,
+                content_type="application/json"
+            )
+            logger.info(f"GCPStorageBackend: Created backup at gs://{self.bucket_name}/{backup_blob_name}")
+        
+        try:
+            self._write_manifest(entries, None)
+        except gcp_exceptions.PreconditionFailed:
+            # Another process published the manifest first
+            logger.info("GCPStorageBackend: Manifest already created by another writer")
+            return 0
+        
+        logger.info(
+            f"GCPStorageBackend: Migrated {len(entries)} snapshots to "
+            f"gs://{self.bucket_name}/{SHARD_PREFIX}"
+        )
+        return len(entries)
+    
+    def _save_snapshot_sharded(self, snapshot_data: Dict[str, Any]) -> bool:
+        """
+        Save snapshot as its own shard and append it to the manifest.
+        
+        Args:
+            snapshot_data: Snapshot dictionary
+            
+        Returns:
+            bool: True if save successful, False otherwise
+        """
+        try:
+            # Step 1: Upload the shard (immutable, named by timestamp and hash)
+            content_hash = compute_snapshot_hash(snapshot_data)
+            name = shard_blob_name(snapshot_data, content_hash)
+            content = dumps(snapshot_data)
+            self._upload_shard(name, content)
+            
+            # Step 2: Publish it in the manifest
+            entry = manifest_entry(snapshot_data, name, content_hash)
+            self._update_manifest(lambda entries: entries.append(entry))
+            
+            logger.info(
+                f"GCPStorageBackend: Snapshot saved to gs://{self.bucket_name}/{name} "
+                f"({len(live_entries(self._manifest_entries))} total)"
+            )
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error saving snapshot: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to save snapshot to GCS: {e}")
+            return False
+    
+    def _save_snapshots_sharded(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Upload several shards in parallel and publish them in one manifest update.
+        
+        Args:
+            snapshots: Snapshots in chronological order
+            
+        Returns:
+            bool: True if every snapshot is now stored
+        """
+        try:
+            # Step 1: Upload the shards (immutable, so re-uploads are harmless)
+            new_entries = []
+            payloads = {}
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                name = shard_blob_name(snapshot, content_hash)
+                new_entries.append(manifest_entry(snapshot, name, content_hash))
+                payloads[name] = dumps(snapshot)
+            self._upload_shards(payloads)
+            
+            # Step 2: Publish the ones not listed yet
+            def append_missing(entries: List[Dict[str, Any]]) -> None:
+                existing = {entry.get("hash") for entry in entries if not entry.get("deleted_at")}
+                for entry in new_entries:
+                    if entry["hash"] not in existing:
+                        entries.append(entry)
+                        existing.add(entry["hash"])
+            
+            self._update_manifest(append_missing)
+            
+            logger.info(
+                f"GCPStorageBackend: Saved {len(snapshots)} snapshots as shards "
+                f"({len(live_entries(self._manifest_entries))} total)"
+            )
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error saving snapshots: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to save snapshots to GCS: {e}")
+            return False
+    
+    def _get_latest_snapshot_sharded(self) -> Optional[Dict[str, Any]]:
+        """
+        Get latest snapshot by fetching only the last shard in the manifest.
+        
+        Returns:
+            dict: Latest snapshot or None if unavailable
+        """
+        try:
+            entries = self._read_live_manifest()
+            if not entries:
+                return None
+            
+            latest = self._fetch_shards(entries[-1:])[0]
+            if latest:
+                logger.debug(f"GCPStorageBackend: Retrieved latest snapshot from {latest.get('timestamp', 'unknown')}")
+            return latest
+            
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to get latest snapshot from GCS: {e}")
+            return None
+    
+    def _load_sharded_history(self) -> List[Dict[str, Any]]:
+        """
+        Load all snapshots listed in the manifest, in manifest order.
+        
+        Returns:
+            list: All snapshots (shards that can't be read are skipped)
+        """
+        entries = self._read_live_manifest()
+        history = [snapshot for snapshot in self._fetch_shards(entries) if snapshot is not None]
+        
+        if len(history) != len(entries):
+            logger.warning(
+                f"GCPStorageBackend: {len(entries) - len(history)} shard(s) listed in the "
+                f"manifest could not be read"
+            )
+        return history
+    
+    def _delete_snapshot_sharded(self, index: int) -> bool:
+        """
+        Delete snapshot by index in the sharded layout.
+        
+        Marks the manifest entry as deleted; the shard is backed up and
+        removed by compact_history().
+        
+        Args:
+            index: Zero-based index of snapshot to delete
+            
+        Returns:
+            bool: True if deletion succeeded, False otherwise
+        """
+        try:
+            # Step 1: Read manifest and validate index
+            entries = live_entries(self._read_manifest())
+            
+            if not entries:
+                logger.error("GCPStorageBackend: No history to delete from")
+                return False
+            
+            if index < 0 or index >= len(entries):
+                logger.error(
+                    f"GCPStorageBackend: Index {index} out of range "
+                    f"(valid: 0-{len(entries)-1})"
+                )
+                return False
+            
+            target = entries[index]
+            
+            logger.info(
+                f"GCPStorageBackend: Deleting snapshot at index {index}: "
+                f"{target.get('timestamp', 'unknown')}"
+            )
+            
+            # Step 2: Mark it as deleted in the manifest
+            def mark(current: List[Dict[str, Any]]) -> None:
+                positions = [i for i, entry in enumerate(current) if not entry.get("deleted_at")]
+                if index >= len(positions) or current[positions[index]]["name"] != target["name"]:
+                    raise RuntimeError(f"Snapshot at index {index} changed concurrently")
+                current[positions[index]] = {
+                    **current[positions[index]],
+                    "deleted_at": datetime.now(timezone.utc).isoformat(),
+                }
+            
+            self._update_manifest(mark)
+            
+            logger.info(
+                f"GCPStorageBackend: Successfully deleted snapshot. "
+                f"Remaining snapshots: {len(live_entries(self._manifest_entries))}"
+            )
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error during deletion: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Unexpected error deleting snapshot: {e}", exc_info=True)
+            return False
+    
+    def _compact_sharded(self):
+        """
+        Drop entries marked as deleted from the manifest and delete their shards.
+        
+        Each shard no live entry references is backed up before it is
+        deleted.
+        
+        Returns:
+            tuple: (snapshots removed, snapshots remaining)
+        """
+        deleted = [entry for entry in self._read_manifest() if entry.get("deleted_at")]
+        if not deleted:
+            return 0, len(self._manifest_entries)
+        
+        # Step 1: Publish the manifest without them
+        removed = []
+        
+        def drop_deleted(entries: List[Dict[str, Any]]) -> None:
+            removed[:] = [entry for entry in entries if entry.get("deleted_at")]
+            entries[:] = [entry for entry in entries if not entry.get("deleted_at")]
+        
+        self._update_manifest(drop_deleted)
+        
+        # Step 2: Back up and delete shards nothing references any more
+        referenced = {entry["name"] for entry in self._manifest_entries}
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        for name in sorted({entry["name"] for entry in removed} - referenced):
+            content = self._get_shard_content(name)
+            if content is not None:
+                self.bucket.blob(f"backup/{name}.bak.{timestamp}").upload_from_string(
+                    content,
+                    content_type="application/json"
+                )
+            try:
+                self.bucket.blob(name).delete()
+            except gcp_exceptions.NotFound:
+                pass
+            self._shard_cache.pop(name, None)
+        
+        return len(removed), len(self._manifest_entries)
+    
+    def _replace_history_sharded(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Publish a new manifest listing exactly the given snapshots.
+        
+        Args:
+            snapshots: New history, in order
+            
+        Returns:
+            bool: True if the history was replaced, False otherwise
+        """
+        try:
+            # Step 1: Upload shards the current manifest doesn't reference
+            stored = {entry["name"] for entry in self._read_manifest()}
+            new_entries = []
+            payloads = {}
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                name = shard_blob_name(snapshot, content_hash)
+                new_entries.append(manifest_entry(snapshot, name, content_hash))
+                if name not in stored:
+                    payloads[name] = dumps(snapshot)
+            self._upload_shards(payloads)
+            
+            # Step 2: Swap the manifest contents
+            def replace(entries: List[Dict[str, Any]]) -> None:
+                entries[:] = new_entries
+            
+            self._update_manifest(replace)
+            
+            logger.info(
+                f"GCPStorageBackend: Replaced manifest with {len(new_entries)} snapshots "
+                f"({len(payloads)} shards uploaded)"
+            )
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error replacing history: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to replace history in GCS: {e}")
+            return False
+    
+    def _delete_all_snapshots_sharded(self) -> bool:
+        """
+        Delete the manifest and every shard (TEST USE ONLY).
+        
+        Returns:
+            bool: True if deletion succeeded, False on error
+        """
+        try:
+            for blob in self.bucket.list_blobs(prefix=SHARD_PREFIX):
+                try:
+                    blob.delete()
+                except gcp_exceptions.NotFound:
+                    pass
+            
+            self._manifest_generation = None
+            self._manifest_entries = []
+            self._shard_cache.clear()
+            
+            logger.info(f"GCPStorageBackend: Deleted all snapshots from gs://{self.bucket_name}/{SHARD_PREFIX}")
+            return True
+            
+        except gcp_exceptions.GoogleAPIError as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: GCP API error deleting snapshots: {e}")
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            logger.error(f"GCPStorageBackend: Failed to delete snapshots from GCS: {e}")
+            return False
+    
+    def _read_manifest(self) -> List[Dict[str, Any]]:
+        """
+        Read the manifest, revalidating the cached copy by generation.
+        
+        If no manifest exists yet but a monolithic history does, the
+        history is migrated first.
+        
+        Returns:
+            list: Manifest entries (copy; safe to modify)
+            
+        Raises:
+            Exception: If the manifest can't be downloaded or migration fails
+        """
+        blob = self.bucket.blob(self.manifest_blob_name)
+        try:
+            if self._manifest_generation is not None:
+                content = blob.download_as_bytes(if_generation_not_match=self._manifest_generation)
+            else:
+                content = blob.download_as_bytes()
+        except gcp_exceptions.NotModified:
+            self._health.record_success()
+            return list(self._manifest_entries)
+        except gcp_exceptions.NotFound:
+            self._health.record_success()
+            self._manifest_generation = None
+            self._manifest_entries = []
+            if self.bucket.get_blob(self.blob_name) is not None:
+                logger.info("GCPStorageBackend: No manifest found, migrating monolithic history")
+                self._migrate_monolithic()
+                return self._read_manifest()
+            return []
+        
+        self._health.record_success()
+        manifest = loads(content)
+        entries = manifest.get("shards") if isinstance(manifest, dict) else None
+        if not isinstance(entries, list):
+            raise ValueError("Manifest in GCS has invalid format (no shard list)")
+        
+        self._manifest_generation = blob.generation
+        self._manifest_entries = entries
+        return list(entries)
+    
+    def _read_live_manifest(self) -> List[Dict[str, Any]]:
+        """Read the manifest entries that aren't marked as deleted."""
+        return live_entries(self._read_manifest())
+    
+    def _write_manifest(self, entries: List[Dict[str, Any]], expected_generation: Optional[int]) -> None:
+        """
+        Upload the manifest if it is still at the expected generation.
+        
+        Args:
+            entries: Manifest entries to publish
+            expected_generation: Generation read before modifying the entries
+                                 (None if the manifest must not exist yet)
+            
+        Raises:
+            gcp_exceptions.PreconditionFailed: If another writer updated it first
+        """
+        content = dumps({"version": MANIFEST_VERSION, "shards": entries})
+        blob = self.bucket.blob(self.manifest_blob_name)
+        blob.upload_from_string(
+            content,
+            content_type="application/json",
+            if_generation_match=expected_generation or 0
+        )
+        self._manifest_generation = blob.generation
+        self._manifest_entries = list(entries)
+    
+    def _update_manifest(self, modify: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """
+        Apply a change to the manifest with optimistic concurrency.
+        
+        Re-reads the manifest and re-applies the change if another writer
+        updated it in between.
+        
+        Args:
+            modify: Function modifying the entry list in place (may raise to abort)
+            
+        Raises:
+            RuntimeError: If the manifest kept changing for every attempt
+        """
+        for attempt in range(MANIFEST_UPDATE_ATTEMPTS):
+            entries = self._read_manifest()
+            modify(entries)
+            try:
+                self._write_manifest(entries, self._manifest_generation)
+                return
+            except gcp_exceptions.PreconditionFailed:
+                logger.info(f"GCPStorageBackend: Manifest changed concurrently, retrying (attempt {attempt + 1})")
+        
+        raise RuntimeError(f"Manifest update failed after {MANIFEST_UPDATE_ATTEMPTS} attempts")
+    
+    def _fetch_shards(self, entries: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return the snapshots for manifest entries, downloading missing shards in parallel.
+        
+        Args:
+            entries: Manifest entries
+            
+        Returns:
+            list: Snapshot per entry (None for shards that can't be read)
+        """
+        missing = []
+        for entry in entries:
+            name = entry["name"]
+            if name not in self._shard_cache and name not in missing and not self._load_cached_shard(name):
+                missing.append(name)
+        
+        if missing:
+            workers = min(self.download_workers, len(missing))
+            if workers == 1:
+                for name in missing:
+                    self._download_shard(name)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(self._download_shard, missing))
+            logger.debug(f"GCPStorageBackend: Downloaded {len(missing)} shard(s) with {workers} worker(s)")
+        
+        snapshots = []
+        for entry in entries:
+            content = self._shard_cache.get(entry["name"])
+            snapshots.append(loads(content) if content is not None else None)
+        return snapshots
+    
+    def _get_shard_content(self, name: str) -> Optional[bytes]:
+        """Return the raw payload of one shard, downloading it if needed."""
+        if name not in self._shard_cache and not self._load_cached_shard(name):
+            self._download_shard(name)
+        return self._shard_cache.get(name)
+    
+    def _download_shard(self, name: str) -> None:
+        """
+        Download one shard into the shard cache.
+        
+        Runs on worker threads; only touches the bucket and the cache entry
+        for its own name.
+        """
+        try:
+            content = self.bucket.blob(name).download_as_bytes()
+        except gcp_exceptions.NotFound:
+            logger.warning(f"GCPStorageBackend: Shard {name} listed in manifest but not found")
+            return
+        
+        try:
+            content = decompress_payload(content)
+            loads(content)
+        except (UnicodeDecodeError, json.JSONDecodeError, OSError, EOFError) as e:
+            logger.error(f"GCPStorageBackend: Invalid JSON in shard {name}: {e}")
+            return
+        
+        self._store_cached_shard(name, content)
+    
+    def _upload_shard(self, name: str, content: bytes) -> None:
+        """
+        Upload one shard unless it already exists.
+        
+        Shard names include the content hash, so an existing object with
+        the same name already holds identical data.
+        """
+        try:
+            self._upload_payload(self.bucket.blob(name), content, if_generation_match=0)
+        except gcp_exceptions.PreconditionFailed:
+            logger.debug(f"GCPStorageBackend: Shard {name} already exists")
+        self._store_cached_shard(name, content)
+    
+    def _upload_shards(self, payloads: Dict[str, bytes]) -> None:
+        """Upload several shards in parallel."""
+        if not payloads:
+            return
+        
+        workers = min(self.download_workers, len(payloads))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda item: self._upload_shard(*item), payloads.items()))
+    
+    def _load_cached_shard(self, name: str) -> bool:
+        """
+        Load a shard from the persistent cache into memory.
+        
+        Returns:
+            bool: True if the shard is now cached in memory
+        """
+        if not self.cache_dir:
+            return False
+        
+        try:
+            with open(os.path.join(self.cache_dir, name), "rb") as f:
+                content = f.read()
+            loads(content)
+        except (IOError, OSError, UnicodeDecodeError, json.JSONDecodeError):
+            return False
+        
+        self._shard_cache[name] = content
+        return True
+    
+    def _store_cached_shard(self, name: str, content: bytes) -> None:
+        """Remember a shard payload in memory and, if configured, on disk."""
+        self._shard_cache[name] = content
+        
+        if not self.cache_dir:
+            return
+        
+        path = os.path.join(self.cache_dir, name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{id(content)}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning(f"GCPStorageBackend: Failed to cache shard {name} locally: {e}")
+    
+    def _upload_payload(self, blob, payload: bytes, **kwargs) -> None:
+        """
+        Upload a JSON payload, compressed according to the compression setting.
+        
+        Compressed uploads carry Content-Encoding: gzip so GCS serves them
+        compressed to clients that accept it (the client library decodes
+        them transparently).
+        
+        Args:
+            blob: Target blob
+            payload: Plain JSON payload
+            **kwargs: Extra arguments for upload_from_string (preconditions)
+        """
+        blob.content_encoding = content_encoding(self.compression)
+        blob.upload_from_string(
+            compress_payload(payload, self.compression),
+            content_type="application/json",
+            **kwargs
+        )
+        self._health.record_success()
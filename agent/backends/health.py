@@ -0,0 +1,161 @@
+"""
+Availability tracking for remote storage backends.
+
+A CircuitBreaker caches whether a backend is reachable, so callers can ask
+is_available() as often as they like without a network round trip each
+time:
+
+    closed     the backend works; the last answer is reused for `ttl`
+               seconds, after which the next call probes again
+    open       `failure_threshold` consecutive failures were seen; calls
+               return False without probing until `reset_timeout` passes
+    half-open  one probe is let through; success closes the circuit,
+               failure opens it again
+
+Besides explicit probes, the breaker is fed passively: backends report the
+outcome of their real operations with record_success()/record_failure().
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_TTL = 30.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 60.0
+
+
+class CircuitBreaker:
+    """Cached, thread-safe availability state with a circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = DEFAULT_TTL,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the breaker (closed, nothing known yet).
+
+        Args:
+            name: Backend name used in log messages
+            ttl: Seconds a known state is reused before probing again
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+            clock: Monotonic time source (replaceable in tests)
+        """
+        self.name = name
+        self.ttl = ttl
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._available: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+        self._opened_at: Optional[float] = None
+        self._consecutive_failures = 0
+        self._probing = False
+
+    def is_available(self, probe: Callable[[], bool]) -> bool:
+        """
+        Return the cached availability, probing only when it has expired.
+
+        At most one probe runs at a time; concurrent callers get the last
+        known answer instead of waiting for it.
+
+        Args:
+            probe: Live check returning True if the backend is reachable
+                   (an exception counts as unreachable)
+
+        Returns:
+            bool: True if the backend is considered available
+        """
+        with self._lock:
+            now = self._clock()
+            if self._state == OPEN:
+                if now - self._opened_at < self.reset_timeout or self._probing:
+                    return False
+                self._state = HALF_OPEN
+                logger.info(f"{self.name}: Circuit half-open, probing availability")
+            elif self._probing:
+                return bool(self._available)
+            elif self._available is not None and now - self._checked_at < self.ttl:
+                return self._available
+            self._probing = True
+
+        try:
+            available = bool(probe())
+        except Exception as e:
+            logger.warning(f"{self.name}: Availability probe failed: {e}")
+            available = False
+        finally:
+            with self._lock:
+                self._probing = False
+
+        if available:
+            self.record_success()
+        else:
+            self.record_failure()
+        return available
+
+    def record_success(self) -> None:
+        """Record a successful operation: closes the circuit."""
+        with self._lock:
+            if self._state != CLOSED or self._available is False:
+                logger.info(f"{self.name}: Available again, circuit closed")
+            self._state = CLOSED
+            self._available = True
+            self._checked_at = self._clock()
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Record a failed operation: opens the circuit at the threshold, or from half-open."""
+        with self._lock:
+            now = self._clock()
+            self._available = False
+            self._checked_at = now
+            self._consecutive_failures += 1
+
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = now
+                logger.warning(
+                    f"{self.name}: Circuit opened after {self._consecutive_failures} consecutive failures, "
+                    f"next probe in {self.reset_timeout:.0f}s"
+                )
+            elif self._state == OPEN:
+                self._opened_at = now
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Describe the current state.
+
+        Returns:
+            dict: state, available (None if unknown), consecutive_failures,
+                  seconds since the last check and until the next probe
+        """
+        with self._lock:
+            now = self._clock()
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, round(self._opened_at + self.reset_timeout - now, 1))
+            return {
+                "state": self._state,
+                "available": self._available,
+                "consecutive_failures": self._consecutive_failures,
+                "checked_seconds_ago": round(now - self._checked_at, 1) if self._checked_at is not None else None,
+                "retry_in_seconds": retry_in,
+            }
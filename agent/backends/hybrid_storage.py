@@ -2,39 +2,99 @@
 Hybrid storage backend with fallback support.
 
 Uses GCP as primary, local file as fallback for offline scenarios.
-Automatically retries failed GCP uploads when connectivity is restored.
+Saves commit to the fallback and return; a background worker replicates
+them to the primary, retrying with exponential backoff until connectivity
+is restored. Reads use the fallback while replication is behind.
+
+The replication queue can be persisted as a JSON Lines journal, so
+snapshots that haven't reached the primary survive a restart. Queued
+snapshots are replicated as one batch (save_snapshots), keyed by content
+hash so a replayed batch never stores duplicates.
 """
 
-from typing import Dict, List, Optional, Any
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterator, Sequence, Union
 import logging
 
-from ..storage_backend import StorageBackend
+from ..json_codec import dumps, loads
+from ..storage_backend import DEFAULT_KEEP_BACKUPS, StorageBackend, compute_snapshot_hash
 
 logger = logging.getLogger(__name__)
 
+# Background replication defaults
+REPLICATION_QUEUE_SIZE = 1000
+REPLICATION_INITIAL_BACKOFF = 1.0
+REPLICATION_MAX_BACKOFF = 300.0
+REPLICATION_SHUTDOWN_TIMEOUT = 10.0
+PENDING_SYNC_JOURNAL_FILE = "pending_sync.jsonl"
+
 
 class HybridStorageBackend(StorageBackend):
     """
     Hybrid storage with primary and fallback backends.
     
     Strategy:
-    - Attempts primary (GCP) first
-    - Falls back to secondary (local file) if primary unavailable
-    - Dual-write when both available for redundancy
-    - Queues retry for failed primary writes
+    - Commits snapshots to secondary (local file) synchronously
+    - Replicates them to primary (GCP) from a background worker
+    - Reads from primary when it is available and up to date,
+      otherwise from secondary
+    - Retries failed primary writes with exponential backoff
     """
     
-    def __init__(self, primary: StorageBackend, fallback: StorageBackend):
+    def __init__(
+        self,
+        primary: StorageBackend,
+        fallback: StorageBackend,
+        max_pending: int = REPLICATION_QUEUE_SIZE,
+        initial_backoff: float = REPLICATION_INITIAL_BACKOFF,
+        max_backoff: float = REPLICATION_MAX_BACKOFF,
+        journal_path: Optional[str] = None
+    ):
         """
         Initialize hybrid backend.
         
         Args:
             primary: Primary storage backend (e.g., GCP)
             fallback: Fallback storage backend (e.g., local file)
+            max_pending: Maximum snapshots queued for replication; further
+                         snapshots are kept in the fallback only
+            initial_backoff: Seconds before the first replication retry
+            max_backoff: Upper bound for the retry delay in seconds
+            journal_path: JSON Lines file persisting the replication queue
+                          (optional; in-memory only if None). Snapshots
+                          found in it are queued again on startup.
         """
         self.primary = primary
         self.fallback = fallback
-        self.pending_sync: List[Dict[str, Any]] = []  # Queue for failed primary writes
+        self.max_pending = max_pending
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        
+        # Replication queue: {"hash", "queued_at", "snapshot"} entries in save
+        # order, drained by the worker thread and mirrored to the journal.
+        # All replication state is guarded by _sync_cond.
+        self.journal_path = journal_path
+        self.pending_sync: List[Dict[str, Any]] = []
+        self._sync_cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self._retry_now = False
+        self._replication_failures = 0
+        self._next_retry_at: Optional[float] = None
+        self._last_replicated_at: Optional[float] = None
+        self._dropped_syncs = 0
+        
+        with self._sync_cond:
+            self.pending_sync = self._load_journal()
+            if self.pending_sync:
+                logger.info(
+                    f"HybridStorageBackend: Resuming replication of {len(self.pending_sync)} "
+                    f"journaled snapshots"
+                )
+                self._ensure_worker()
         
         logger.info("HybridStorageBackend initialized with primary and fallback")
     
@@ -43,10 +103,9 @@ class HybridStorageBackend(StorageBackend):
         Save snapshot to storage with fallback.
         
         Strategy:
-        1. Retry any pending syncs first
-        2. Try primary (GCP)
-        3. Always write to fallback (local) as backup
-        4. If primary fails, queue for retry
+        1. Write to fallback (local) and return once it is committed
+        2. Queue the snapshot for background replication to primary (GCP)
+        3. If the fallback write fails, write to primary inline instead
         
         Args:
             snapshot_data: Snapshot dictionary
@@ -54,55 +113,71 @@ class HybridStorageBackend(StorageBackend):
         Returns:
             bool: True if at least one backend succeeded
         """
-        primary_success = False
-        fallback_success = False
-        
-        # Retry any pending syncs first
-        self._retry_pending_syncs()
-        
-        # Try primary storage
-        if self.primary.is_available():
-            primary_success = self.primary.save_snapshot(snapshot_data)
-            if primary_success:
-                logger.info("HybridStorageBackend: Snapshot saved to primary storage (GCP)")
-            else:
-                logger.warning("HybridStorageBackend: Primary storage write failed, queuing for retry")
-                self.pending_sync.append(snapshot_data)
-        else:
-            logger.warning("HybridStorageBackend: Primary storage unavailable, using fallback only")
-            self.pending_sync.append(snapshot_data)
-        
-        # Always write to fallback as backup
+        # Commit locally first
         fallback_success = self.fallback.save_snapshot(snapshot_data)
         if fallback_success:
             logger.info("HybridStorageBackend: Snapshot saved to fallback storage (local)")
-        else:
-            logger.error("HybridStorageBackend: CRITICAL: Fallback storage write failed!")
+            self._enqueue_replication([snapshot_data])
+            return True
         
-        # Success if at least one backend succeeded
-        success = primary_success or fallback_success
+        logger.error("HybridStorageBackend: CRITICAL: Fallback storage write failed!")
         
-        if not success:
-            logger.error("HybridStorageBackend: Both primary and fallback storage failed!")
+        # Without a local copy, don't return before primary has it
+        if self.primary.save_snapshot(snapshot_data):
+            logger.info("HybridStorageBackend: Snapshot saved to primary storage (GCP)")
+            return True
         
-        return success
+        logger.error("HybridStorageBackend: Both primary and fallback storage failed!")
+        self._enqueue_replication([snapshot_data])
+        return False
     
+    def save_snapshots(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Save several snapshots: one fallback write, one replication batch.
+        
+        The batch is committed to the fallback with a single save_snapshots()
+        call and queued for replication with a single journal append; the
+        worker sends it to primary as one batch. If the fallback write
+        fails, the batch is written to primary inline instead.
+        
+        Args:
+            snapshots: Snapshots in chronological order
+        
+        Returns:
+            bool: True if at least one backend has every snapshot
+        """
+        if self.fallback.save_snapshots(snapshots):
+            logger.info(f"HybridStorageBackend: {len(snapshots)} snapshots saved to fallback storage (local)")
+            self._enqueue_replication(snapshots)
+            return True
+        
+        logger.error("HybridStorageBackend: CRITICAL: Fallback storage batch write failed!")
+        
+        if self.primary.save_snapshots(snapshots):
+            logger.info(f"HybridStorageBackend: {len(snapshots)} snapshots saved to primary storage (GCP)")
+            return True
+        
+        logger.error("HybridStorageBackend: Both primary and fallback storage failed!")
+        self._enqueue_replication(snapshots)
+        return False
+
     def get_latest_snapshot(self) -> Optional[Dict[str, Any]]:
         """
         Get latest snapshot, preferring primary.
         
         Returns:
             Latest snapshot from primary, or fallback if primary unavailable
+            or still replicating
         """
         # Try primary first
-        if self.primary.is_available():
+        if self._primary_readable():
             snapshot = self.primary.get_latest_snapshot()
             if snapshot:
                 logger.debug("HybridStorageBackend: Retrieved latest snapshot from primary")
                 return snapshot
             logger.debug("HybridStorageBackend: No snapshot in primary, trying fallback")
         else:
-            logger.debug("HybridStorageBackend: Primary unavailable, using fallback")
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
         
         # Fall back to local
         snapshot = self.fallback.get_latest_snapshot()
@@ -116,22 +191,112 @@ class HybridStorageBackend(StorageBackend):
         
         Returns:
             All snapshots from primary, or fallback if primary unavailable
+            or still replicating
         """
         # Try primary first
-        if self.primary.is_available():
+        if self._primary_readable():
             snapshots = self.primary.get_all_snapshots()
             if snapshots:
                 logger.debug(f"HybridStorageBackend: Retrieved {len(snapshots)} snapshots from primary")
                 return snapshots
             logger.debug("HybridStorageBackend: No snapshots in primary, trying fallback")
         else:
-            logger.debug("HybridStorageBackend: Primary unavailable, using fallback")
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
         
         # Fall back to local
         snapshots = self.fallback.get_all_snapshots()
         logger.debug(f"HybridStorageBackend: Retrieved {len(snapshots)} snapshots from fallback")
         return snapshots
     
+    def iter_snapshots(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream snapshots, preferring primary.
+        
+        Falls back to the fallback backend if primary is unavailable or
+        yields nothing for the requested range.
+        
+        Yields:
+            dict: Matching snapshots in history order
+        """
+        if self._primary_readable():
+            snapshots = self.primary.iter_snapshots(start, end, fields)
+            first = next(snapshots, None)
+            if first is not None:
+                logger.debug("HybridStorageBackend: Streaming snapshots from primary")
+                yield first
+                yield from snapshots
+                return
+            logger.debug("HybridStorageBackend: No snapshots in primary, trying fallback")
+        else:
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
+        
+        yield from self.fallback.iter_snapshots(start, end, fields)
+    
+    def get_snapshots_between(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the snapshots within a timestamp range, preferring primary.
+        
+        Returns:
+            Snapshots in chronological order from primary, or fallback if
+            primary is unavailable, behind or has none in the range
+        """
+        if self._primary_readable():
+            snapshots = self.primary.get_snapshots_between(start, end)
+            if snapshots:
+                logger.debug(f"HybridStorageBackend: Retrieved {len(snapshots)} snapshots in range from primary")
+                return snapshots
+            logger.debug("HybridStorageBackend: No snapshots in range in primary, trying fallback")
+        else:
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
+        
+        return self.fallback.get_snapshots_between(start, end)
+    
+    def get_snapshot_at_or_before(self, timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest snapshot at or before a timestamp, preferring primary.
+        
+        Returns:
+            Snapshot from primary, or fallback if primary is unavailable,
+            behind or has none
+        """
+        if self._primary_readable():
+            snapshot = self.primary.get_snapshot_at_or_before(timestamp)
+            if snapshot:
+                logger.debug("HybridStorageBackend: Retrieved snapshot at timestamp from primary")
+                return snapshot
+            logger.debug("HybridStorageBackend: No snapshot at timestamp in primary, trying fallback")
+        else:
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
+        
+        return self.fallback.get_snapshot_at_or_before(timestamp)
+    
+    def get_snapshot_index(self) -> List[Dict[str, Any]]:
+        """
+        Get the snapshot metadata index, preferring primary.
+        
+        Returns:
+            Index from primary, or fallback if primary unavailable or empty
+        """
+        if self._primary_readable():
+            entries = self.primary.get_snapshot_index()
+            if entries:
+                logger.debug(f"HybridStorageBackend: Retrieved index of {len(entries)} snapshots from primary")
+                return entries
+            logger.debug("HybridStorageBackend: No snapshots in primary index, trying fallback")
+        else:
+            logger.debug("HybridStorageBackend: Primary unavailable or behind, using fallback")
+        
+        return self.fallback.get_snapshot_index()
+    
     def is_available(self) -> bool:
         """
         Hybrid storage is available if either backend is available.
@@ -141,6 +306,33 @@ class HybridStorageBackend(StorageBackend):
         """
         return self.primary.is_available() or self.fallback.is_available()
     
+    def get_history_version(self) -> Optional[tuple]:
+        """
+        Return a version token for the history reads would currently see.
+        
+        Reads prefer primary and fall back to local, so the token combines
+        both versions while primary is readable, and the local version
+        alone while it is unavailable or replication is pending.
+        
+        Returns:
+            tuple: Combined version token, or None if either side is unknown
+        """
+        fallback_version = self.fallback.get_history_version()
+        if fallback_version is None:
+            return None
+        
+        if self._primary_readable():
+            primary_version = self.primary.get_history_version()
+            if primary_version is None:
+                return None
+            return ("primary", primary_version, fallback_version)
+        
+        return ("fallback", fallback_version)
+    
+    def get_data_dir(self) -> Optional[str]:
+        """Return the fallback's directory (reads and writes always reach it)."""
+        return self.fallback.get_data_dir()
+    
     def save_transactions(self, transaction_data: Dict[str, Any]) -> bool:
         """
         Save transactions to both primary and fallback storage.
@@ -220,37 +412,263 @@ class HybridStorageBackend(StorageBackend):
             logger.error(f"HybridStorageBackend: Fallback backend failed to load transactions: {e}")
             return None
     
-    def _retry_pending_syncs(self):
-        """Retry any pending syncs to primary storage."""
-        if not self.pending_sync:
-            return
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued snapshots have been replicated to primary.
         
-        if not self.primary.is_available():
-            logger.debug(f"HybridStorageBackend: {len(self.pending_sync)} pending syncs waiting for primary availability")
+        A replication retry that is waiting out its backoff is started
+        immediately.
+        
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+            
+        Returns:
+            bool: True if the queue was drained, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        with self._sync_cond:
+            if self.pending_sync:
+                self._ensure_worker()
+                self._retry_now = True
+                self._sync_cond.notify_all()
+            
+            while self.pending_sync:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(
+                        f"HybridStorageBackend: Flush timed out with {len(self.pending_sync)} pending syncs"
+                    )
+                    return False
+                self._sync_cond.wait(remaining)
+        
+        return True
+    
+    def shutdown(self, timeout: float = REPLICATION_SHUTDOWN_TIMEOUT) -> bool:
+        """
+        Drain the replication queue (bounded by timeout) and stop the worker.
+        
+        Args:
+            timeout: Maximum seconds to wait for pending replication
+            
+        Returns:
+            bool: True if everything was replicated before stopping
+        """
+        drained = self.flush(timeout)
+        
+        with self._sync_cond:
+            self._stopping = True
+            self._sync_cond.notify_all()
+            worker = self._worker
+        
+        if worker is not None:
+            worker.join(timeout=1.0)
+        
+        if not drained:
+            logger.warning(
+                f"HybridStorageBackend: Stopped with {len(self.pending_sync)} snapshots not replicated to primary"
+            )
+        return drained
+    
+    def sync(self) -> None:
+        """Make deferred writes of both backends durable."""
+        self.fallback.sync()
+        self.primary.sync()
+    
+    def _primary_readable(self) -> bool:
+        """Primary serves reads only when it is available and has every saved snapshot."""
+        if self.pending_sync:
+            return False
+        return self.primary.is_available()
+    
+    def _enqueue_replication(self, snapshots: List[Dict[str, Any]]) -> None:
+        """Queue (and journal, in one append) snapshots for background replication to primary."""
+        with self._sync_cond:
+            queued = {entry["hash"] for entry in self.pending_sync}
+            entries = []
+            dropped = 0
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                if content_hash in queued:
+                    logger.debug("HybridStorageBackend: Snapshot already queued for replication")
+                    continue
+                if len(self.pending_sync) + len(entries) >= self.max_pending:
+                    dropped += 1
+                    continue
+                queued.add(content_hash)
+                entries.append({"hash": content_hash, "queued_at": time.time(), "snapshot": snapshot})
+            
+            if dropped:
+                self._dropped_syncs += dropped
+                logger.error(
+                    f"HybridStorageBackend: Replication queue full ({self.max_pending}), "
+                    f"{dropped} snapshot(s) kept in fallback only"
+                )
+            if not entries:
+                return
+            self._append_journal(entries)
+            self.pending_sync.extend(entries)
+            self._ensure_worker()
+            self._sync_cond.notify_all()
+
+    def _ensure_worker(self) -> None:
+        """Start the replication worker if it isn't running (caller holds _sync_cond)."""
+        if self._worker is not None and self._worker.is_alive() and not self._stopping:
             return
         
-        logger.info(f"HybridStorageBackend: Retrying {len(self.pending_sync)} pending syncs to primary storage")
+        self._stopping = False
+        self._worker = threading.Thread(
+            target=self._replication_loop,
+            name="hybrid-replication",
+            daemon=True
+        )
+        self._worker.start()
+    
+    def _replication_loop(self) -> None:
+        """
+        Replicate queued snapshots to primary, oldest first.
         
-        retry_queue = self.pending_sync.copy()
-        self.pending_sync = []
+        Everything queued is sent as one save_snapshots() batch, so N
+        pending snapshots cost one primary write. A failed batch is retried
+        after an exponentially growing delay (initial_backoff doubling up to
+        max_backoff), together with anything queued in the meantime.
+        """
+        me = threading.current_thread()
+        
+        while True:
+            with self._sync_cond:
+                while not self.pending_sync and not self._stopping:
+                    self._sync_cond.wait()
+                if self._stopping or self._worker is not me:
+                    return
+                self._retry_now = False
+                batch = list(self.pending_sync)
+            
+            try:
+                success = self.primary.is_available() and self.primary.save_snapshots(
+                    [entry["snapshot"] for entry in batch]
+                )
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error during replication: {e}")
+                success = False
+            
+            with self._sync_cond:
+                if success:
+                    replicated = {entry["hash"] for entry in batch}
+                    self.pending_sync = [e for e in self.pending_sync if e["hash"] not in replicated]
+                    self._rewrite_journal()
+                    self._replication_failures = 0
+                    self._next_retry_at = None
+                    self._last_replicated_at = time.time()
+                    logger.info(
+                        f"HybridStorageBackend: Replicated {len(batch)} snapshot(s) to primary storage (GCP), "
+                        f"{len(self.pending_sync)} pending"
+                    )
+                    self._sync_cond.notify_all()
+                    continue
+                
+                self._replication_failures += 1
+                delay = min(self.initial_backoff * 2 ** (self._replication_failures - 1), self.max_backoff)
+                self._next_retry_at = time.time() + delay
+                logger.warning(
+                    f"HybridStorageBackend: Replication to primary failed "
+                    f"(attempt {self._replication_failures}), retrying in {delay:.0f}s"
+                )
+                
+                deadline = time.monotonic() + delay
+                while not self._stopping and not self._retry_now:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._sync_cond.wait(remaining)
+    
+    def _load_journal(self) -> List[Dict[str, Any]]:
+        """
+        Read queued snapshots from the journal.
         
-        for snapshot in retry_queue:
-            success = self.primary.save_snapshot(snapshot)
-            if success:
-                logger.info("HybridStorageBackend: Pending sync succeeded")
-            else:
-                logger.warning("HybridStorageBackend: Pending sync failed, re-queuing")
-                self.pending_sync.append(snapshot)
+        Unparseable lines (e.g. a record torn by a crash) are skipped and
+        duplicate hashes are dropped.
         
-        if len(self.pending_sync) == 0:
-            logger.info("HybridStorageBackend: All pending syncs completed successfully")
-        else:
-            logger.warning(f"HybridStorageBackend: {len(self.pending_sync)} pending syncs still queued")
+        Returns:
+            list: Journal entries in queue order
+        """
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return []
+        
+        entries = []
+        seen = set()
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = loads(line)
+                        content_hash = entry["hash"]
+                        entry["snapshot"]
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(
+                            f"HybridStorageBackend: Skipping invalid journal line {line_number} "
+                            f"in {self.journal_path}"
+                        )
+                        continue
+                    if content_hash not in seen:
+                        seen.add(content_hash)
+                        entries.append(entry)
+        except (IOError, OSError) as e:
+            logger.error(f"HybridStorageBackend: Failed to read sync journal {self.journal_path}: {e}")
+        
+        return entries
+    
+    def _append_journal(self, entries: List[Dict[str, Any]]) -> None:
+        """Append queued snapshots to the journal and fsync once (caller holds _sync_cond)."""
+        if not self.journal_path:
+            return
+        
+        try:
+            with open(self.journal_path, "ab+") as f:
+                f.seek(0, os.SEEK_END)
+                prefix = b""
+                if f.tell() > 0:
+                    # Start on a fresh line if a previous append was torn
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        prefix = b"\n"
+                    f.seek(0, os.SEEK_END)
+                f.write(prefix + b"".join(dumps(entry) + b"\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.error(f"HybridStorageBackend: Failed to journal pending sync: {e}")
+    
+    def _rewrite_journal(self) -> None:
+        """Replace the journal with the current queue (caller holds _sync_cond)."""
+        if not self.journal_path:
+            return
+        
+        try:
+            if not self.pending_sync:
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                return
+            
+            temp_path = f"{self.journal_path}.tmp"
+            with open(temp_path, "wb") as f:
+                for entry in self.pending_sync:
+                    f.write(dumps(entry) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.journal_path)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.error(f"HybridStorageBackend: Failed to rewrite sync journal: {e}")
     
     def delete_snapshot(self, index: int) -> bool:
         """
         Delete snapshot from both primary and fallback storage.
         
+        Pending replication is flushed first (bounded by a timeout), so
+        the index refers to the same snapshot in both backends.
+        
         Strategy (as per requirement):
         1. Attempt deletion from primary (GCP) first
         2. Then attempt deletion from fallback (local)
@@ -265,8 +683,11 @@ class HybridStorageBackend(StorageBackend):
         primary_success = False
         fallback_success = False
         
+        if self.pending_sync and self.primary.is_available():
+            self.flush(timeout=REPLICATION_SHUTDOWN_TIMEOUT)
+        
         # Step 1: Try primary (GCP) first
-        if self.primary.is_available():
+        if self._primary_readable():
             try:
                 primary_success = self.primary.delete_snapshot(index)
                 if primary_success:
@@ -276,7 +697,7 @@ class HybridStorageBackend(StorageBackend):
             except Exception as e:
                 logger.warning(f"HybridStorageBackend: Primary backend error during deletion: {e}")
         else:
-            logger.warning("HybridStorageBackend: Primary unavailable, skipping")
+            logger.warning("HybridStorageBackend: Primary unavailable or behind, skipping")
         
         # Step 2: Try fallback (local)
         try:
@@ -301,16 +722,229 @@ class HybridStorageBackend(StorageBackend):
         
         return overall_success
     
+    def compact_history(self, keep_backups: int = DEFAULT_KEEP_BACKUPS) -> Dict[str, Any]:
+        """
+        Compact fallback and primary storage.
+        
+        Each backend drops its deleted snapshots in one rewrite and prunes
+        its old backups. The primary is skipped while unavailable (its
+        tombstones stay until the next compaction).
+        
+        Args:
+            keep_backups: Number of most recent backups each backend keeps
+            
+        Returns:
+            dict: {"success", "removed_snapshots", "backups_removed",
+                   "fallback": result, "primary": result or None}
+        """
+        fallback_result = self.fallback.compact_history(keep_backups)
+        
+        primary_result = None
+        if self.primary.is_available():
+            try:
+                primary_result = self.primary.compact_history(keep_backups)
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error during compaction: {e}")
+                primary_result = {"success": False, "error": str(e)}
+        else:
+            logger.warning("HybridStorageBackend: Primary unavailable, compacting fallback only")
+        
+        results = [r for r in (fallback_result, primary_result) if r and r.get("success")]
+        return {
+            "success": fallback_result.get("success", False),
+            "removed_snapshots": sum(r.get("removed_snapshots", 0) for r in results),
+            "backups_removed": sum(r.get("backups_removed", 0) for r in results),
+            "fallback": fallback_result,
+            "primary": primary_result,
+        }
+    
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """
+        List the fallback's history backups, newest first.
+        
+        Returns:
+            list: Backup summaries (see BackupStore.list_backups)
+        """
+        return self.fallback.list_backups()
+    
+    def restore_backup(self, backup_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+        """
+        Restore a fallback backup and mirror the result to primary.
+        
+        Pending replication is flushed first so it can't re-add snapshots
+        after the restore. The primary is skipped while unavailable
+        (sync_storage can push the restored history later).
+        
+        Args:
+            backup_id: Backup to restore (see list_backups)
+            include_deleted: Also restore the snapshot a delete backup was taken for
+            
+        Returns:
+            dict: Fallback result plus "primary_synced"
+        """
+        if not self.flush(timeout=30.0):
+            logger.warning("HybridStorageBackend: Background replication still pending, restoring anyway")
+        
+        result = self.fallback.restore_backup(backup_id, include_deleted)
+        if not result.get("success"):
+            return result
+        
+        primary_synced = False
+        if self.primary.is_available():
+            try:
+                primary_synced = self.primary.replace_history(self.fallback.get_all_snapshots())
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error during restore: {e}")
+        if not primary_synced:
+            logger.warning("HybridStorageBackend: Restored backup to fallback only")
+        
+        return {**result, "primary_synced": primary_synced}
+    
+    def replace_history(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Replace the history in fallback and primary storage.
+        
+        Pending replication is flushed first so it can't re-add snapshots
+        afterwards. Both copies have to change together (reconciliation
+        would otherwise merge the old history back), so nothing is
+        replaced while the primary is unavailable.
+        
+        Args:
+            snapshots: New history, in order
+        
+        Returns:
+            bool: True if both backends now hold exactly these snapshots
+        """
+        if not self.flush(timeout=30.0):
+            logger.warning("HybridStorageBackend: Background replication still pending, not replacing history")
+            return False
+        if not self.primary.is_available():
+            logger.warning("HybridStorageBackend: Primary unavailable, not replacing history")
+            return False
+        
+        if not self.fallback.replace_history(snapshots):
+            return False
+        try:
+            if self.primary.replace_history(snapshots):
+                return True
+        except Exception as e:
+            logger.warning(f"HybridStorageBackend: Primary backend error replacing history: {e}")
+        logger.error("HybridStorageBackend: Replaced history in fallback only; run sync_storage to repair primary")
+        return False
+    
+    def archive_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Archive snapshots in fallback storage and, if available, primary.
+        
+        Args:
+            snapshots: Snapshots to archive (full resolution)
+        
+        Returns:
+            dict: {"success", "years", "fallback": result,
+                   "primary": result or None}; success requires the fallback
+                  archive and, while available, the primary archive
+        """
+        fallback_result = self.fallback.archive_snapshots(snapshots)
+        
+        primary_result = None
+        if self.primary.is_available():
+            try:
+                primary_result = self.primary.archive_snapshots(snapshots)
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error archiving snapshots: {e}")
+                primary_result = {"success": False, "error": str(e)}
+        else:
+            logger.warning("HybridStorageBackend: Primary unavailable, archiving to fallback only")
+        
+        success = fallback_result.get("success", False) and (primary_result is None or primary_result.get("success", False))
+        result = {
+            "success": success,
+            "years": fallback_result.get("years", {}),
+            "fallback": fallback_result,
+            "primary": primary_result,
+        }
+        if not success:
+            result["error"] = (fallback_result if not fallback_result.get("success") else primary_result).get("error")
+        return result
+    
+    def get_archived_snapshots(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return a year's archived snapshots from primary, or fallback if unavailable.
+        
+        Args:
+            year: Archive year
+        
+        Returns:
+            list: Archived snapshots, in timestamp order
+        """
+        if self.primary.is_available():
+            try:
+                snapshots = self.primary.get_archived_snapshots(year)
+                if snapshots:
+                    return snapshots
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error reading archive: {e}")
+        return self.fallback.get_archived_snapshots(year)
+    
+    def list_archive_years(self) -> List[int]:
+        """
+        Return the years archived in either backend, oldest first.
+        
+        Returns:
+            list: Archive years
+        """
+        years = set(self.fallback.list_archive_years())
+        if self.primary.is_available():
+            try:
+                years.update(self.primary.list_archive_years())
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error listing archives: {e}")
+        return sorted(years)
+    
+    def count_tombstones(self) -> int:
+        """
+        Return the larger tombstone count of fallback and primary.
+        
+        Returns:
+            int: Deleted snapshots awaiting compaction in either backend
+        """
+        count = self.fallback.count_tombstones()
+        if self.primary.is_available():
+            try:
+                count = max(count, self.primary.count_tombstones())
+            except Exception as e:
+                logger.warning(f"HybridStorageBackend: Primary backend error counting tombstones: {e}")
+        return count
+    
     def get_sync_status(self) -> Dict[str, Any]:
         """
         Get sync status information.
         
         Returns:
-            dict: Sync status with pending count and availability
+            dict: Sync status with pending count, availability and
+                  replication lag (age of the oldest unreplicated snapshot)
         """
+        with self._sync_cond:
+            pending = len(self.pending_sync)
+            oldest = self.pending_sync[0]["queued_at"] if self.pending_sync else None
+            failures = self._replication_failures
+            next_retry_at = self._next_retry_at
+            last_replicated_at = self._last_replicated_at
+            dropped = self._dropped_syncs
+        
+        primary_available = self.primary.is_available()
+        
+        def iso(epoch: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+        
         return {
-            "primary_available": self.primary.is_available(),
+            "primary_available": primary_available,
             "fallback_available": self.fallback.is_available(),
-            "pending_syncs": len(self.pending_sync),
-            "fully_synced": len(self.pending_sync) == 0 and self.primary.is_available()
+            "pending_syncs": pending,
+            "fully_synced": pending == 0 and dropped == 0 and primary_available,
+            "replication_lag_seconds": round(time.time() - oldest, 1) if oldest is not None else 0.0,
+            "replication_failures": failures,
+            "next_retry_at": iso(next_retry_at),
+            "last_replicated_at": iso(last_replicated_at),
+            "dropped_syncs": dropped
         }
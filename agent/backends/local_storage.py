@@ -1,49 +1,170 @@
 """
 Local file-based storage backend.
 
-Uses JSON files with atomic writes, backups, and validation.
+Snapshot history is an append-only JSON Lines log (one snapshot per line),
+so saving a snapshot only writes and fsyncs the new record, and
+save_snapshots() appends a whole batch with one write and one fsync. With
+durability="interval", fsyncs are deferred to at most one per interval (see
+durability.py). A small sidecar file points at the latest record so it can
+be read without decoding the rest of the log, and a second one holds the snapshot metadata index (timestamps,
+totals, asset counts, hashes) for listing tools. Transactions are stored as a regular JSON file with atomic writes
+and backups.
+
+The index sidecar also records where each snapshot's record (and the
+keyframe its delta chain starts at) lies in the log, so range and
+point-in-time queries (get_snapshots_between, get_snapshot_at_or_before)
+binary-search the index and read only the records they return.
+
+Deleting a snapshot appends a tombstone record to the log instead of
+rewriting it; readers skip tombstoned snapshots. compact_history() rewrites
+the log once without them and prunes old backups.
+
+History backups (before compaction and replace_history) go to a
+content-addressed BackupStore under backup/ (see backup_store.py): each
+snapshot is stored once and a backup is a manifest of hashes, restorable
+with restore_backup(). Retention archives full-resolution history per year
+under archive/ (see archive.py).
+
+With compression="gzip" the log is portfolio_history.jsonl.gz instead: each
+record is its own gzip member (the concatenation is a valid gzip stream of
+the same JSON Lines). Readers detect the format from the file contents, and
+a log written in the other format is converted on first use.
+
+With delta_keyframe_interval=K > 1, every K-th snapshot record is written
+whole (a keyframe) and the ones in between as field diffs from the previous
+snapshot (see delta.py). Readers rebuild snapshots transparently, whatever
+the setting; the latest-snapshot pointer also records where the latest
+record's keyframe starts, so reading it decodes at most K records.
 """
 
+import bisect
 import json
 import os
+import re
 import shutil
-from typing import Dict, List, Optional, Any
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterator, Sequence, Union
 import logging
 
-from ..storage_backend import StorageBackend
+from ..json_codec import dumps, loads
+from ..storage_backend import (
+    DEFAULT_KEEP_BACKUPS,
+    StorageBackend,
+    bound_to_epoch,
+    chronological,
+    compute_snapshot_hash,
+    epoch_in_range,
+    is_tombstoned,
+    live_to_position,
+    make_tombstone,
+    project_snapshot,
+    snapshot_index_entry,
+    timestamp_to_epoch,
+    tombstoned_positions,
+)
+from .archive import ARCHIVE_DIR, FileArchive
+from .backup_store import BackupStore
+from .compression import compress_payload, decompress_payload, is_compressed, validate_compression
+from .delta import DELTA_RECORD_PATTERN, apply_delta, encode_delta
+from .durability import DEFAULT_FSYNC_INTERVAL, DeferredSync, validate_durability
 
 logger = logging.getLogger(__name__)
 
-HISTORY_FILE = "portfolio_history.json"
-BACKUP_FILE = "portfolio_history.json.bak"
-TEMP_FILE = "portfolio_history.json.tmp"
+HISTORY_FILE = "portfolio_history.jsonl"
+TEMP_FILE = "portfolio_history.jsonl.tmp"
+COMPRESSED_HISTORY_FILE = "portfolio_history.jsonl.gz"
+COMPRESSED_TEMP_FILE = "portfolio_history.jsonl.gz.tmp"
+LATEST_POINTER_FILE = "portfolio_history.latest.json"
+LATEST_POINTER_TEMP_FILE = "portfolio_history.latest.json.tmp"
+INDEX_FILE = "portfolio_history.index.json"
+INDEX_TEMP_FILE = "portfolio_history.index.json.tmp"
+
+# Pre-JSONL history format (single pretty-printed JSON array)
+LEGACY_HISTORY_FILE = "portfolio_history.json"
+LEGACY_MIGRATED_FILE = "portfolio_history.json.migrated"
 
 TRANSACTIONS_FILE = "transactions.json"
 TRANSACTIONS_BACKUP_FILE = "transactions.json.bak"
 TRANSACTIONS_TEMP_FILE = "transactions.json.tmp"
 
+# Read size when scanning gzip members
+GZIP_SCAN_CHUNK_SIZE = 64 * 1024
+
+# Records written by this backend start with the timestamp, so range scans
+# can skip records without decoding their assets
+RECORD_TIMESTAMP_PATTERN = re.compile(rb'^\{"timestamp":\s*"([^"\\]*)"')
+
+# Log records marking a snapshot as deleted: {"_tombstone": {...}}
+TOMBSTONE_KEY = "_tombstone"
+TOMBSTONE_PREFIX = b'{"' + TOMBSTONE_KEY.encode("ascii") + b'"'
+
 
 class LocalFileBackend(StorageBackend):
-    """Local JSON file storage backend with safety features."""
+    """Local JSON Lines storage backend with safety features."""
     
-    def __init__(self, data_dir: str = "."):
+    def __init__(
+        self,
+        data_dir: str = ".",
+        compression: str = "none",
+        keep_backups: int = DEFAULT_KEEP_BACKUPS,
+        backup_keep_days: float = 0,
+        delta_keyframe_interval: int = 0,
+        durability: str = "batch",
+        fsync_interval: float = DEFAULT_FSYNC_INTERVAL
+    ):
         """
         Initialize local file backend.
         
         Args:
             data_dir: Directory to store files (default: current directory)
+            compression: "none" (JSON Lines) or "gzip" (one gzip member per record)
+            keep_backups: Most recent history backups kept by retention
+            backup_keep_days: History backups younger than this are kept too
+                              (0: keep_backups only)
+            delta_keyframe_interval: Write every K-th snapshot whole and the
+                                     others as deltas (0 or 1: all whole)
+            durability: "batch" (fsync every save) or "interval" (fsync at
+                        most every fsync_interval seconds, see durability.py)
+            fsync_interval: Seconds between fsyncs with "interval"
+        
+        Raises:
+            ValueError: If compression, delta_keyframe_interval or durability
+                        is invalid
         """
+        if delta_keyframe_interval < 0:
+            raise ValueError(f"Invalid delta_keyframe_interval: {delta_keyframe_interval}. Must be >= 0.")
+        
         self.data_dir = data_dir
+        self.delta_keyframe_interval = delta_keyframe_interval
+        self.durability = validate_durability(durability, fsync_interval)
+        self._deferred_sync = DeferredSync("LocalFileBackend", self._fsync_log, fsync_interval)
         self.backup_dir = os.path.join(data_dir, "backup")
+        self.compression = validate_compression(compression)
+        self.backups = BackupStore(self.backup_dir, self.compression, keep_backups, backup_keep_days)
+        self.archive = FileArchive(os.path.join(data_dir, ARCHIVE_DIR))
         
-        self.history_path = os.path.join(data_dir, HISTORY_FILE)
-        self.backup_path = os.path.join(self.backup_dir, BACKUP_FILE)
-        self.temp_path = os.path.join(data_dir, TEMP_FILE)
+        if self.compression == "gzip":
+            self.history_path = os.path.join(data_dir, COMPRESSED_HISTORY_FILE)
+            self.temp_path = os.path.join(data_dir, COMPRESSED_TEMP_FILE)
+            self.other_history_path = os.path.join(data_dir, HISTORY_FILE)
+        else:
+            self.history_path = os.path.join(data_dir, HISTORY_FILE)
+            self.temp_path = os.path.join(data_dir, TEMP_FILE)
+            self.other_history_path = os.path.join(data_dir, COMPRESSED_HISTORY_FILE)
+        self.legacy_history_path = os.path.join(data_dir, LEGACY_HISTORY_FILE)
+        self.latest_pointer_path = os.path.join(data_dir, LATEST_POINTER_FILE)
+        self.latest_pointer_temp_path = os.path.join(data_dir, LATEST_POINTER_TEMP_FILE)
+        self.index_path = os.path.join(data_dir, INDEX_FILE)
+        self.index_temp_path = os.path.join(data_dir, INDEX_TEMP_FILE)
         
         self.transactions_path = os.path.join(data_dir, TRANSACTIONS_FILE)
         self.transactions_backup_path = os.path.join(self.backup_dir, TRANSACTIONS_BACKUP_FILE)
         self.transactions_temp_path = os.path.join(data_dir, TRANSACTIONS_TEMP_FILE)
         
+        # Tail repair runs once per process, on first access to the log
+        self._tail_checked = False
+        
         # Create data directory and backup directory if they don't exist
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(self.backup_dir, exist_ok=True)
@@ -52,13 +173,14 @@ class LocalFileBackend(StorageBackend):
     
     def save_snapshot(self, snapshot_data: Dict[str, Any]) -> bool:
         """
-        Save snapshot to local file with atomic write and backup.
+        Append snapshot to the local history log.
         
         Safety features:
-        - Validates snapshot structure
-        - Fails fast on corrupted JSON (preserves corrupted file)
-        - Creates .bak backup before overwriting
-        - Uses atomic write (temp file + rename)
+        - Migrates a legacy JSON array file before the first write
+        - Repairs a torn trailing record left by a crash
+        - Writes a single line and fsyncs only that record (a delta from
+          the previous snapshot unless a keyframe is due)
+        - Updates the latest-snapshot pointer and the metadata index
         - Comprehensive error logging
         
         Args:
@@ -68,137 +190,180 @@ class LocalFileBackend(StorageBackend):
             bool: True if save successful, False otherwise
         """
         try:
-            # Step 1: Read existing history with fail-fast on corruption
-            history = []
-            if os.path.exists(self.history_path):
-                logger.debug(f"Reading existing history from {self.history_path}...")
-                try:
-                    with open(self.history_path, "r") as f:
-                        content = f.read().strip()
-                        if content:
-                            history = json.loads(content)
-
-                    # Validate history is a list
-                    if not isinstance(history, list):
-                        raise ValueError(
-                            f"History file {self.history_path} has invalid format: expected list, got {type(history).__name__}"
-                        )
-
-                    logger.debug(f"Successfully loaded {len(history)} existing snapshots")
-
-                except json.JSONDecodeError as e:
-                    # FAIL FAST: Do not overwrite corrupted file
-                    error_msg = (
-                        f"CRITICAL: History file {self.history_path} contains invalid JSON and cannot be parsed.\n"
-                        f"JSON Error: {e}\n"
-                        f"The file has been preserved and will NOT be overwritten.\n"
-                        f"Action required:\n"
-                        f"  1. Inspect the file at: {os.path.abspath(self.history_path)}\n"
-                        f"  2. Fix the JSON syntax manually, or\n"
-                        f"  3. Restore from backup: {os.path.abspath(self.backup_path)} (if available), or\n"
-                        f"  4. Rename/move the corrupted file and restart with fresh history"
-                    )
-                    logger.error(error_msg)
-                    return False
-
-                except IOError as e:
-                    logger.error(f"Failed to read history file {self.history_path}: {e}")
-                    return False
-            else:
-                logger.debug(f"No existing history file found. Starting fresh.")
-
-            # Step 2: Create backup of existing file (if it exists)
-            if os.path.exists(self.history_path):
-                logger.debug(f"Creating backup: {self.history_path} -> {self.backup_path}")
-                try:
-                    shutil.copy2(self.history_path, self.backup_path)
-                    logger.debug("Backup created successfully")
-                except IOError as e:
-                    logger.error(f"Failed to create backup file {self.backup_path}: {e}")
-                    return False
-
-            # Step 3: Append new snapshot
-            history.append(snapshot_data)
-            logger.debug(f"Appended new snapshot. Total snapshots: {len(history)}")
-
-            # Step 4: Validate that the full history can be serialized to JSON
+            self._open_log()
+            
+            # Step 1: Serialize to a single record (fails before touching the file)
             try:
-                json_content = json.dumps(history, indent=2, ensure_ascii=False)
+                base = self._delta_base()
+                delta = encode_delta(base[1], snapshot_data) if base else None
+                data = self._encode_record(delta or snapshot_data)
             except (TypeError, ValueError) as e:
-                logger.error(f"Failed to serialize history to JSON: {e}")
+                logger.error(f"Failed to serialize snapshot to JSON: {e}")
                 return False
-
-            # Step 5: Atomic write using temp file + rename
-            logger.debug(f"Writing to temporary file: {self.temp_path}")
+            
+            # Step 2: Append and fsync the new record
+            index_state = self._read_snapshot_index()
             try:
-                # Write to temp file
-                with open(self.temp_path, "w") as f:
-                    f.write(json_content)
-                    f.flush()  # Ensure data is written to disk
-                    os.fsync(f.fileno())  # Force OS to write to disk
-
-                logger.debug(
-                    f"Temp file written successfully. Renaming {self.temp_path} -> {self.history_path}"
-                )
-
-                # Atomic rename (POSIX guarantees atomicity)
-                os.replace(self.temp_path, self.history_path)
-
-                logger.info(
-                    f"LocalFileBackend: Successfully saved snapshot to {self.history_path}. Total snapshots: {len(history)}"
-                )
-                return True
-
+                offset, length = self._append_record(data)
             except IOError as e:
-                logger.error(f"Failed to write history file: {e}")
-                # Clean up temp file if it exists
-                if os.path.exists(self.temp_path):
-                    try:
-                        os.remove(self.temp_path)
-                        logger.debug(f"Cleaned up temporary file {self.temp_path}")
-                    except:
-                        pass
+                logger.error(f"Failed to append to history file {self.history_path}: {e}")
                 return False
-
+            
+            # Step 3: Point the latest-snapshot sidecar at the new record
+            if delta:
+                pointer = base[0]
+                self._write_latest_pointer(offset, length, pointer["keyframe_offset"], pointer["chain"] + 1, True)
+            else:
+                self._write_latest_pointer(offset, length, offset, 0, True)
+            
+            # Step 4: Extend the metadata index (rebuilt on next read if it was stale)
+            if index_state is not None:
+                index_entries, tombstones, locations = index_state
+                index_entries.append(snapshot_index_entry(snapshot_data, len(index_entries)))
+                if locations is not None:
+                    locations.append([offset, length, base[0]["keyframe_offset"] if delta else offset])
+                self._write_snapshot_index(index_entries, tombstones, locations)
+            
+            logger.info(
+                f"LocalFileBackend: Successfully appended snapshot to {self.history_path} "
+                f"({snapshot_data.get('timestamp', 'unknown time')})"
+            )
+            return True
+        
         except Exception as e:
             logger.error(f"LocalFileBackend: Failed to save snapshot: {e}", exc_info=True)
             return False
     
+    def save_snapshots(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Append several snapshots to the history log in a single write.
+        
+        Snapshots already stored (by content hash) are skipped. The new
+        records (keyframes and deltas as in save_snapshot) are appended with
+        one write and made durable once, and the pointer and index are
+        updated once, so importing N snapshots costs one fsync instead of N.
+        If the write fails, the log is truncated back so nothing of the
+        batch remains.
+        
+        Args:
+            snapshots: Snapshots in chronological order
+        
+        Returns:
+            bool: True if every snapshot is now stored
+        """
+        try:
+            self._open_log()
+            
+            # Step 1: Skip snapshots already in the history
+            entries, tombstones, locations = self._load_index_state()
+            known = {entry.get("hash") for entry in entries}
+            new = []
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                if content_hash not in known:
+                    known.add(content_hash)
+                    new.append(snapshot)
+            if not new:
+                return True
+            
+            # Step 2: Serialize every record, continuing the delta chain at the tail
+            base = self._delta_base()
+            previous, chain = (base[1], base[0]["chain"]) if base else (None, 0)
+            records = []
+            keyframes = []  # Per record: batch position of its keyframe (None: before the batch)
+            try:
+                for snapshot in new:
+                    delta = None
+                    if previous is not None and chain + 1 < self.delta_keyframe_interval:
+                        delta = encode_delta(previous, snapshot)
+                    if delta:
+                        chain += 1
+                        keyframes.append(keyframes[-1] if keyframes else None)
+                    else:
+                        chain = 0
+                        keyframes.append(len(records))
+                    records.append(self._encode_record(delta or snapshot))
+                    previous = snapshot
+            except (TypeError, ValueError) as e:
+                logger.error(f"Failed to serialize snapshot to JSON: {e}")
+                return False
+            
+            # Step 3: Append the batch with one write and one fsync
+            try:
+                offset, _ = self._append_record(b"".join(records))
+            except IOError as e:
+                logger.error(f"Failed to append to history file {self.history_path}: {e}")
+                return False
+            
+            offsets = []
+            for data in records:
+                offsets.append(offset)
+                offset += len(data)
+            keyframe_offsets = [
+                offsets[keyframe] if keyframe is not None else base[0]["keyframe_offset"] for keyframe in keyframes
+            ]
+            
+            # Step 4: Point at the last record and extend the index
+            self._write_latest_pointer(offsets[-1], len(records[-1]), keyframe_offsets[-1], chain, True)
+            for snapshot in new:
+                entries.append(snapshot_index_entry(snapshot, len(entries)))
+            if locations is not None:
+                locations.extend([[o, len(d), k] for o, d, k in zip(offsets, records, keyframe_offsets)])
+            self._write_snapshot_index(entries, tombstones, locations)
+            
+            logger.info(
+                f"LocalFileBackend: Appended {len(new)} snapshots to {self.history_path} "
+                f"({len(snapshots) - len(new)} already stored)"
+            )
+            return True
+        
+        except Exception as e:
+            logger.error(f"LocalFileBackend: Failed to save snapshots: {e}", exc_info=True)
+            return False
+    
     def get_latest_snapshot(self) -> Optional[Dict[str, Any]]:
         """
-        Retrieve the most recent snapshot from the history file.
+        Retrieve the most recent snapshot from the history log.
+        
+        Reads only the latest record via the sidecar pointer. If the pointer
+        is missing or stale, falls back to scanning the log and rebuilds it.
         
         Returns:
-            dict: The latest snapshot object, or None if the file is empty
+            dict: The latest snapshot object, or None if the log is empty
         """
         try:
-            if not os.path.exists(self.history_path):
-                logger.debug(f"History file {self.history_path} does not exist")
+            self._open_log()
+            
+            found, latest = self._read_latest_via_pointer()
+            if not found:
+                logger.debug("Latest-snapshot pointer missing or stale, scanning history log")
+                latest = None
+                pointer = (None, None)
+                last_position = -1
+                dead = self._tombstoned_positions(self.history_path)
+                for offset, length, position, keyframe_offset, chain, record in self._iter_snapshot_records(
+                    self.history_path
+                ):
+                    last_position = position
+                    if dead and is_tombstoned(position, record, dead):
+                        continue
+                    latest = record
+                    pointer = (offset, length, keyframe_offset, chain, position)
+                if latest is None:
+                    self._write_latest_pointer(None, None)
+                else:
+                    self._write_latest_pointer(*pointer[:4], pointer[4] == last_position)
+            
+            if latest is None:
+                logger.debug("No snapshots in history")
                 return None
-
-            with open(self.history_path, "r") as f:
-                content = f.read().strip()
-                if not content:
-                    logger.debug("History file is empty")
-                    return None
-
-                history = json.loads(content)
-
-                if not isinstance(history, list):
-                    logger.warning("History file format invalid")
-                    return None
-
-                if len(history) == 0:
-                    logger.debug("No snapshots in history")
-                    return None
-
-                latest = history[-1]
-                logger.debug(
-                    f"Retrieved latest snapshot from {latest.get('timestamp', 'unknown time')}"
-                )
-                return latest
-
-        except (json.JSONDecodeError, IOError) as e:
+            
+            logger.debug(
+                f"Retrieved latest snapshot from {latest.get('timestamp', 'unknown time')}"
+            )
+            return latest
+        
+        except (ValueError, IOError) as e:
             logger.error(f"LocalFileBackend: Failed to read latest snapshot: {e}")
             return None
         except Exception as e:
@@ -207,38 +372,198 @@ class LocalFileBackend(StorageBackend):
     
     def get_all_snapshots(self) -> List[Dict[str, Any]]:
         """
-        Retrieve all snapshots from the history file.
+        Retrieve all snapshots from the history log.
         
         Returns:
-            list: All snapshot objects, or empty list if file doesn't exist or is empty
+            list: All snapshot objects, or empty list if log doesn't exist or is empty
         """
         try:
-            if not os.path.exists(self.history_path):
-                logger.debug(f"History file {self.history_path} does not exist")
-                return []
-
-            with open(self.history_path, "r") as f:
-                content = f.read().strip()
-                if not content:
-                    logger.debug("History file is empty")
-                    return []
-
-                history = json.loads(content)
-
-                if not isinstance(history, list):
-                    logger.warning("History file format invalid")
-                    return []
-
-                logger.debug(f"Retrieved {len(history)} snapshots from history")
-                return history
-
-        except (json.JSONDecodeError, IOError) as e:
+            self._open_log()
+            history = self._read_history()
+            logger.debug(f"Retrieved {len(history)} snapshots from history")
+            return history
+        
+        except (ValueError, IOError) as e:
             logger.error(f"LocalFileBackend: Failed to read snapshots: {e}")
             return []
         except Exception as e:
             logger.error(f"LocalFileBackend: Unexpected error reading snapshots: {e}")
             return []
     
+    def iter_snapshots(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream snapshots from the history log, one record at a time.
+        
+        Each record is decoded on its own, so memory use is bounded by the
+        largest snapshot (times the keyframe interval, for delta records).
+        With a timestamp range, records outside it are skipped by reading
+        their leading timestamp, without decoding assets; delta records are
+        only decoded if a snapshot in the range depends on them. Deleted
+        (tombstoned) snapshots are skipped. Iteration stops (with an error
+        logged) at an invalid record.
+        
+        Args:
+            start: Inclusive lower timestamp bound
+            end: Inclusive upper timestamp bound
+            fields: Top-level fields to return (None for whole snapshots)
+        
+        Yields:
+            dict: Matching snapshots in log order
+        """
+        start_epoch = bound_to_epoch(start)
+        end_epoch = bound_to_epoch(end)
+        bounded = start_epoch is not None or end_epoch is not None
+        
+        try:
+            self._open_log()
+            dead = self._tombstoned_positions(self.history_path)
+            
+            def wanted(position: int, payload: bytes) -> bool:
+                match = RECORD_TIMESTAMP_PATTERN.match(payload)
+                return not match or epoch_in_range(
+                    timestamp_to_epoch(match.group(1).decode("utf-8")), start_epoch, end_epoch
+                )
+            
+            for _, _, position, _, _, record in self._iter_snapshot_records(
+                self.history_path, wanted if bounded else None
+            ):
+                if record is None:
+                    continue
+                if dead and is_tombstoned(position, record, dead):
+                    continue
+                if bounded and not epoch_in_range(
+                    timestamp_to_epoch(record.get("timestamp")), start_epoch, end_epoch
+                ):
+                    continue
+                yield project_snapshot(record, fields)
+        
+        except (ValueError, IOError) as e:
+            logger.error(f"LocalFileBackend: Failed to stream snapshots: {e}")
+    
+    def get_snapshots_between(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read the snapshots within a timestamp range via the index sidecar.
+        
+        The range is found by binary search over the index timestamps and
+        only the records in it (plus the delta chains they need) are read.
+        Falls back to a filtered log scan if the index has no record
+        locations yet.
+        
+        Args:
+            start: Inclusive lower timestamp bound
+            end: Inclusive upper timestamp bound
+        
+        Returns:
+            list: Matching snapshots in chronological order (empty on error)
+        
+        Raises:
+            ValueError: If a bound can't be parsed
+        """
+        start_epoch = bound_to_epoch(start)
+        end_epoch = bound_to_epoch(end)
+        try:
+            self._open_log()
+            entries, _, locations = self._load_index_state()
+            if locations is None or (start_epoch is None and end_epoch is None):
+                return chronological(self.iter_snapshots(start, end))
+            
+            positions = self._positions_in_range(entries, start_epoch, end_epoch)
+            return self._read_located([locations[position] for position in positions])
+        
+        except (ValueError, IOError, OSError, EOFError, zlib.error) as e:
+            logger.error(f"LocalFileBackend: Failed to read snapshot range: {e}")
+            return []
+    
+    def get_snapshot_at_or_before(self, timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        Read the newest snapshot taken at or before a timestamp.
+        
+        Found by binary search over the index; only its record (and delta
+        chain) is read.
+        
+        Args:
+            timestamp: ISO 8601 timestamp or datetime
+        
+        Returns:
+            dict: The snapshot, or None if there is none (or on error)
+        
+        Raises:
+            ValueError: If the timestamp can't be parsed
+        """
+        epoch = bound_to_epoch(timestamp)
+        try:
+            self._open_log()
+            entries, _, locations = self._load_index_state()
+            if locations is None:
+                return super().get_snapshot_at_or_before(timestamp)
+            
+            positions = self._positions_in_range(entries, None, epoch)
+            if not positions:
+                return None
+            return self._read_located([locations[positions[-1]]])[0]
+        
+        except (ValueError, IOError, OSError, EOFError, zlib.error) as e:
+            logger.error(f"LocalFileBackend: Failed to read snapshot at {timestamp}: {e}")
+            return None
+    
+    def _positions_in_range(
+        self,
+        entries: List[Dict[str, Any]],
+        start_epoch: Optional[float],
+        end_epoch: Optional[float]
+    ) -> List[int]:
+        """
+        Return the index positions of snapshots within inclusive bounds.
+        
+        The index is in history order, which is chronological unless
+        snapshots were saved out of order; then every entry is checked.
+        
+        Returns:
+            list: Positions in chronological order (history order for ties)
+        """
+        epochs = [entry.get("epoch") for entry in entries]
+        if all(epoch is not None for epoch in epochs) and all(a <= b for a, b in zip(epochs, epochs[1:])):
+            low = 0 if start_epoch is None else bisect.bisect_left(epochs, start_epoch)
+            high = len(epochs) if end_epoch is None else bisect.bisect_right(epochs, end_epoch)
+            return list(range(low, high))
+        
+        matching = [
+            position for position, epoch in enumerate(epochs)
+            if epoch is not None and epoch_in_range(epoch, start_epoch, end_epoch)
+        ]
+        return sorted(matching, key=lambda position: epochs[position])
+    
+    def get_snapshot_index(self) -> List[Dict[str, Any]]:
+        """
+        Get metadata for every snapshot from the index sidecar.
+        
+        If the sidecar is missing or stale, it is rebuilt with one scan of
+        the log.
+        
+        Returns:
+            list: Index entries in history order, or empty list on error
+        """
+        try:
+            self._open_log()
+            entries, _, _ = self._load_index_state()
+            return entries
+        
+        except (ValueError, IOError) as e:
+            logger.error(f"LocalFileBackend: Failed to read snapshot index: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"LocalFileBackend: Unexpected error reading snapshot index: {e}")
+            return []
+    
     def save_transactions(self, transaction_data: Dict[str, Any]) -> bool:
         """
         Save transactions to local file with atomic write and backup.
@@ -267,7 +592,7 @@ class LocalFileBackend(StorageBackend):
             
             # Step 2: Validate that data can be serialized to JSON
             try:
-                json_content = json.dumps(transaction_data, indent=2, ensure_ascii=False)
+                json_content = dumps(transaction_data, pretty=True)
             except (TypeError, ValueError) as e:
                 logger.error(f"Failed to serialize transactions to JSON: {e}")
                 return False
@@ -276,7 +601,7 @@ class LocalFileBackend(StorageBackend):
             logger.debug(f"Writing to temporary file: {self.transactions_temp_path}")
             try:
                 # Write to temp file
-                with open(self.transactions_temp_path, "w") as f:
+                with open(self.transactions_temp_path, "wb") as f:
                     f.write(json_content)
                     f.flush()  # Ensure data is written to disk
                     os.fsync(f.fileno())  # Force OS to write to disk
@@ -329,7 +654,7 @@ class LocalFileBackend(StorageBackend):
                     logger.warning("Transactions file is empty")
                     return None
                 
-                data = json.loads(content)
+                data = loads(content)
                 
                 sell_count = data.get("metadata", {}).get("sell_count", 0)
                 buy_count = data.get("metadata", {}).get("buy_count", 0)
@@ -351,111 +676,1196 @@ class LocalFileBackend(StorageBackend):
     
     def delete_snapshot(self, index: int) -> bool:
         """
-        Delete snapshot by index from local file.
+        Delete snapshot by index by appending a tombstone to the log.
         
-        Creates timestamped backup before deletion.
-        Uses atomic write pattern for safety.
+        Only the tombstone record is written (and fsynced); the snapshot
+        stays in the log, unreadable, until compact_history() rewrites it.
         
         Args:
             index: Zero-based index of snapshot to delete
-            
+        
         Returns:
             bool: True if deletion succeeded, False otherwise
         """
         try:
-            # Step 1: Load current history
+            # Step 1: Load the index (live snapshots and existing tombstones)
+            self._open_log()
+            
             if not os.path.exists(self.history_path):
                 logger.error(f"LocalFileBackend: History file does not exist: {self.history_path}")
                 return False
             
-            with open(self.history_path, "r") as f:
-                content = f.read().strip()
-                if not content:
-                    logger.error("LocalFileBackend: History file is empty")
-                    return False
-                
-                history = json.loads(content)
+            entries, tombstones, locations = self._load_index_state()
             
-            if not isinstance(history, list):
-                logger.error("LocalFileBackend: History file format invalid (not a list)")
+            if not entries:
+                logger.error("LocalFileBackend: History file is empty")
                 return False
             
             # Step 2: Validate index
-            if index < 0 or index >= len(history):
+            if index < 0 or index >= len(entries):
                 logger.error(
                     f"LocalFileBackend: Index {index} out of range "
-                    f"(valid: 0-{len(history)-1})"
+                    f"(valid: 0-{len(entries)-1})"
                 )
                 return False
             
-            # Step 3: Create timestamped backup in backup/ folder
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            backup_filename = f"{HISTORY_FILE}.bak.{timestamp}"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            try:
-                shutil.copy2(self.history_path, backup_path)
-                logger.info(f"LocalFileBackend: Created backup at {backup_path}")
-            except IOError as e:
-                logger.error(f"LocalFileBackend: Failed to create backup: {e}")
-                return False
-            
-            # Step 4: Remove snapshot at index
-            deleted_snapshot = history.pop(index)
-            deleted_timestamp = deleted_snapshot.get("timestamp", "unknown")
-            deleted_value = deleted_snapshot.get("total_value_eur", 0.0)
+            target = entries[index]
+            position = live_to_position(index, tombstoned_positions(tombstones))
+            pointer = self._read_fresh_pointer()
             
             logger.info(
                 f"LocalFileBackend: Deleting snapshot at index {index}: "
-                f"{deleted_timestamp} (€{deleted_value:,.2f})"
+                f"{target.get('timestamp', 'unknown')} "
+                f"(€{target.get('total_value_eur') or 0.0:,.2f})"
             )
             
-            # Step 5: Write updated history atomically
+            # Step 3: Append and fsync the tombstone
+            tombstone = make_tombstone(position, target)
             try:
-                json_content = json.dumps(history, indent=2, ensure_ascii=False)
-            except (TypeError, ValueError) as e:
-                logger.error(f"LocalFileBackend: Failed to serialize history: {e}")
+                self._append_record(self._encode_record({TOMBSTONE_KEY: tombstone}))
+            except IOError as e:
+                logger.error(f"LocalFileBackend: Failed to append tombstone: {e}")
                 return False
             
-            # Write to temp file
-            try:
-                with open(self.temp_path, "w") as f:
-                    f.write(json_content)
-                    f.flush()
-                    os.fsync(f.fileno())
-                
-                # Atomic rename
-                os.replace(self.temp_path, self.history_path)
-                
-                logger.info(
-                    f"LocalFileBackend: Successfully deleted snapshot. "
-                    f"Remaining snapshots: {len(history)}"
+            # Step 4: Update the index and, unless the latest snapshot went, the pointer
+            remaining = entries[:index] + entries[index + 1:]
+            for i, entry in enumerate(remaining):
+                entry["index"] = i
+            if locations is not None:
+                locations = locations[:index] + locations[index + 1:]
+            self._write_snapshot_index(remaining, tombstones + [tombstone], locations)
+            if pointer is not None and index < len(entries) - 1:
+                self._write_latest_pointer(
+                    pointer["offset"], pointer["length"], pointer.get("keyframe_offset"),
+                    pointer.get("chain", 0), pointer.get("tail", False)
                 )
-                return True
-                
-            except IOError as e:
-                logger.error(f"LocalFileBackend: Failed to write updated history: {e}")
-                # Clean up temp file if it exists
-                if os.path.exists(self.temp_path):
-                    try:
-                        os.remove(self.temp_path)
-                    except:
-                        pass
-                return False
+            
+            logger.info(
+                f"LocalFileBackend: Successfully deleted snapshot. "
+                f"Remaining snapshots: {len(remaining)}"
+            )
+            return True
         
-        except json.JSONDecodeError as e:
-            logger.error(f"LocalFileBackend: Invalid JSON in history file: {e}")
+        except ValueError as e:
+            logger.error(f"LocalFileBackend: Invalid history log: {e}")
             return False
         except Exception as e:
             logger.error(f"LocalFileBackend: Unexpected error deleting snapshot: {e}", exc_info=True)
             return False
     
-    def is_available(self) -> bool:
+    def compact_history(self, keep_backups: int = DEFAULT_KEEP_BACKUPS) -> Dict[str, Any]:
         """
-        Check if local storage is available.
+        Rewrite the log without deleted snapshots and prune old backups.
+        
+        If there are tombstones, the current log (deleted snapshots
+        included) is backed up to the backup store and then rewritten
+        atomically. Afterwards backups beyond keep_backups (and
+        backup_keep_days) are removed, with the snapshots only they held.
+        
+        Args:
+            keep_backups: Number of most recent history backups to keep
         
         Returns:
-            bool: Always True (local storage is always available)
+            dict: {"success", "removed_snapshots", "snapshots", "bytes_before",
+                   "bytes_after", "backups_removed", "backup_id"} or
+                  {"success": False, "error"}
         """
-        return True
+        try:
+            self._open_log()
+            entries, tombstones, _ = self._load_index_state()
+            bytes_before = os.path.getsize(self.history_path) if os.path.exists(self.history_path) else 0
+            
+            backup = None
+            if tombstones:
+                # Step 1: Back up the log (it still contains the deleted snapshots)
+                backup = self._backup_history("compact")
+                
+                # Step 2: Rewrite without tombstoned snapshots
+                self._rewrite_history(self._read_history())
+            
+            # Step 3: Prune old backups (and full copies left by older versions)
+            pruned = self.backups.prune(keep_backups, self.backups.keep_days)
+            legacy_keep = keep_backups - len(self.backups.list_backups())
+            backups_removed = pruned["backups_removed"] + self._prune_legacy_backups(legacy_keep)
+            bytes_after = os.path.getsize(self.history_path) if os.path.exists(self.history_path) else 0
+            
+            logger.info(
+                f"LocalFileBackend: Compacted history ({len(tombstones)} deleted snapshots dropped, "
+                f"{bytes_before - bytes_after} bytes freed, {backups_removed} old backups removed)"
+            )
+            return {
+                "success": True,
+                "removed_snapshots": len(tombstones),
+                "snapshots": len(entries),
+                "bytes_before": bytes_before,
+                "bytes_after": bytes_after,
+                "backups_removed": backups_removed,
+                "backup_id": backup["id"] if backup else None,
+            }
+        
+        except (TypeError, ValueError, IOError, OSError) as e:
+            logger.error(f"LocalFileBackend: Failed to compact history: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def count_tombstones(self) -> int:
+        """
+        Return the number of deleted snapshots still in the log.
+        
+        Returns:
+            int: Tombstones since the last compaction (0 on error)
+        """
+        try:
+            self._open_log()
+            return len(self._load_index_state()[1])
+        except (ValueError, IOError, OSError) as e:
+            logger.error(f"LocalFileBackend: Failed to read tombstones: {e}")
+            return 0
+    
+    def replace_history(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Replace the history log with the given snapshots.
+        
+        Backs up the current log to the backup store first (only snapshots
+        not stored yet are written), then rewrites it atomically.
+        
+        Args:
+            snapshots: New history, in order
+            
+        Returns:
+            bool: True if the log was replaced, False otherwise
+        """
+        try:
+            self._open_log()
+            
+            # Step 1: Back up the current log
+            if os.path.exists(self.history_path):
+                try:
+                    self._backup_history("replace")
+                except (IOError, OSError) as e:
+                    logger.error(f"LocalFileBackend: Failed to create backup: {e}")
+                    return False
+            
+            # Step 2: Rewrite log atomically
+            self._rewrite_history(list(snapshots))
+            logger.info(f"LocalFileBackend: Replaced history with {len(snapshots)} snapshots")
+            return True
+        
+        except (TypeError, ValueError) as e:
+            logger.error(f"LocalFileBackend: Failed to serialize history: {e}")
+            return False
+        except IOError as e:
+            logger.error(f"LocalFileBackend: Failed to write replaced history: {e}")
+            return False
+    
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """
+        List history backups in the backup store, newest first.
+        
+        Returns:
+            list: Backup summaries (see BackupStore.list_backups)
+        """
+        return self.backups.list_backups()
+    
+    def restore_backup(self, backup_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+        """
+        Replace the history with the one recorded by a backup.
+        
+        The current history is backed up first (replace_history), so a
+        restore can itself be undone.
+        
+        Args:
+            backup_id: Backup to restore (see list_backups)
+            include_deleted: Also restore snapshots that were deleted (but
+                             not yet compacted) when the backup was taken
+        
+        Returns:
+            dict: {"success", "backup_id", "restored_snapshots"} or
+                  {"success": False, "error"}
+        """
+        try:
+            snapshots = self.backups.load_backup(backup_id, include_deleted)
+        except KeyError:
+            return {"success": False, "error": f"Backup not found: {backup_id}"}
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"LocalFileBackend: Failed to read backup {backup_id}: {e}")
+            return {"success": False, "error": f"Backup {backup_id} is incomplete or corrupted: {e}"}
+        
+        if not self.replace_history(snapshots):
+            return {"success": False, "error": "Failed to write restored history. Check logs for details."}
+        
+        logger.info(f"LocalFileBackend: Restored {len(snapshots)} snapshots from backup {backup_id}")
+        return {"success": True, "backup_id": backup_id, "restored_snapshots": len(snapshots)}
+    
+    def archive_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Copy snapshots to per-year archives under archive/.
+        
+        Args:
+            snapshots: Snapshots to archive (full resolution)
+        
+        Returns:
+            dict: {"success", "years": {year: snapshots added}} or
+                  {"success": False, "error"}
+        """
+        try:
+            return {"success": True, "years": self.archive.write(snapshots)}
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"LocalFileBackend: Failed to archive snapshots: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def get_archived_snapshots(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return the archived snapshots of a year, in timestamp order.
+        
+        Args:
+            year: Archive year
+        
+        Returns:
+            list: Archived snapshots (empty if there is no archive or it can't be read)
+        """
+        try:
+            return self.archive.read(year)
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"LocalFileBackend: Failed to read {year} archive: {e}")
+            return []
+    
+    def list_archive_years(self) -> List[int]:
+        """
+        Return the years that have an archive, oldest first.
+        
+        Returns:
+            list: Archive years
+        """
+        return self.archive.years()
+    
+    def get_history_version(self) -> Optional[tuple]:
+        """
+        Return the history log's mtime and size as a version token.
+        
+        Before migration or conversion the legacy array file (or the log in
+        the other format) is used instead, so a cache filled from it is
+        invalidated once the log is created.
+        
+        Returns:
+            tuple: (file name, mtime_ns, size), or ("absent",) if no history exists
+        """
+        for path in (self.history_path, self.other_history_path, self.legacy_history_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"LocalFileBackend: Failed to stat {path}: {e}")
+                return None
+            return (os.path.basename(path), stat.st_mtime_ns, stat.st_size)
+        return ("absent",)
+    
+    def get_data_dir(self) -> Optional[str]:
+        """Return the directory holding the history log."""
+        return self.data_dir
+    
+    def is_available(self) -> bool:
+        """
+        Check if local storage is available.
+        
+        Returns:
+            bool: Always True (local storage is always available)
+        """
+        return True
+    
+    def _open_log(self) -> None:
+        """
+        Prepare the history log for use.
+        
+        Performs the one-time migration from the legacy JSON array file (or
+        converts a log written with the other compression setting) and, on
+        first access, truncates any torn record left at the end of the log.
+        """
+        if not os.path.exists(self.history_path):
+            if os.path.exists(self.other_history_path):
+                self._convert_history()
+            elif os.path.exists(self.legacy_history_path):
+                self._migrate_legacy_history()
+        
+        if not self._tail_checked:
+            self._repair_tail()
+            self._tail_checked = True
+    
+    def _migrate_legacy_history(self) -> None:
+        """
+        Convert the legacy JSON array file into the JSON Lines log.
+        
+        The legacy file is moved to backup/ once the log is in place, so the
+        migration never runs twice and the original data is preserved.
+        
+        Raises:
+            ValueError: If the legacy file is not a valid JSON array
+        """
+        logger.info(f"LocalFileBackend: Migrating {self.legacy_history_path} to {self.history_path}...")
+        
+        with open(self.legacy_history_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        
+        try:
+            history = loads(content) if content else []
+        except json.JSONDecodeError as e:
+            # FAIL FAST: Do not migrate (or overwrite) a corrupted file
+            raise ValueError(
+                f"CRITICAL: Legacy history file {self.legacy_history_path} contains invalid JSON "
+                f"and cannot be migrated: {e}. The file has been preserved."
+            )
+        
+        if not isinstance(history, list):
+            raise ValueError(
+                f"Legacy history file {self.legacy_history_path} has invalid format: "
+                f"expected list, got {type(history).__name__}"
+            )
+        
+        self._rewrite_history(history)
+        
+        migrated_path = os.path.join(self.backup_dir, LEGACY_MIGRATED_FILE)
+        os.replace(self.legacy_history_path, migrated_path)
+        
+        logger.info(
+            f"LocalFileBackend: Migrated {len(history)} snapshots to {self.history_path}. "
+            f"Original file kept at {migrated_path}"
+        )
+    
+    def _convert_history(self) -> None:
+        """
+        Rewrite a log from the other compression format into the current one.
+        
+        The source log is moved to backup/ once the new log is in place.
+        
+        Raises:
+            ValueError: If the source log contains an invalid record
+        """
+        logger.info(f"LocalFileBackend: Converting {self.other_history_path} to {self.history_path}...")
+        
+        history = [record for _, _, record in self._iter_live_records(self.other_history_path)]
+        self._rewrite_history(history)
+        
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        converted_path = os.path.join(
+            self.backup_dir, f"{os.path.basename(self.other_history_path)}.converted.{timestamp}"
+        )
+        os.replace(self.other_history_path, converted_path)
+        
+        logger.info(
+            f"LocalFileBackend: Converted {len(history)} snapshots to {self.history_path}. "
+            f"Original file kept at {converted_path}"
+        )
+    
+    def _repair_tail(self) -> None:
+        """
+        Truncate an incomplete trailing record.
+        
+        Plain records are written as a single line terminated by a newline,
+        so a crash mid-append leaves bytes after the last newline. Those bytes
+        are dropped; every complete record before them is kept. Compressed
+        logs are checked member by member instead (see _repair_gzip_tail).
+        """
+        if not os.path.exists(self.history_path):
+            return
+        
+        if self._is_compressed_log(self.history_path):
+            self._repair_gzip_tail()
+            return
+        
+        with open(self.history_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            
+            # Scan backwards for the last newline
+            position = size
+            chunk_size = 4096
+            while position > 0:
+                read_size = min(chunk_size, position)
+                position -= read_size
+                f.seek(position)
+                chunk = f.read(read_size)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    valid_size = position + newline + 1
+                    break
+            else:
+                valid_size = 0
+            
+            if valid_size == size:
+                return
+            
+            logger.warning(
+                f"LocalFileBackend: Truncating {size - valid_size} bytes of incomplete "
+                f"record at end of {self.history_path}"
+            )
+            f.truncate(valid_size)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _repair_gzip_tail(self) -> None:
+        """
+        Truncate an incomplete trailing gzip member.
+        
+        Scanning starts at the record the latest-snapshot pointer refers to
+        (when it still lies inside the log), so normally only the last few
+        members are decompressed.
+        """
+        size = os.path.getsize(self.history_path)
+        start = 0
+        try:
+            with open(self.latest_pointer_path, "rb") as f:
+                pointer = loads(f.read())
+            if pointer.get("offset") is not None and pointer["offset"] + pointer["length"] <= size:
+                start = pointer["offset"]
+        except (IOError, OSError, json.JSONDecodeError, KeyError, TypeError):
+            pass
+        
+        try:
+            valid_size = self._gzip_valid_end(start)
+        except ValueError:
+            if start == 0:
+                raise
+            # Pointer no longer lands on a member boundary; scan from the start
+            valid_size = self._gzip_valid_end(0)
+        
+        if valid_size == size:
+            return
+        
+        logger.warning(
+            f"LocalFileBackend: Truncating {size - valid_size} bytes of incomplete "
+            f"record at end of {self.history_path}"
+        )
+        with open(self.history_path, "rb+") as f:
+            f.truncate(valid_size)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _gzip_valid_end(self, start: int) -> int:
+        """Return the end offset of the last complete gzip member at or after start."""
+        end = start
+        with open(self.history_path, "rb") as f:
+            for offset, length, _ in self._iter_gzip_members(f, start):
+                end = offset + length
+        return end
+    
+    def _read_history(self) -> List[Dict[str, Any]]:
+        """
+        Read all live (not deleted) snapshots from the log.
+        
+        Returns:
+            list: Snapshots in log order (empty if the log doesn't exist)
+        
+        Raises:
+            ValueError: If a record is not valid JSON
+        """
+        return [record for _, _, record in self._iter_live_records()]
+    
+    def _iter_live_records(self, path: Optional[str] = None):
+        """
+        Iterate over snapshot records that haven't been deleted.
+        
+        Tombstone records are skipped, as are the snapshots they refer to.
+        
+        Args:
+            path: Log to read (default: the current history log)
+        
+        Yields:
+            tuple: (offset, length, snapshot) in log order
+        
+        Raises:
+            ValueError: If a record is not valid JSON
+        """
+        path = path or self.history_path
+        dead = self._tombstoned_positions(path)
+        for offset, length, position, _, _, record in self._iter_snapshot_records(path):
+            if dead and is_tombstoned(position, record, dead):
+                continue
+            yield offset, length, record
+    
+    def _iter_snapshot_records(self, path: str, wanted=None):
+        """
+        Iterate over the snapshot records of a log, rebuilding delta records.
+        
+        Tombstone records are skipped. Records for which wanted(position,
+        payload) is false are yielded without a snapshot and only decoded
+        if a later wanted delta record depends on them.
+        
+        Args:
+            path: Log to read
+            wanted: Optional filter on (position, undecoded payload)
+        
+        Yields:
+            tuple: (offset, length, position, keyframe_offset, chain, snapshot)
+                   where keyframe_offset is where the record's delta chain
+                   starts and chain its distance from that keyframe
+        
+        Raises:
+            ValueError: If a record is not valid JSON or a delta doesn't apply
+        """
+        previous = None
+        pending = []
+        keyframe_offset = None
+        chain = 0
+        position = -1
+        for offset, length, payload, label in self._iter_raw_records(path):
+            if payload.startswith(TOMBSTONE_PREFIX):
+                continue
+            position += 1
+            
+            if DELTA_RECORD_PATTERN.match(payload):
+                chain += 1
+            else:
+                keyframe_offset, chain = offset, 0
+                previous, pending = None, []
+            pending.append((payload, label))
+            
+            if wanted is not None and not wanted(position, payload):
+                yield offset, length, position, keyframe_offset, chain, None
+                continue
+            
+            for pending_payload, pending_label in pending:
+                record = self._decode_record(pending_payload, pending_label, path)
+                previous = self._apply_record(previous, record, pending_label, path)
+            pending = []
+            yield offset, length, position, keyframe_offset, chain, previous
+    
+    def _tombstoned_positions(self, path: str) -> Dict[int, str]:
+        """
+        Return the deleted positions of a log (see tombstoned_positions).
+        
+        Uses the index sidecar when it is current; otherwise only the
+        tombstone records of the log are decoded.
+        
+        Raises:
+            ValueError: If a tombstone record is not valid JSON
+        """
+        if path == self.history_path:
+            state = self._read_snapshot_index()
+            if state is not None:
+                return tombstoned_positions(state[1])
+        
+        tombstones = [
+            self._decode_record(payload, label, path)[TOMBSTONE_KEY]
+            for _, _, payload, label in self._iter_raw_records(path)
+            if payload.startswith(TOMBSTONE_PREFIX)
+        ]
+        return tombstoned_positions(tombstones)
+    
+    def _load_index_state(self):
+        """
+        Return the index entries, tombstones and record locations.
+        
+        The sidecar is rebuilt if needed, which decodes every record once.
+        Tombstones whose hash doesn't match the snapshot at their position
+        are dropped.
+        
+        Returns:
+            tuple: (entries, tombstones, locations) for the current log;
+                   locations holds [offset, length, keyframe_offset] per
+                   entry, or is None for a sidecar written without them
+        
+        Raises:
+            ValueError: If a record is not valid JSON
+        """
+        state = self._read_snapshot_index()
+        if state is not None:
+            return state
+        
+        logger.debug("Snapshot index missing or stale, rebuilding from history log")
+        stored = []
+        stored_locations = []
+        tombstones = []
+        previous = None
+        keyframe_offset = None
+        for offset, length, payload, label in self._iter_raw_records(self.history_path):
+            record = self._decode_record(payload, label, self.history_path)
+            if payload.startswith(TOMBSTONE_PREFIX):
+                tombstones.append(record[TOMBSTONE_KEY])
+                continue
+            if not DELTA_RECORD_PATTERN.match(payload):
+                keyframe_offset = offset
+            previous = self._apply_record(previous, record, label, self.history_path)
+            stored.append(snapshot_index_entry(previous, len(stored)))
+            stored_locations.append([offset, length, keyframe_offset])
+        
+        tombstones = [
+            tombstone for tombstone in tombstones
+            if tombstone["position"] < len(stored) and stored[tombstone["position"]]["hash"] == tombstone["hash"]
+        ]
+        dead = tombstoned_positions(tombstones)
+        entries = [entry for position, entry in enumerate(stored) if position not in dead]
+        locations = [location for position, location in enumerate(stored_locations) if position not in dead]
+        for i, entry in enumerate(entries):
+            entry["index"] = i
+        
+        self._write_snapshot_index(entries, tombstones, locations)
+        return entries, tombstones, locations
+    
+    def _iter_records(self, path: Optional[str] = None):
+        """
+        Iterate over log records with their byte positions.
+        
+        The format (JSON Lines or gzip members) is detected from the file
+        contents, not from the compression setting.
+        
+        Args:
+            path: Log to read (default: the current history log)
+        
+        Yields:
+            tuple: (offset, length, record) for each record in log order
+            
+        Raises:
+            ValueError: If a record is not valid JSON
+        """
+        path = path or self.history_path
+        for offset, length, payload, label in self._iter_raw_records(path):
+            yield offset, length, self._decode_record(payload, label, path)
+    
+    def _iter_raw_records(self, path: str):
+        """
+        Iterate over undecoded log records (plain lines or decompressed members).
+        
+        Yields:
+            tuple: (offset, length, payload, label) where label describes the
+                   record position for error messages
+        """
+        if not os.path.exists(path):
+            logger.debug(f"History file {path} does not exist")
+            return
+        
+        with open(path, "rb") as f:
+            if is_compressed(f.read(2)):
+                for record_number, (offset, length, payload) in enumerate(self._iter_gzip_members(f), 1):
+                    yield offset, length, payload, f"record #{record_number}"
+                return
+            
+            f.seek(0)
+            offset = 0
+            for line_number, line in enumerate(f, 1):
+                length = len(line)
+                if line.strip():
+                    yield offset, length, line, f"record on line {line_number}"
+                offset += length
+    
+    def _decode_record(self, payload: bytes, label: str, path: str) -> Dict[str, Any]:
+        """
+        Decode one log record.
+        
+        Raises:
+            ValueError: If the record is not valid JSON
+        """
+        try:
+            return loads(payload)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"History file {path} has invalid {label}: {e}")
+    
+    def _apply_record(
+        self, previous: Optional[Dict[str, Any]], record: Dict[str, Any], label: str, path: str
+    ) -> Dict[str, Any]:
+        """
+        Rebuild the snapshot a decoded record stands for (see apply_delta).
+        
+        Raises:
+            ValueError: If the record is a delta that doesn't apply
+        """
+        try:
+            return apply_delta(previous, record)
+        except ValueError as e:
+            raise ValueError(f"History file {path} has invalid {label}: {e}")
+    
+    def _iter_gzip_members(self, f, start: int = 0):
+        """
+        Iterate over complete gzip members of an open log file.
+        
+        Reads in fixed-size chunks, so memory use doesn't grow with the log.
+        An incomplete member at the end of the file (torn append) ends the
+        iteration.
+        
+        Args:
+            f: Log file opened in binary mode
+            start: Offset of the first member to read
+        
+        Yields:
+            tuple: (offset, length, payload) for each member
+            
+        Raises:
+            ValueError: If a member is corrupted
+        """
+        f.seek(start)
+        offset = start
+        data = b""
+        
+        while True:
+            decompressor = zlib.decompressobj(wbits=31)
+            payload = []
+            consumed = 0
+            
+            while not decompressor.eof:
+                if not data:
+                    data = f.read(GZIP_SCAN_CHUNK_SIZE)
+                    if not data:
+                        break
+                try:
+                    payload.append(decompressor.decompress(data))
+                except zlib.error as e:
+                    raise ValueError(f"History file {f.name} has corrupted record at byte {offset}: {e}")
+                consumed += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+            
+            if not decompressor.eof:
+                if consumed:
+                    logger.warning(f"Ignoring incomplete record at byte {offset} of {f.name}")
+                return
+            
+            yield offset, consumed, b"".join(payload)
+            offset += consumed
+    
+    def _is_compressed_log(self, path: str) -> bool:
+        """Return True if the log at path consists of gzip members."""
+        with open(path, "rb") as f:
+            return is_compressed(f.read(2))
+    
+    def _encode_record(self, record: Dict[str, Any]) -> bytes:
+        """Serialize a record as a single log line (one gzip member if compressed)."""
+        line = dumps(record) + b"\n"
+        return compress_payload(line, self.compression)
+    
+    def _append_record(self, data: bytes):
+        """
+        Append encoded records to the log and make them durable.
+        
+        If a previous writer left a torn record at the end of the log, it is
+        repaired first so the new data starts on a record boundary. If the
+        write fails, the log is truncated back to its previous end. The data
+        is fsynced before returning, or with "interval" durability within
+        fsync_interval seconds.
+        
+        Args:
+            data: One or more encoded records
+        
+        Returns:
+            tuple: (offset, length) of the appended data in bytes
+        
+        Raises:
+            IOError: If the write fails
+        """
+        if os.path.exists(self.history_path) and os.path.getsize(self.history_path) > 0:
+            if self._is_compressed_log(self.history_path):
+                self._repair_tail()
+            else:
+                with open(self.history_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._repair_tail()
+        
+        with open(self.history_path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            try:
+                f.write(data)
+                f.flush()
+                if self.durability == "batch":
+                    os.fsync(f.fileno())
+            except (IOError, OSError):
+                f.truncate(offset)
+                raise
+        
+        if self.durability == "interval":
+            self._deferred_sync.written()
+        return offset, len(data)
+    
+    def sync(self) -> None:
+        """Fsync log appends deferred by "interval" durability."""
+        self._deferred_sync.flush()
+    
+    def _fsync_log(self) -> None:
+        """Fsync the history log (DeferredSync callback)."""
+        if not os.path.exists(self.history_path):
+            return
+        fd = os.open(self.history_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _rewrite_history(self, history: List[Dict[str, Any]]) -> None:
+        """
+        Atomically replace the log with the given snapshots.
+        
+        Also rewrites the latest-snapshot pointer and the metadata index
+        for the new log. The new log has no tombstones; with a keyframe
+        interval, snapshots are re-encoded as keyframes and deltas.
+        
+        Args:
+            history: Snapshots to write, in order
+            
+        Raises:
+            TypeError, ValueError: If a snapshot cannot be serialized
+            IOError: If the write fails
+        """
+        lines = []
+        locations = []
+        size = 0
+        keyframe_offset = chain = 0
+        for i, snapshot in enumerate(history):
+            delta = None
+            if i and chain + 1 < self.delta_keyframe_interval:
+                delta = encode_delta(history[i - 1], snapshot)
+            if delta:
+                chain += 1
+            else:
+                keyframe_offset, chain = size, 0
+            lines.append(self._encode_record(delta or snapshot))
+            locations.append([size, len(lines[-1]), keyframe_offset])
+            size += len(lines[-1])
+        content = b"".join(lines)
+        
+        try:
+            with open(self.temp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            # Atomic rename (POSIX guarantees atomicity)
+            os.replace(self.temp_path, self.history_path)
+        
+        except IOError:
+            # Clean up temp file if it exists
+            if os.path.exists(self.temp_path):
+                try:
+                    os.remove(self.temp_path)
+                    logger.debug(f"Cleaned up temporary file {self.temp_path}")
+                except:
+                    pass
+            raise
+        
+        if lines:
+            self._write_latest_pointer(len(content) - len(lines[-1]), len(lines[-1]), keyframe_offset, chain, True)
+        else:
+            self._write_latest_pointer(None, None)
+        self._write_snapshot_index([snapshot_index_entry(s, i) for i, s in enumerate(history)], [], locations)
+    
+    def _write_latest_pointer(
+        self,
+        offset: Optional[int],
+        length: Optional[int],
+        keyframe_offset: Optional[int] = None,
+        chain: int = 0,
+        tail: bool = False
+    ) -> None:
+        """
+        Record where the latest snapshot lives in the log.
+        
+        The pointer is a derived cache: it stores the log size and mtime it
+        was written for, and readers ignore it when they no longer match. It
+        is therefore not fsynced, and failing to write it is not an error.
+        
+        Args:
+            offset: Byte offset of the latest record (None if log is empty)
+            length: Byte length of the latest record (None if log is empty)
+            keyframe_offset: Offset of the keyframe the record's delta chain
+                             starts at (None: the record is whole)
+            chain: Number of delta records from the keyframe to this record
+            tail: True if no snapshot record follows it (deleted or not),
+                  so the next save can be a delta from it
+        """
+        try:
+            stat = os.stat(self.history_path) if os.path.exists(self.history_path) else None
+            pointer = {
+                "offset": offset,
+                "length": length,
+                "keyframe_offset": keyframe_offset,
+                "chain": chain,
+                "tail": tail,
+                "log_size": stat.st_size if stat else 0,
+                "log_mtime_ns": stat.st_mtime_ns if stat else None,
+            }
+            with open(self.latest_pointer_temp_path, "wb") as f:
+                f.write(dumps(pointer))
+            os.replace(self.latest_pointer_temp_path, self.latest_pointer_path)
+        except (IOError, OSError) as e:
+            logger.warning(f"LocalFileBackend: Failed to update latest-snapshot pointer: {e}")
+    
+    def _write_snapshot_index(
+        self,
+        entries: List[Dict[str, Any]],
+        tombstones: List[Dict[str, Any]],
+        locations: Optional[List[List[int]]] = None
+    ) -> None:
+        """
+        Write the metadata index sidecar.
+        
+        Like the latest-snapshot pointer, the index is a derived cache tagged
+        with the log size and mtime it describes, so it is not fsynced and
+        failing to write it is not an error.
+        
+        Args:
+            entries: Index entries for every live snapshot in the log
+            tombstones: Tombstone records in the log
+            locations: [offset, length, keyframe_offset] of each entry's
+                       record (None if unknown; range reads then scan the log)
+        """
+        try:
+            stat = os.stat(self.history_path) if os.path.exists(self.history_path) else None
+            index = {
+                "log_size": stat.st_size if stat else 0,
+                "log_mtime_ns": stat.st_mtime_ns if stat else None,
+                "entries": entries,
+                "tombstones": tombstones,
+            }
+            if locations is not None:
+                index["locations"] = locations
+            with open(self.index_temp_path, "wb") as f:
+                f.write(dumps(index))
+            os.replace(self.index_temp_path, self.index_path)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.warning(f"LocalFileBackend: Failed to update snapshot index: {e}")
+    
+    def _read_snapshot_index(self):
+        """
+        Read the metadata index sidecar.
+        
+        Returns:
+            tuple: (entries, tombstones, locations), or None if the sidecar
+                   is missing or stale (locations is None if not recorded)
+        """
+        try:
+            with open(self.index_path, "rb") as f:
+                index = loads(f.read())
+        except (IOError, OSError, json.JSONDecodeError):
+            return None
+        
+        stat = os.stat(self.history_path) if os.path.exists(self.history_path) else None
+        log_size = stat.st_size if stat else 0
+        log_mtime_ns = stat.st_mtime_ns if stat else None
+        if index.get("log_size") != log_size or index.get("log_mtime_ns") != log_mtime_ns:
+            return None
+        
+        entries = index.get("entries")
+        tombstones = index.get("tombstones", [])
+        if not isinstance(entries, list) or not isinstance(tombstones, list):
+            return None
+        locations = index.get("locations")
+        if not isinstance(locations, list) or len(locations) != len(entries):
+            locations = None
+        return entries, tombstones, locations
+    
+    def _read_latest_via_pointer(self):
+        """
+        Read the latest snapshot using the sidecar pointer.
+        
+        Returns:
+            tuple: (found, snapshot). found is False if the pointer is missing
+                   or stale; snapshot is None when the log is empty.
+        """
+        pointer = self._read_fresh_pointer()
+        if pointer is None:
+            return False, None
+        
+        if pointer.get("offset") is None:
+            return True, None
+        
+        try:
+            keyframe_offset = pointer.get("keyframe_offset")
+            if keyframe_offset is not None and keyframe_offset < pointer["offset"]:
+                return True, self._read_delta_chain(keyframe_offset, pointer["offset"] + pointer["length"])
+            
+            with open(self.history_path, "rb") as f:
+                f.seek(pointer["offset"])
+                data = f.read(pointer["length"])
+            return True, apply_delta(None, loads(decompress_payload(data)))
+        except (ValueError, OSError, EOFError, zlib.error):
+            return False, None
+    
+    def _read_delta_chain(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the snapshot whose record ends at end from the keyframe at start.
+        
+        Raises:
+            ValueError: If a record is invalid or a delta doesn't apply
+        """
+        snapshot = None
+        for _, payload in self._iter_span(start, end):
+            if not payload.startswith(TOMBSTONE_PREFIX):
+                snapshot = apply_delta(snapshot, loads(payload))
+        return snapshot
+    
+    def _iter_span(self, start: int, end: int):
+        """
+        Read the records between two byte offsets of the log.
+        
+        Args:
+            start: Offset of the first record
+            end: Offset just past the last record
+        
+        Yields:
+            tuple: (offset, payload) for each record, tombstones included
+        
+        Raises:
+            ValueError: If a gzip member is corrupted
+        """
+        with open(self.history_path, "rb") as f:
+            if is_compressed(f.read(2)):
+                records = []
+                for offset, _, payload in self._iter_gzip_members(f, start):
+                    if offset >= end:
+                        break
+                    records.append((offset, payload))
+            else:
+                f.seek(start)
+                records = []
+                offset = start
+                for line in f.read(end - start).splitlines(keepends=True):
+                    if line.strip():
+                        records.append((offset, line))
+                    offset += len(line)
+        return iter(records)
+    
+    def _read_located(self, locations: List[List[int]]) -> List[Dict[str, Any]]:
+        """
+        Read the snapshots at index locations, decoding only their delta chains.
+        
+        Overlapping chains are read once: locations are merged into byte
+        spans, each starting at a keyframe.
+        
+        Args:
+            locations: [offset, length, keyframe_offset] per wanted snapshot
+        
+        Returns:
+            list: Snapshots in the order of locations
+        
+        Raises:
+            ValueError: If a record is invalid or a delta doesn't apply
+        """
+        spans: List[List[int]] = []
+        for offset, length, keyframe_offset in sorted(locations, key=lambda location: location[2]):
+            if spans and keyframe_offset <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], offset + length)
+            else:
+                spans.append([keyframe_offset, offset + length])
+        
+        wanted = {location[0] for location in locations}
+        found = {}
+        for start, end in spans:
+            snapshot = None
+            for offset, payload in self._iter_span(start, end):
+                if payload.startswith(TOMBSTONE_PREFIX):
+                    continue
+                snapshot = apply_delta(snapshot, loads(payload))
+                if offset in wanted:
+                    found[offset] = snapshot
+        return [found[location[0]] for location in locations]
+    
+    def _delta_base(self):
+        """
+        Return the snapshot the next save can be a delta from.
+        
+        Returns:
+            tuple: (pointer, snapshot) for the last snapshot record, or None
+                   if delta encoding is off, a keyframe is due or the
+                   pointer doesn't describe the end of the log
+        """
+        if self.delta_keyframe_interval <= 1:
+            return None
+        
+        pointer = self._read_fresh_pointer()
+        if pointer is None or not pointer.get("tail") or pointer.get("offset") is None:
+            return None
+        if pointer.get("keyframe_offset") is None or pointer.get("chain", 0) + 1 >= self.delta_keyframe_interval:
+            return None
+        
+        found, snapshot = self._read_latest_via_pointer()
+        return (pointer, snapshot) if found and snapshot is not None else None
+    
+    def _read_fresh_pointer(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the latest-snapshot pointer if it still matches the log.
+        
+        Returns:
+            dict: Pointer with offset and length, or None if missing or stale
+        """
+        try:
+            with open(self.latest_pointer_path, "rb") as f:
+                pointer = loads(f.read())
+        except (IOError, OSError, json.JSONDecodeError):
+            return None
+        
+        if not os.path.exists(self.history_path):
+            return None
+        
+        stat = os.stat(self.history_path)
+        if pointer.get("log_size") != stat.st_size or pointer.get("log_mtime_ns") != stat.st_mtime_ns:
+            return None
+        return pointer
+    
+    def _backup_history(self, reason: str) -> Optional[Dict[str, Any]]:
+        """
+        Back up the stored log (deleted snapshots included) to the backup store.
+        
+        Hashes come from the index sidecar and tombstones; only records
+        whose snapshot the store doesn't hold yet are decoded.
+        
+        Args:
+            reason: Operation that triggered the backup
+        
+        Returns:
+            dict: Backup summary, or None if the log holds no snapshots
+        
+        Raises:
+            ValueError: If a record is not valid JSON
+            IOError: If the backup can't be written
+        """
+        entries, tombstones, _ = self._load_index_state()
+        dead = tombstoned_positions(tombstones)
+        live = iter(entries)
+        hashes = [
+            dead[position] if position in dead else next(live)["hash"]
+            for position in range(len(entries) + len(dead))
+        ]
+        if not hashes:
+            return None
+        
+        def fetch(missing: List[str]):
+            wanted = set(missing)
+            for _, _, _, _, _, snapshot in self._iter_snapshot_records(
+                self.history_path, lambda position, _: position < len(hashes) and hashes[position] in wanted
+            ):
+                if snapshot is not None:
+                    yield snapshot
+        
+        return self.backups.create_backup(
+            hashes, fetch, deleted=sorted(dead), reason=reason,
+            source=os.path.basename(self.history_path)
+        )
+    
+    def _prune_legacy_backups(self, keep: int) -> int:
+        """
+        Remove all but the most recent full-copy history backups.
+        
+        Older versions copied the whole log to backup/<log>.bak.<timestamp>;
+        these are older than any backup store backup, so callers pass the
+        part of keep_backups the store doesn't use.
+        
+        Args:
+            keep: Number of backups to keep
+        
+        Returns:
+            int: Number of backups removed
+        """
+        backups = [
+            os.path.join(self.backup_dir, name)
+            for name in os.listdir(self.backup_dir)
+            if name.startswith(HISTORY_FILE) and ".bak." in name
+        ]
+        backups.sort(key=os.path.getmtime, reverse=True)
+        
+        removed = 0
+        for path in backups[max(keep, 0):]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"LocalFileBackend: Failed to remove old backup {path}: {e}")
+        return removed
@@ -0,0 +1,1010 @@
+"""
+SQLite storage backend.
+
+Snapshots are stored in normalized tables, so saving a snapshot is a single
+transaction insert and deleting one is a row delete:
+
+    snapshots        one row per snapshot (timestamp, epoch, total value,
+                     asset count, content hash, remaining fields as JSON),
+                     indexed by epoch
+    snapshot_assets  one row per asset per snapshot, indexed by asset name
+    transactions     single-row table holding the transactions object
+
+save_snapshots() inserts a batch in one transaction. Every commit is
+fsynced (synchronous=FULL) unless durability is "interval": then commits
+are made durable by a WAL checkpoint at most once per interval.
+
+The database runs in WAL mode, so readers don't block the writer. Range,
+point-in-time and per-asset queries (get_snapshots_between,
+get_snapshot_at_or_before, get_asset_history) are answered from the
+indexes without reading the whole history.
+
+Deletes and replace_history back up the history to a content-addressed
+BackupStore under backup/ first (see backup_store.py); the stored content
+hashes name the backup, so only snapshots not backed up before are read.
+Retention archives full-resolution history per year under archive/ next to
+the database (see archive.py).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterator, Sequence, Union
+import logging
+
+from ..json_codec import dumps, loads
+from ..storage_backend import (
+    DEFAULT_KEEP_BACKUPS,
+    StorageBackend,
+    bound_to_epoch,
+    compute_snapshot_hash,
+    project_snapshot,
+    snapshot_index_entry,
+    timestamp_to_epoch,
+)
+from .archive import ARCHIVE_DIR, FileArchive
+from .backup_store import BackupStore
+from .durability import DEFAULT_FSYNC_INTERVAL, DeferredSync, validate_durability
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "portfolio_history.db"
+
+# Snapshots fetched per query when streaming
+ITER_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    epoch REAL,
+    total_value_eur REAL,
+    asset_count INTEGER,
+    content_hash TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_epoch ON snapshots (epoch);
+
+CREATE TABLE IF NOT EXISTS snapshot_assets (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity REAL,
+    current_value_eur REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_snapshot_assets_name ON snapshot_assets (name, snapshot_id);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+"""
+
+# Columns added to the snapshots table after its first release
+ADDED_SNAPSHOT_COLUMNS = {
+    "asset_count": "INTEGER",
+    "content_hash": "TEXT",
+}
+
+
+class SQLiteStorageBackend(StorageBackend):
+    """SQLite storage backend with indexed snapshot and asset tables."""
+
+    def __init__(
+        self,
+        db_path: str = DB_FILE,
+        keep_backups: int = DEFAULT_KEEP_BACKUPS,
+        backup_keep_days: float = 0,
+        durability: str = "batch",
+        fsync_interval: float = DEFAULT_FSYNC_INTERVAL
+    ):
+        """
+        Initialize SQLite backend and create the schema if needed.
+
+        Args:
+            db_path: Path to the database file (default: ./portfolio_history.db)
+            keep_backups: Most recent history backups kept by retention
+            backup_keep_days: History backups younger than this are kept too
+                              (0: keep_backups only)
+            durability: "batch" (every commit is fsynced) or "interval"
+                        (the WAL is checkpointed at most every
+                        fsync_interval seconds, see durability.py)
+            fsync_interval: Seconds between checkpoints with "interval"
+
+        Raises:
+            ValueError: If durability is invalid
+        """
+        self.db_path = db_path
+        self.durability = validate_durability(durability, fsync_interval)
+        self._deferred_sync = DeferredSync("SQLiteStorageBackend", self._checkpoint, fsync_interval)
+        self.backup_dir = os.path.join(os.path.dirname(db_path) or ".", "backup")
+        self.backups = BackupStore(self.backup_dir, keep=keep_backups, keep_days=backup_keep_days)
+        self.archive = FileArchive(os.path.join(os.path.dirname(db_path) or ".", ARCHIVE_DIR))
+
+        # One connection shared by all threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # FULL fsyncs the WAL on every commit; NORMAL only at checkpoints
+            self._conn.execute(f"PRAGMA synchronous={'FULL' if durability == 'batch' else 'NORMAL'}")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            self._add_missing_columns()
+            self._conn.commit()
+
+        logger.debug(f"SQLiteStorageBackend initialized: {self.db_path}")
+
+    def save_snapshot(self, snapshot_data: Dict[str, Any]) -> bool:
+        """
+        Insert snapshot and its assets in a single transaction.
+
+        Args:
+            snapshot_data: Snapshot dictionary
+
+        Returns:
+            bool: True if save successful, False otherwise
+        """
+        try:
+            with self._lock, self._conn:
+                self._insert_snapshot(snapshot_data)
+                self._bump_revision()
+            self._committed()
+
+            logger.info(
+                f"SQLiteStorageBackend: Saved snapshot to {self.db_path} "
+                f"({snapshot_data.get('timestamp', 'unknown time')})"
+            )
+            return True
+
+        except (TypeError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to serialize snapshot: {e}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to save snapshot: {e}")
+            return False
+
+    def save_snapshots(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Insert several snapshots in a single transaction, skipping any
+        already stored (by content hash).
+
+        Args:
+            snapshots: Snapshots in chronological order
+
+        Returns:
+            bool: True if every snapshot is now stored
+        """
+        try:
+            known = {entry["hash"] for entry in self.get_snapshot_index()}
+            new = []
+            for snapshot in snapshots:
+                content_hash = compute_snapshot_hash(snapshot)
+                if content_hash not in known:
+                    known.add(content_hash)
+                    new.append(snapshot)
+            if not new:
+                return True
+
+            with self._lock, self._conn:
+                for snapshot in new:
+                    self._insert_snapshot(snapshot)
+                self._bump_revision()
+            self._committed()
+
+            logger.info(
+                f"SQLiteStorageBackend: Saved {len(new)} snapshots to {self.db_path} "
+                f"({len(snapshots) - len(new)} already stored)"
+            )
+            return True
+
+        except (TypeError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to serialize snapshot: {e}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to save snapshots: {e}")
+            return False
+
+    def import_snapshots(self, snapshots: List[Dict[str, Any]]) -> int:
+        """
+        Insert several snapshots in a single transaction (e.g. when migrating
+        from the JSON backends).
+
+        Args:
+            snapshots: Snapshots in chronological order
+
+        Returns:
+            int: Number of snapshots imported
+
+        Raises:
+            sqlite3.Error: If the insert fails (nothing is imported)
+        """
+        with self._lock, self._conn:
+            for snapshot in snapshots:
+                self._insert_snapshot(snapshot)
+            self._bump_revision()
+        self._committed()
+
+        logger.info(f"SQLiteStorageBackend: Imported {len(snapshots)} snapshots into {self.db_path}")
+        return len(snapshots)
+
+    def get_latest_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the most recently saved snapshot.
+
+        Returns:
+            dict: Latest snapshot or None if the database is empty
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM snapshots ORDER BY id DESC LIMIT 1"
+                ).fetchall()
+                snapshots = self._load_snapshots(rows)
+            return snapshots[0] if snapshots else None
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read latest snapshot: {e}")
+            return None
+
+    def get_all_snapshots(self) -> List[Dict[str, Any]]:
+        """
+        Retrieve all snapshots in the order they were saved.
+
+        Returns:
+            list: All snapshots or empty list
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT id, data FROM snapshots ORDER BY id").fetchall()
+                snapshots = self._load_snapshots(rows)
+            logger.debug(f"SQLiteStorageBackend: Retrieved {len(snapshots)} snapshots")
+            return snapshots
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read snapshots: {e}")
+            return []
+
+    def iter_snapshots(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream snapshots in save order, a page at a time.
+
+        The range is applied in SQL on the epoch column, and asset rows are
+        not read at all when "assets" is not among the requested fields.
+        The lock is released between pages, never held while yielding.
+
+        Args:
+            start: Inclusive lower timestamp bound
+            end: Inclusive upper timestamp bound
+            fields: Top-level fields to return (None for whole snapshots)
+
+        Yields:
+            dict: Matching snapshots
+        """
+        conditions = ["id > ?"]
+        bounds = []
+        start_epoch = bound_to_epoch(start)
+        end_epoch = bound_to_epoch(end)
+        if start_epoch is not None:
+            conditions.append("epoch >= ?")
+            bounds.append(start_epoch)
+        if end_epoch is not None:
+            conditions.append("epoch <= ?")
+            bounds.append(end_epoch)
+        query = f"SELECT id, data FROM snapshots WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        include_assets = fields is None or "assets" in fields
+
+        last_id = 0
+        while True:
+            try:
+                with self._lock:
+                    rows = self._conn.execute(query, (last_id, *bounds, ITER_PAGE_SIZE)).fetchall()
+                    if include_assets:
+                        page = self._load_snapshots(rows)
+                    else:
+                        page = [loads(row["data"]) for row in rows]
+            except sqlite3.Error as e:
+                logger.error(f"SQLiteStorageBackend: Failed to stream snapshots: {e}")
+                return
+
+            for snapshot in page:
+                yield project_snapshot(snapshot, fields)
+
+            if len(rows) < ITER_PAGE_SIZE:
+                return
+            last_id = rows[-1]["id"]
+
+    def get_snapshots_between(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve snapshots taken between two timestamps (inclusive).
+
+        Uses the epoch index; only matching snapshots are read.
+
+        Args:
+            start: Inclusive lower bound, ISO 8601 or datetime (naive = UTC)
+            end: Inclusive upper bound
+
+        Returns:
+            list: Matching snapshots in chronological order
+
+        Raises:
+            ValueError: If a timestamp can't be parsed
+        """
+        conditions = []
+        bounds = []
+        start_epoch = bound_to_epoch(start)
+        end_epoch = bound_to_epoch(end)
+        if start_epoch is not None:
+            conditions.append("epoch >= ?")
+            bounds.append(start_epoch)
+        if end_epoch is not None:
+            conditions.append("epoch <= ?")
+            bounds.append(end_epoch)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM snapshots {where} ORDER BY epoch IS NULL, epoch, id",
+                    bounds
+                ).fetchall()
+                return self._load_snapshots(rows)
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to query snapshot range: {e}")
+            return []
+
+    def get_snapshot_at_or_before(self, timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the newest snapshot taken at or before a timestamp.
+
+        One lookup on the epoch index; ties go to the snapshot saved last.
+
+        Args:
+            timestamp: ISO 8601 timestamp or datetime (naive = UTC)
+
+        Returns:
+            dict: The snapshot, or None if there is none (or on error)
+
+        Raises:
+            ValueError: If the timestamp can't be parsed
+        """
+        epoch = bound_to_epoch(timestamp)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM snapshots WHERE epoch <= ? ORDER BY epoch DESC, id DESC LIMIT 1",
+                    (epoch,)
+                ).fetchall()
+                snapshots = self._load_snapshots(rows)
+            return snapshots[0] if snapshots else None
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to query snapshot at {timestamp}: {e}")
+            return None
+
+    def get_asset_history(self, asset_name: str) -> List[Dict[str, Any]]:
+        """
+        Retrieve one asset's entries across all snapshots.
+
+        Uses the asset name index; other assets are not read.
+
+        Args:
+            asset_name: Asset name as stored in snapshots
+
+        Returns:
+            list: Asset dicts with an added "timestamp" key, in save order
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    """
+                    SELECT s.timestamp, a.data
+                    FROM snapshot_assets a JOIN snapshots s ON s.id = a.snapshot_id
+                    WHERE a.name = ?
+                    ORDER BY s.id, a.position
+                    """,
+                    (asset_name,)
+                ).fetchall()
+            return [{"timestamp": row["timestamp"], **loads(row["data"])} for row in rows]
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to query asset history: {e}")
+            return []
+
+    def get_snapshot_index(self) -> List[Dict[str, Any]]:
+        """
+        Get metadata for every snapshot from the snapshot table columns.
+
+        Asset rows and snapshot JSON are not read, except once to backfill
+        rows saved before the asset_count/content_hash columns existed.
+
+        Returns:
+            list: Index entries in save order, or empty list on error
+        """
+        query = (
+            "SELECT timestamp, total_value_eur, asset_count, content_hash "
+            "FROM snapshots ORDER BY id"
+        )
+        try:
+            with self._lock:
+                rows = self._conn.execute(query).fetchall()
+                if any(row["content_hash"] is None or row["asset_count"] is None for row in rows):
+                    self._backfill_index_columns()
+                    rows = self._conn.execute(query).fetchall()
+
+            return [
+                {
+                    "index": i,
+                    "timestamp": row["timestamp"],
+                    "epoch": timestamp_to_epoch(row["timestamp"]),
+                    "total_value_eur": row["total_value_eur"] if row["total_value_eur"] is not None else 0.0,
+                    "asset_count": row["asset_count"],
+                    "hash": row["content_hash"],
+                }
+                for i, row in enumerate(rows)
+            ]
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read snapshot index: {e}")
+            return []
+
+    def count_snapshots(self) -> int:
+        """Return the number of stored snapshots."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def is_available(self) -> bool:
+        """
+        Check if the database can be queried.
+
+        Returns:
+            bool: True if the database is reachable
+        """
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"SQLiteStorageBackend: Database unavailable: {e}")
+            return False
+
+    def get_history_version(self) -> Optional[tuple]:
+        """
+        Return the write revision counter as a version token.
+
+        The counter is incremented in the same transaction as every change,
+        so writes by other processes are detected too.
+
+        Returns:
+            tuple: (database path, revision), or None on error
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+            return (self.db_path, row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"SQLiteStorageBackend: Failed to read revision: {e}")
+            return None
+
+    def get_data_dir(self) -> Optional[str]:
+        """Return the directory holding the database file."""
+        return os.path.dirname(self.db_path) or "."
+
+    def save_transactions(self, transaction_data: Dict[str, Any]) -> bool:
+        """
+        Save transactions object (replaces the previous one).
+
+        Args:
+            transaction_data: Full transactions object
+
+        Returns:
+            bool: True if save successful, False otherwise
+        """
+        try:
+            content = dumps(transaction_data).decode("utf-8")
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transactions (id, data) VALUES (1, ?)",
+                    (content,)
+                )
+            self._committed()
+
+            sell_count = transaction_data.get("metadata", {}).get("sell_count", 0)
+            buy_count = transaction_data.get("metadata", {}).get("buy_count", 0)
+            logger.info(
+                f"SQLiteStorageBackend: Successfully saved transactions to {self.db_path}. "
+                f"Sells: {sell_count}, Buys: {buy_count}"
+            )
+            return True
+
+        except (TypeError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to serialize transactions: {e}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to save transactions: {e}")
+            return False
+
+    def get_transactions(self) -> Optional[Dict[str, Any]]:
+        """
+        Load transactions object.
+
+        Returns:
+            dict: Transaction data or None if none saved yet
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT data FROM transactions WHERE id = 1").fetchone()
+            return loads(row["data"]) if row else None
+
+        except json.JSONDecodeError as e:
+            logger.error(f"SQLiteStorageBackend: Transactions row contains invalid JSON: {e}")
+            return None
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read transactions: {e}")
+            return None
+
+    def delete_snapshot(self, index: int) -> bool:
+        """
+        Delete snapshot by index (0-based, in save order).
+
+        Backs up the history (deleted snapshot marked) to the backup store
+        first, then deletes its rows in a single transaction.
+
+        Args:
+            index: Zero-based index of snapshot to delete
+
+        Returns:
+            bool: True if deletion succeeded, False otherwise
+        """
+        try:
+            with self._lock:
+                # Step 1: Validate index
+                count = self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+                if index < 0 or index >= count:
+                    logger.error(
+                        f"SQLiteStorageBackend: Index {index} out of range "
+                        f"(valid: 0-{count-1})"
+                    )
+                    return False
+
+                rows = self._conn.execute(
+                    "SELECT id, data FROM snapshots ORDER BY id LIMIT 1 OFFSET ?",
+                    (index,)
+                ).fetchall()
+                deleted_snapshot = self._load_snapshots(rows)[0]
+
+                # Step 2: Back up the history, marking the snapshot being deleted
+                try:
+                    self._backup_history("delete", deleted=[index])
+                except (IOError, OSError, ValueError) as e:
+                    logger.error(f"SQLiteStorageBackend: Failed to create backup: {e}")
+                    return False
+
+                logger.info(
+                    f"SQLiteStorageBackend: Deleting snapshot at index {index}: "
+                    f"{deleted_snapshot.get('timestamp', 'unknown')} "
+                    f"(€{deleted_snapshot.get('total_value_eur', 0.0):,.2f})"
+                )
+
+                # Step 3: Delete rows (assets cascade)
+                with self._conn:
+                    self._conn.execute("DELETE FROM snapshots WHERE id = ?", (rows[0]["id"],))
+                    self._bump_revision()
+            self._committed()
+
+            logger.info(
+                f"SQLiteStorageBackend: Successfully deleted snapshot. "
+                f"Remaining snapshots: {count - 1}"
+            )
+            return True
+
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to delete snapshot: {e}")
+            return False
+
+    def replace_history(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Replace all snapshot rows with the given snapshots in one transaction.
+
+        The current history is backed up to the backup store first.
+
+        Args:
+            snapshots: New history, in order
+
+        Returns:
+            bool: True if the history was replaced, False otherwise
+        """
+        try:
+            with self._lock:
+                # Step 1: Back up the current history
+                try:
+                    self._backup_history("replace")
+                except (IOError, OSError, ValueError) as e:
+                    logger.error(f"SQLiteStorageBackend: Failed to create backup: {e}")
+                    return False
+
+                # Step 2: Swap the rows (assets cascade)
+                with self._conn:
+                    self._conn.execute("DELETE FROM snapshots")
+                    for snapshot in snapshots:
+                        self._insert_snapshot(snapshot)
+                    self._bump_revision()
+            self._committed()
+
+            logger.info(f"SQLiteStorageBackend: Replaced history with {len(snapshots)} snapshots")
+            return True
+
+        except (TypeError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to serialize snapshot: {e}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"SQLiteStorageBackend: Failed to replace history: {e}")
+            return False
+
+    def compact_history(self, keep_backups: int = DEFAULT_KEEP_BACKUPS) -> Dict[str, Any]:
+        """
+        Reclaim free pages and prune old delete/replace backups.
+
+        Deletes are physical row deletes, so there are no snapshots to drop;
+        VACUUM returns the space they occupied to the file system. Backups
+        beyond keep_backups (and backup_keep_days) are removed from the
+        backup store, with the snapshots only they held.
+
+        Args:
+            keep_backups: Number of most recent backups to keep
+
+        Returns:
+            dict: {"success", "removed_snapshots", "snapshots", "bytes_before",
+                   "bytes_after", "backups_removed"} or {"success": False, "error"}
+        """
+        try:
+            with self._lock:
+                bytes_before = os.path.getsize(self.db_path)
+                self._conn.execute("VACUUM")
+                bytes_after = os.path.getsize(self.db_path)
+                count = self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+            pruned = self.backups.prune(keep_backups, self.backups.keep_days)
+            legacy_keep = keep_backups - len(self.backups.list_backups())
+            backups_removed = pruned["backups_removed"] + self._prune_legacy_backups(legacy_keep)
+            logger.info(
+                f"SQLiteStorageBackend: Compacted database ({bytes_before - bytes_after} bytes freed, "
+                f"{backups_removed} old backups removed)"
+            )
+            return {
+                "success": True,
+                "removed_snapshots": 0,
+                "snapshots": count,
+                "bytes_before": bytes_before,
+                "bytes_after": bytes_after,
+                "backups_removed": backups_removed,
+            }
+
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to compact database: {e}")
+            return {"success": False, "error": str(e)}
+
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """
+        List history backups in the backup store, newest first.
+
+        Returns:
+            list: Backup summaries (see BackupStore.list_backups)
+        """
+        return self.backups.list_backups()
+
+    def restore_backup(self, backup_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+        """
+        Replace the history with the one recorded by a backup.
+
+        The current history is backed up first (replace_history), so a
+        restore can itself be undone.
+
+        Args:
+            backup_id: Backup to restore (see list_backups)
+            include_deleted: Also restore the snapshot a delete backup was taken for
+
+        Returns:
+            dict: {"success", "backup_id", "restored_snapshots"} or
+                  {"success": False, "error"}
+        """
+        try:
+            snapshots = self.backups.load_backup(backup_id, include_deleted)
+        except KeyError:
+            return {"success": False, "error": f"Backup not found: {backup_id}"}
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read backup {backup_id}: {e}")
+            return {"success": False, "error": f"Backup {backup_id} is incomplete or corrupted: {e}"}
+
+        if not self.replace_history(snapshots):
+            return {"success": False, "error": "Failed to write restored history. Check logs for details."}
+
+        logger.info(f"SQLiteStorageBackend: Restored {len(snapshots)} snapshots from backup {backup_id}")
+        return {"success": True, "backup_id": backup_id, "restored_snapshots": len(snapshots)}
+
+    def archive_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Copy snapshots to per-year archives under archive/.
+
+        Args:
+            snapshots: Snapshots to archive (full resolution)
+
+        Returns:
+            dict: {"success", "years": {year: snapshots added}} or
+                  {"success": False, "error"}
+        """
+        try:
+            return {"success": True, "years": self.archive.write(snapshots)}
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to archive snapshots: {e}")
+            return {"success": False, "error": str(e)}
+
+    def get_archived_snapshots(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return the archived snapshots of a year, in timestamp order.
+
+        Args:
+            year: Archive year
+
+        Returns:
+            list: Archived snapshots (empty if there is no archive or it can't be read)
+        """
+        try:
+            return self.archive.read(year)
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"SQLiteStorageBackend: Failed to read {year} archive: {e}")
+            return []
+
+    def list_archive_years(self) -> List[int]:
+        """
+        Return the years that have an archive, oldest first.
+
+        Returns:
+            list: Archive years
+        """
+        return self.archive.years()
+
+    def sync(self) -> None:
+        """Checkpoint commits deferred by "interval" durability."""
+        self._deferred_sync.flush()
+
+    def close(self) -> None:
+        """Checkpoint pending commits and close the database connection."""
+        self.sync()
+        with self._lock:
+            self._conn.close()
+
+    def _committed(self) -> None:
+        """Record a commit for "interval" durability (FULL commits are already durable)."""
+        if self.durability == "interval":
+            self._deferred_sync.written()
+
+    def _checkpoint(self) -> None:
+        """
+        Copy the WAL into the database, fsyncing both (DeferredSync callback).
+
+        Raises:
+            IOError: If the checkpoint fails
+        """
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(FULL)")
+        except sqlite3.Error as e:
+            raise IOError(f"WAL checkpoint failed: {e}")
+
+    def _backup_history(self, reason: str, deleted: Sequence[int] = ()) -> Optional[Dict[str, Any]]:
+        """
+        Back up the current history to the backup store (caller holds the lock).
+
+        Hashes come from the content_hash column; only snapshots the store
+        doesn't hold yet are read.
+
+        Args:
+            reason: Operation that triggered the backup
+            deleted: Positions of snapshots about to be deleted
+
+        Returns:
+            dict: Backup summary, or None if there are no snapshots
+
+        Raises:
+            ValueError: If a snapshot can't be read back
+            IOError: If the backup can't be written
+        """
+        query = "SELECT content_hash FROM snapshots ORDER BY id"
+        hashes = [row["content_hash"] for row in self._conn.execute(query)]
+        if any(content_hash is None for content_hash in hashes):
+            self._backfill_index_columns()
+            hashes = [row["content_hash"] for row in self._conn.execute(query)]
+        if not hashes:
+            return None
+
+        def fetch(missing: List[str]) -> List[Dict[str, Any]]:
+            snapshots = []
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM snapshots WHERE content_hash IN ({placeholders}) ORDER BY id",
+                    chunk
+                ).fetchall()
+                snapshots.extend(self._load_snapshots(rows))
+            return snapshots
+
+        return self.backups.create_backup(
+            hashes, fetch, deleted=deleted, reason=reason, source=os.path.basename(self.db_path)
+        )
+
+    def _prune_legacy_backups(self, keep: int) -> int:
+        """
+        Remove all but the most recent per-operation JSON backups.
+
+        Older versions wrote backup/<db>.deleted.<timestamp>.json and
+        .replaced.<timestamp>.json files; these are older than any backup
+        store backup, so callers pass the part of keep_backups the store
+        doesn't use.
+
+        Args:
+            keep: Number of backups to keep
+
+        Returns:
+            int: Number of backups removed
+        """
+        if not os.path.isdir(self.backup_dir):
+            return 0
+
+        prefixes = tuple(f"{os.path.basename(self.db_path)}.{kind}." for kind in ("deleted", "replaced"))
+        backups = [
+            os.path.join(self.backup_dir, name)
+            for name in os.listdir(self.backup_dir)
+            if name.startswith(prefixes) and name.endswith(".json")
+        ]
+        backups.sort(key=os.path.getmtime, reverse=True)
+
+        removed = 0
+        for path in backups[max(keep, 0):]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"SQLiteStorageBackend: Failed to remove old backup {path}: {e}")
+        return removed
+
+    def _add_missing_columns(self) -> None:
+        """Add snapshot columns missing from databases created by older versions (caller holds the lock)."""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(snapshots)")}
+        for column, column_type in ADDED_SNAPSHOT_COLUMNS.items():
+            if column not in existing:
+                logger.info(f"SQLiteStorageBackend: Adding column snapshots.{column}")
+                self._conn.execute(f"ALTER TABLE snapshots ADD COLUMN {column} {column_type}")
+
+    def _backfill_index_columns(self) -> None:
+        """
+        Fill asset_count and content_hash for rows that predate them
+        (caller holds the lock). Snapshot contents are unchanged, so the
+        revision is not bumped.
+        """
+        rows = self._conn.execute(
+            "SELECT id, data FROM snapshots WHERE content_hash IS NULL OR asset_count IS NULL ORDER BY id"
+        ).fetchall()
+        snapshots = self._load_snapshots(rows)
+
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE snapshots SET asset_count = ?, content_hash = ? WHERE id = ?",
+                [
+                    (len(snapshot.get("assets") or []), compute_snapshot_hash(snapshot), row["id"])
+                    for row, snapshot in zip(rows, snapshots)
+                ]
+            )
+        logger.info(f"SQLiteStorageBackend: Backfilled index columns for {len(rows)} snapshots")
+
+    def _insert_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Insert one snapshot and its assets (caller holds the lock and
+        manages the transaction).
+
+        The assets list is stored in snapshot_assets; the snapshot row keeps
+        an "assets": null placeholder so the original key order is restored
+        on read.
+        """
+        assets = snapshot.get("assets")
+        data = dict(snapshot)
+        if "assets" in data:
+            data["assets"] = None
+
+        entry = snapshot_index_entry(snapshot, 0)
+        cursor = self._conn.execute(
+            """
+            INSERT INTO snapshots (timestamp, epoch, total_value_eur, asset_count, content_hash, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                str(snapshot.get("timestamp", "")),
+                entry["epoch"],
+                snapshot.get("total_value_eur"),
+                entry["asset_count"],
+                entry["hash"],
+                dumps(data).decode("utf-8"),
+            )
+        )
+
+        if assets:
+            self._conn.executemany(
+                """
+                INSERT INTO snapshot_assets (snapshot_id, position, name, quantity, current_value_eur, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        cursor.lastrowid,
+                        position,
+                        str(asset.get("name", "")),
+                        asset.get("quantity"),
+                        asset.get("current_value_eur"),
+                        dumps(asset).decode("utf-8"),
+                    )
+                    for position, asset in enumerate(assets)
+                ]
+            )
+
+    def _bump_revision(self) -> None:
+        """Increment the revision counter (inside the caller's transaction)."""
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def _load_snapshots(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """
+        Rebuild snapshots from snapshot rows (caller holds the lock).
+
+        Args:
+            rows: Rows with id and data columns, in the desired order
+
+        Returns:
+            list: Snapshot dictionaries with their assets
+        """
+        if not rows:
+            return []
+
+        snapshots = {row["id"]: loads(row["data"]) for row in rows}
+
+        ids = list(snapshots)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            asset_rows = self._conn.execute(
+                f"SELECT snapshot_id, data FROM snapshot_assets "
+                f"WHERE snapshot_id IN ({placeholders}) ORDER BY snapshot_id, position",
+                chunk
+            )
+            for asset_row in asset_rows:
+                snapshot = snapshots[asset_row["snapshot_id"]]
+                if snapshot.get("assets") is None:
+                    snapshot["assets"] = []
+                snapshot["assets"].append(loads(asset_row["data"]))
+
+        for snapshot in snapshots.values():
+            if "assets" in snapshot and snapshot["assets"] is None:
+                snapshot["assets"] = []
+
+        return [snapshots[row["id"]] for row in rows]
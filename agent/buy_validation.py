@@ -4,11 +4,13 @@ Buy Transaction Validation
 Ensures all detected buys have corresponding transaction records.
 """
 
-from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 from dataclasses import dataclass
 import logging
 
+from .snapshot_diff import SnapshotDiff
+from .transaction_index import TransactionIndex, snapshot_period
+
 logger = logging.getLogger(__name__)
 
 
@@ -95,7 +97,8 @@ class BuyValidationError(Exception):
 def detect_buys(
     current_snapshot: Dict[str, Any],
     previous_snapshot: Dict[str, Any],
-    threshold: float = 1.0
+    threshold: float = 1.0,
+    diff: Optional[SnapshotDiff] = None
 ) -> List[DetectedBuy]:
     """
     Detect buy positions by comparing snapshots.
@@ -104,37 +107,32 @@ def detect_buys(
         current_snapshot: Current portfolio snapshot
         previous_snapshot: Previous portfolio snapshot
         threshold: Minimum quantity change to consider a buy (default: 1.0 share)
+        diff: SnapshotDiff of the two snapshots, if already computed
     
     Returns:
         List of DetectedBuy objects
     """
-    # Build asset dictionaries
-    current_assets = {
-        asset["name"]: asset 
-        for asset in current_snapshot.get("assets", [])
-    }
-    previous_assets = {
-        asset["name"]: asset 
-        for asset in previous_snapshot.get("assets", [])
-    }
+    # Match assets by name (or reuse the caller's diff)
+    diff = SnapshotDiff.of(current_snapshot, previous_snapshot, diff)
     
     detected_buys = []
     
     # Check all assets from current snapshot for quantity increases
-    for name, curr_asset in current_assets.items():
+    for name, curr_asset in diff.current_assets.items():
         # Skip non-tradable categories
         category = curr_asset.get("category", "")
         if category in ["Pension", "Cash"]:
             continue
         
-        current_qty = curr_asset.get("quantity", 0.0)
-        previous_qty = previous_assets.get(name, {}).get("quantity", 0.0)
+        change = diff.changes[name]
+        current_qty = change.current_quantity
+        previous_qty = change.previous_quantity
         
-        qty_change = current_qty - previous_qty
+        qty_change = change.quantity_change
         
         # Detect buys (quantity increased by at least threshold)
         if qty_change >= threshold:
-            is_new_position = name not in previous_assets
+            is_new_position = change.status == "new"
             
             detected_buys.append(DetectedBuy(
                 asset_name=name,
@@ -160,53 +158,30 @@ def detect_buys(
 
 
 def find_matching_buy_transactions(
-    transactions: List[Dict[str, Any]],
+    transactions: Union[TransactionIndex, List[Dict[str, Any]]],
     asset_name: str,
-    previous_date: str,
-    current_date: str
+    previous_date: Union[str, float],
+    current_date: Union[str, float]
 ) -> List[Dict[str, Any]]:
     """
     Find buy transactions matching asset name within date range.
     
     Args:
-        transactions: List of all parsed buy transactions
+        transactions: TransactionIndex over the buy transactions (or the
+            list of parsed transactions, indexed on the fly)
         asset_name: Asset name to match (case-sensitive exact match)
-        previous_date: Start of period (ISO format, exclusive)
-        current_date: End of period (ISO format, inclusive)
+        previous_date: Start of period (ISO format or POSIX seconds, exclusive)
+        current_date: End of period (ISO format or POSIX seconds, inclusive)
     
     Returns:
         List of matching transaction dicts
     """
-    # Parse date strings
-    prev_dt = datetime.fromisoformat(previous_date.replace('Z', '+00:00'))
-    curr_dt = datetime.fromisoformat(current_date.replace('Z', '+00:00'))
-    
-    matching = []
-    for txn in transactions:
-        # Match asset name (case-sensitive exact match)
-        txn_name = txn.get("asset_name", "")
-        if txn_name != asset_name:
-            continue
-        
-        # Check date range: previous < txn_date <= current
-        txn_date_str = txn.get("date")
-        if not txn_date_str:
-            continue
-        
-        # Parse transaction date
-        try:
-            txn_date = datetime.fromisoformat(txn_date_str.replace('Z', '+00:00'))
-        except (ValueError, AttributeError):
-            logger.warning(f"Invalid date format in buy transaction: {txn_date_str}")
-            continue
-        
-        # Check if within range
-        if prev_dt < txn_date <= curr_dt:
-            matching.append(txn)
-            logger.debug(
-                f"Matched buy transaction: {asset_name} - {txn.get('quantity', 0):.0f} shares "
-                f"on {txn_date.date()}"
-            )
+    matching = TransactionIndex.of(transactions, "buy transaction").find(asset_name, previous_date, current_date)
+    for txn in matching:
+        logger.debug(
+            f"Matched buy transaction: {asset_name} - {txn.get('quantity', 0):.0f} shares "
+            f"on {str(txn['date'])[:10]}"
+        )
     
     return matching
 
@@ -214,7 +189,8 @@ def find_matching_buy_transactions(
 def validate_buys_have_transactions(
     current_snapshot: Dict[str, Any],
     previous_snapshot: Dict[str, Any],
-    buy_transactions: List[Dict[str, Any]]
+    buy_transactions: Union[TransactionIndex, List[Dict[str, Any]]],
+    diff: Optional[SnapshotDiff] = None
 ) -> None:
     """
     Validates that all detected buys have matching transactions.
@@ -222,13 +198,14 @@ def validate_buys_have_transactions(
     Args:
         current_snapshot: Current portfolio snapshot
         previous_snapshot: Previous portfolio snapshot  
-        buy_transactions: List of parsed buy transactions
+        buy_transactions: Parsed buy transactions (list or TransactionIndex)
+        diff: SnapshotDiff of the two snapshots, if already computed
     
     Raises:
         BuyValidationError: If any buy lacks matching transaction
     """
     # Detect all buys (including new positions)
-    detected_buys = detect_buys(current_snapshot, previous_snapshot)
+    detected_buys = detect_buys(current_snapshot, previous_snapshot, diff=diff)
     
     if not detected_buys:
         logger.info("No buys detected, validation passed")
@@ -237,6 +214,8 @@ def validate_buys_have_transactions(
     logger.info(f"Validating {len(detected_buys)} detected buy(s) against transactions")
     
     # Validate each buy
+    buy_transactions = TransactionIndex.of(buy_transactions, "buy transaction")
+    period_start, period_end = snapshot_period(previous_snapshot, current_snapshot)
     missing_transactions = []
     
     for buy in detected_buys:
@@ -244,8 +223,8 @@ def validate_buys_have_transactions(
         matching_txns = find_matching_buy_transactions(
             transactions=buy_transactions,
             asset_name=buy.asset_name,
-            previous_date=previous_snapshot["timestamp"],
-            current_date=current_snapshot["timestamp"]
+            previous_date=period_start,
+            current_date=period_end
         )
         
         # Sum transaction quantities
@@ -5,7 +5,7 @@ Provides type-safe configuration with validation for the Investment MCP Agent.
 All configuration is loaded from config.yaml with optional environment variable overrides.
 """
 
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -99,6 +99,35 @@ class GCPStorageConfig(BaseModel):
     bucket_name: str = "investment_snapshots"
     region: str = "europe-north1"
     blob_name: str = "portfolio_history.json"
+    cache_dir: Optional[str] = Field(
+        default=".gcs_cache",
+        description="Local copy of the last downloaded history (None disables persistence)",
+    )
+    layout: Literal["monolithic", "sharded"] = Field(
+        default="monolithic",
+        description="History layout in the bucket: one blob, or one object per snapshot plus a manifest",
+    )
+    download_workers: int = Field(
+        default=8,
+        ge=1,
+        le=32,
+        description="Parallel shard downloads for full-history reads (sharded layout)",
+    )
+    availability_ttl: float = Field(
+        default=30.0,
+        ge=0,
+        description="Seconds a known GCS availability state is reused before probing again",
+    )
+    failure_threshold: int = Field(
+        default=3,
+        ge=1,
+        description="Consecutive connectivity failures before GCS calls are skipped (circuit open)",
+    )
+    circuit_reset_timeout: float = Field(
+        default=60.0,
+        ge=0,
+        description="Seconds an open circuit waits before probing GCS again",
+    )
 
     @field_validator("bucket_name")
     @classmethod
@@ -118,14 +147,92 @@ class LocalStorageConfig(BaseModel):
 
     data_dir: str = "."
     history_file: str = "portfolio_history.json"
+    delta_keyframe_interval: int = Field(
+        default=0,
+        ge=0,
+        description="Store every K-th snapshot whole and the others as diffs from the previous one (0 or 1 disables)",
+    )
+
+
+class SQLiteStorageConfig(BaseModel):
+    """SQLite storage configuration."""
+
+    db_path: str = "portfolio_history.db"
+
+
+class RetentionTier(BaseModel):
+    """One step of the history retention policy."""
+
+    after_days: int = Field(ge=0, description="Applies to snapshots at least this many days old")
+    keep: Literal["daily", "weekly", "monthly"] = Field(
+        description="Keep the last snapshot of each day, ISO week or month"
+    )
+
+
+class RetentionConfig(BaseModel):
+    """History retention (time-based downsampling) configuration."""
+
+    tiers: List[RetentionTier] = Field(
+        default_factory=list,
+        description="Retention tiers, youngest first (empty: keep every snapshot)",
+    )
+    archive: bool = Field(
+        default=True,
+        description="Copy full-resolution history to per-year archives before thinning it",
+    )
+
+    @field_validator("tiers")
+    @classmethod
+    def validate_tiers(cls, v: List[RetentionTier]) -> List[RetentionTier]:
+        """Validate tiers get older and never finer-grained."""
+        resolutions = ["daily", "weekly", "monthly"]
+        for previous, tier in zip(v, v[1:]):
+            if tier.after_days <= previous.after_days:
+                raise ValueError("Retention tiers must be ordered by strictly increasing after_days")
+            if resolutions.index(tier.keep) < resolutions.index(previous.keep):
+                raise ValueError(
+                    f"Retention tier after {tier.after_days} days keeps '{tier.keep}', "
+                    f"finer than the '{previous.keep}' tier before it"
+                )
+        return v
 
 
 class StorageConfig(BaseModel):
     """Storage backend configuration."""
 
-    backend: Literal["hybrid", "gcp", "local"] = "hybrid"
+    backend: Literal["hybrid", "gcp", "local", "sqlite"] = "hybrid"
+    fallback: Literal["local", "sqlite"] = Field(
+        default="local",
+        description="Fallback backend under the hybrid backend",
+    )
+    compression: Literal["none", "gzip"] = Field(
+        default="none",
+        description="Compress snapshot history (local log and GCS uploads); reads detect either format",
+    )
+    compact_after_deletes: int = Field(
+        default=10,
+        ge=0,
+        description="Compact history during the weekly analysis once this many deletes are pending (0 disables)",
+    )
+    keep_backups: int = Field(
+        default=5, ge=0, description="History backups kept by compaction (older ones are removed)"
+    )
+    backup_keep_days: int = Field(
+        default=0,
+        ge=0,
+        description="Local/SQLite history backups younger than this many days are kept as well (0: keep_backups only)",
+    )
+    durability: Literal["batch", "interval"] = Field(
+        default="batch",
+        description="Local/SQLite writes: fsync every save (batch) or at most every fsync_interval seconds (interval)",
+    )
+    fsync_interval: float = Field(
+        default=1.0, gt=0, description="Seconds between fsyncs with durability 'interval'"
+    )
+    retention: RetentionConfig = Field(default_factory=RetentionConfig)
     gcp: GCPStorageConfig = Field(default_factory=GCPStorageConfig)
     local: LocalStorageConfig = Field(default_factory=LocalStorageConfig)
+    sqlite: SQLiteStorageConfig = Field(default_factory=SQLiteStorageConfig)
 
 
 class AlphaVantageConfig(BaseModel):
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 
 from . import storage
+from .storage_backend import snapshot_epoch
 
 logger = logging.getLogger(__name__)
 
@@ -22,45 +23,24 @@ def get_yesterday_snapshot() -> Optional[Dict[str, Any]]:
         Dict containing yesterday's snapshot, or None if not found
     """
     try:
-        all_snapshots = storage.get_all_snapshots()
-
-        if not all_snapshots:
-            logger.warning("No snapshots available")
-            return None
-
         # Get current date (today)
         now = datetime.now(timezone.utc)
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
         # Look for snapshot from yesterday (24 hours ago)
         yesterday_start = today_start - timedelta(days=1)
-        yesterday_end = today_start
-
-        # Find the most recent snapshot from yesterday
-        yesterday_snapshots = []
-        for snapshot in all_snapshots:
-            snap_date = datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))
-            if yesterday_start <= snap_date < yesterday_end:
-                yesterday_snapshots.append(snapshot)
-
-        if yesterday_snapshots:
-            # Return the most recent snapshot from yesterday
-            return yesterday_snapshots[-1]
-
-        # If no snapshot from exactly yesterday, find the most recent snapshot
-        # that's at least 1 day old
-        cutoff = today_start - timedelta(days=1)
-        previous_snapshots = []
-        for snapshot in all_snapshots:
-            snap_date = datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))
-            if snap_date < cutoff:
-                previous_snapshots.append((snap_date, snapshot))
-
-        if previous_snapshots:
-            # Sort by date and return most recent
-            previous_snapshots.sort(key=lambda x: x[0], reverse=True)
-            logger.info(f"No snapshot from yesterday, using snapshot from {previous_snapshots[0][0].date()}")
-            return previous_snapshots[0][1]
+
+        # The most recent snapshot before today: yesterday's last snapshot,
+        # or else the most recent older one (a binary search of the cached
+        # timestamp index, or read without the rest of history)
+        snapshot = storage.get_snapshot_at_or_before(today_start - timedelta(microseconds=1))
+
+        if snapshot:
+            epoch = snapshot_epoch(snapshot)
+            if epoch is not None and epoch < yesterday_start.timestamp():
+                snap_date = datetime.fromtimestamp(epoch, tz=timezone.utc)
+                logger.info(f"No snapshot from yesterday, using snapshot from {snap_date.date()}")
+            return snapshot
 
         logger.warning("No previous snapshot found for daily comparison")
         return None
@@ -12,6 +12,7 @@ from typing import Dict, List, Any, Optional
 from . import storage
 from . import daily_analysis
 from . import dashboard_components as components
+from .asset_panel import AssetPanel
 
 logger = logging.getLogger(__name__)
 
@@ -21,17 +22,23 @@ class DailyOverviewView:
     Daily Overview - Quick check-in view optimized for seeing today's changes.
     """
 
-    def __init__(self, snapshots: List[Dict[str, Any]], time_period: str = "7d"):
+    def __init__(
+        self,
+        today_snapshot: Optional[Dict[str, Any]],
+        panel: AssetPanel,
+        time_period: str = "7d"
+    ):
         """
         Initialize daily overview view.
 
         Args:
-            snapshots: List of portfolio snapshots
+            today_snapshot: Latest portfolio snapshot
+            panel: Asset panel rows of the time period
             time_period: Time period for sparkline context
         """
-        self.snapshots = snapshots
+        self.panel = panel
         self.time_period = time_period
-        self.today_snapshot = snapshots[-1] if snapshots else None
+        self.today_snapshot = today_snapshot
         self.yesterday_snapshot = daily_analysis.get_yesterday_snapshot()
 
     def generate(self) -> Dict[str, Any]:
@@ -156,13 +163,13 @@ class DailyOverviewView:
 
     def _create_sparkline(self) -> str:
         """Create 7-day portfolio value sparkline."""
-        # Get last 7 days of snapshots
-        recent_snapshots = self.snapshots[-7:] if len(self.snapshots) >= 7 else self.snapshots
+        # Get last 7 snapshots
+        recent = self.panel.tail(7)
 
-        values = [s["total_value_eur"] for s in recent_snapshots]
+        values = recent.totals.tolist()
         timestamps = [
-            datetime.fromisoformat(s["timestamp"].replace("Z", "+00:00")).strftime("%Y-%m-%d")
-            for s in recent_snapshots
+            datetime.fromisoformat(timestamp.replace("Z", "+00:00")).strftime("%Y-%m-%d")
+            for timestamp in recent.timestamps.tolist()
         ]
 
         return components.create_sparkline(values, timestamps, width=300, height=60)
@@ -0,0 +1,118 @@
+"""
+JSON encoding and decoding shared by every persistence path.
+
+Uses orjson when it is installed and the stdlib json module otherwise.
+Either way the stored data is equivalent JSON (it parses back to the same
+values), but not always the same bytes: orjson formats floats in exponent
+form differently (1e-7 where the stdlib writes 1e-07).
+
+    dumps(obj)               compact bytes, no whitespace (the default)
+    dumps(obj, pretty=True)  2-space indented bytes, for files people read
+    loads(data)              parse bytes or str
+    canonical_dumps(obj)     sorted-key text that content hashes are computed
+                             over; always the stdlib encoder, so hashes never
+                             depend on which library is installed
+
+Values orjson handles differently from the stdlib fall back to the stdlib
+encoder/decoder: NaN and Infinity (orjson writes null and rejects them when
+parsing), non-string keys, integers beyond 64 bits, float subclasses such as
+numpy scalars, and types the stdlib refuses (datetimes, dataclasses), which
+keep raising TypeError. Strings are never ASCII-escaped.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # Optional speedup, see pyproject.toml
+    orjson = None
+
+JSON_LIBRARY = "orjson" if orjson is not None else "json"
+
+_COMPACT_SEPARATORS = (",", ":")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def _refuse(obj: Any) -> Any:
+    """orjson default hook: hand anything non-native back to the stdlib encoder."""
+    raise TypeError(f"Object of type {type(obj).__name__} is not natively supported")
+
+
+def _lost_non_finite(obj: Any, data: bytes) -> bool:
+    """
+    Whether orjson's output dropped NaN/Infinity values from obj.
+
+    orjson writes them as null, so the output decodes to something unequal
+    to obj. Decoding and comparing run in C, far cheaper than re-encoding
+    with the stdlib or walking obj in Python; the rare false alarms (tuples
+    decode as lists) only cost the stdlib fallback.
+    """
+    return orjson.loads(data) != obj
+
+
+def _stdlib_dumps(obj: Any, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=_COMPACT_SEPARATORS).encode("utf-8")
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serialize a value to UTF-8 JSON.
+
+    Args:
+        obj: JSON-compatible value
+        pretty: Indent by 2 spaces (same layout as json.dumps(indent=2))
+
+    Returns:
+        bytes: Encoded JSON
+
+    Raises:
+        TypeError: If the value isn't JSON serializable
+    """
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, default=_refuse, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if pretty else 0))
+        except TypeError:  # orjson.JSONEncodeError is a TypeError
+            return _stdlib_dumps(obj, pretty)
+        # orjson writes NaN/Infinity as null; re-encode rather than lose them
+        # (only output containing null can hold one, so most payloads skip the check)
+        if b"null" not in data or not _lost_non_finite(obj, data):
+            return data
+    return _stdlib_dumps(obj, pretty)
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    Parse UTF-8 JSON.
+
+    Args:
+        data: Encoded JSON (bytes or str)
+
+    Returns:
+        Parsed value
+
+    Raises:
+        ValueError: If the data isn't valid JSON (json.JSONDecodeError)
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # Let the stdlib parse NaN/Infinity or raise its usual error
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def canonical_dumps(obj: Any) -> str:
+    """
+    Serialize a value the way content hashes are computed over.
+
+    Sorted keys, stdlib separators, no ASCII escaping. Unchanged from
+    earlier releases, so stored hashes stay valid.
+    """
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False)
@@ -22,6 +22,8 @@ from . import insider_trading
 from . import short_volume
 from .sell_validation import validate_sells_have_transactions, SellValidationError
 from .buy_validation import validate_buys_have_transactions, BuyValidationError
+from .snapshot_diff import SnapshotDiff
+from .transaction_index import TransactionIndex
 from .utils import sanitize_error_message
 
 # Configure logging
@@ -96,13 +98,14 @@ def get_portfolio_history_summary() -> str:
         str: Portfolio history summary
     """
     try:
-        all_snapshots = storage.get_all_snapshots()
+        # The metadata index has everything the summary needs
+        snapshot_index = storage.get_snapshot_index()
         
-        if not all_snapshots:
+        if not snapshot_index:
             return "No portfolio history available."
         
-        first_snapshot = all_snapshots[0]
-        latest_snapshot = all_snapshots[-1]
+        first_snapshot = snapshot_index[0]
+        latest_snapshot = snapshot_index[-1]
         
         first_date = first_snapshot.get('timestamp', 'Unknown')
         latest_date = latest_snapshot.get('timestamp', 'Unknown')
@@ -117,7 +120,7 @@ def get_portfolio_history_summary() -> str:
         
         return f"""📈 Portfolio History Summary
 
-**Total Snapshots:** {len(all_snapshots)}
+**Total Snapshots:** {len(snapshot_index)}
 **First Snapshot:** {first_date}
 **Latest Snapshot:** {latest_date}
 
@@ -993,9 +996,9 @@ def get_daily_overview() -> str:
         logger.info("Fetching daily portfolio overview...")
 
         # Get today's and yesterday's snapshots
-        all_snapshots = storage.get_all_snapshots()
+        today_snapshot = storage.get_latest_snapshot()
 
-        if not all_snapshots:
+        if not today_snapshot:
             return """# 📊 Daily Overview
 
 ## ⚠️ No Data Available
@@ -1003,7 +1006,6 @@ No portfolio snapshots found. Run portfolio analysis first.
 
 *Daily Overview by Investment MCP Agent*"""
 
-        today_snapshot = all_snapshots[-1]
         yesterday_snapshot = daily_analysis.get_yesterday_snapshot()
 
         if not yesterday_snapshot:
@@ -1121,18 +1123,43 @@ def get_storage_status() -> str:
             output_lines.append(f"**Primary (GCP):** {'✅ Available' if primary_avail else '❌ Unavailable'}")
             output_lines.append(f"**Fallback (Local):** {'✅ Available' if fallback_avail else '❌ Unavailable'}")
             output_lines.append(f"**Pending Syncs:** {pending_syncs}")
+            if pending_syncs > 0:
+                output_lines.append(f"**Replication Lag:** {status.get('replication_lag_seconds', 0.0):.0f}s")
+                if status.get('next_retry_at'):
+                    output_lines.append(f"**Next Retry:** {status['next_retry_at']}")
+            if status.get('dropped_syncs'):
+                output_lines.append(f"**Dropped Syncs:** {status['dropped_syncs']} (kept in local storage only)")
+            gcs_health = status.get('gcs_health')
+            if gcs_health and gcs_health.get('state') != 'closed':
+                retry_in = gcs_health.get('retry_in_seconds')
+                retry_note = f", next probe in {retry_in:.0f}s" if retry_in is not None else ""
+                output_lines.append(
+                    f"**GCP Circuit:** {gcs_health['state']} after "
+                    f"{gcs_health['consecutive_failures']} failures{retry_note}"
+                )
             output_lines.append(f"**Fully Synced:** {'✅ Yes' if fully_synced else '⚠️ No'}")
             output_lines.append("")
             
             if pending_syncs > 0:
                 output_lines.append("⚠️ **Warning:** Some snapshots are queued for GCP upload")
-                output_lines.append("They will be automatically synced when GCP becomes available")
+                output_lines.append("They are replicated in the background as soon as GCP is reachable")
                 output_lines.append("")
             
             if fully_synced and primary_avail:
                 output_lines.append("✅ **All Good:** Portfolio data is synced to cloud storage")
                 output_lines.append("")
         
+        # Snapshot cache statistics
+        cache = status.get("snapshot_cache")
+        if cache:
+            output_lines.append("## Snapshot Cache")
+            output_lines.append("")
+            output_lines.append(f"**Hits:** {cache.get('hits', 0)}")
+            output_lines.append(f"**Misses:** {cache.get('misses', 0)}")
+            output_lines.append(f"**Invalidations:** {cache.get('invalidations', 0)}")
+            output_lines.append(f"**Cached Snapshots:** {cache.get('cached_snapshots', 0)}")
+            output_lines.append("")
+        
         # Error handling
         if "error" in status:
             output_lines.append("## ❌ Error")
@@ -1144,7 +1171,7 @@ def get_storage_status() -> str:
         output_lines.append("")
         output_lines.append("**Storage Location:**")
         output_lines.append("- Primary: `gs://investment_snapshots/portfolio_history.json`")
-        output_lines.append("- Fallback: `./portfolio_history.json`")
+        output_lines.append("- Fallback: `./portfolio_history.jsonl` (or `./portfolio_history.db` with `storage.fallback: sqlite`)")
         
         return "\n".join(output_lines)
         
@@ -1236,8 +1263,9 @@ def delete_snapshot(index: int, confirm: bool = False) -> str:
     """
     Delete a specific snapshot from portfolio history.
     
-    **⚠️ WARNING:** This operation permanently deletes data from both GCP and local storage.
-    A timestamped backup is created before deletion.
+    **⚠️ WARNING:** This operation deletes data from both GCP and local storage.
+    The snapshot is marked as deleted; compact_history() later removes it
+    and keeps a backup (see list_backups() and restore_backup()).
     
     Args:
         index: 1-based index of snapshot to delete (use list_snapshots() to see indices)
@@ -1273,8 +1301,8 @@ def delete_snapshot(index: int, confirm: bool = False) -> str:
 **This action will:**
 - Delete the snapshot from GCP Cloud Storage
 - Delete the snapshot from local storage
-- Create timestamped backups before deletion
-- **Cannot be undone** (except by restoring from backup)
+- Keep it in a timestamped backup when history is next compacted
+- **Cannot be undone** (except by restoring a backup with restore_backup())
 
 **To confirm deletion, run:**
 ```
@@ -1304,12 +1332,11 @@ delete_snapshot(index={index}, confirm=True)
 - **Total Value:** €{deleted['total_value_eur']:,.2f}
 - **Assets:** {deleted['asset_count']}
 
-**Backups Created:**
-- Local: `./portfolio_history.json.bak.<timestamp>`
-- GCP: `gs://bucket/portfolio_history.json.bak.<timestamp>`
-
 **Remaining Snapshots:** {remaining}
 
+The snapshot is marked as deleted. Run `compact_history()` to remove it from
+storage (a timestamped backup is created then).
+
 Run `list_snapshots()` to see updated list.
 
 *Generated by Investment MCP Agent*"""
@@ -1325,6 +1352,353 @@ Run `list_snapshots()` to see updated list.
 *Generated by Investment MCP Agent*"""
 
 
+@mcp.tool()
+def sync_storage(direction: str = "both", dry_run: bool = True) -> str:
+    """
+    Reconcile portfolio history between GCP and local storage.
+    
+    Compares per-snapshot content hashes on both sides and transfers only
+    the snapshots that are missing or differ. Runs as a dry run unless
+    dry_run=False is passed.
+    
+    Args:
+        direction: "both" (copy missing snapshots each way),
+                   "push" (make GCP match local) or "pull" (make local match GCP)
+        dry_run: Only show what would change (default True)
+    
+    Examples:
+        sync_storage()
+        sync_storage(direction="both", dry_run=False)
+        sync_storage(direction="pull", dry_run=False)
+    
+    Returns:
+        str: Reconciliation plan and transfer statistics
+    """
+    try:
+        logger.info(f"Storage sync request: direction={direction}, dry_run={dry_run}")
+        
+        result = storage.sync_storage(direction=direction, dry_run=dry_run)
+        
+        if not result.get("success") and "to_primary" not in result:
+            return f"""# ❌ Storage Sync Failed
+
+{result.get('error', 'Unknown error')}
+
+*Generated by Investment MCP Agent*"""
+        
+        title = "🔍 Storage Sync Plan (Dry Run)" if result["dry_run"] else "🔄 Storage Sync"
+        output_lines = [
+            f"# {title}",
+            "",
+            f"**Direction:** {result['direction']}",
+            f"**GCP Snapshots:** {result['primary_count']}",
+            f"**Local Snapshots:** {result['fallback_count']}",
+            f"**In Sync:** {result['in_sync_count']}",
+            ""
+        ]
+        
+        changes = [
+            ("Copy to GCP", result["to_primary"]),
+            ("Copy to Local", result["to_fallback"]),
+            ("Remove from GCP", result["remove_from_primary"]),
+            ("Remove from Local", result["remove_from_fallback"]),
+        ]
+        if not any(entries for _, entries in changes) and not result["divergent"]:
+            output_lines.append("✅ **Already in sync:** Both sides hold the same snapshots")
+            output_lines.append("")
+        
+        for label, entries in changes:
+            if not entries:
+                continue
+            output_lines.append(f"## {label} ({len(entries)})")
+            output_lines.append("")
+            for entry in entries[:20]:
+                output_lines.append(f"- {entry.get('timestamp')} (€{entry.get('total_value_eur') or 0.0:,.2f})")
+            if len(entries) > 20:
+                output_lines.append(f"- ... and {len(entries) - 20} more")
+            output_lines.append("")
+        
+        if result["divergent"]:
+            output_lines.append(f"## ⚠️ Divergent Snapshots ({len(result['divergent'])})")
+            output_lines.append("")
+            output_lines.append("Same timestamp, different contents on each side:")
+            for item in result["divergent"][:20]:
+                output_lines.append(f"- {item['timestamp']}")
+            if result["direction"] == "both":
+                output_lines.append("")
+                output_lines.append("Left unchanged. Use `direction=\"push\"` (keep local) or `\"pull\"` (keep GCP) to resolve.")
+            output_lines.append("")
+        
+        if result["dry_run"]:
+            output_lines.append("**To apply:** `sync_storage(direction=\"" + result["direction"] + "\", dry_run=False)`")
+        elif result.get("success"):
+            transferred = result["transferred"]
+            output_lines.extend([
+                "## Transfer Statistics",
+                "",
+                f"**Copied to GCP:** {transferred['to_primary']}",
+                f"**Copied to Local:** {transferred['to_fallback']}",
+                f"**Removed:** {transferred['removed_from_primary'] + transferred['removed_from_fallback']}",
+                f"**Transferred:** {transferred['bytes'] / 1024:,.1f} KB",
+                f"**Duration:** {result['duration_seconds']:.2f}s"
+            ])
+        else:
+            output_lines.append("## ❌ Error")
+            output_lines.append("")
+            output_lines.append(result.get("error", "Unknown error"))
+        
+        output_lines.extend(["", "*Generated by Investment MCP Agent*"])
+        return "\n".join(output_lines)
+        
+    except Exception as e:
+        error_msg = f"Failed to sync storage: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return f"""# ❌ Storage Sync Failed
+
+## Error
+{error_msg}
+
+*Generated by Investment MCP Agent*"""
+
+
+@mcp.tool()
+def compact_history(keep_backups: int = -1) -> str:
+    """
+    Remove deleted snapshots from storage and prune old backups.
+    
+    Deletes only mark snapshots as deleted. Compaction rewrites the history
+    once per backend (local and GCP), backing it up first, and keeps only
+    the most recent backups. It also runs automatically during the weekly
+    analysis once storage.compact_after_deletes deletes are pending.
+    
+    Args:
+        keep_backups: Backups to keep (default: storage.keep_backups from config)
+    
+    Examples:
+        compact_history()
+        compact_history(keep_backups=10)
+    
+    Returns:
+        str: Compaction statistics
+    """
+    try:
+        logger.info(f"Compact history request: keep_backups={keep_backups}")
+        
+        result = storage.compact_history(keep_backups=keep_backups if keep_backups >= 0 else None)
+        
+        if not result.get("success"):
+            return f"""# ❌ History Compaction Failed
+
+{result.get('error', 'Unknown error')}
+
+*Generated by Investment MCP Agent*"""
+        
+        output_lines = [
+            "# 🧹 History Compacted",
+            "",
+            f"**Deleted Snapshots Removed:** {result['removed_snapshots']}",
+            f"**Old Backups Removed:** {result['backups_removed']}",
+        ]
+        if "bytes_before" in result:
+            freed = result["bytes_before"] - result["bytes_after"]
+            output_lines.append(f"**Space Freed:** {freed / 1024:,.1f} KB")
+        
+        primary = result.get("primary")
+        if "primary" in result and primary is None:
+            output_lines.append("")
+            output_lines.append("⚠️ GCP storage unavailable: only local storage was compacted.")
+        elif primary is not None and not primary.get("success"):
+            output_lines.append("")
+            output_lines.append(f"⚠️ GCP compaction failed: {primary.get('error', 'Unknown error')}")
+        
+        output_lines.extend(["", "*Generated by Investment MCP Agent*"])
+        return "\n".join(output_lines)
+        
+    except Exception as e:
+        error_msg = f"Failed to compact history: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return f"""# ❌ History Compaction Failed
+
+## Error
+{error_msg}
+
+*Generated by Investment MCP Agent*"""
+
+
+@mcp.tool()
+def list_backups() -> str:
+    """
+    List history backups that restore_backup() can restore.
+    
+    Local and SQLite storage back up the history before compaction,
+    deletes and replacements. Backups share unchanged snapshots, so
+    keeping many of them costs little space.
+    
+    Returns:
+        str: Backups, newest first
+    """
+    try:
+        backups = storage.list_backups()
+        
+        if not backups:
+            return """# 🗄️ History Backups
+
+No backups found.
+
+*Generated by Investment MCP Agent*"""
+        
+        output_lines = [
+            "# 🗄️ History Backups",
+            "",
+            "| Backup ID | Created | Reason | Snapshots | Deleted |",
+            "|-----------|---------|--------|-----------|---------|",
+        ]
+        for backup in backups:
+            output_lines.append(
+                f"| {backup['id']} | {backup['created_at']} | {backup['reason']} | "
+                f"{backup['count']} | {backup['deleted_count']} |"
+            )
+        output_lines.extend([
+            "",
+            "Restore one with `restore_backup(backup_id=\"...\", confirm=True)`.",
+            "",
+            "*Generated by Investment MCP Agent*",
+        ])
+        return "\n".join(output_lines)
+        
+    except Exception as e:
+        error_msg = f"Failed to list backups: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return f"""# ❌ Listing Backups Failed
+
+## Error
+{error_msg}
+
+*Generated by Investment MCP Agent*"""
+
+
+@mcp.tool()
+def restore_backup(backup_id: str, include_deleted: bool = False, confirm: bool = False) -> str:
+    """
+    Replace the portfolio history with a backup.
+    
+    **⚠️ WARNING:** This replaces the current history. It is backed up
+    first, so the restore itself can be undone from list_backups().
+    
+    Args:
+        backup_id: Backup to restore (use list_backups() to see IDs)
+        include_deleted: Also restore the snapshot a delete backup was taken for
+        confirm: Must be True to execute the restore (safety check)
+    
+    Examples:
+        restore_backup(backup_id="20250101-100000-000000-compact", confirm=True)
+    
+    Returns:
+        str: Restore status message
+    """
+    try:
+        logger.info(f"Restore backup request: backup_id={backup_id}, confirm={confirm}")
+        
+        result = storage.restore_backup(backup_id, include_deleted=include_deleted, confirm=confirm)
+        
+        if not result.get("success"):
+            return f"""# ❌ Backup Restore Failed
+
+{result.get('error', 'Unknown error')}
+
+*Generated by Investment MCP Agent*"""
+        
+        output_lines = [
+            "# ♻️ Backup Restored",
+            "",
+            f"**Backup:** {result['backup_id']}",
+            f"**Snapshots Restored:** {result['restored_snapshots']}",
+        ]
+        if result.get("primary_synced") is False:
+            output_lines.append("")
+            output_lines.append("⚠️ GCP storage was not updated; run sync_storage(direction=\"push\", dry_run=False) later.")
+        
+        output_lines.extend(["", "*Generated by Investment MCP Agent*"])
+        return "\n".join(output_lines)
+        
+    except Exception as e:
+        error_msg = f"Failed to restore backup: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return f"""# ❌ Backup Restore Failed
+
+## Error
+{error_msg}
+
+*Generated by Investment MCP Agent*"""
+
+
+@mcp.tool()
+def apply_retention(dry_run: bool = True) -> str:
+    """
+    Thin out old portfolio history according to the retention policy.
+    
+    Uses storage.retention.tiers in config.yaml (e.g. every snapshot for
+    90 days, then daily, then weekly). Snapshots around sell/buy
+    transactions are always kept, and every year that loses snapshots is
+    archived at full resolution first. Runs as a dry run unless
+    dry_run=False is passed; the weekly analysis applies it automatically.
+    
+    Args:
+        dry_run: Only show what would be dropped (default True)
+    
+    Examples:
+        apply_retention()
+        apply_retention(dry_run=False)
+    
+    Returns:
+        str: Retention statistics
+    """
+    try:
+        logger.info(f"Retention request: dry_run={dry_run}")
+        
+        result = storage.apply_retention(dry_run=dry_run)
+        
+        if not result.get("success"):
+            return f"""# ❌ Retention Failed
+
+{result.get('error', 'Unknown error')}
+
+*Generated by Investment MCP Agent*"""
+        
+        title = "🔍 Retention Plan (Dry Run)" if result["dry_run"] else "🗜️ Retention Applied"
+        output_lines = [
+            f"# {title}",
+            "",
+            f"**Snapshots:** {result['total']}",
+            f"**Kept:** {result['kept']} ({result['protected']} around transactions)",
+            f"**Dropped:** {result['dropped']}",
+            "",
+            "| Tier | Kept | Dropped |",
+            "|------|------|---------|",
+        ]
+        for label, counts in result["by_tier"].items():
+            output_lines.append(f"| {label} | {counts['kept']} | {counts['dropped']} |")
+        
+        if result["archived"]:
+            output_lines.append("")
+            output_lines.append("**Archived:** " + ", ".join(
+                f"{year} (+{added})" for year, added in sorted(result["archived"].items())
+            ))
+        
+        output_lines.extend(["", "*Generated by Investment MCP Agent*"])
+        return "\n".join(output_lines)
+    
+    except Exception as e:
+        error_msg = f"Failed to apply retention: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return f"""# ❌ Retention Failed
+
+## Error
+{error_msg}
+
+*Generated by Investment MCP Agent*"""
+
+
 def _run_weekly_analysis() -> str:
     """
     Core function that performs the weekly portfolio analysis workflow.
@@ -1374,6 +1748,13 @@ def _run_weekly_analysis() -> str:
         logger.info("Creating portfolio snapshot...")
         current_snapshot = analysis.create_portfolio_snapshot(normalized_data)
         
+        # Index transactions once for validation and comparison
+        sell_index = TransactionIndex(sell_transactions)
+        buy_index = TransactionIndex(buy_transactions, "buy transaction")
+        
+        # Diff the snapshots once for validation and comparison
+        snapshot_diff = SnapshotDiff.compute(current_snapshot, previous_snapshot) if previous_snapshot else None
+        
         # VALIDATE: Check sells and buys have matching transactions (if previous snapshot exists)
         if previous_snapshot:
             logger.info("Validating sell transactions...")
@@ -1381,7 +1762,8 @@ def _run_weekly_analysis() -> str:
                 validate_sells_have_transactions(
                     current_snapshot=current_snapshot,
                     previous_snapshot=previous_snapshot,
-                    transactions=sell_transactions
+                    transactions=sell_index,
+                    diff=snapshot_diff
                 )
                 logger.info("✓ Sell validation passed")
             except SellValidationError as e:
@@ -1394,7 +1776,8 @@ def _run_weekly_analysis() -> str:
                 validate_buys_have_transactions(
                     current_snapshot=current_snapshot,
                     previous_snapshot=previous_snapshot,
-                    buy_transactions=buy_transactions
+                    buy_transactions=buy_index,
+                    diff=snapshot_diff
                 )
                 logger.info("✓ Buy validation passed")
             except BuyValidationError as e:
@@ -1420,6 +1803,22 @@ def _run_weekly_analysis() -> str:
         storage.save_snapshot(current_snapshot)
         logger.info("Snapshot saved successfully")
         
+        # Drop deleted snapshots once enough have accumulated
+        try:
+            compaction = storage.compact_history_if_due()
+            if compaction is not None and not compaction.get("success"):
+                logger.warning(f"History compaction failed: {compaction.get('error')}")
+        except Exception as e:
+            logger.warning(f"History compaction failed: {e}")
+        
+        # Thin out old history according to the retention policy
+        try:
+            retention_result = storage.apply_retention_if_due()
+            if retention_result is not None and not retention_result.get("success"):
+                logger.warning(f"History retention failed: {retention_result.get('error')}")
+        except Exception as e:
+            logger.warning(f"History retention failed: {e}")
+        
         # Generate dashboard after snapshot is saved
         dashboard_link = ""
         try:
@@ -1446,8 +1845,9 @@ def _run_weekly_analysis() -> str:
             report_data = analysis.compare_snapshots(
                 current_snapshot,
                 previous_snapshot,
-                sell_transactions,
-                buy_transactions
+                sell_index,
+                buy_index,
+                diff=snapshot_diff
             )
             
             # Generate markdown report
@@ -12,6 +12,8 @@ from typing import Dict, List, Any, Optional
 from . import sheets_connector
 from . import storage
 from . import analysis
+from .snapshot_diff import SnapshotDiff
+from .storage_backend import snapshot_epoch
 from . import events_tracker
 from . import insider_trading
 
@@ -190,25 +192,22 @@ def get_quick_analysis_json(winners_losers_limit: int = 5) -> Dict[str, Any]:
         buy_transactions = transactions_data.get("buy_transactions", [])
         
         # 4. Compare live data vs latest snapshot
+        diff = SnapshotDiff.compute(current_live_snapshot, latest_snapshot)
         comparison = analysis.compare_snapshots(
             current_live_snapshot,
             latest_snapshot,
             sell_transactions,
-            buy_transactions
+            buy_transactions,
+            diff=diff
         )
         
         # 5. Build winners list with enriched data
         winners = []
         for mover in comparison.get("top_movers", [])[:winners_losers_limit]:
-            # Find asset in current live data
-            current_asset = next(
-                (a for a in current_normalized if a["name"] == mover["name"]),
-                None
-            )
-            snapshot_asset = next(
-                (a for a in latest_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            # Movers are held assets: in both the live data and the snapshot
+            change = diff.changes[mover["name"]]
+            current_asset = change.current
+            snapshot_asset = change.previous
             
             if current_asset and snapshot_asset:
                 current_val = current_asset.get("current_value_eur", 0)
@@ -226,14 +225,9 @@ def get_quick_analysis_json(winners_losers_limit: int = 5) -> Dict[str, Any]:
         # 5. Build losers list
         losers = []
         for mover in comparison.get("bottom_movers", [])[:winners_losers_limit]:
-            current_asset = next(
-                (a for a in current_normalized if a["name"] == mover["name"]),
-                None
-            )
-            snapshot_asset = next(
-                (a for a in latest_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            change = diff.changes[mover["name"]]
+            current_asset = change.current
+            snapshot_asset = change.previous
             
             if current_asset and snapshot_asset:
                 current_val = current_asset.get("current_value_eur", 0)
@@ -249,9 +243,8 @@ def get_quick_analysis_json(winners_losers_limit: int = 5) -> Dict[str, Any]:
                 })
         
         # 6. Calculate time since snapshot
-        snapshot_time = datetime.fromisoformat(latest_snapshot["timestamp"])
         current_time = datetime.now(timezone.utc)
-        days_ago = (current_time - snapshot_time).days
+        days_ago = int((current_time.timestamp() - snapshot_epoch(latest_snapshot)) // 86400)
         
         # 7. Portfolio value comparison
         current_total = current_live_snapshot.get("total_value_eur", 0)
@@ -319,17 +312,17 @@ def get_winners_losers_json(limit: int = 5) -> Dict[str, Any]:
         dict: Winners/losers between last 2 snapshots
     """
     try:
-        all_snapshots = storage.get_all_snapshots()
+        # The two newest snapshots, from the cached timestamp index
+        latest_snapshots = storage.get_timestamp_index().latest(2)
         
-        if len(all_snapshots) < 2:
+        if len(latest_snapshots) < 2:
             return {
                 "success": False,
                 "error": "Need at least 2 snapshots for comparison. Run portfolio_analysis() to create snapshots.",
                 "data": None
             }
         
-        current = all_snapshots[-1]
-        previous = all_snapshots[-2]
+        previous, current = latest_snapshots
         
         # Load transactions for comparison
         transactions_data = storage.get_transactions()
@@ -337,24 +330,21 @@ def get_winners_losers_json(limit: int = 5) -> Dict[str, Any]:
         buy_transactions = transactions_data.get("buy_transactions", [])
         
         # Perform comparison
+        diff = SnapshotDiff.compute(current, previous)
         report = analysis.compare_snapshots(
             current,
             previous,
             sell_transactions,
-            buy_transactions
+            buy_transactions,
+            diff=diff
         )
         
         # Extract and enrich winners data
         winners = []
         for mover in report.get("top_movers", [])[:limit]:
-            asset = next(
-                (a for a in current.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
-            prev_asset = next(
-                (a for a in previous.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            change = diff.changes[mover["name"]]
+            asset = change.current
+            prev_asset = change.previous
             
             if asset and prev_asset:
                 current_val = asset.get("current_value_eur", 0)
@@ -372,14 +362,9 @@ def get_winners_losers_json(limit: int = 5) -> Dict[str, Any]:
         # Extract and enrich losers data
         losers = []
         for mover in report.get("bottom_movers", [])[:limit]:
-            asset = next(
-                (a for a in current.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
-            prev_asset = next(
-                (a for a in previous.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            change = diff.changes[mover["name"]]
+            asset = change.current
+            prev_asset = change.previous
             
             if asset and prev_asset:
                 current_val = asset.get("current_value_eur", 0)
@@ -395,9 +380,7 @@ def get_winners_losers_json(limit: int = 5) -> Dict[str, Any]:
                 })
         
         # Calculate time period
-        from_time = datetime.fromisoformat(previous["timestamp"])
-        to_time = datetime.fromisoformat(current["timestamp"])
-        days_diff = (to_time - from_time).days
+        days_diff = int((snapshot_epoch(current) - snapshot_epoch(previous)) // 86400)
         
         return {
             "success": True,
@@ -0,0 +1,214 @@
+"""
+History Retention Module
+
+Thins out old snapshot history according to a tiered policy, e.g.
+
+    keep everything for 90 days, then one snapshot per day,
+    after a year one per week, after three years one per month
+
+Each tier applies to snapshots at least `after_days` old and keeps the last
+snapshot of every day, ISO week or month. Snapshots younger than the first
+tier are all kept, as are snapshots without a parseable timestamp.
+
+Sell/buy validation compares consecutive snapshots and matches transactions
+dated within (previous, current]. So that every transaction still falls
+between the same two snapshots, the last snapshot before and the first
+snapshot at or after each transaction date are always kept.
+
+Before anything is dropped, every snapshot of the affected years is copied
+to the backend's per-year archive (see backends/archive.py), so thinning
+the hot history never loses data.
+"""
+
+import bisect
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .storage_backend import StorageBackend, compute_snapshot_hash, timestamp_to_epoch
+from .backends.archive import group_by_year
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("daily", "weekly", "monthly")
+
+
+def period_key(epoch: float, resolution: str) -> Any:
+    """
+    Return the UTC day, ISO week or month an instant falls into.
+
+    Args:
+        epoch: POSIX seconds
+        resolution: "daily", "weekly" or "monthly"
+
+    Returns:
+        Hashable period key
+
+    Raises:
+        ValueError: If resolution is unknown
+    """
+    moment = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    if resolution == "daily":
+        return moment.date()
+    if resolution == "weekly":
+        iso_year, iso_week, _ = moment.isocalendar()
+        return (iso_year, iso_week)
+    if resolution == "monthly":
+        return (moment.year, moment.month)
+    raise ValueError(f"Unknown retention resolution '{resolution}' (expected one of {RESOLUTIONS})")
+
+
+def plan_retention(
+    index: List[Dict[str, Any]],
+    tiers: List[Dict[str, Any]],
+    now: float,
+    transaction_dates: Iterable[str] = ()
+) -> Dict[str, Any]:
+    """
+    Work out which snapshots a retention policy keeps.
+
+    Args:
+        index: Snapshot index as returned by get_snapshot_index()
+        tiers: [{"after_days": int, "keep": "daily" | "weekly" | "monthly"}]
+        now: Current time (POSIX seconds) that ages are measured from
+        transaction_dates: ISO dates of sell/buy transactions
+
+    Returns:
+        dict: {
+            "keep": positions (in index) of kept snapshots, ascending,
+            "drop": positions of dropped snapshots, ascending,
+            "protected": snapshots kept only because they bound a transaction,
+            "by_tier": {tier label: {"kept": int, "dropped": int}}
+        }
+
+    Raises:
+        ValueError: If a tier has an unknown resolution
+    """
+    tiers = sorted(tiers, key=lambda tier: tier["after_days"])
+    for tier in tiers:
+        if tier["keep"] not in RESOLUTIONS:
+            raise ValueError(f"Unknown retention resolution '{tier['keep']}' (expected one of {RESOLUTIONS})")
+
+    timed = sorted(
+        (entry["epoch"], position) for position, entry in enumerate(index) if entry.get("epoch") is not None
+    )
+    keep = {position for position, entry in enumerate(index) if entry.get("epoch") is None}
+    if timed:
+        keep.add(timed[-1][1])  # The latest snapshot is always kept
+
+    # Step 1: The last snapshot of each period, per tier
+    by_tier: Dict[str, Dict[str, int]] = {"all": {"kept": 0, "dropped": 0}}
+    tier_of = {}
+    buckets: Dict[Any, int] = {}
+    for epoch, position in timed:
+        age_days = (now - epoch) / 86400
+        tier = None
+        for candidate in tiers:
+            if age_days >= candidate["after_days"]:
+                tier = candidate
+        if tier is None:
+            tier_of[position] = "all"
+            keep.add(position)
+            continue
+        label = f"{tier['keep']} after {tier['after_days']}d"
+        tier_of[position] = label
+        by_tier.setdefault(label, {"kept": 0, "dropped": 0})
+        buckets[(label, period_key(epoch, tier["keep"]))] = position  # Later snapshots replace earlier ones
+    keep.update(buckets.values())
+
+    # Step 2: Snapshots around transactions, so validation windows stay the same
+    protected = set()
+    epochs = [epoch for epoch, _ in timed]
+    for date in transaction_dates:
+        txn_epoch = timestamp_to_epoch(date)
+        if txn_epoch is None:
+            continue
+        after = bisect.bisect_left(epochs, txn_epoch)
+        for i in (after - 1, after):
+            if 0 <= i < len(timed) and timed[i][1] not in keep:
+                protected.add(timed[i][1])
+    keep |= protected
+
+    for position, label in tier_of.items():
+        by_tier[label]["kept" if position in keep else "dropped"] += 1
+
+    return {
+        "keep": sorted(keep),
+        "drop": sorted(set(range(len(index))) - keep),
+        "protected": len(protected),
+        "by_tier": by_tier,
+    }
+
+
+def apply_retention(
+    backend: StorageBackend,
+    tiers: List[Dict[str, Any]],
+    transaction_dates: Iterable[str] = (),
+    now: Optional[float] = None,
+    dry_run: bool = True,
+    archive: bool = True
+) -> Dict[str, Any]:
+    """
+    Thin out a backend's history according to a retention policy.
+
+    The full history of every year that loses snapshots is archived first;
+    if archiving fails nothing is dropped. The thinned history is then
+    written in one rewrite (replace_history, which backs up the previous
+    history).
+
+    Args:
+        backend: Storage backend to compact
+        tiers: Retention tiers (see plan_retention)
+        transaction_dates: ISO dates of sell/buy transactions
+        now: Current time in POSIX seconds (defaults to the wall clock)
+        dry_run: Only plan, change nothing
+        archive: Archive affected years before dropping snapshots
+
+    Returns:
+        dict: {"success", "dry_run", "total", "kept", "dropped", "protected",
+               "by_tier", "archived": {year: snapshots added}} or an "error"
+
+    Raises:
+        NotImplementedError: If the backend can't replace history or archive
+    """
+    # Step 1: Plan from the index (no snapshot payloads)
+    index = backend.get_snapshot_index()
+    plan = plan_retention(index, tiers, time.time() if now is None else now, list(transaction_dates))
+    result = {
+        "success": True,
+        "dry_run": dry_run,
+        "total": len(index),
+        "kept": len(plan["keep"]),
+        "dropped": len(plan["drop"]),
+        "protected": plan["protected"],
+        "by_tier": plan["by_tier"],
+        "archived": {},
+    }
+    logger.info(
+        f"Retention plan: keep {result['kept']} of {result['total']} snapshots "
+        f"({result['protected']} around transactions), drop {result['dropped']}"
+    )
+    if dry_run or not plan["drop"]:
+        return result
+
+    # Step 2: Load the history the plan was made for
+    snapshots = backend.get_all_snapshots()
+    if [compute_snapshot_hash(snapshot) for snapshot in snapshots] != [entry.get("hash") for entry in index]:
+        return {**result, "success": False, "error": "History changed while planning retention, try again"}
+
+    # Step 3: Archive every snapshot of the years losing snapshots
+    if archive:
+        dropped_years = set(group_by_year([snapshots[position] for position in plan["drop"]]))
+        to_archive = [s for year, items in group_by_year(snapshots).items() if year in dropped_years for s in items]
+        archived = backend.archive_snapshots(to_archive)
+        if not archived.get("success"):
+            return {**result, "success": False, "error": f"Archiving failed, nothing dropped: {archived.get('error')}"}
+        result["archived"] = archived.get("years", {})
+
+    # Step 4: Rewrite the history without the dropped snapshots
+    if not backend.replace_history([snapshots[position] for position in plan["keep"]]):
+        return {**result, "success": False, "error": "Failed to rewrite history. Check logs for details."}
+
+    logger.info(f"Retention: Dropped {result['dropped']} snapshots, {result['kept']} remain")
+    return result
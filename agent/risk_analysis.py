@@ -5,7 +5,6 @@ Calculates comprehensive risk metrics including beta, VaR,
 concentration risk, correlations, and volatility.
 """
 
-import json
 import os
 import re
 import time
@@ -19,6 +18,8 @@ import pandas as pd
 from scipy import stats
 import requests
 
+from .json_codec import dumps, loads
+
 logger = logging.getLogger(__name__)
 
 CACHE_DIR = "cache"
@@ -158,8 +159,8 @@ def fetch_historical_prices(ticker: str, api_key: str, lookback_days: int = 365)
     
     if is_cache_valid(cache_path):
         try:
-            with open(cache_path, 'r') as f:
-                cached_data = json.load(f)
+            with open(cache_path, 'rb') as f:
+                cached_data = loads(f.read())
             df = pd.DataFrame(cached_data)
             df['date'] = pd.to_datetime(df['date'])
             logger.info(f"Loaded cached prices for {ticker}")
@@ -210,11 +211,11 @@ def fetch_historical_prices(ticker: str, api_key: str, lookback_days: int = 365)
         df = df[df['date'] >= cutoff_date.replace(tzinfo=None)]
         
         try:
-            with open(cache_path, 'w') as f:
+            with open(cache_path, 'wb') as f:
                 cache_data = df.to_dict('records')
                 for record in cache_data:
                     record['date'] = record['date'].isoformat()
-                json.dump(cache_data, f, indent=2)
+                f.write(dumps(cache_data))
             logger.info(f"Cached {len(df)} days of prices for {ticker}")
         except Exception as e:
             logger.warning(f"Failed to cache prices for {ticker}: {e}")
@@ -684,8 +685,8 @@ def analyze_portfolio_risk(portfolio_assets: List[Dict[str, Any]]) -> Dict[str,
             if category not in ['Cash', 'Pension', 'Bonds']:
                 asset_name = asset.get('name', '')
                 if asset_name in ticker_map:
-                    asset['ticker'] = ticker_map[asset_name]
-                    stock_assets.append(asset)
+                    # Copy: snapshot assets are shared with the storage cache
+                    stock_assets.append({**asset, 'ticker': ticker_map[asset_name]})
         
         logger.info(f"Analyzing {len(stock_assets)} stock positions out of {len(portfolio_assets)} total assets")
         
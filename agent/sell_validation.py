@@ -4,11 +4,13 @@ Sell Transaction Validation
 Ensures all detected sells have corresponding transaction records.
 """
 
-from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 from dataclasses import dataclass
 import logging
 
+from .snapshot_diff import SnapshotDiff
+from .transaction_index import TransactionIndex, snapshot_period
+
 logger = logging.getLogger(__name__)
 
 
@@ -85,7 +87,8 @@ class SellValidationError(Exception):
 def detect_sells(
     current_snapshot: Dict[str, Any],
     previous_snapshot: Dict[str, Any],
-    threshold: float = 1.0
+    threshold: float = 1.0,
+    diff: Optional[SnapshotDiff] = None
 ) -> List[DetectedSell]:
     """
     Detect sell positions by comparing snapshots.
@@ -94,33 +97,28 @@ def detect_sells(
         current_snapshot: Current portfolio snapshot
         previous_snapshot: Previous portfolio snapshot
         threshold: Minimum quantity change to consider a sell (default: 1.0 share)
+        diff: SnapshotDiff of the two snapshots, if already computed
     
     Returns:
         List of DetectedSell objects
     """
-    # Build asset dictionaries
-    current_assets = {
-        asset["name"]: asset 
-        for asset in current_snapshot.get("assets", [])
-    }
-    previous_assets = {
-        asset["name"]: asset 
-        for asset in previous_snapshot.get("assets", [])
-    }
+    # Match assets by name (or reuse the caller's diff)
+    diff = SnapshotDiff.of(current_snapshot, previous_snapshot, diff)
     
     detected_sells = []
     
     # Check all assets from previous snapshot
-    for name, prev_asset in previous_assets.items():
+    for name, prev_asset in diff.previous_assets.items():
         # Skip non-tradable categories
         category = prev_asset.get("category", "")
         if category in ["Pension", "Cash"]:
             continue
         
-        previous_qty = prev_asset.get("quantity", 0.0)
-        current_qty = current_assets.get(name, {}).get("quantity", 0.0)
+        change = diff.changes[name]
+        previous_qty = change.previous_quantity
+        current_qty = change.current_quantity
         
-        qty_change = current_qty - previous_qty
+        qty_change = change.quantity_change
         
         # Detect sells (quantity decreased by at least threshold)
         if qty_change <= -threshold:
@@ -140,53 +138,30 @@ def detect_sells(
 
 
 def find_matching_transactions(
-    transactions: List[Dict[str, Any]],
+    transactions: Union[TransactionIndex, List[Dict[str, Any]]],
     asset_name: str,
-    previous_date: str,
-    current_date: str
+    previous_date: Union[str, float],
+    current_date: Union[str, float]
 ) -> List[Dict[str, Any]]:
     """
     Find transactions matching asset name within date range.
     
     Args:
-        transactions: List of all parsed transactions
+        transactions: TransactionIndex over the sell transactions (or the
+            list of parsed transactions, indexed on the fly)
         asset_name: Asset name to match (case-sensitive exact match)
-        previous_date: Start of period (ISO format, exclusive)
-        current_date: End of period (ISO format, inclusive)
+        previous_date: Start of period (ISO format or POSIX seconds, exclusive)
+        current_date: End of period (ISO format or POSIX seconds, inclusive)
     
     Returns:
         List of matching transaction dicts
     """
-    # Parse date strings
-    prev_dt = datetime.fromisoformat(previous_date.replace('Z', '+00:00'))
-    curr_dt = datetime.fromisoformat(current_date.replace('Z', '+00:00'))
-    
-    matching = []
-    for txn in transactions:
-        # Match asset name (case-sensitive exact match)
-        txn_name = txn.get("asset_name", "")
-        if txn_name != asset_name:
-            continue
-        
-        # Check date range: previous < txn_date <= current
-        txn_date_str = txn.get("date")
-        if not txn_date_str:
-            continue
-        
-        # Parse transaction date
-        try:
-            txn_date = datetime.fromisoformat(txn_date_str.replace('Z', '+00:00'))
-        except (ValueError, AttributeError):
-            logger.warning(f"Invalid date format in transaction: {txn_date_str}")
-            continue
-        
-        # Check if within range
-        if prev_dt < txn_date <= curr_dt:
-            matching.append(txn)
-            logger.debug(
-                f"Matched transaction: {asset_name} - {txn.get('quantity', 0):.0f} shares "
-                f"on {txn_date.date()}"
-            )
+    matching = TransactionIndex.of(transactions, "transaction").find(asset_name, previous_date, current_date)
+    for txn in matching:
+        logger.debug(
+            f"Matched transaction: {asset_name} - {txn.get('quantity', 0):.0f} shares "
+            f"on {str(txn['date'])[:10]}"
+        )
     
     return matching
 
@@ -194,7 +169,8 @@ def find_matching_transactions(
 def validate_sells_have_transactions(
     current_snapshot: Dict[str, Any],
     previous_snapshot: Dict[str, Any],
-    transactions: List[Dict[str, Any]]
+    transactions: Union[TransactionIndex, List[Dict[str, Any]]],
+    diff: Optional[SnapshotDiff] = None
 ) -> None:
     """
     Validates that all detected sells have matching transactions.
@@ -202,13 +178,14 @@ def validate_sells_have_transactions(
     Args:
         current_snapshot: Current portfolio snapshot
         previous_snapshot: Previous portfolio snapshot  
-        transactions: List of parsed transactions
+        transactions: Parsed sell transactions (list or TransactionIndex)
+        diff: SnapshotDiff of the two snapshots, if already computed
     
     Raises:
         SellValidationError: If any sell lacks matching transaction
     """
     # Detect all sells
-    detected_sells = detect_sells(current_snapshot, previous_snapshot)
+    detected_sells = detect_sells(current_snapshot, previous_snapshot, diff=diff)
     
     if not detected_sells:
         logger.info("No sells detected, validation passed")
@@ -217,6 +194,8 @@ def validate_sells_have_transactions(
     logger.info(f"Validating {len(detected_sells)} detected sell(s) against transactions")
     
     # Validate each sell
+    transactions = TransactionIndex.of(transactions)
+    period_start, period_end = snapshot_period(previous_snapshot, current_snapshot)
     missing_transactions = []
     
     for sell in detected_sells:
@@ -224,8 +203,8 @@ def validate_sells_have_transactions(
         matching_txns = find_matching_transactions(
             transactions=transactions,
             asset_name=sell.asset_name,
-            previous_date=previous_snapshot["timestamp"],
-            current_date=current_snapshot["timestamp"]
+            previous_date=period_start,
+            current_date=period_end
         )
         
         # Sum transaction quantities
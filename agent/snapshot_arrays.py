@@ -0,0 +1,177 @@
+"""
+Batch Snapshot Comparison
+
+NumPy versions of the per-asset arithmetic in analysis.compare_snapshots and
+daily_analysis.calculate_daily_changes for every consecutive pair of a
+history at once (e.g. attribution studies over the whole history). The
+history is aligned once, as an AssetPanel; changes and percentages are
+computed for all pairs as (pairs × assets) matrices, and top/bottom movers
+are picked for all pairs with one argpartition instead of sorting every
+asset of every pair.
+
+Pair i compares panel rows i (previous) and i + 1 (current), in history
+order. Single comparisons keep using the loops, which don't need a panel.
+
+Values match the loops: the matrices use the same float64 operations in
+the same order, and rounding matches Python's round() (see
+round_like_python). Two differences follow from the panel's layout: movers
+with equal changes are listed in panel column order (first appearance in
+the history) rather than the current snapshot's order, and a snapshot
+listing a name twice contributes only its last entry.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .asset_panel import AssetPanel
+
+# Top and bottom movers reported by compare_snapshots
+MOVER_COUNT = 5
+
+
+def round_like_python(values: np.ndarray, ndigits: int = 2) -> np.ndarray:
+    """
+    Round an array exactly like round(value, ndigits) on each element.
+
+    np.round scales by 10**ndigits before rounding, and the scaled value can
+    land on the other side of .5 than the exact decimal does; such values
+    are rounded with round() instead. NaN stays NaN.
+
+    Args:
+        values: float64 array (any shape)
+        ndigits: Decimal places
+
+    Returns:
+        np.ndarray: Rounded copy
+    """
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+    # Allow for the error of the scaling, which grows with the magnitude
+    tolerance = np.maximum(1e-6, np.abs(scaled) * 1e-15)
+    with np.errstate(invalid="ignore"):
+        near_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < tolerance
+    for i in np.flatnonzero(near_half):
+        rounded.flat[i] = round(float(values.flat[i]), ndigits)
+    return rounded
+
+
+def consecutive_value_changes(panel: AssetPanel) -> np.ndarray:
+    """
+    Value change at constant quantity for every consecutive pair, rounded to cents.
+
+    Where the quantity changed by more than 0.01 the current price is
+    applied to the previous quantity (0 if either quantity is 0); otherwise
+    it is the plain value change (compare_snapshots' change_eur).
+
+    Args:
+        panel: History to compare
+
+    Returns:
+        np.ndarray: change_eur, shape (rows - 1, asset columns); NaN where
+                    the asset isn't held in both snapshots
+    """
+    previous_value, current_value = panel.values[:-1], panel.values[1:]
+    previous_qty, current_qty = panel.quantities[:-1], panel.quantities[1:]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quantity_changed = np.abs(current_qty - previous_qty) > 0.01
+        both_positive = (current_qty > 0) & (previous_qty > 0)
+        normalized = current_value / current_qty * previous_qty - previous_value
+    changes = np.where(
+        quantity_changed,
+        np.where(both_positive, normalized, 0.0),
+        current_value - previous_value
+    )
+    changes[np.isnan(previous_value) | np.isnan(current_value)] = np.nan
+    return round_like_python(changes)
+
+
+def _top_k(changes: np.ndarray, k: int) -> List[np.ndarray]:
+    """
+    Columns of the k largest positive changes per row, largest first.
+
+    Changes are whole cents, so each is packed with its column into one
+    integer key (ties go to the lower column) and a single argpartition
+    over all rows finds the candidates.
+    """
+    pairs, columns = changes.shape
+    k = min(k, columns)
+    if k == 0:
+        return [np.empty(0, dtype=np.intp) for _ in range(pairs)]
+
+    with np.errstate(invalid="ignore"):
+        positive = changes > 0
+    cents = np.rint(np.where(positive, changes, 0.0) * 100).astype(np.int64)
+    keys = np.where(positive, cents * columns + (columns - 1 - np.arange(columns)), -1)
+
+    top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    top_keys = np.take_along_axis(keys, top, axis=1)
+    order = np.argsort(-top_keys, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_keys = np.take_along_axis(top_keys, order, axis=1)
+    return [row[row_keys >= 0] for row, row_keys in zip(top, top_keys)]
+
+
+def consecutive_movers(
+    panel: AssetPanel,
+    count: int = MOVER_COUNT
+) -> List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """
+    Largest gains and losses for every consecutive pair.
+
+    Args:
+        panel: History to compare
+        count: Movers to return on each side
+
+    Returns:
+        list: (top_movers, bottom_movers) per pair, each
+              [{"name", "change_eur"}] ordered by absolute change, largest
+              first, as in compare_snapshots
+    """
+    changes = consecutive_value_changes(panel)
+    names = panel.names.tolist()
+
+    movers = []
+    for row, top, bottom in zip(changes.tolist(), _top_k(changes, count), _top_k(-changes, count)):
+        movers.append((
+            [{"name": names[column], "change_eur": row[column]} for column in top.tolist()],
+            [{"name": names[column], "change_eur": row[column]} for column in bottom.tolist()],
+        ))
+    return movers
+
+
+def consecutive_daily_changes(panel: AssetPanel) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Value change and percentage per asset for every consecutive pair.
+
+    New positions count their whole value as the change (100%); assets with
+    neither a change nor a value of at least 0.01 are dropped, as in
+    calculate_daily_changes.
+
+    Args:
+        panel: History to compare
+
+    Returns:
+        tuple: (change_eur, change_pct), each of shape (rows - 1, asset
+               columns); NaN where the current snapshot doesn't hold the
+               asset or it is dropped
+    """
+    previous_value, current_value = panel.values[:-1], panel.values[1:]
+    in_previous = ~np.isnan(previous_value)
+
+    change_eur = np.where(in_previous, current_value - previous_value, current_value)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = change_eur / previous_value * 100
+        change_pct = np.where(
+            in_previous,
+            np.where(previous_value > 0, percent, 0.0),
+            100.0
+        )
+        dropped = (np.abs(change_eur) < 0.01) & (current_value < 0.01)
+
+    missing = np.isnan(current_value) | dropped
+    change_eur[missing] = np.nan
+    change_pct[missing] = np.nan
+    return change_eur, change_pct
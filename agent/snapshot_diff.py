@@ -0,0 +1,147 @@
+"""
+Snapshot Diff
+
+Matches the assets of two snapshots by name once, so that validation,
+comparison and the Raycast views can all work from the same result instead
+of each rebuilding name lookups and recomputing quantity and value changes.
+Compute a diff with SnapshotDiff.compute(current, previous) and pass it to
+detect_sells/detect_buys, the validators and compare_snapshots.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class AssetChange:
+    """How one asset changed between the previous and the current snapshot."""
+    name: str
+    current: Optional[Dict[str, Any]]
+    previous: Optional[Dict[str, Any]]
+    current_quantity: float
+    previous_quantity: float
+    current_value: float
+    previous_value: float
+
+    @property
+    def status(self) -> str:
+        """'held' (in both snapshots), 'new' or 'sold'."""
+        if self.current is None:
+            return "sold"
+        if self.previous is None:
+            return "new"
+        return "held"
+
+    @property
+    def quantity_change(self) -> float:
+        """Current minus previous quantity."""
+        return self.current_quantity - self.previous_quantity
+
+    @property
+    def value_change(self) -> float:
+        """Current minus previous value in EUR."""
+        return self.current_value - self.previous_value
+
+
+@dataclass
+class SnapshotDiff:
+    """
+    Asset-by-asset difference between two snapshots.
+
+    Attributes:
+        current_snapshot: The newer snapshot
+        previous_snapshot: The older snapshot
+        current_assets: Current assets by name, in snapshot order
+        previous_assets: Previous assets by name, in snapshot order
+        held_names: Names in both snapshots (current snapshot order)
+        new_names: Names only in the current snapshot (current snapshot order)
+        sold_names: Names only in the previous snapshot (previous snapshot order)
+        changes: AssetChange per name, for every name in either snapshot
+    """
+    current_snapshot: Dict[str, Any]
+    previous_snapshot: Dict[str, Any]
+    current_assets: Dict[str, Dict[str, Any]]
+    previous_assets: Dict[str, Dict[str, Any]]
+    held_names: List[str] = field(default_factory=list)
+    new_names: List[str] = field(default_factory=list)
+    sold_names: List[str] = field(default_factory=list)
+    changes: Dict[str, AssetChange] = field(default_factory=dict)
+
+    @classmethod
+    def compute(cls, current_snapshot: Dict[str, Any], previous_snapshot: Dict[str, Any]) -> "SnapshotDiff":
+        """
+        Diff two snapshots in one pass over each asset list.
+
+        Missing quantities and values count as 0. If a name appears twice in
+        a snapshot, its last entry is used.
+
+        Args:
+            current_snapshot: The newer snapshot
+            previous_snapshot: The older snapshot
+
+        Returns:
+            SnapshotDiff: The diff
+        """
+        current_assets = {asset["name"]: asset for asset in current_snapshot.get("assets", [])}
+        previous_assets = {asset["name"]: asset for asset in previous_snapshot.get("assets", [])}
+        diff = cls(current_snapshot, previous_snapshot, current_assets, previous_assets)
+
+        for name, asset in current_assets.items():
+            previous = previous_assets.get(name)
+            (diff.held_names if previous is not None else diff.new_names).append(name)
+            diff.changes[name] = AssetChange(
+                name=name,
+                current=asset,
+                previous=previous,
+                current_quantity=asset.get("quantity", 0.0),
+                previous_quantity=previous.get("quantity", 0.0) if previous is not None else 0.0,
+                current_value=asset.get("current_value_eur", 0.0),
+                previous_value=previous.get("current_value_eur", 0.0) if previous is not None else 0.0,
+            )
+        for name, asset in previous_assets.items():
+            if name in current_assets:
+                continue
+            diff.sold_names.append(name)
+            diff.changes[name] = AssetChange(
+                name=name,
+                current=None,
+                previous=asset,
+                current_quantity=0.0,
+                previous_quantity=asset.get("quantity", 0.0),
+                current_value=0.0,
+                previous_value=asset.get("current_value_eur", 0.0),
+            )
+
+        return diff
+
+    @classmethod
+    def of(
+        cls,
+        current_snapshot: Dict[str, Any],
+        previous_snapshot: Dict[str, Any],
+        diff: Optional["SnapshotDiff"] = None
+    ) -> "SnapshotDiff":
+        """
+        Return a diff of two snapshots, reusing one already computed for them.
+
+        Args:
+            current_snapshot: The newer snapshot
+            previous_snapshot: The older snapshot
+            diff: A diff computed earlier (used if it is for these snapshots)
+
+        Returns:
+            SnapshotDiff: The given diff, or a newly computed one
+        """
+        if diff is not None and diff.current_snapshot is current_snapshot and diff.previous_snapshot is previous_snapshot:
+            return diff
+        return cls.compute(current_snapshot, previous_snapshot)
+
+    def quantity_change(self, name: str) -> float:
+        """Quantity change of an asset (0 if it is in neither snapshot)."""
+        change = self.changes.get(name)
+        return change.quantity_change if change is not None else 0.0
+
+    def value_change(self, name: str) -> float:
+        """Value change of an asset in EUR (0 if it is in neither snapshot)."""
+        change = self.changes.get(name)
+        return change.value_change if change is not None else 0.0
@@ -3,32 +3,72 @@ Data Persistence Layer
 
 This module provides the public interface for portfolio history storage,
 using pluggable backends (local files, GCP, etc.).
+
+Snapshot reads go through a process-wide cache validated against the
+backend's history version (file mtime+size, or GCS generation), so repeated
+reads within and across tool calls don't re-read or re-decode the history.
+Cached snapshots are shared between callers and must not be mutated.
+
+The asset panel (time × asset matrices for dashboard charts, see
+asset_panel) is kept next to the local history; each save appends its rows
+as a chunk file and grows the in-process panel, and the panel is rebuilt
+whenever it no longer matches the snapshot index.
 """
 
+import atexit
+import copy
 import json
 import logging
+import os
 import subprocess
-from typing import Dict, List, Optional, Any
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Hashable, Iterator, Sequence, Tuple, Union
 
 from . import config
-from .storage_backend import StorageBackend
+from .asset_panel import MAX_PANEL_CHUNKS, AssetPanel, append_rows, hashes_of, list_chunks, panel_path
+from .config_models import StorageConfig
+from .storage_backend import (
+    StorageBackend,
+    compute_snapshot_hash,
+    select_snapshots,
+)
+from .timestamp_index import TimestampIndex
 from .backends.local_storage import LocalFileBackend
 from .backends.gcp_storage import GCPStorageBackend
-from .backends.hybrid_storage import HybridStorageBackend
+from .backends.hybrid_storage import HybridStorageBackend, PENDING_SYNC_JOURNAL_FILE
+from .backends.sqlite_storage import SQLiteStorageBackend
+from . import retention
+from . import storage_sync
 
 logger = logging.getLogger(__name__)
 
 # Global storage backend instance
 _storage_backend: Optional[StorageBackend] = None
 
+# Process-wide snapshot cache, keyed by backend history version
+_cache_lock = threading.Lock()
+_cached_version: Optional[Hashable] = None
+_cached_snapshots: Optional[Tuple[Dict[str, Any], ...]] = None
+_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+_cached_panel_version: Optional[Hashable] = None
+_cached_panel: Optional[AssetPanel] = None
+
+# Timestamp index over the cached snapshots (rebuilt when they are replaced)
+_indexed_snapshots: Optional[Tuple[Dict[str, Any], ...]] = None
+_timestamp_index: Optional[TimestampIndex] = None
+
 
 def _get_storage_backend() -> StorageBackend:
     """
     Get or initialize the storage backend.
     
-    Lazy initialization on first use. Uses hybrid storage with:
-    - Primary: GCP Cloud Storage
-    - Fallback: Local file storage
+    Lazy initialization on first use, according to storage.backend:
+    - hybrid (default): GCP primary + local (or SQLite) fallback; fallback
+      only if GCP can't be initialized
+    - gcp: GCP Cloud Storage only
+    - local: Local JSON Lines file only
+    - sqlite: SQLite database only
     
     Returns:
         StorageBackend: Configured storage backend
@@ -38,38 +78,120 @@ def _get_storage_backend() -> StorageBackend:
     if _storage_backend is None:
         # Initialize backends
         try:
-            # Local fallback backend (always initialize)
-            local_backend = LocalFileBackend(data_dir=".")
-            logger.info("Local file backend initialized")
+            storage_cfg = _get_storage_config()
             
-            # Try to initialize GCP backend
-            try:
-                credentials_dict = _load_gcp_credentials()
-                cfg = config.get_config()
-                gcp_backend = GCPStorageBackend(
-                    bucket_name=cfg.storage.gcp.bucket_name,
-                    credentials_dict=credentials_dict
-                )
-                
-                # Use hybrid with GCP primary + local fallback
-                _storage_backend = HybridStorageBackend(
-                    primary=gcp_backend,
-                    fallback=local_backend
-                )
-                logger.info("Storage initialized: GCP primary + local fallback")
+            if storage_cfg.backend == "local":
+                _storage_backend = _create_local_backend(storage_cfg)
+                logger.info("Storage initialized: local file only")
+            elif storage_cfg.backend == "sqlite":
+                _storage_backend = _create_sqlite_backend(storage_cfg)
+                logger.info("Storage initialized: SQLite only")
+            elif storage_cfg.backend == "gcp":
+                _storage_backend = _create_gcp_backend(storage_cfg)
+                logger.info("Storage initialized: GCP only")
+            else:
+                # Fallback backend (always initialize)
+                if storage_cfg.fallback == "sqlite":
+                    fallback_backend = _create_sqlite_backend(storage_cfg)
+                else:
+                    fallback_backend = _create_local_backend(storage_cfg)
+                logger.info(f"Fallback backend initialized ({storage_cfg.fallback})")
                 
-            except Exception as e:
-                # If GCP fails to initialize, use local only
-                logger.warning(f"GCP storage unavailable, using local only: {e}")
-                _storage_backend = local_backend
+                # Try to initialize GCP backend
+                try:
+                    gcp_backend = _create_gcp_backend(storage_cfg)
+                    
+                    # Use hybrid with GCP primary + local fallback
+                    _storage_backend = HybridStorageBackend(
+                        primary=gcp_backend,
+                        fallback=fallback_backend,
+                        journal_path=os.path.join(storage_cfg.local.data_dir, PENDING_SYNC_JOURNAL_FILE)
+                    )
+                    # Give background replication a chance to finish on exit
+                    atexit.register(_storage_backend.shutdown)
+                    logger.info(f"Storage initialized: GCP primary + {storage_cfg.fallback} fallback")
+                    
+                except Exception as e:
+                    # If GCP fails to initialize, use fallback only
+                    logger.warning(f"GCP storage unavailable, using {storage_cfg.fallback} only: {e}")
+                    _storage_backend = fallback_backend
         
         except Exception as e:
             logger.error(f"Failed to initialize storage backend: {e}")
             raise
+        
+        # Fsync writes deferred by durability "interval" before exiting
+        atexit.register(_storage_backend.sync)
     
     return _storage_backend
 
 
+def _create_local_backend(storage_cfg: StorageConfig) -> LocalFileBackend:
+    """Create the local JSON Lines backend from config."""
+    return LocalFileBackend(
+        data_dir=storage_cfg.local.data_dir,
+        compression=storage_cfg.compression,
+        keep_backups=storage_cfg.keep_backups,
+        backup_keep_days=storage_cfg.backup_keep_days,
+        delta_keyframe_interval=storage_cfg.local.delta_keyframe_interval,
+        durability=storage_cfg.durability,
+        fsync_interval=storage_cfg.fsync_interval,
+    )
+
+
+def _create_sqlite_backend(storage_cfg: StorageConfig) -> SQLiteStorageBackend:
+    """
+    Create the SQLite backend from config.
+    
+    A new (empty) database is seeded from the local history log, if any, so
+    switching backends doesn't hide existing snapshots.
+    """
+    backend = SQLiteStorageBackend(
+        db_path=storage_cfg.sqlite.db_path,
+        keep_backups=storage_cfg.keep_backups,
+        backup_keep_days=storage_cfg.backup_keep_days,
+        durability=storage_cfg.durability,
+        fsync_interval=storage_cfg.fsync_interval,
+    )
+
+    if backend.count_snapshots() == 0:
+        history = _create_local_backend(storage_cfg).get_all_snapshots()
+        if history:
+            logger.info(f"Seeding SQLite database with {len(history)} snapshots from local history")
+            backend.import_snapshots(history)
+    
+    return backend
+
+
+def _create_gcp_backend(storage_cfg: StorageConfig) -> GCPStorageBackend:
+    """Create the GCP backend from config (raises if credentials are unavailable)."""
+    return GCPStorageBackend(
+        bucket_name=storage_cfg.gcp.bucket_name,
+        credentials_dict=_load_gcp_credentials(),
+        cache_dir=storage_cfg.gcp.cache_dir,
+        layout=storage_cfg.gcp.layout,
+        download_workers=storage_cfg.gcp.download_workers,
+        compression=storage_cfg.compression,
+        availability_ttl=storage_cfg.gcp.availability_ttl,
+        failure_threshold=storage_cfg.gcp.failure_threshold,
+        circuit_reset_timeout=storage_cfg.gcp.circuit_reset_timeout
+    )
+
+
+def _get_storage_config() -> StorageConfig:
+    """
+    Get the storage section of config.yaml.
+    
+    Returns:
+        StorageConfig: Configured settings, or defaults if config can't be loaded
+    """
+    try:
+        return config.get_config().storage
+    except Exception as e:
+        logger.warning(f"Failed to load storage config, using defaults: {e}")
+        return StorageConfig()
+
+
 def _load_gcp_credentials() -> Dict[str, Any]:
     """
     Load GCP credentials from macOS Keychain.
@@ -111,6 +233,465 @@ def _load_gcp_credentials() -> Dict[str, Any]:
         raise
 
 
+def _lookup_snapshot_cache(version: Optional[Hashable]) -> Optional[Tuple[Dict[str, Any], ...]]:
+    """
+    Return cached snapshots if they were loaded at the given history version.
+    
+    Records a hit or miss in the cache statistics.
+    
+    Args:
+        version: Current backend history version (None = unknown)
+        
+    Returns:
+        tuple: Cached snapshots, or None on a miss
+    """
+    with _cache_lock:
+        if version is not None and _cached_snapshots is not None and version == _cached_version:
+            _cache_stats["hits"] += 1
+            return _cached_snapshots
+        _cache_stats["misses"] += 1
+        return None
+
+
+def _load_snapshots(backend: StorageBackend) -> Tuple[Dict[str, Any], ...]:
+    """
+    Load all snapshots through the process-wide cache.
+    
+    The version is read before loading, so a concurrent write can only make
+    the cached entry look older than it is (forcing a reload), never newer.
+    
+    Args:
+        backend: Storage backend to read from on a cache miss
+        
+    Returns:
+        tuple: All snapshots (shared; must not be mutated)
+    """
+    global _cached_version, _cached_snapshots
+    
+    version = backend.get_history_version()
+    cached = _lookup_snapshot_cache(version)
+    if cached is not None:
+        logger.debug(f"Snapshot cache hit ({len(cached)} snapshots)")
+        return cached
+    
+    snapshots = tuple(backend.get_all_snapshots())
+    
+    if version is not None:
+        with _cache_lock:
+            _cached_version = version
+            _cached_snapshots = snapshots
+    
+    return snapshots
+
+
+def _index_snapshots(snapshots: Tuple[Dict[str, Any], ...]) -> TimestampIndex:
+    """
+    Return the timestamp index over snapshots from the process-wide cache.
+    
+    Built once per cached tuple, i.e. once per history version.
+    
+    Args:
+        snapshots: Snapshots returned by _load_snapshots or the cache lookup
+    
+    Returns:
+        TimestampIndex: Index over the snapshots
+    """
+    global _indexed_snapshots, _timestamp_index
+    
+    with _cache_lock:
+        if _indexed_snapshots is snapshots:
+            return _timestamp_index
+    
+    index = TimestampIndex(snapshots)
+    with _cache_lock:
+        _indexed_snapshots = snapshots
+        _timestamp_index = index
+    return index
+
+
+def flush_replication(timeout: Optional[float] = None) -> bool:
+    """
+    Wait for background replication to the primary backend to finish.
+    
+    Useful before shutdown and in tests. A no-op unless hybrid storage is in use.
+    
+    Args:
+        timeout: Maximum seconds to wait (None waits indefinitely)
+    
+    Returns:
+        bool: True if nothing is left to replicate
+    """
+    backend = _get_storage_backend()
+    if isinstance(backend, HybridStorageBackend):
+        return backend.flush(timeout)
+    return True
+
+
+def sync_storage(direction: str = "both", dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Reconcile the GCP and local histories.
+    
+    Compares per-snapshot content hashes on both sides and transfers only
+    the snapshots one side is missing (see storage_sync). Pending
+    background replication is flushed first.
+    
+    Args:
+        direction: "both" (union), "push" (make GCP match local) or
+                   "pull" (make local match GCP)
+        dry_run: Only report what would change (default)
+    
+    Returns:
+        dict: Reconciliation plan and transfer statistics, or
+              {"success": False, "error": str}
+    """
+    if direction not in storage_sync.DIRECTIONS:
+        return {
+            "success": False,
+            "error": f"Invalid direction: {direction}. Use one of: {', '.join(storage_sync.DIRECTIONS)}"
+        }
+    
+    try:
+        backend = _get_storage_backend()
+        if not isinstance(backend, HybridStorageBackend):
+            return {
+                "success": False,
+                "error": "Sync needs hybrid storage (GCP primary + local fallback); "
+                         f"current backend is {backend.__class__.__name__}."
+            }
+        
+        if not backend.flush(timeout=30.0):
+            logger.warning("Background replication still pending, reconciling anyway")
+        if not backend.primary.is_available():
+            return {"success": False, "error": "GCP storage is unavailable. Try again when online."}
+        
+        result = storage_sync.reconcile_backends(backend.primary, backend.fallback, direction, dry_run)
+        if not dry_run:
+            invalidate_snapshot_cache()
+        return result
+    
+    except Exception as e:
+        logger.error(f"Failed to sync storage: {e}", exc_info=True)
+        invalidate_snapshot_cache()
+        return {"success": False, "error": str(e)}
+
+
+def compact_history(keep_backups: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Drop deleted snapshots from storage and prune old backups.
+    
+    Deletes only record tombstones; this rewrites each history once
+    (after backing it up) and keeps the most recent backups.
+    
+    Args:
+        keep_backups: Backups to keep (default: storage.keep_backups)
+    
+    Returns:
+        dict: Compaction statistics (see StorageBackend.compact_history),
+              or {"success": False, "error": str}
+    """
+    if keep_backups is None:
+        keep_backups = _get_storage_config().keep_backups
+    if keep_backups < 0:
+        return {"success": False, "error": f"Invalid keep_backups: {keep_backups}. Must be >= 0."}
+    
+    try:
+        backend = _get_storage_backend()
+        if isinstance(backend, HybridStorageBackend) and not backend.flush(timeout=30.0):
+            logger.warning("Background replication still pending, compacting anyway")
+        
+        result = backend.compact_history(keep_backups)
+        invalidate_snapshot_cache()
+        return result
+    
+    except Exception as e:
+        logger.error(f"Failed to compact history: {e}", exc_info=True)
+        invalidate_snapshot_cache()
+        return {"success": False, "error": str(e)}
+
+
+def compact_history_if_due() -> Optional[Dict[str, Any]]:
+    """
+    Compact history if enough deletes are pending (storage.compact_after_deletes).
+    
+    Called from the weekly analysis, so tombstones don't accumulate
+    without anyone running compact_history explicitly.
+    
+    Returns:
+        dict: Compaction result, or None if compaction wasn't due
+    """
+    threshold = _get_storage_config().compact_after_deletes
+    if threshold <= 0:
+        return None
+    
+    pending = _get_storage_backend().count_tombstones()
+    if pending < threshold:
+        return None
+    
+    logger.info(f"{pending} deleted snapshots pending, compacting history")
+    return compact_history()
+
+
+def list_backups() -> List[Dict[str, Any]]:
+    """
+    List history backups of the active backend, newest first.
+    
+    Returns:
+        list: Backup summaries with id, created_at, reason, source, count
+              and deleted_count (empty if the backend keeps none)
+    """
+    try:
+        return _get_storage_backend().list_backups()
+    except Exception as e:
+        logger.error(f"Failed to list backups: {e}", exc_info=True)
+        return []
+
+
+def restore_backup(backup_id: str, include_deleted: bool = False, confirm: bool = False) -> Dict[str, Any]:
+    """
+    Replace the history with a backup.
+    
+    The current history is backed up first, so a restore can be undone
+    by restoring that backup.
+    
+    Args:
+        backup_id: Backup to restore (see list_backups)
+        include_deleted: Also restore the snapshot a delete backup was taken for
+        confirm: Must be True to actually replace the history
+    
+    Returns:
+        dict: {"success", "backup_id", "restored_snapshots"} or
+              {"success": False, "error": str}
+    """
+    if not confirm:
+        return {
+            "success": False,
+            "error": "Restoring replaces the current history. Call again with confirm=True."
+        }
+    
+    try:
+        result = _get_storage_backend().restore_backup(backup_id, include_deleted)
+    except NotImplementedError:
+        result = {"success": False, "error": "The active storage backend doesn't support restoring backups."}
+    except Exception as e:
+        logger.error(f"Failed to restore backup {backup_id}: {e}", exc_info=True)
+        result = {"success": False, "error": str(e)}
+    
+    invalidate_snapshot_cache()
+    return result
+
+
+def apply_retention(dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Thin out old history according to storage.retention.
+    
+    Keeps the last snapshot per day/week/month in the configured tiers,
+    plus the snapshots around every sell/buy transaction so validation
+    still sees each transaction between the same two snapshots. Years
+    that lose snapshots are archived at full resolution first (see
+    retention.apply_retention).
+    
+    Args:
+        dry_run: Only report what would be dropped (default)
+    
+    Returns:
+        dict: Retention statistics (kept, dropped, protected, by_tier,
+              archived), or {"success": False, "error": str}
+    """
+    retention_cfg = _get_storage_config().retention
+    if not retention_cfg.tiers:
+        return {"success": False, "error": "No retention tiers configured (storage.retention.tiers)."}
+    
+    try:
+        backend = _get_storage_backend()
+        if isinstance(backend, HybridStorageBackend) and not dry_run:
+            if not backend.flush(timeout=30.0):
+                return {"success": False, "error": "Background replication still pending. Try again later."}
+            if not backend.primary.is_available():
+                return {"success": False, "error": "GCP storage is unavailable. Try again when online."}
+        
+        transactions = get_transactions()
+        dates = [
+            txn.get("date")
+            for txn in transactions.get("sell_transactions", []) + transactions.get("buy_transactions", [])
+            if txn.get("date")
+        ]
+        
+        result = retention.apply_retention(
+            backend,
+            [tier.model_dump() for tier in retention_cfg.tiers],
+            transaction_dates=dates,
+            dry_run=dry_run,
+            archive=retention_cfg.archive
+        )
+        if not dry_run:
+            invalidate_snapshot_cache()
+        return result
+    
+    except NotImplementedError:
+        return {"success": False, "error": "The active storage backend doesn't support retention."}
+    except Exception as e:
+        logger.error(f"Failed to apply retention: {e}", exc_info=True)
+        invalidate_snapshot_cache()
+        return {"success": False, "error": str(e)}
+
+
+def apply_retention_if_due() -> Optional[Dict[str, Any]]:
+    """
+    Apply the retention policy if one is configured.
+    
+    Called from the weekly analysis; a run that has nothing to drop
+    rewrites nothing.
+    
+    Returns:
+        dict: Retention result, or None if no tiers are configured
+    """
+    if not _get_storage_config().retention.tiers:
+        return None
+    return apply_retention(dry_run=False)
+
+
+def invalidate_snapshot_cache() -> None:
+    """Drop cached snapshots, their timestamp index and the asset panel (called after any write to history)."""
+    global _cached_version, _cached_snapshots, _cached_panel_version, _cached_panel
+    global _indexed_snapshots, _timestamp_index
+    
+    with _cache_lock:
+        if _cached_snapshots is not None:
+            _cache_stats["invalidations"] += 1
+        _cached_version = None
+        _cached_snapshots = None
+        _cached_panel_version = None
+        _cached_panel = None
+        _indexed_snapshots = None
+        _timestamp_index = None
+
+
+def _cache_asset_panel(version: Optional[Hashable], panel: AssetPanel) -> None:
+    """Keep a panel in process for reads at the given history version."""
+    global _cached_panel_version, _cached_panel
+    
+    if version is None:
+        return
+    with _cache_lock:
+        _cached_panel_version = version
+        _cached_panel = panel
+
+
+def _peek_asset_panel() -> Optional[AssetPanel]:
+    """The panel held in process, whatever history version it was read at."""
+    with _cache_lock:
+        return _cached_panel
+
+
+def _append_to_asset_panel(
+    backend: StorageBackend,
+    snapshots: List[Dict[str, Any]],
+    previous: Optional[AssetPanel]
+) -> None:
+    """
+    Extend the asset panel with just-saved snapshots, without rewriting it.
+    
+    If the index now ends with these snapshots, their rows are written to a
+    chunk file next to the persisted panel (get_asset_panel folds chunks in
+    and rebuilds the panel if it didn't end where the chunk starts), and the
+    panel held in process before the save grows in memory if it held
+    exactly the history before the save. Otherwise (no panel yet,
+    duplicates skipped by the backend, concurrent writers) the panel is
+    left for get_asset_panel to rebuild. Failures never fail the save.
+    
+    Args:
+        backend: Backend the snapshots were saved to
+        snapshots: Saved snapshots, in save order
+        previous: Panel held in process before the save (if any)
+    """
+    try:
+        hashes = hashes_of(backend.get_snapshot_index())
+        new_hashes = [compute_snapshot_hash(snapshot) for snapshot in snapshots]
+        split = len(hashes) - len(new_hashes)
+        if split < 0 or hashes[split:] != new_hashes:
+            logger.debug("Asset panel out of date, rebuilding on next read")
+            return
+        
+        path = panel_path(backend.get_data_dir())
+        if path and os.path.exists(path):
+            append_rows(path, split, snapshots, new_hashes)
+        
+        if previous is not None and previous.matches(hashes[:split]):
+            # Grow a copy: readers may still hold the previous panel
+            panel = copy.copy(previous)
+            panel.extend(snapshots, new_hashes)
+            _cache_asset_panel(backend.get_history_version(), panel)
+    except Exception as e:
+        logger.warning(f"Failed to update asset panel: {e}")
+
+
+def get_asset_panel() -> AssetPanel:
+    """
+    Get the asset panel: value and quantity matrices of the whole history.
+    
+    Served from process memory or the persisted panel file (plus the chunks
+    appended by saves) when it matches the snapshot index; otherwise rebuilt
+    from the snapshots (and persisted). Once more than MAX_PANEL_CHUNKS
+    chunks have piled up they are folded into the panel file.
+    The returned panel is shared and must not be mutated; slice it with
+    take/since/tail.
+    
+    Returns:
+        AssetPanel: One row per snapshot in history order
+    """
+    backend = _get_storage_backend()
+    path = panel_path(backend.get_data_dir())
+    
+    version = backend.get_history_version()
+    with _cache_lock:
+        cached = _cached_panel if version is not None and version == _cached_panel_version else None
+    if cached is not None:
+        _compact_asset_panel(path, cached)
+        return cached
+    
+    hashes = hashes_of(backend.get_snapshot_index())
+    panel = AssetPanel.load(path) if path else None
+    
+    if panel is None or not panel.matches(hashes):
+        snapshots = _load_snapshots(backend)
+        logger.info(f"Rebuilding asset panel from {len(snapshots)} snapshots")
+        panel = AssetPanel.from_snapshots(snapshots, hashes if len(hashes) == len(snapshots) else None)
+        if path:
+            try:
+                panel.save(path)
+            except OSError as e:
+                logger.warning(f"Failed to write asset panel {path}: {e}")
+    else:
+        _compact_asset_panel(path, panel)
+    
+    _cache_asset_panel(version, panel)
+    return panel
+
+
+def _compact_asset_panel(path: Optional[str], panel: AssetPanel) -> None:
+    """Fold chunk files into the panel file once more than MAX_PANEL_CHUNKS have piled up."""
+    if not path or len(list_chunks(path)) <= MAX_PANEL_CHUNKS:
+        return
+    try:
+        panel.save(path)
+    except OSError as e:
+        logger.warning(f"Failed to compact asset panel {path}: {e}")
+
+
+def get_snapshot_cache_stats() -> Dict[str, Any]:
+    """
+    Get snapshot cache statistics.
+    
+    Returns:
+        dict: hits, misses, invalidations and number of cached snapshots
+    """
+    with _cache_lock:
+        return {
+            **_cache_stats,
+            "cached_snapshots": len(_cached_snapshots) if _cached_snapshots is not None else 0,
+        }
+
+
 def _validate_snapshot_structure(snapshot_data: Dict[str, Any]) -> None:
     """
     Validates that snapshot data has the required structure.
@@ -158,36 +739,84 @@ def save_snapshot(snapshot_data: Dict[str, Any]) -> None:
         
         # Save snapshot
         logger.info("Saving snapshot to storage...")
+        previous_panel = _peek_asset_panel()
         success = backend.save_snapshot(snapshot_data)
+        invalidate_snapshot_cache()
         
         if not success:
             raise IOError("All storage backends failed to save snapshot")
         
         logger.info("Snapshot saved successfully")
+        _append_to_asset_panel(backend, [snapshot_data], previous_panel)
         
         # Log sync status if using hybrid storage
         if isinstance(backend, HybridStorageBackend):
             status = backend.get_sync_status()
-            if not status["fully_synced"]:
+            if status["replication_failures"] or status["dropped_syncs"]:
                 logger.warning(
-                    f"Snapshot saved locally, {status['pending_syncs']} pending GCP syncs"
+                    f"Snapshot saved locally, {status['pending_syncs']} pending GCP syncs "
+                    f"(lag {status['replication_lag_seconds']:.0f}s)"
                 )
+            else:
+                logger.info("Snapshot saved locally, replicating to GCP in background")
         
     except Exception as e:
         logger.error(f"Failed to save snapshot: {e}", exc_info=True)
         raise
 
 
+def save_snapshots(snapshots: List[Dict[str, Any]]) -> None:
+    """
+    Save many snapshots at once (bulk import, archive replay).
+    
+    Every snapshot is validated before anything is written. The backend
+    stores the batch with one write made durable once, skipping snapshots
+    it already holds (by content hash), so re-running an interrupted
+    import is safe.
+    
+    Args:
+        snapshots: Snapshots in chronological order
+    
+    Raises:
+        ValueError: If any snapshot is invalid (nothing is saved)
+        IOError: If all storage backends fail
+    """
+    for position, snapshot in enumerate(snapshots):
+        try:
+            _validate_snapshot_structure(snapshot)
+        except ValueError as e:
+            raise ValueError(f"Snapshot {position}: {e}")
+    
+    backend = _get_storage_backend()
+    logger.info(f"Saving {len(snapshots)} snapshots to storage...")
+    previous_panel = _peek_asset_panel()
+    success = backend.save_snapshots(snapshots)
+    invalidate_snapshot_cache()
+    
+    if not success:
+        raise IOError("All storage backends failed to save snapshots")
+    logger.info(f"Saved {len(snapshots)} snapshots")
+    _append_to_asset_panel(backend, snapshots, previous_panel)
+
+
 def get_latest_snapshot() -> Optional[Dict[str, Any]]:
     """
     Retrieves the most recent snapshot from storage.
     
+    Served from the snapshot cache when it is current; otherwise uses the
+    backend's latest-snapshot lookup (without loading the full history).
+    
     Returns:
         dict: The latest snapshot object, or None if unavailable
     """
     try:
         backend = _get_storage_backend()
-        snapshot = backend.get_latest_snapshot()
+        
+        cached = _lookup_snapshot_cache(backend.get_history_version())
+        if cached is not None:
+            snapshot = cached[-1] if cached else None
+        else:
+            snapshot = backend.get_latest_snapshot()
         
         if snapshot:
             logger.info(f"Retrieved latest snapshot from {snapshot.get('timestamp', 'unknown time')}")
@@ -203,12 +832,15 @@ def get_all_snapshots() -> List[Dict[str, Any]]:
     """
     Retrieves all snapshots from storage.
     
+    Snapshot dicts are shared with the process-wide cache and must not be
+    mutated; the returned list itself is a fresh copy.
+    
     Returns:
         list: All snapshot objects, or empty list if unavailable
     """
     try:
         backend = _get_storage_backend()
-        snapshots = backend.get_all_snapshots()
+        snapshots = list(_load_snapshots(backend))
         
         logger.info(f"Retrieved {len(snapshots)} snapshots from storage")
         return snapshots
@@ -218,6 +850,131 @@ def get_all_snapshots() -> List[Dict[str, Any]]:
         return []
 
 
+def iter_snapshots(
+    start: Union[str, datetime, None] = None,
+    end: Union[str, datetime, None] = None,
+    fields: Optional[Sequence[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over snapshots in history order without loading them all.
+    
+    Served from the snapshot cache when it is current; otherwise streamed
+    from the backend (without filling the cache), so memory use is bounded
+    by about one snapshot. Yielded dicts must not be mutated.
+    
+    Args:
+        start: Inclusive lower timestamp bound (ISO 8601 or datetime)
+        end: Inclusive upper timestamp bound (ISO 8601 or datetime)
+        fields: Top-level fields to return (e.g. ["timestamp", "total_value_eur"])
+    
+    Yields:
+        dict: Matching snapshots
+        
+    Raises:
+        ValueError: If a bound can't be parsed
+    """
+    backend = _get_storage_backend()
+    
+    cached = _lookup_snapshot_cache(backend.get_history_version())
+    if cached is not None:
+        yield from select_snapshots(cached, start, end, fields)
+        return
+    
+    yield from backend.iter_snapshots(start, end, fields)
+
+
+def get_snapshots_between(
+    start: Union[str, datetime, None] = None,
+    end: Union[str, datetime, None] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get the snapshots taken within a timestamp range.
+    
+    Served from the snapshot cache's timestamp index when the cache is
+    current; otherwise the backend reads only the snapshots in the range.
+    Returned dicts must not be mutated.
+    
+    Args:
+        start: Inclusive lower timestamp bound (ISO 8601 or datetime)
+        end: Inclusive upper timestamp bound (ISO 8601 or datetime)
+    
+    Returns:
+        list: Matching snapshots in chronological order
+    
+    Raises:
+        ValueError: If a bound can't be parsed
+    """
+    backend = _get_storage_backend()
+    
+    cached = _lookup_snapshot_cache(backend.get_history_version())
+    if cached is not None:
+        return _index_snapshots(cached).snapshot_in_window(start, end)
+    
+    return backend.get_snapshots_between(start, end)
+
+
+def get_snapshot_at_or_before(timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+    """
+    Get the newest snapshot taken at or before a timestamp.
+    
+    Served from the snapshot cache's timestamp index when the cache is
+    current; otherwise the backend reads only that snapshot. The returned
+    dict must not be mutated.
+    
+    Args:
+        timestamp: ISO 8601 timestamp or datetime (naive = UTC)
+    
+    Returns:
+        dict: The snapshot, or None if every snapshot is newer
+    
+    Raises:
+        ValueError: If the timestamp can't be parsed
+    """
+    backend = _get_storage_backend()
+    
+    cached = _lookup_snapshot_cache(backend.get_history_version())
+    if cached is not None:
+        return _index_snapshots(cached).snapshot_at_or_before(timestamp)
+    
+    return backend.get_snapshot_at_or_before(timestamp)
+
+
+def get_timestamp_index() -> TimestampIndex:
+    """
+    Get a timestamp index over the whole history.
+    
+    Loads the history through the snapshot cache and indexes it once per
+    history version, for callers that look up many snapshots by time.
+    Indexed dicts must not be mutated.
+    
+    Returns:
+        TimestampIndex: Index with snapshot_at_or_before, snapshot_in_window
+                        and latest lookups
+    """
+    backend = _get_storage_backend()
+    return _index_snapshots(_load_snapshots(backend))
+
+
+def get_snapshot_index() -> List[Dict[str, Any]]:
+    """
+    Get compact metadata for every snapshot, without asset payloads.
+    
+    The index is maintained by the backend at save/delete time, so this
+    doesn't read the snapshot history.
+    
+    Returns:
+        list: Entries in history order, each with:
+            - index: Zero-based position in the history
+            - timestamp: ISO timestamp string
+            - epoch: Timestamp as POSIX seconds (None if unparseable)
+            - total_value_eur: Portfolio total value
+            - asset_count: Number of assets
+            - hash: Snapshot content hash
+    """
+    backend = _get_storage_backend()
+    return backend.get_snapshot_index()
+
+
 def get_storage_status() -> Dict[str, Any]:
     """
     Get current storage backend status.
@@ -230,13 +987,20 @@ def get_storage_status() -> Dict[str, Any]:
         
         status = {
             "backend_type": backend.__class__.__name__,
-            "available": backend.is_available()
+            "available": backend.is_available(),
+            "snapshot_cache": get_snapshot_cache_stats(),
+            "pending_deletes": backend.count_tombstones()
         }
         
         # Add hybrid-specific status
         if isinstance(backend, HybridStorageBackend):
             status.update(backend.get_sync_status())
         
+        # Add GCS availability state (cached probe / circuit breaker)
+        gcp_backend = backend.primary if isinstance(backend, HybridStorageBackend) else backend
+        if isinstance(gcp_backend, GCPStorageBackend):
+            status["gcs_health"] = gcp_backend.get_health_status()
+        
         return status
         
     except Exception as e:
@@ -308,23 +1072,20 @@ def list_snapshots() -> List[Dict[str, Any]]:
             - asset_count: Number of assets
     """
     try:
-        backend = _get_storage_backend()
-        all_snapshots = backend.get_all_snapshots()
-        
-        if not all_snapshots:
-            logger.info("No snapshots found")
-            return []
-        
-        # Build summary list with 1-based indices
+        # Build summary list with 1-based indices from the metadata index
         summaries = []
-        for i, snapshot in enumerate(all_snapshots):
+        for entry in get_snapshot_index():
             summaries.append({
-                "index": i + 1,  # 1-based for user display
-                "timestamp": snapshot.get("timestamp", "Unknown"),
-                "total_value_eur": snapshot.get("total_value_eur", 0.0),
-                "asset_count": len(snapshot.get("assets", []))
+                "index": entry["index"] + 1,  # 1-based for user display
+                "timestamp": entry.get("timestamp") or "Unknown",
+                "total_value_eur": entry.get("total_value_eur", 0.0),
+                "asset_count": entry.get("asset_count", 0)
             })
         
+        if not summaries:
+            logger.info("No snapshots found")
+            return []
+        
         logger.info(f"Listed {len(summaries)} snapshots")
         return summaries
         
@@ -355,7 +1116,8 @@ def delete_snapshot(index: int, confirm: bool = False) -> Dict[str, Any]:
             return {
                 "success": False,
                 "error": "Deletion cancelled. Set confirm=True to proceed.",
-                "warning": "This operation is permanent and will delete the snapshot from both GCP and local storage."
+                "warning": "This will delete the snapshot from both GCP and local storage "
+                           "(it is kept in the backup written when history is compacted)."
             }
         
         # Validate index (must be positive)
@@ -367,7 +1129,7 @@ def delete_snapshot(index: int, confirm: bool = False) -> Dict[str, Any]:
         
         # Get current snapshots to validate and get info
         backend = _get_storage_backend()
-        all_snapshots = backend.get_all_snapshots()
+        all_snapshots = _load_snapshots(backend)
         
         if not all_snapshots:
             return {
@@ -390,6 +1152,7 @@ def delete_snapshot(index: int, confirm: bool = False) -> Dict[str, Any]:
         # Perform deletion
         logger.info(f"Deleting snapshot at index {index} (0-based: {zero_based_index})")
         success = backend.delete_snapshot(zero_based_index)
+        invalidate_snapshot_cache()
         
         if success:
             remaining = len(all_snapshots) - 1
@@ -5,11 +5,295 @@ Supports multiple backends: local files, GCP Cloud Storage, etc.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Hashable, Iterable, Iterator, Sequence, Union
+import hashlib
 import logging
 
+from .json_codec import canonical_dumps
+
 logger = logging.getLogger(__name__)
 
+# Backups kept by compact_history() (older ones are removed)
+DEFAULT_KEEP_BACKUPS = 5
+
+
+def compute_snapshot_hash(snapshot: Dict[str, Any]) -> str:
+    """
+    Compute SHA-256 content hash of a snapshot.
+    
+    Keys are sorted before hashing, so the hash identifies the snapshot
+    contents independently of how (or by which backend) it was serialized.
+    
+    Args:
+        snapshot: Snapshot dictionary
+    
+    Returns:
+        str: SHA-256 hash as hex string with 'sha256:' prefix
+    """
+    json_str = canonical_dumps(snapshot)
+    return f"sha256:{hashlib.sha256(json_str.encode('utf-8')).hexdigest()}"
+
+
+def timestamp_to_epoch(timestamp: Optional[str]) -> Optional[float]:
+    """
+    Convert an ISO 8601 snapshot timestamp to POSIX seconds.
+    
+    Naive timestamps are treated as UTC, matching how snapshots are created.
+    
+    Args:
+        timestamp: ISO 8601 string (e.g. "2025-01-01T10:00:00Z")
+    
+    Returns:
+        float: Seconds since the epoch, or None if the timestamp can't be parsed
+    """
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def snapshot_epoch(snapshot: Dict[str, Any]) -> Optional[float]:
+    """
+    Return a snapshot's timestamp as POSIX seconds.
+    
+    Uses the numeric "epoch" recorded with the snapshot (or index entry)
+    when there is one, so only older snapshots need their timestamp parsed.
+    
+    Args:
+        snapshot: Snapshot dictionary or snapshot index entry
+    
+    Returns:
+        float: Seconds since the epoch, or None if the timestamp can't be parsed
+    """
+    epoch = snapshot.get("epoch")
+    if isinstance(epoch, (int, float)) and not isinstance(epoch, bool):
+        return float(epoch)
+    return timestamp_to_epoch(snapshot.get("timestamp"))
+
+
+def snapshot_index_entry(
+    snapshot: Dict[str, Any],
+    index: int,
+    content_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build the metadata index entry describing a snapshot.
+    
+    Args:
+        snapshot: Snapshot dictionary
+        index: Zero-based position of the snapshot in the history
+        content_hash: Precomputed compute_snapshot_hash() value (optional)
+    
+    Returns:
+        dict: {index, timestamp, epoch, total_value_eur, asset_count, hash}
+    """
+    return {
+        "index": index,
+        "timestamp": snapshot.get("timestamp"),
+        "epoch": snapshot_epoch(snapshot),
+        "total_value_eur": snapshot.get("total_value_eur", 0.0),
+        "asset_count": len(snapshot.get("assets") or []),
+        "hash": content_hash or compute_snapshot_hash(snapshot),
+    }
+
+
+def make_tombstone(position: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a tombstone marking one stored snapshot as deleted.
+    
+    Positions count every stored snapshot (deleted or not) in storage
+    order, so they stay valid while the history is only appended to. The
+    hash guards against a tombstone outliving a rewrite of the history.
+    
+    Args:
+        position: Position of the snapshot among all stored snapshots
+        entry: Index entry of the snapshot (see snapshot_index_entry)
+    
+    Returns:
+        dict: {position, hash, timestamp, deleted_at}
+    """
+    return {
+        "position": position,
+        "hash": entry.get("hash"),
+        "timestamp": entry.get("timestamp"),
+        "deleted_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def tombstoned_positions(tombstones: Iterable[Dict[str, Any]]) -> Dict[int, str]:
+    """Map tombstoned positions to the content hash they must match."""
+    return {tombstone["position"]: tombstone.get("hash") for tombstone in tombstones}
+
+
+def is_tombstoned(position: int, snapshot: Dict[str, Any], dead: Dict[int, str]) -> bool:
+    """
+    Check whether the snapshot stored at a position has been deleted.
+    
+    Args:
+        position: Position of the snapshot among all stored snapshots
+        snapshot: The stored snapshot
+        dead: Result of tombstoned_positions()
+    
+    Returns:
+        bool: True if a tombstone for this position and content exists
+    """
+    return position in dead and dead[position] == compute_snapshot_hash(snapshot)
+
+
+def drop_tombstoned(snapshots: Iterable[Dict[str, Any]], tombstones: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield stored snapshots that haven't been deleted, in order.
+    
+    Args:
+        snapshots: All stored snapshots in storage order
+        tombstones: Tombstones recorded for them
+    
+    Yields:
+        dict: Live snapshots
+    """
+    dead = tombstoned_positions(tombstones)
+    for position, snapshot in enumerate(snapshots):
+        if not (dead and is_tombstoned(position, snapshot, dead)):
+            yield snapshot
+
+
+def live_to_position(index: int, dead_positions: Iterable[int]) -> int:
+    """
+    Translate an index among live snapshots into a storage position.
+    
+    Args:
+        index: Zero-based index as shown to users (deleted snapshots skipped)
+        dead_positions: Positions of deleted snapshots
+    
+    Returns:
+        int: Position among all stored snapshots
+    """
+    position = index
+    for dead in sorted(dead_positions):
+        if dead > position:
+            break
+        position += 1
+    return position
+
+
+def bound_to_epoch(bound: Union[str, datetime, None]) -> Optional[float]:
+    """
+    Convert an iter_snapshots() range bound to POSIX seconds.
+    
+    Args:
+        bound: ISO 8601 string, datetime (naive = UTC), or None
+    
+    Returns:
+        float: Seconds since the epoch, or None if no bound is given
+        
+    Raises:
+        ValueError: If the bound can't be parsed
+    """
+    if bound is None:
+        return None
+    if isinstance(bound, datetime):
+        bound = bound.isoformat()
+    epoch = timestamp_to_epoch(bound)
+    if epoch is None:
+        raise ValueError(f"Invalid timestamp bound: {bound!r}")
+    return epoch
+
+
+def epoch_in_range(epoch: Optional[float], start_epoch: Optional[float], end_epoch: Optional[float]) -> bool:
+    """
+    Check whether a snapshot epoch lies within inclusive bounds.
+    
+    Snapshots without a parseable timestamp only match when no bound is set.
+    """
+    if start_epoch is None and end_epoch is None:
+        return True
+    if epoch is None:
+        return False
+    if start_epoch is not None and epoch < start_epoch:
+        return False
+    if end_epoch is not None and epoch > end_epoch:
+        return False
+    return True
+
+
+def project_snapshot(snapshot: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """
+    Return only the requested top-level fields of a snapshot.
+    
+    Args:
+        snapshot: Snapshot dictionary
+        fields: Field names to keep (None keeps the snapshot as is)
+    
+    Returns:
+        dict: The snapshot itself, or a new dict with the requested fields
+    """
+    if fields is None:
+        return snapshot
+    return {field: snapshot[field] for field in fields if field in snapshot}
+
+
+def select_snapshots(
+    snapshots: Iterable[Dict[str, Any]],
+    start: Union[str, datetime, None] = None,
+    end: Union[str, datetime, None] = None,
+    fields: Optional[Sequence[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Filter snapshots by timestamp range and project them to fields, lazily.
+    
+    Args:
+        snapshots: Snapshots in history order
+        start: Inclusive lower timestamp bound (optional)
+        end: Inclusive upper timestamp bound (optional)
+        fields: Top-level fields to keep (optional)
+    
+    Yields:
+        dict: Matching snapshots in history order
+        
+    Raises:
+        ValueError: If a bound can't be parsed
+    """
+    start_epoch = bound_to_epoch(start)
+    end_epoch = bound_to_epoch(end)
+    bounded = start_epoch is not None or end_epoch is not None
+    
+    for snapshot in snapshots:
+        if bounded and not epoch_in_range(snapshot_epoch(snapshot), start_epoch, end_epoch):
+            continue
+        yield project_snapshot(snapshot, fields)
+
+
+def chronological(snapshots: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sort snapshots by timestamp, keeping history order for equal timestamps.
+    
+    Snapshots without a parseable timestamp go last.
+    """
+    def key(snapshot: Dict[str, Any]):
+        epoch = snapshot_epoch(snapshot)
+        return (epoch is None, epoch or 0.0)
+    
+    return sorted(snapshots, key=key)
+
+
+def latest_at_or_before(snapshots: Iterable[Dict[str, Any]], epoch: float) -> Optional[Dict[str, Any]]:
+    """
+    Return the newest snapshot taken at or before an instant.
+    
+    Of snapshots with the same timestamp, the one later in history wins.
+    """
+    best = None
+    best_epoch = None
+    for snapshot in snapshots:
+        taken = snapshot_epoch(snapshot)
+        if taken is not None and taken <= epoch and (best_epoch is None or taken >= best_epoch):
+            best, best_epoch = snapshot, taken
+    return best
+
 
 class StorageBackend(ABC):
     """Abstract base class for storage backends."""
@@ -27,6 +311,32 @@ class StorageBackend(ABC):
         """
         pass
     
+    def save_snapshots(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Save several snapshots in order, skipping any already stored.
+        
+        Snapshots are matched by content hash, so replaying a batch (e.g.
+        after a lost acknowledgement or a crash part-way through) doesn't
+        store duplicates. Backends override this to store the batch in a
+        single write made durable once (bulk imports); this default saves
+        missing snapshots one by one.
+        
+        Args:
+            snapshots: Snapshots in chronological order
+        
+        Returns:
+            bool: True if every snapshot is now stored
+        """
+        existing = {entry.get("hash") for entry in self.get_snapshot_index()}
+        for snapshot in snapshots:
+            content_hash = compute_snapshot_hash(snapshot)
+            if content_hash in existing:
+                continue
+            if not self.save_snapshot(snapshot):
+                return False
+            existing.add(content_hash)
+        return True
+    
     @abstractmethod
     def get_latest_snapshot(self) -> Optional[Dict[str, Any]]:
         """
@@ -47,6 +357,89 @@ class StorageBackend(ABC):
         """
         pass
     
+    def iter_snapshots(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over snapshots in history order, optionally filtered.
+        
+        Backends override this to stream from storage, so only about one
+        snapshot is decoded at a time; this default filters the result of
+        get_all_snapshots().
+        
+        Args:
+            start: Inclusive lower timestamp bound (ISO 8601 or datetime)
+            end: Inclusive upper timestamp bound (ISO 8601 or datetime)
+            fields: Top-level fields to return (e.g. ["timestamp",
+                    "total_value_eur"]); None returns whole snapshots
+        
+        Yields:
+            dict: Matching snapshots
+            
+        Raises:
+            ValueError: If a bound can't be parsed
+        """
+        return select_snapshots(self.get_all_snapshots(), start, end, fields)
+    
+    def get_snapshots_between(
+        self,
+        start: Union[str, datetime, None] = None,
+        end: Union[str, datetime, None] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the snapshots taken within a timestamp range.
+        
+        Backends override this to read only the snapshots in the range
+        (e.g. located via their metadata index); this default filters
+        iter_snapshots().
+        
+        Args:
+            start: Inclusive lower timestamp bound (ISO 8601 or datetime)
+            end: Inclusive upper timestamp bound (ISO 8601 or datetime)
+        
+        Returns:
+            list: Matching snapshots in chronological order
+        
+        Raises:
+            ValueError: If a bound can't be parsed
+        """
+        return chronological(self.iter_snapshots(start, end))
+    
+    def get_snapshot_at_or_before(self, timestamp: Union[str, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the newest snapshot taken at or before a timestamp.
+        
+        Backends override this to read that one snapshot only; this default
+        streams iter_snapshots() up to the timestamp.
+        
+        Args:
+            timestamp: ISO 8601 timestamp or datetime (naive = UTC)
+        
+        Returns:
+            dict: The snapshot, or None if every snapshot is newer
+        
+        Raises:
+            ValueError: If the timestamp can't be parsed
+        """
+        epoch = bound_to_epoch(timestamp)
+        return latest_at_or_before(self.iter_snapshots(end=timestamp), epoch)
+    
+    def get_snapshot_index(self) -> List[Dict[str, Any]]:
+        """
+        Get compact metadata for every snapshot, without asset payloads.
+        
+        Backends maintain the index at save/delete time so listing tools
+        don't need to read the history; this default derives it from the
+        snapshots themselves.
+        
+        Returns:
+            list: snapshot_index_entry() dicts in history order
+        """
+        return [snapshot_index_entry(snapshot, i) for i, snapshot in enumerate(self.iter_snapshots())]
+    
     @abstractmethod
     def is_available(self) -> bool:
         """
@@ -92,3 +485,152 @@ class StorageBackend(ABC):
             bool: True if deletion succeeded, False otherwise
         """
         pass
+    
+    def replace_history(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """
+        Replace the whole history with the given snapshots.
+        
+        Used when history has to change other than by appending or
+        deleting one snapshot (e.g. reconciliation inserting snapshots
+        into the middle of the history). The previous history is backed
+        up first.
+        
+        Args:
+            snapshots: New history, in order
+        
+        Returns:
+            bool: True if the history now consists of exactly these snapshots
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support replacing history")
+    
+    def compact_history(self, keep_backups: int = DEFAULT_KEEP_BACKUPS) -> Dict[str, Any]:
+        """
+        Drop deleted snapshots from storage and remove old backups.
+        
+        Backends that delete logically (tombstones) rewrite the history
+        once here, after backing it up. Backends that delete physically
+        have nothing to rewrite; this default reports that.
+        
+        Args:
+            keep_backups: Number of most recent history backups to keep
+        
+        Returns:
+            dict: {"success": bool, "removed_snapshots": int,
+                   "backups_removed": int, ...} or {"success": False, "error": str}
+        """
+        return {"success": True, "removed_snapshots": 0, "backups_removed": 0}
+    
+    def count_tombstones(self) -> int:
+        """
+        Return the number of deleted snapshots awaiting compaction.
+        
+        Returns:
+            int: Tombstones recorded since the last compaction (0 if the
+                 backend deletes physically)
+        """
+        return 0
+    
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """
+        List restorable history backups, newest first.
+        
+        Returns:
+            list: {"id", "created_at", "reason", "source", "count",
+                   "deleted_count"} per backup (empty if the backend
+                   keeps no restorable backups)
+        """
+        return []
+    
+    def restore_backup(self, backup_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+        """
+        Replace the history with the one recorded by a backup.
+        
+        Args:
+            backup_id: Backup to restore (see list_backups)
+            include_deleted: Also restore snapshots that were deleted (but not
+                             yet dropped) when the backup was taken
+        
+        Returns:
+            dict: {"success", "backup_id", "restored_snapshots"} or
+                  {"success": False, "error"}
+        
+        Raises:
+            NotImplementedError: If the backend keeps no restorable backups
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support restoring backups")
+    
+    def archive_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Copy snapshots to cold per-year archives (see backends/archive.py).
+        
+        Each year's archive is merged with what it already holds, so
+        archiving a snapshot twice stores it once.
+        
+        Args:
+            snapshots: Snapshots to archive (full resolution)
+        
+        Returns:
+            dict: {"success", "years": {year: snapshots added}} or
+                  {"success": False, "error"}
+        
+        Raises:
+            NotImplementedError: If the backend keeps no archives
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support archives")
+    
+    def get_archived_snapshots(self, year: int) -> List[Dict[str, Any]]:
+        """
+        Return the archived snapshots of a year, in timestamp order.
+        
+        Args:
+            year: Archive year
+        
+        Returns:
+            list: Archived snapshots (empty if there is no archive)
+        """
+        return []
+    
+    def list_archive_years(self) -> List[int]:
+        """
+        Return the years that have an archive, oldest first.
+        
+        Returns:
+            list: Archive years (empty if the backend keeps no archives)
+        """
+        return []
+    
+    def get_history_version(self) -> Optional[Hashable]:
+        """
+        Return a cheap token identifying the current history contents.
+        
+        The token must change whenever the history changes and must be
+        obtainable without reading snapshot payloads (e.g. file mtime and
+        size, or an object generation). Used to validate in-process caches.
+        
+        Returns:
+            Hashable token, or None if the version cannot be determined
+            (callers must then treat any cached history as stale)
+        """
+        return None
+    
+    def get_data_dir(self) -> Optional[str]:
+        """
+        Return the local directory for files derived from the history.
+        
+        Used for caches the storage facade maintains next to the history
+        (e.g. the asset panel).
+        
+        Returns:
+            str: Directory path, or None if the backend has no local files
+        """
+        return None
+    
+    def sync(self) -> None:
+        """
+        Make every completed write durable now.
+        
+        Backends that defer fsyncs (durability "interval") flush them here;
+        the default does nothing, for backends whose writes are durable when
+        they return.
+        """
+        pass
@@ -0,0 +1,293 @@
+"""
+Storage Reconciliation Module
+
+Brings the primary (GCS) and fallback (local) histories back in line after
+they diverged, e.g. after a delete that only reached one side or saves that
+were never replicated.
+
+Each side's snapshot index serves as its hash manifest (content hash per
+snapshot), so planning reads no snapshot payloads. Only snapshots missing
+on the other side are transferred. Directions:
+
+    both  union of both histories; snapshots that differ between the sides
+          for the same timestamp are reported but left alone
+    push  make the primary match the fallback (local wins)
+    pull  make the fallback match the primary (GCS wins)
+"""
+
+import logging
+import time
+from typing import Dict, List, Any, Optional
+
+from .json_codec import dumps
+from .storage_backend import StorageBackend, compute_snapshot_hash, snapshot_epoch
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ("both", "push", "pull")
+
+
+def build_hash_manifest(index: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map content hashes to index entries (first occurrence wins).
+
+    Args:
+        index: Snapshot index as returned by get_snapshot_index()
+
+    Returns:
+        dict: {content_hash: index entry}
+    """
+    manifest = {}
+    for entry in index:
+        manifest.setdefault(entry.get("hash"), entry)
+    return manifest
+
+
+def plan_reconciliation(
+    primary_index: List[Dict[str, Any]],
+    fallback_index: List[Dict[str, Any]],
+    direction: str = "both"
+) -> Dict[str, Any]:
+    """
+    Work out which snapshots each side is missing or has in excess.
+
+    Args:
+        primary_index: Snapshot index of the primary backend
+        fallback_index: Snapshot index of the fallback backend
+        direction: "both", "push" or "pull"
+
+    Returns:
+        dict: {
+            "direction": str,
+            "in_sync_count": int (snapshots present on both sides),
+            "to_primary": list of index entries to copy to the primary,
+            "to_fallback": list of index entries to copy to the fallback,
+            "remove_from_primary": list of index entries to drop,
+            "remove_from_fallback": list of index entries to drop,
+            "divergent": list of {"timestamp", "primary_hash", "fallback_hash"}
+        }
+
+    Raises:
+        ValueError: If direction is unknown
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown sync direction '{direction}' (expected one of {DIRECTIONS})")
+
+    primary = build_hash_manifest(primary_index)
+    fallback = build_hash_manifest(fallback_index)
+    only_primary = [entry for content_hash, entry in primary.items() if content_hash not in fallback]
+    only_fallback = [entry for content_hash, entry in fallback.items() if content_hash not in primary]
+
+    # Same instant, different contents: the two sides disagree about a snapshot
+    fallback_by_time = {_entry_time(entry): entry for entry in only_fallback}
+    divergent = []
+    for entry in only_primary:
+        other = fallback_by_time.get(_entry_time(entry))
+        if other is not None:
+            divergent.append({
+                "timestamp": entry.get("timestamp"),
+                "primary_hash": entry.get("hash"),
+                "fallback_hash": other.get("hash"),
+            })
+
+    plan = {
+        "direction": direction,
+        "in_sync_count": len(primary.keys() & fallback.keys()),
+        "to_primary": [],
+        "to_fallback": [],
+        "remove_from_primary": [],
+        "remove_from_fallback": [],
+        "divergent": divergent,
+    }
+
+    if direction == "push":
+        plan["to_primary"] = only_fallback
+        plan["remove_from_primary"] = only_primary
+    elif direction == "pull":
+        plan["to_fallback"] = only_primary
+        plan["remove_from_fallback"] = only_fallback
+    else:
+        conflicted = {d["primary_hash"] for d in divergent} | {d["fallback_hash"] for d in divergent}
+        plan["to_primary"] = [e for e in only_fallback if e.get("hash") not in conflicted]
+        plan["to_fallback"] = [e for e in only_primary if e.get("hash") not in conflicted]
+
+    return plan
+
+
+def reconcile_backends(
+    primary: StorageBackend,
+    fallback: StorageBackend,
+    direction: str = "both",
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Reconcile two backends according to the plan for their indexes.
+
+    Each side is written at most once: missing snapshots that are newer
+    than everything on the target are appended (save_snapshots); anything
+    else (inserts into the middle, removals) replaces the target history
+    in timestamp order (replace_history).
+
+    Args:
+        primary: Primary backend (GCS)
+        fallback: Fallback backend (local)
+        direction: "both", "push" or "pull"
+        dry_run: Only plan, change nothing
+
+    Returns:
+        dict: The plan (see plan_reconciliation) plus "success", "dry_run",
+              "primary_count", "fallback_count", "transferred" (snapshot
+              and byte counts per side) and "duration_seconds"
+
+    Raises:
+        ValueError: If direction is unknown
+    """
+    started = time.monotonic()
+
+    # Step 1: Compare the hash manifests
+    primary_index = primary.get_snapshot_index()
+    fallback_index = fallback.get_snapshot_index()
+    plan = plan_reconciliation(primary_index, fallback_index, direction)
+
+    result = {
+        "success": True,
+        "dry_run": dry_run,
+        "primary_count": len(primary_index),
+        "fallback_count": len(fallback_index),
+        **plan,
+        "transferred": {
+            "to_primary": 0,
+            "to_fallback": 0,
+            "removed_from_primary": 0,
+            "removed_from_fallback": 0,
+            "bytes": 0,
+        },
+    }
+
+    logger.info(
+        f"Storage sync plan ({direction}): {len(plan['to_primary'])} to primary, "
+        f"{len(plan['to_fallback'])} to fallback, {len(plan['remove_from_primary'])} + "
+        f"{len(plan['remove_from_fallback'])} to remove, {len(plan['divergent'])} divergent"
+    )
+
+    # Step 2: Apply the plan to each side
+    if not dry_run:
+        sides = (
+            ("primary", primary, fallback, primary_index, plan["to_primary"], plan["remove_from_primary"]),
+            ("fallback", fallback, primary, fallback_index, plan["to_fallback"], plan["remove_from_fallback"]),
+        )
+        for name, target, source, target_index, additions, removals in sides:
+            if not additions and not removals:
+                continue
+
+            snapshots = _fetch_snapshots(source, additions)
+            if not _apply(target, target_index, snapshots, removals):
+                logger.error(f"Storage sync: Failed to update {name}")
+                result["success"] = False
+                result["error"] = f"Failed to update {name} storage. Check logs for details."
+                break
+
+            transferred = result["transferred"]
+            transferred[f"to_{name}"] = len(snapshots)
+            transferred[f"removed_from_{name}"] = len(removals)
+            transferred["bytes"] += sum(
+                len(dumps(snapshot)) for snapshot in snapshots
+            )
+
+    result["duration_seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def _entry_time(entry: Dict[str, Any]) -> Any:
+    """Return the instant an index entry refers to (epoch, or raw timestamp if unparseable)."""
+    epoch = entry.get("epoch")
+    return epoch if epoch is not None else entry.get("timestamp")
+
+
+def _fetch_snapshots(source: StorageBackend, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Read the snapshots for index entries from a backend, in history order.
+
+    Streams from the earliest requested timestamp, so backends that can
+    seek (SQLite, sharded GCS) skip older history.
+
+    Args:
+        source: Backend to read from
+        entries: Index entries of the wanted snapshots
+
+    Returns:
+        list: Snapshots found (each content hash at most once)
+
+    Raises:
+        RuntimeError: If a wanted snapshot is no longer in the source
+    """
+    if not entries:
+        return []
+
+    wanted = {entry.get("hash") for entry in entries}
+    epochs = [entry.get("epoch") for entry in entries]
+    start = None
+    if all(epoch is not None for epoch in epochs):
+        start = min(entries, key=lambda entry: entry["epoch"])["timestamp"]
+
+    snapshots = []
+    for snapshot in source.iter_snapshots(start=start):
+        content_hash = compute_snapshot_hash(snapshot)
+        if content_hash in wanted:
+            wanted.discard(content_hash)
+            snapshots.append(snapshot)
+
+    if wanted:
+        raise RuntimeError(f"{len(wanted)} snapshots disappeared from the source during sync")
+    return snapshots
+
+
+def _apply(
+    target: StorageBackend,
+    target_index: List[Dict[str, Any]],
+    additions: List[Dict[str, Any]],
+    removals: List[Dict[str, Any]]
+) -> bool:
+    """
+    Write additions and removals to one backend in a single update.
+
+    Args:
+        target: Backend to update
+        target_index: Its snapshot index before the update
+        additions: Snapshots to add
+        removals: Index entries of snapshots to drop
+
+    Returns:
+        bool: True if the update succeeded
+    """
+    latest_epoch = _max_epoch(target_index)
+    addition_epochs = [_snapshot_epoch(snapshot) for snapshot in additions]
+    appends_only = not removals and all(
+        epoch is not None and (latest_epoch is None or epoch >= latest_epoch)
+        for epoch in addition_epochs
+    )
+    if appends_only:
+        return target.save_snapshots(additions)
+
+    removed = {entry.get("hash") for entry in removals}
+    history = [s for s in target.get_all_snapshots() if compute_snapshot_hash(s) not in removed]
+    history.extend(additions)
+
+    # Stable sort: snapshots without a parseable timestamp keep their place at the front
+    def sort_key(snapshot: Dict[str, Any]) -> float:
+        epoch = _snapshot_epoch(snapshot)
+        return epoch if epoch is not None else float("-inf")
+
+    history.sort(key=sort_key)
+    return target.replace_history(history)
+
+
+def _max_epoch(index: List[Dict[str, Any]]) -> Optional[float]:
+    """Return the newest epoch in an index (None if empty or unparseable)."""
+    epochs = [entry.get("epoch") for entry in index if entry.get("epoch") is not None]
+    return max(epochs) if epochs else None
+
+
+def _snapshot_epoch(snapshot: Dict[str, Any]) -> Optional[float]:
+    """Return a snapshot's timestamp as epoch seconds (None if unparseable)."""
+    return snapshot_epoch(snapshot)
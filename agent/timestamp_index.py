@@ -0,0 +1,111 @@
+"""
+Snapshot Timestamp Index
+
+Finds snapshots by time. The index is built once per history version (see
+storage.get_timestamp_index) from each snapshot's stored epoch, sorted, so
+point-in-time and window lookups are binary searches instead of scans that
+parse every timestamp.
+"""
+
+import bisect
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .storage_backend import bound_to_epoch, snapshot_epoch
+
+# A lookup bound: ISO 8601 string, datetime (naive = UTC) or POSIX seconds
+Bound = Union[str, datetime, float, None]
+
+
+def _to_epoch(bound: Bound) -> Optional[float]:
+    """Convert a lookup bound to POSIX seconds (None stays None)."""
+    if isinstance(bound, (int, float)) and not isinstance(bound, bool):
+        return float(bound)
+    return bound_to_epoch(bound)
+
+
+class TimestampIndex:
+    """Snapshots sorted by epoch, keeping history order for equal timestamps."""
+
+    def __init__(self, snapshots: Iterable[Dict[str, Any]]):
+        """
+        Index snapshots (or snapshot index entries) by time.
+
+        Snapshots without a parseable timestamp are kept aside: they only
+        appear in unbounded windows, last, like storage_backend.chronological.
+
+        Args:
+            snapshots: Snapshots in history order
+        """
+        dated = []
+        self._undated: List[Dict[str, Any]] = []
+        for position, snapshot in enumerate(snapshots):
+            epoch = snapshot_epoch(snapshot)
+            if epoch is None:
+                self._undated.append(snapshot)
+            else:
+                dated.append((epoch, position, snapshot))
+
+        dated.sort(key=lambda entry: (entry[0], entry[1]))
+        self._epochs: List[float] = [epoch for epoch, _, _ in dated]
+        self._snapshots: List[Dict[str, Any]] = [snapshot for _, _, snapshot in dated]
+
+    def __len__(self) -> int:
+        """Number of indexed snapshots."""
+        return len(self._snapshots) + len(self._undated)
+
+    def snapshot_at_or_before(self, timestamp: Bound) -> Optional[Dict[str, Any]]:
+        """
+        Find the newest snapshot taken at or before an instant.
+
+        Of snapshots with the same timestamp, the one later in history wins.
+
+        Args:
+            timestamp: ISO 8601 string, datetime (naive = UTC) or POSIX seconds
+
+        Returns:
+            dict: The snapshot, or None if every snapshot is newer
+
+        Raises:
+            ValueError: If the timestamp can't be parsed
+        """
+        epoch = _to_epoch(timestamp)
+        if epoch is None:
+            raise ValueError("A timestamp is required")
+        position = bisect.bisect_right(self._epochs, epoch)
+        return self._snapshots[position - 1] if position else None
+
+    def snapshot_in_window(self, start: Bound = None, end: Bound = None) -> List[Dict[str, Any]]:
+        """
+        Find the snapshots taken within inclusive bounds.
+
+        Args:
+            start: Lower bound (None = unbounded)
+            end: Upper bound (None = unbounded)
+
+        Returns:
+            list: Matching snapshots in chronological order
+
+        Raises:
+            ValueError: If a bound can't be parsed
+        """
+        start_epoch = _to_epoch(start)
+        end_epoch = _to_epoch(end)
+        if start_epoch is None and end_epoch is None:
+            return self._snapshots + self._undated
+
+        low = 0 if start_epoch is None else bisect.bisect_left(self._epochs, start_epoch)
+        high = len(self._epochs) if end_epoch is None else bisect.bisect_right(self._epochs, end_epoch)
+        return self._snapshots[low:high]
+
+    def latest(self, count: int) -> List[Dict[str, Any]]:
+        """
+        Return the newest snapshots.
+
+        Args:
+            count: Number of snapshots
+
+        Returns:
+            list: Up to count snapshots with a timestamp, oldest first
+        """
+        return self._snapshots[-count:] if count > 0 else []
@@ -0,0 +1,147 @@
+"""
+Transaction Lookup Index
+
+Finds the transactions recorded for an asset between two snapshots. The
+index is built once per run from the parsed sell or buy transactions:
+grouped by asset name (case-sensitive exact match), with every date parsed
+once and sorted, so each lookup is a binary search over one asset's
+transactions instead of a scan over all of them. Callers looking up many
+assets over the same period convert its bounds once (snapshot_period).
+"""
+
+import bisect
+from typing import Any, Dict, Iterable, List, Tuple, Union
+import logging
+
+from .storage_backend import snapshot_epoch, timestamp_to_epoch
+
+logger = logging.getLogger(__name__)
+
+# A period bound: ISO timestamp or POSIX seconds
+Bound = Union[str, float]
+
+
+class TransactionIndex:
+    """Transactions grouped by asset name and sorted by date."""
+
+    def __init__(self, transactions: Iterable[Dict[str, Any]], label: str = "transaction"):
+        """
+        Index parsed transactions.
+
+        Transactions without a date are skipped, as are ones whose date
+        can't be parsed (logged as a warning). Naive dates are treated as
+        UTC, like snapshot timestamps.
+
+        Args:
+            transactions: Parsed sell or buy transactions
+            label: Kind of transaction, used in log messages
+        """
+        grouped: Dict[Any, List[Tuple[float, int, Dict[str, Any]]]] = {}
+        for position, txn in enumerate(transactions):
+            date = txn.get("date")
+            if not date:
+                continue
+            epoch = timestamp_to_epoch(date)
+            if epoch is None:
+                logger.warning(f"Invalid date format in {label}: {date}")
+                continue
+            grouped.setdefault(txn.get("asset_name", ""), []).append((epoch, position, txn))
+
+        self._epochs: Dict[Any, List[float]] = {}
+        self._entries: Dict[Any, List[Tuple[int, Dict[str, Any]]]] = {}
+        for name, entries in grouped.items():
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
+            self._epochs[name] = [epoch for epoch, _, _ in entries]
+            self._entries[name] = [(position, txn) for _, position, txn in entries]
+        self._count = sum(len(entries) for entries in grouped.values())
+
+    @classmethod
+    def of(
+        cls,
+        transactions: Union["TransactionIndex", Iterable[Dict[str, Any]]],
+        label: str = "transaction"
+    ) -> "TransactionIndex":
+        """
+        Return an index over transactions, reusing one that is already built.
+
+        Args:
+            transactions: A TransactionIndex or a list of parsed transactions
+            label: Kind of transaction, used in log messages
+
+        Returns:
+            TransactionIndex: The given index, or a new one over the list
+        """
+        if isinstance(transactions, cls):
+            return transactions
+        return cls(transactions, label)
+
+    def __len__(self) -> int:
+        """Number of indexed (dated) transactions."""
+        return self._count
+
+    def find(self, asset_name: str, previous_date: Bound, current_date: Bound) -> List[Dict[str, Any]]:
+        """
+        Find an asset's transactions within a snapshot period.
+
+        Bounds are only converted for assets that have transactions.
+
+        Args:
+            asset_name: Asset name to match (case-sensitive exact match)
+            previous_date: Start of period (ISO format or POSIX seconds, exclusive)
+            current_date: End of period (ISO format or POSIX seconds, inclusive)
+
+        Returns:
+            List of matching transaction dicts, in their original order
+
+        Raises:
+            ValueError: If the asset has transactions and a period bound
+                        isn't an ISO date
+        """
+        epochs = self._epochs.get(asset_name)
+        if not epochs:
+            return []
+
+        start = _period_bound(previous_date)
+        end = _period_bound(current_date)
+
+        # Date range: previous < txn_date <= current
+        low = bisect.bisect_right(epochs, start)
+        high = bisect.bisect_right(epochs, end)
+        if low >= high:
+            return []
+        return [txn for _, txn in sorted(self._entries[asset_name][low:high], key=lambda entry: entry[0])]
+
+
+def snapshot_period(
+    previous_snapshot: Dict[str, Any],
+    current_snapshot: Dict[str, Any]
+) -> Tuple[Bound, Bound]:
+    """
+    Convert the period between two snapshots to bounds for find, once.
+
+    Uses each snapshot's stored epoch (parsing the timestamp only for
+    snapshots saved without one). A timestamp that can't be converted is
+    passed on as is, so find raises for it as before.
+
+    Args:
+        previous_snapshot: Snapshot starting the period
+        current_snapshot: Snapshot ending the period
+
+    Returns:
+        tuple: (start, end) bounds
+    """
+    bounds = []
+    for snapshot in (previous_snapshot, current_snapshot):
+        epoch = snapshot_epoch(snapshot)
+        bounds.append(snapshot["timestamp"] if epoch is None else epoch)
+    return bounds[0], bounds[1]
+
+
+def _period_bound(date: Bound) -> float:
+    """Convert a period bound (ISO timestamp or POSIX seconds) to POSIX seconds."""
+    if isinstance(date, (int, float)) and not isinstance(date, bool):
+        return float(date)
+    epoch = timestamp_to_epoch(date)
+    if epoch is None:
+        raise ValueError(f"Invalid period bound: {date!r}")
+    return epoch
@@ -6,11 +6,12 @@ Implements hash-based change detection to minimize unnecessary writes.
 """
 
 import hashlib
-import json
 import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 
+from .json_codec import canonical_dumps
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,7 +68,7 @@ def compute_transaction_hash(transactions: List[Dict[str, Any]]) -> str:
     normalized.sort(key=lambda x: (x["date"], x["asset_name"]))
     
     # Compute hash
-    json_str = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    json_str = canonical_dumps(normalized)
     hash_obj = hashlib.sha256(json_str.encode('utf-8'))
     
     return f"sha256:{hash_obj.hexdigest()}"
@@ -19,6 +19,7 @@ from plotly.subplots import make_subplots
 import yfinance as yf
 
 from . import storage
+from .asset_panel import CURRENCY_BY_CATEGORY, AssetPanel
 
 logger = logging.getLogger(__name__)
 
@@ -35,120 +36,80 @@ PERIOD_MAPPING = {
 }
 
 
-def _filter_snapshots_by_period(
-    snapshots: List[Dict[str, Any]], 
-    period: str
-) -> List[Dict[str, Any]]:
+def _load_panel_for_period(period: str) -> AssetPanel:
     """
-    Filter snapshots by time period.
+    Slice the asset panel to a time period.
+    
+    Keeps the rows taken at or after the cutoff (the latest snapshot's time
+    minus the period), in chronological order.
     
     Args:
-        snapshots: List of all snapshots
         period: One of "7d", "30d", "90d", "1y", "all"
     
     Returns:
-        Filtered list of snapshots
+        AssetPanel with the rows in the period
     """
     if period not in PERIOD_MAPPING:
         logger.warning(f"Invalid period '{period}', defaulting to 'all'")
         period = "all"
     
-    delta = PERIOD_MAPPING[period]
-    
-    if delta is None:
-        return snapshots
-    
-    if not snapshots:
-        return []
+    panel = storage.get_asset_panel()
+    if PERIOD_MAPPING[period] is None or not len(panel):
+        return panel
     
-    # Get cutoff date
-    latest_snapshot = snapshots[-1]
-    latest_date = datetime.fromisoformat(latest_snapshot["timestamp"].replace("Z", "+00:00"))
-    cutoff_date = latest_date - delta
-    
-    # Filter snapshots
-    filtered = []
-    for snapshot in snapshots:
-        snap_date = datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))
-        if snap_date >= cutoff_date:
-            filtered.append(snapshot)
-    
-    return filtered
+    return panel.since(panel.epochs[-1] - PERIOD_MAPPING[period].total_seconds())
+
+
+def _panel_timestamps(panel: AssetPanel) -> pd.DatetimeIndex:
+    """Row timestamps of a panel as UTC datetimes."""
+    return pd.to_datetime(panel.epochs, unit="s", utc=True)
 
 
 def _prepare_portfolio_timeseries(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> pd.DataFrame:
     """
-    Convert snapshots to time-series DataFrame for portfolio totals.
+    Convert panel rows to time-series DataFrame for portfolio totals.
     
     Returns:
         DataFrame with columns: timestamp, total_value_eur
     """
-    data = []
-    for snapshot in snapshots:
-        data.append({
-            "timestamp": datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00")),
-            "total_value_eur": snapshot["total_value_eur"]
-        })
-    
-    df = pd.DataFrame(data)
+    df = pd.DataFrame({
+        "timestamp": _panel_timestamps(panel),
+        "total_value_eur": panel.totals
+    })
     df = df.sort_values("timestamp")
     return df
 
 
 def _prepare_category_timeseries(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> pd.DataFrame:
     """
-    Convert snapshots to time-series DataFrame for category allocation.
+    Convert panel rows to time-series DataFrame for category allocation.
     
     Returns:
         DataFrame with columns: timestamp, category1, category2, ...
     """
-    data = []
-    for snapshot in snapshots:
-        row = {"timestamp": datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))}
-        
-        # Aggregate by category
-        for asset in snapshot.get("assets", []):
-            category = asset.get("category", "Other")
-            value = asset.get("current_value_eur", 0.0)
-            row[category] = row.get(category, 0.0) + value
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
+    # Per-row category totals, summed over every asset when the row was added
+    df = pd.DataFrame(panel.filled_category_values(), columns=panel.category_names.tolist())
+    df.insert(0, "timestamp", _panel_timestamps(panel))
     df = df.sort_values("timestamp")
-    df = df.fillna(0)
     return df
 
 
 def _prepare_asset_timeseries(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> pd.DataFrame:
     """
-    Convert snapshots to time-series DataFrame for individual assets.
+    Convert panel rows to time-series DataFrame for individual assets.
     
     Returns:
         DataFrame with columns: timestamp, asset1, asset2, ...
     """
-    data = []
-    for snapshot in snapshots:
-        row = {"timestamp": datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))}
-        
-        # Add each asset
-        for asset in snapshot.get("assets", []):
-            name = asset.get("name")
-            value = asset.get("current_value_eur", 0.0)
-            if name:
-                row[name] = value
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(panel.filled_values(), columns=panel.names.tolist())
+    df.insert(0, "timestamp", _panel_timestamps(panel))
     df = df.sort_values("timestamp")
-    df = df.fillna(0)
     return df
 
 
@@ -181,7 +142,7 @@ def _get_top_assets_by_value(
 
 
 def _prepare_benchmark_data(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Fetch benchmark data for S&P 500 (SPY) and All-World (VT).
@@ -191,12 +152,12 @@ def _prepare_benchmark_data(
     
     Note: Uses yfinance to fetch benchmark data, normalizes to portfolio start date
     """
-    if not snapshots:
+    if not len(panel):
         return pd.DataFrame(), pd.DataFrame()
     
     # Get date range
-    start_date = datetime.fromisoformat(snapshots[0]["timestamp"].replace("Z", "+00:00"))
-    end_date = datetime.fromisoformat(snapshots[-1]["timestamp"].replace("Z", "+00:00"))
+    start_date = datetime.fromisoformat(str(panel.timestamps[0]).replace("Z", "+00:00"))
+    end_date = datetime.fromisoformat(str(panel.timestamps[-1]).replace("Z", "+00:00"))
     
     # Add buffer
     start_date = start_date - timedelta(days=7)
@@ -458,7 +419,8 @@ def _create_asset_performance_chart(
 
 
 def _create_top_holdings_chart(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel,
+    latest_snapshot: Dict[str, Any]
 ) -> go.Figure:
     """
     Create chart showing how top 10 holdings change over time.
@@ -468,15 +430,14 @@ def _create_top_holdings_chart(
     """
     fig = go.Figure()
     
-    if not snapshots:
+    if not len(panel):
         return fig
     
     # Get latest snapshot to determine top holdings
-    latest_snapshot = snapshots[-1]
     top_assets = _get_top_assets_by_value(latest_snapshot, n=10)
     
     # Prepare data for top assets
-    df = _prepare_asset_timeseries(snapshots)
+    df = _prepare_asset_timeseries(panel)
     
     for asset in top_assets:
         if asset in df.columns:
@@ -567,7 +528,7 @@ def _create_gainloss_chart(
 
 
 def _create_quantity_changes_chart(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> go.Figure:
     """
     Create scatter/line chart showing buy/sell activity over time.
@@ -579,55 +540,35 @@ def _create_quantity_changes_chart(
     """
     fig = go.Figure()
     
-    if len(snapshots) < 2:
+    if len(panel) < 2:
         return fig
     
-    # Track quantity changes
-    transactions = []
+    # Skip cash and pension positions (only show securities), by name or category
+    securities = np.array([
+        "Cash" not in name and "Pension" not in name and category not in ["Cash", "Pension"]
+        for name, category in zip(panel.names.tolist(), panel.categories.tolist())
+    ], dtype=bool)
     
-    for i in range(1, len(snapshots)):
-        prev_snapshot = snapshots[i - 1]
-        curr_snapshot = snapshots[i]
-        
-        timestamp = datetime.fromisoformat(curr_snapshot["timestamp"].replace("Z", "+00:00"))
-        
-        # Build asset maps
-        prev_assets = {asset["name"]: asset for asset in prev_snapshot.get("assets", [])}
-        curr_assets = {asset["name"]: asset for asset in curr_snapshot.get("assets", [])}
-        
-        # Check for quantity changes
-        for name in set(list(prev_assets.keys()) + list(curr_assets.keys())):
-            # Skip cash and pension positions (only show securities)
-            if "Cash" in name or "Pension" in name:
-                continue
-
-            # Also check category
-            asset_info = curr_assets.get(name) or prev_assets.get(name)
-            if asset_info:
-                category = asset_info.get("category", "")
-                if category in ["Cash", "Pension"]:
-                    continue
-
-            prev_qty = prev_assets.get(name, {}).get("quantity", 0.0)
-            curr_qty = curr_assets.get(name, {}).get("quantity", 0.0)
-
-            qty_change = curr_qty - prev_qty
-
-            if abs(qty_change) > 0.01:  # Threshold to avoid noise
-                # For buys, show current value (position after buy)
-                # For sells, show previous value (what was sold)
-                if qty_change > 0:  # Buy
-                    value = curr_assets.get(name, {}).get("current_value_eur", 0.0)
-                else:  # Sell
-                    value = prev_assets.get(name, {}).get("current_value_eur", 0.0)
-
-                transactions.append({
-                    "timestamp": timestamp,
-                    "name": name,
-                    "qty_change": qty_change,
-                    "value": value,
-                    "type": "Buy" if qty_change > 0 else "Sell"
-                })
+    # Quantity changes between consecutive snapshots (absent positions hold 0)
+    quantities = panel.filled_quantities()[:, securities]
+    values = panel.filled_values()[:, securities]
+    names = panel.names[securities]
+    qty_changes = np.diff(quantities, axis=0)
+    
+    timestamps = _panel_timestamps(panel)
+    transactions = []
+    for row, column in zip(*np.nonzero(np.abs(qty_changes) > 0.01)):  # Threshold to avoid noise
+        qty_change = float(qty_changes[row, column])
+        # For buys, show current value (position after buy)
+        # For sells, show previous value (what was sold)
+        value = values[row + 1, column] if qty_change > 0 else values[row, column]
+        transactions.append({
+            "timestamp": timestamps[row + 1],
+            "name": str(names[column]),
+            "qty_change": qty_change,
+            "value": float(value),
+            "type": "Buy" if qty_change > 0 else "Sell"
+        })
     
     if not transactions:
         # Add a note that no transactions detected
@@ -710,46 +651,32 @@ def _create_quantity_changes_chart(
 
 
 def _create_currency_exposure_chart(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> go.Figure:
     """
     Create stacked area chart of currency exposure.
     
     Features:
     - USD, EUR, GBP exposure over time
-    - Based on asset geography/category
+    - Based on asset geography/category (asset_panel.CURRENCY_BY_CATEGORY)
     """
     fig = go.Figure()
     
-    if not snapshots:
+    if not len(panel):
         return fig
     
-    # Map categories to currencies (simplified assumption)
-    currency_map = {
-        "US Stocks": "USD",
-        "EU Stocks": "EUR",
-        "Bonds": "EUR",
-        "ETFs": "Mixed",
-        "Pension": "EUR",
-        "Cash": "EUR"
-    }
-    
-    data = []
-    for snapshot in snapshots:
-        row = {"timestamp": datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00"))}
-        
-        # Aggregate by currency
-        for asset in snapshot.get("assets", []):
-            category = asset.get("category", "Other")
-            currency = currency_map.get(category, "Other")
-            value = asset.get("current_value_eur", 0.0)
-            row[currency] = row.get(currency, 0.0) + value
-        
-        data.append(row)
+    # Sum category columns into one column per currency (first-seen order)
+    currency_columns: Dict[str, int] = {}
+    columns = [
+        currency_columns.setdefault(CURRENCY_BY_CATEGORY.get(category, "Other"), len(currency_columns))
+        for category in panel.category_names.tolist()
+    ]
+    totals = np.zeros((len(panel), len(currency_columns)))
+    np.add.at(totals.T, columns, panel.filled_category_values().T)
     
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(totals, columns=list(currency_columns))
+    df.insert(0, "timestamp", _panel_timestamps(panel))
     df = df.sort_values("timestamp")
-    df = df.fillna(0)
     
     currencies = [col for col in df.columns if col != "timestamp"]
     
@@ -786,7 +713,7 @@ def _create_currency_exposure_chart(
 
 
 def _create_metrics_dashboard(
-    snapshots: List[Dict[str, Any]]
+    panel: AssetPanel
 ) -> go.Figure:
     """
     Create subplot dashboard with key metrics:
@@ -799,7 +726,7 @@ def _create_metrics_dashboard(
     - 2x2 subplot grid
     - Each metric toggleable
     """
-    if len(snapshots) < 2:
+    if len(panel) < 2:
         fig = go.Figure()
         fig.add_annotation(
             text="Need more snapshot history to calculate metrics",
@@ -826,7 +753,7 @@ def _create_metrics_dashboard(
     )
     
     # Prepare portfolio time series
-    df = _prepare_portfolio_timeseries(snapshots)
+    df = _prepare_portfolio_timeseries(panel)
     
     # 1. Cumulative Returns
     initial_value = df.iloc[0]["total_value_eur"]
@@ -1080,11 +1007,11 @@ def _create_cost_basis_waterfall(assets: List[Dict[str, Any]]) -> go.Figure:
     # Filter out cash and pension, focus on traded securities
     tradeable = [a for a in assets if a.get("category") not in ["Cash", "Pension"] and a.get("quantity", 0) > 0]
 
-    # Sort by unrealized gain/loss
-    for asset in tradeable:
-        cost_basis = asset.get("purchase_price_total_eur", 0)
-        current_value = asset.get("current_value_eur", 0)
-        asset["unrealized_gain"] = current_value - cost_basis
+    # Sort by unrealized gain/loss (copies: snapshot assets are shared with the storage cache)
+    tradeable = [
+        {**asset, "unrealized_gain": asset.get("current_value_eur", 0) - asset.get("purchase_price_total_eur", 0)}
+        for asset in tradeable
+    ]
 
     tradeable.sort(key=lambda x: x["unrealized_gain"], reverse=True)
 
@@ -1171,38 +1098,25 @@ def _create_attribution_chart(movers: List[Dict[str, Any]]) -> go.Figure:
     return fig
 
 
-def _create_hhi_trend_chart(snapshots: List[Dict[str, Any]]) -> go.Figure:
+def _create_hhi_trend_chart(panel: AssetPanel) -> go.Figure:
     """
     Create line chart showing HHI concentration index over time.
 
     Args:
-        snapshots: List of portfolio snapshots
+        panel: Asset panel rows to chart
 
     Returns:
         Plotly line figure
     """
     fig = go.Figure()
 
-    if len(snapshots) < 2:
+    if len(panel) < 2:
         return fig
 
-    # Calculate HHI for each snapshot
-    dates = []
-    hhi_values = []
-
-    for snapshot in snapshots:
-        total_value = snapshot.get("total_value_eur", 0)
-        if total_value == 0:
-            continue
-
-        # Calculate HHI (sum of squared weight percentages)
-        hhi = 0
-        for asset in snapshot.get("assets", []):
-            weight = asset.get("current_value_eur", 0) / total_value
-            hhi += weight ** 2
-
-        dates.append(datetime.fromisoformat(snapshot["timestamp"].replace("Z", "+00:00")))
-        hhi_values.append(hhi * 10000)  # Scale to 0-10000
+    # Calculate HHI (sum of squared weight percentages) for each snapshot with a value
+    rows = panel.totals != 0
+    dates = _panel_timestamps(panel)[rows]
+    hhi_values = panel.value_squares[rows] / panel.totals[rows] ** 2 * 10000  # Scale to 0-10000
 
     fig.add_trace(go.Scatter(
         x=dates,
@@ -1776,7 +1690,7 @@ def _create_time_selector_js() -> str:
 def _wrap_view_html(
     view_content: str,
     title: str,
-    snapshots: List[Dict[str, Any]],
+    panel: AssetPanel,
     period: str
 ) -> str:
     """
@@ -1785,7 +1699,7 @@ def _wrap_view_html(
     Args:
         view_content: HTML content from view (e.g., DailyOverviewView)
         title: Page title
-        snapshots: All snapshots for metadata
+        panel: Asset panel rows of the period, for metadata
         period: Current time period selection
 
     Returns:
@@ -1827,7 +1741,7 @@ def _wrap_view_html(
 
 def _generate_dashboard_html(
     figures: Dict[str, go.Figure],
-    snapshots: List[Dict[str, Any]],
+    panel: AssetPanel,
     period: str
 ) -> str:
     """
@@ -1835,26 +1749,22 @@ def _generate_dashboard_html(
     
     Args:
         figures: Dict of chart_name -> plotly figure
-        snapshots: All snapshots for metadata
+        panel: Asset panel rows of the period, for metadata
         period: Current time period selection
     
     Returns:
         Complete HTML string
     """
     # Calculate summary statistics
-    if not snapshots:
+    if not len(panel):
         return "<html><body><h1>No data available</h1></body></html>"
     
-    latest = snapshots[-1]
-    first = snapshots[0]
-    
-    current_value = latest["total_value_eur"]
-    initial_value = first["total_value_eur"]
+    current_value = float(panel.totals[-1])
+    initial_value = float(panel.totals[0])
     total_change = current_value - initial_value
     total_change_pct = (total_change / initial_value * 100) if initial_value > 0 else 0
     
-    start_date = datetime.fromisoformat(first["timestamp"].replace("Z", "+00:00")).strftime("%Y-%m-%d")
-    end_date = datetime.fromisoformat(latest["timestamp"].replace("Z", "+00:00")).strftime("%Y-%m-%d")
+    start_date, end_date = _panel_date_range(panel)
     
     # Generate HTML
     html_parts = []
@@ -1920,7 +1830,7 @@ def _generate_dashboard_html(
         </div>
         <div class="stat-card">
             <h3>Snapshots</h3>
-            <p>{len(snapshots)}</p>
+            <p>{len(panel)}</p>
         </div>
         <div class="stat-card">
             <h3>Date Range</h3>
@@ -1972,6 +1882,14 @@ def _generate_dashboard_html(
     return '\n'.join(html_parts)
 
 
+def _panel_date_range(panel: AssetPanel) -> Tuple[str, str]:
+    """First and last row dates of a panel as YYYY-MM-DD."""
+    return tuple(
+        datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).strftime("%Y-%m-%d")
+        for timestamp in (panel.timestamps[0], panel.timestamps[-1])
+    )
+
+
 def generate_portfolio_dashboard(
     view: str = "daily",
     time_period: str = "all",
@@ -2010,28 +1928,27 @@ def generate_portfolio_dashboard(
             logger.warning(f"Invalid view '{view}', defaulting to 'daily'")
             view = "daily"
 
-        # Get all snapshots
-        all_snapshots = storage.get_all_snapshots()
-
         # Daily view only needs 1 snapshot (will show current status if no yesterday snapshot)
         min_snapshots = 1 if view == "daily" else 2
 
-        if len(all_snapshots) < min_snapshots:
-            return {
-                "success": False,
-                "error": f"Need at least {min_snapshots} snapshot(s) to generate dashboard (found {len(all_snapshots)})"
-            }
-
-        # Filter by time period
-        snapshots = _filter_snapshots_by_period(all_snapshots, time_period)
+        # Slice the asset panel to the selected time period
+        panel = _load_panel_for_period(time_period)
 
-        if len(snapshots) < min_snapshots:
+        if len(panel) < min_snapshots:
+            # Count the whole history to report which check failed
+            total_snapshots = len(storage.get_snapshot_index())
+            if total_snapshots < min_snapshots:
+                return {
+                    "success": False,
+                    "error": f"Need at least {min_snapshots} snapshot(s) to generate dashboard (found {total_snapshots})"
+                }
             return {
                 "success": False,
-                "error": f"Need at least {min_snapshots} snapshot(s) in selected period (found {len(snapshots)})"
+                "error": f"Need at least {min_snapshots} snapshot(s) in selected period (found {len(panel)})"
             }
 
-        logger.info(f"Processing {len(snapshots)} snapshots for {view} view")
+        logger.info(f"Processing {len(panel)} snapshots for {view} view")
+        latest_snapshot = storage.get_latest_snapshot()
 
         # Route to appropriate view
         html_content = None
@@ -2039,7 +1956,7 @@ def generate_portfolio_dashboard(
         if view == "daily":
             # Daily Overview - uses new view system
             from . import dashboard_views
-            daily_view = dashboard_views.DailyOverviewView(snapshots, time_period)
+            daily_view = dashboard_views.DailyOverviewView(latest_snapshot, panel, time_period)
             view_result = daily_view.generate()
 
             if not view_result.get("success"):
@@ -2049,20 +1966,20 @@ def generate_portfolio_dashboard(
                 }
 
             # Wrap in full HTML page
-            html_content = _wrap_view_html(view_result["html"], "Daily Overview", snapshots, time_period)
+            html_content = _wrap_view_html(view_result["html"], "Daily Overview", panel, time_period)
 
         else:
             # Performance/Transaction/Risk views - use legacy chart generation for now
             # Prepare data
-            portfolio_df = _prepare_portfolio_timeseries(snapshots)
-            category_df = _prepare_category_timeseries(snapshots)
-            asset_df = _prepare_asset_timeseries(snapshots)
+            portfolio_df = _prepare_portfolio_timeseries(panel)
+            category_df = _prepare_category_timeseries(panel)
+            asset_df = _prepare_asset_timeseries(panel)
 
             # Get benchmark data
-            spy_df, vt_df = _prepare_benchmark_data(snapshots)
+            spy_df, vt_df = _prepare_benchmark_data(panel)
 
             # Get top assets
-            top_assets = _get_top_assets_by_value(snapshots[-1], n=10)
+            top_assets = _get_top_assets_by_value(latest_snapshot, n=10)
 
             # Generate charts based on view
             figures = {}
@@ -2072,22 +1989,22 @@ def generate_portfolio_dashboard(
                 figures["portfolio_value"] = _create_portfolio_value_chart(portfolio_df, spy_df, vt_df)
                 figures["category_allocation"] = _create_category_allocation_chart(category_df)
                 figures["asset_performance"] = _create_asset_performance_chart(asset_df, top_assets)
-                figures["gainloss"] = _create_gainloss_chart(snapshots[-1])
-                figures["hhi_trend"] = _create_hhi_trend_chart(snapshots)
+                figures["gainloss"] = _create_gainloss_chart(latest_snapshot)
+                figures["hhi_trend"] = _create_hhi_trend_chart(panel)
 
             elif view == "transactions":
                 logger.info("Creating transaction view charts...")
-                figures["transactions"] = _create_quantity_changes_chart(snapshots)
+                figures["transactions"] = _create_quantity_changes_chart(panel)
                 # TODO: Add realized gains chart when transaction data is available
 
             elif view == "risk":
                 logger.info("Creating risk view charts...")
-                figures["metrics"] = _create_metrics_dashboard(snapshots)
+                figures["metrics"] = _create_metrics_dashboard(panel)
                 # TODO: Add correlation heatmap and volatility charts when risk data is available
 
             # Generate HTML for legacy views
             logger.info("Generating HTML dashboard...")
-            html_content = _generate_dashboard_html(figures, snapshots, time_period)
+            html_content = _generate_dashboard_html(figures, panel, time_period)
         
         # Ensure dashboard directory exists
         dashboard_path = Path(DASHBOARD_DIR)
@@ -2101,8 +2018,7 @@ def generate_portfolio_dashboard(
         file_url = f"file://{abs_path}"
         
         # Get date range
-        start_date = datetime.fromisoformat(snapshots[0]["timestamp"].replace("Z", "+00:00")).strftime("%Y-%m-%d")
-        end_date = datetime.fromisoformat(snapshots[-1]["timestamp"].replace("Z", "+00:00")).strftime("%Y-%m-%d")
+        start_date, end_date = _panel_date_range(panel)
         
         logger.info(f"Dashboard generated successfully: {abs_path}")
         
@@ -2110,7 +2026,7 @@ def generate_portfolio_dashboard(
             "success": True,
             "file_path": str(abs_path),
             "file_url": file_url,
-            "snapshot_count": len(snapshots),
+            "snapshot_count": len(panel),
             "view": view,
             "date_range": {
                 "start": start_date,
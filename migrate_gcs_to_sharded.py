@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Migrate the GCS portfolio history to the sharded layout.
+
+Copies every snapshot of gs://<bucket>/portfolio_history.json into its own
+object under snapshots/ and publishes a manifest. The monolithic blob is
+backed up and left in place. Afterwards set in config.yaml:
+
+  storage:
+    gcp:
+      layout: "sharded"
+
+Usage:
+  uv run python migrate_gcs_to_sharded.py
+"""
+
+from agent import config
+from agent.storage import _load_gcp_credentials
+from agent.backends.gcp_storage import GCPStorageBackend
+
+
+def main():
+    print("=" * 70)
+    print("🗂️  GCS History Migration: monolithic → sharded")
+    print("=" * 70)
+    print()
+
+    cfg = config.get_config()
+    backend = GCPStorageBackend(
+        bucket_name=cfg.storage.gcp.bucket_name,
+        credentials_dict=_load_gcp_credentials(),
+        cache_dir=cfg.storage.gcp.cache_dir,
+        layout="sharded",
+        download_workers=cfg.storage.gcp.download_workers
+    )
+
+    print(f"Migrating gs://{cfg.storage.gcp.bucket_name}/{backend.blob_name}...")
+    result = backend.migrate_to_sharded()
+
+    if not result.get("success"):
+        print(f"❌ Migration failed: {result.get('error')}")
+        return 1
+
+    if result.get("already_sharded"):
+        print("✅ History is already sharded, nothing to do")
+    else:
+        print(f"✅ Migrated {result['migrated']} snapshots")
+
+    snapshots = backend.get_all_snapshots()
+    print(f"Manifest lists {len(snapshots)} readable snapshots")
+    print()
+    print('Next: set storage.gcp.layout: "sharded" in config.yaml')
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
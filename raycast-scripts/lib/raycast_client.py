@@ -18,9 +18,11 @@ from agent import (
     storage,
     analysis,
     sheets_connector,
+    snapshot_diff,
     events_tracker,
     insider_trading,
 )
+from agent.storage_backend import snapshot_epoch
 
 
 class RaycastClient:
@@ -159,21 +161,21 @@ class RaycastClient:
         buy_transactions = transactions_data.get("buy_transactions", [])
         
         # Compare current vs last
+        diff = snapshot_diff.SnapshotDiff.compute(last_snapshot, current_snapshot)
         comparison = analysis.compare_snapshots(
             last_snapshot,
             current_snapshot,
             sell_transactions,
-            buy_transactions
+            buy_transactions,
+            diff=diff
         )
+        current_assets = diff.previous_assets  # Same argument order as the comparison
 
         # Get top movers (winners) and bottom movers (losers)
         # Build enriched winners/losers with current values from snapshot
         winners = []
         for mover in comparison.get("top_movers", [])[:5]:
-            asset = next(
-                (a for a in current_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            asset = current_assets.get(mover["name"])
             if asset:
                 winners.append({
                     "name": mover["name"],
@@ -184,10 +186,7 @@ class RaycastClient:
         
         losers = []
         for mover in comparison.get("bottom_movers", [])[:5]:
-            asset = next(
-                (a for a in current_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            asset = current_assets.get(mover["name"])
             if asset:
                 losers.append({
                     "name": mover["name"],
@@ -223,19 +222,19 @@ class RaycastClient:
         Returns:
             Dictionary with winners/losers data
         """
-        # Get last 2 snapshots
-        all_snapshots = storage.get_all_snapshots()
+        # Get last 2 snapshots from the cached timestamp index
+        index = storage.get_timestamp_index()
+        latest_snapshots = index.latest(2)
 
-        if len(all_snapshots) < 2:
+        if len(latest_snapshots) < 2:
             return {
                 "error": "Insufficient snapshots",
                 "message": "Need at least 2 snapshots for comparison. Run run_portfolio_analysis() to create snapshots.",
-                "snapshots_available": len(all_snapshots),
+                "snapshots_available": len(index),
             }
 
         # Get the two most recent snapshots (last = most recent, second-to-last = previous)
-        latest_snapshot = all_snapshots[-1]
-        previous_snapshot = all_snapshots[-2]
+        previous_snapshot, latest_snapshot = latest_snapshots
 
         # Load transactions for comparison
         transactions_data = storage.get_transactions()
@@ -243,24 +242,22 @@ class RaycastClient:
         buy_transactions = transactions_data.get("buy_transactions", [])
         
         # Compare snapshots (previous as old, latest as new)
+        diff = snapshot_diff.SnapshotDiff.compute(previous_snapshot, latest_snapshot)
         comparison = analysis.compare_snapshots(
             previous_snapshot,
             latest_snapshot,
             sell_transactions,
-            buy_transactions
+            buy_transactions,
+            diff=diff
         )
+        latest_assets = diff.previous_assets  # Same argument order as the comparison
+        previous_assets = diff.current_assets
 
         # Build enriched winners/losers with current values from latest snapshot
         winners = []
         for mover in comparison.get("top_movers", [])[:5]:
-            asset = next(
-                (a for a in latest_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
-            prev_asset = next(
-                (a for a in previous_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            asset = latest_assets.get(mover["name"])
+            prev_asset = previous_assets.get(mover["name"])
             if asset and prev_asset:
                 current_val = asset.get("current_value_eur", 0)
                 prev_val = prev_asset.get("current_value_eur", 1)
@@ -273,14 +270,8 @@ class RaycastClient:
         
         losers = []
         for mover in comparison.get("bottom_movers", [])[:5]:
-            asset = next(
-                (a for a in latest_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
-            prev_asset = next(
-                (a for a in previous_snapshot.get("assets", []) if a["name"] == mover["name"]),
-                None
-            )
+            asset = latest_assets.get(mover["name"])
+            prev_asset = previous_assets.get(mover["name"])
             if asset and prev_asset:
                 current_val = asset.get("current_value_eur", 0)
                 prev_val = prev_asset.get("current_value_eur", 1)
@@ -292,18 +283,9 @@ class RaycastClient:
                 })
 
         # Calculate days between snapshots
-        from datetime import datetime
-
-        try:
-            prev_time = datetime.fromisoformat(
-                previous_snapshot["timestamp"].replace("Z", "+00:00")
-            )
-            latest_time = datetime.fromisoformat(
-                latest_snapshot["timestamp"].replace("Z", "+00:00")
-            )
-            days_diff = (latest_time - prev_time).days
-        except:
-            days_diff = 0
+        days_diff = int(
+            (snapshot_epoch(latest_snapshot) - snapshot_epoch(previous_snapshot)) // 86400
+        )
 
         return {
             "comparison_period": {
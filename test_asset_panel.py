@@ -0,0 +1,400 @@
+"""
+Tests for the materialized asset panel.
+
+Tests that the panel matrices match the snapshots they were built from,
+that saves append chunk files and grow the cached panel without reading
+the history or rewriting the panel file, that a stale panel is rebuilt after deletes, that the dashboard
+series sliced from it match the ones built from snapshot dicts, and that
+category, currency and HHI aggregates match summing the snapshot dicts
+(duplicate names, unnamed assets and category changes included).
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import agent.storage as storage
+from agent import visualization
+from agent.asset_panel import CURRENCY_BY_CATEGORY, PANEL_FILE, AssetPanel, append_rows, list_chunks
+from agent.backends.local_storage import LocalFileBackend
+from agent.dashboard_views import DailyOverviewView
+from agent.storage_backend import compute_snapshot_hash
+
+
+# Test helper functions
+
+def create_asset(name, quantity, value, category="US Stocks"):
+    """Create an asset dict."""
+    return {"name": name, "quantity": quantity, "current_value_eur": value, "category": category}
+
+
+def create_history(days=10):
+    """Create daily snapshots with positions opened, traded and closed along the way."""
+    snapshots = []
+    for day in range(days):
+        assets = [
+            create_asset("Apple", 10 + (5 if day >= 4 else 0), 1500.0 + day * 20),
+            create_asset("SAP", 8, 900.0 - day * 5, "EU Stocks"),
+            create_asset("Cash (EUR)", 300.0 + day, 300.0 + day, "Cash"),
+        ]
+        if day < 6:
+            assets.append(create_asset("Bund", 4, 400.0, "Bonds"))
+        if day >= 3:
+            assets.append(create_asset("VWCE", 2 + day, 200.0 + day * 30, "ETFs"))
+        snapshots.append({
+            "timestamp": f"2025-01-{day + 1:02d}T10:00:00Z",
+            "total_value_eur": sum(asset["current_value_eur"] for asset in assets),
+            "assets": assets
+        })
+    return snapshots
+
+
+class CountingBackend(LocalFileBackend):
+    """Local backend that counts full history reads."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.full_reads = 0
+
+    def get_all_snapshots(self):
+        self.full_reads += 1
+        return super().get_all_snapshots()
+
+
+def use_backend(backend):
+    """Point the storage facade at a backend with empty caches."""
+    storage._storage_backend = backend
+    storage.invalidate_snapshot_cache()
+
+
+def parse(timestamp):
+    """Parse a snapshot timestamp."""
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def snapshots_for_period(period):
+    """Load the snapshots of a dashboard period with a range query (the panel slice's oracle)."""
+    delta = visualization.PERIOD_MAPPING[period]
+    if delta is None:
+        return storage.get_all_snapshots()
+    latest = storage.get_latest_snapshot()
+    return storage.get_snapshots_between(start=parse(latest["timestamp"]) - delta) if latest else []
+
+
+def aggregate_snapshots(snapshots, label):
+    """Sum asset values per row by label(asset), the way the dashboard did from snapshot dicts."""
+    data = []
+    for snapshot in snapshots:
+        row = {"timestamp": parse(snapshot["timestamp"])}
+        for asset in snapshot.get("assets", []):
+            key = label(asset)
+            row[key] = row.get(key, 0.0) + asset.get("current_value_eur", 0.0)
+        data.append(row)
+    return pd.DataFrame(data).sort_values("timestamp").fillna(0)
+
+
+def create_irregular_history():
+    """Create snapshots with a duplicate name, an unnamed asset and an asset changing category."""
+    return [
+        {"timestamp": "2025-01-01T10:00:00Z", "total_value_eur": 600.0, "assets": [
+            create_asset("Apple", 1, 100.0),
+            create_asset("Apple", 1, 150.0),
+            create_asset("", 1, 50.0, "Bonds"),
+            create_asset("VWCE", 3, 300.0, "ETFs"),
+        ]},
+        {"timestamp": "2025-01-02T10:00:00Z", "total_value_eur": 520.0, "assets": [
+            create_asset("Apple", 2, 200.0),
+            {"quantity": 1, "current_value_eur": 20.0, "category": "Bonds"},
+            create_asset("VWCE", 3, 300.0, "ETFs"),
+        ]},
+        {"timestamp": "2025-01-03T10:00:00Z", "total_value_eur": 560.0, "assets": [
+            create_asset("Apple", 2, 210.0),
+            create_asset("VWCE", 3, 310.0, "US Stocks"),
+            {"name": "Cash (EUR)", "quantity": 40.0, "current_value_eur": 40.0},
+        ]},
+    ]
+
+
+# Test cases
+
+def test_panel_matches_snapshots():
+    """Panel rows and columns should hold each snapshot's values and quantities."""
+    print("\nTesting: Panel matches snapshots...")
+
+    history = create_history()
+    panel = AssetPanel.from_snapshots(history)
+
+    assert len(panel) == len(history)
+    assert panel.names.tolist() == ["Apple", "SAP", "Cash (EUR)", "Bund", "VWCE"]
+    assert panel.categories.tolist() == ["US Stocks", "EU Stocks", "Cash", "Bonds", "ETFs"]
+    assert panel.category_names.tolist() == ["US Stocks", "EU Stocks", "Cash", "Bonds", "ETFs"]
+    assert panel.totals.tolist() == [s["total_value_eur"] for s in history]
+
+    for row, snapshot in enumerate(history):
+        held = {asset["name"]: asset for asset in snapshot["assets"]}
+        for column, name in enumerate(panel.names.tolist()):
+            if name in held:
+                assert panel.values[row, column] == held[name]["current_value_eur"]
+                assert panel.quantities[row, column] == held[name]["quantity"]
+            else:
+                assert np.isnan(panel.values[row, column]) and np.isnan(panel.quantities[row, column])
+
+    # Extending row by row gives the same panel
+    grown = AssetPanel.from_snapshots(history[:2])
+    for snapshot in history[2:]:
+        grown.extend([snapshot])
+    assert grown.names.tolist() == panel.names.tolist()
+    assert np.array_equal(grown.values, panel.values, equal_nan=True)
+    assert np.array_equal(grown.category_values, panel.category_values, equal_nan=True)
+    assert grown.hashes.tolist() == panel.hashes.tolist()
+
+    # Slices drop assets not held in any selected row
+    recent = panel.tail(3)
+    assert "Bund" not in recent.names.tolist() and len(recent) == 3
+
+    print("✓ Test passed: panel_matches_snapshots")
+
+
+def test_save_appends_row_to_persisted_panel():
+    """Saving a snapshot should append a chunk and grow the cached panel, not rewrite the panel file."""
+    print("\nTesting: Save appends a panel row...")
+
+    temp_dir = tempfile.mkdtemp()
+    original_max_chunks = storage.MAX_PANEL_CHUNKS
+    original_save = AssetPanel.save
+
+    def fail_save(self, path):
+        raise AssertionError("Panel file rewritten on the save path")
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        history = create_history()
+        storage.save_snapshots(history[:5])
+
+        # First read builds and persists the panel
+        panel = storage.get_asset_panel()
+        assert len(panel) == 5 and backend.full_reads == 1
+        path = os.path.join(temp_dir, PANEL_FILE)
+        assert os.path.exists(path)
+        with open(path, "rb") as f:
+            persisted_bytes = f.read()
+
+        AssetPanel.save = fail_save
+        for snapshot in history[5:]:
+            storage.save_snapshot(snapshot)
+            grown = storage.get_asset_panel()
+            assert grown.hashes[-1] == compute_snapshot_hash(snapshot), "Cached panel grows in memory"
+        AssetPanel.save = original_save
+        assert len(panel) == 5, "Panels handed out earlier are not mutated"
+
+        with open(path, "rb") as f:
+            assert f.read() == persisted_bytes, "Panel file untouched by saves"
+        assert [offset for offset, _ in list_chunks(path)] == list(range(5, len(history)))
+
+        persisted = AssetPanel.load(path)
+        assert len(persisted) == len(history)
+        assert persisted.matches([entry["hash"] for entry in storage.get_snapshot_index()])
+
+        storage.invalidate_snapshot_cache()
+        panel = storage.get_asset_panel()
+        assert len(panel) == len(history)
+        assert backend.full_reads == 1, f"Expected no rebuild, got {backend.full_reads} full reads"
+        assert np.array_equal(panel.values, AssetPanel.from_snapshots(history).values, equal_nan=True)
+
+        # Reads fold the chunks into the panel file once there are too many
+        storage.MAX_PANEL_CHUNKS = 2
+        storage.get_asset_panel()
+        assert list_chunks(path) == []
+        assert AssetPanel.load(path).matches(panel.hashes.tolist())
+
+        # Chunks left behind by an interrupted fold are skipped
+        append_rows(path, 3, history[3:4])
+        assert AssetPanel.load(path).matches(panel.hashes.tolist())
+
+        print("✓ Test passed: save_appends_row_to_persisted_panel")
+
+    finally:
+        AssetPanel.save = original_save
+        storage.MAX_PANEL_CHUNKS = original_max_chunks
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+def test_stale_panel_rebuilt_after_delete():
+    """A panel that no longer matches the index should be rebuilt on read."""
+    print("\nTesting: Stale panel rebuilt...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        history = create_history(6)
+        storage.save_snapshots(history)
+        assert len(storage.get_asset_panel()) == 6
+
+        result = storage.delete_snapshot(2, confirm=True)
+        assert result["success"]
+
+        panel = storage.get_asset_panel()
+        remaining = history[:1] + history[2:]
+        assert len(panel) == 5
+        assert panel.timestamps.tolist() == [s["timestamp"] for s in remaining]
+
+        # A corrupt file is ignored and replaced
+        with open(os.path.join(temp_dir, PANEL_FILE), "wb") as f:
+            f.write(b"not a panel")
+        storage.invalidate_snapshot_cache()
+        assert len(storage.get_asset_panel()) == 5
+        assert AssetPanel.load(os.path.join(temp_dir, PANEL_FILE)) is not None
+
+        print("✓ Test passed: stale_panel_rebuilt_after_delete")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+def test_dashboard_series_match_snapshots():
+    """Series sliced from the panel should match the ones built from snapshot dicts."""
+    print("\nTesting: Dashboard series from the panel...")
+
+    history = create_history()
+    panel = AssetPanel.from_snapshots(history)
+
+    portfolio = visualization._prepare_portfolio_timeseries(panel)
+    assert portfolio["total_value_eur"].tolist() == [s["total_value_eur"] for s in history]
+    assert [t.to_pydatetime() for t in portfolio["timestamp"]] == [parse(s["timestamp"]) for s in history]
+
+    categories = visualization._prepare_category_timeseries(panel)
+    for row, snapshot in enumerate(history):
+        expected = {}
+        for asset in snapshot["assets"]:
+            expected[asset["category"]] = expected.get(asset["category"], 0.0) + asset["current_value_eur"]
+        for category in categories.columns[1:]:
+            assert categories.iloc[row][category] == expected.get(category, 0.0)
+
+    assets = visualization._prepare_asset_timeseries(panel)
+    assert assets["Bund"].tolist()[-1] == 0 and assets["VWCE"].tolist()[0] == 0
+    assert assets["Apple"].tolist() == [1500.0 + day * 20 for day in range(len(history))]
+
+    # HHI from squared weights
+    hhi = visualization._create_hhi_trend_chart(panel).data[0].y
+    expected_hhi = [
+        sum((a["current_value_eur"] / s["total_value_eur"]) ** 2 for a in s["assets"]) * 10000
+        for s in history
+    ]
+    assert np.allclose(hhi, expected_hhi)
+
+    # Buys and sells: Apple bought on day 4, VWCE every day after day 3, Bund closed on day 6
+    figure = visualization._create_quantity_changes_chart(panel)
+    traces = {trace.name: trace for trace in figure.data}
+    buys = list(traces["Buy"].customdata)
+    assert buys.count("Apple") == 1 and buys.count("VWCE") == 7
+    assert list(traces["Sell"].customdata) == ["Bund"]
+    assert list(traces["Sell"].y) == [400.0]
+    assert "Cash (EUR)" not in buys
+
+    print("✓ Test passed: dashboard_series_match_snapshots")
+
+
+def test_aggregates_match_snapshot_dicts():
+    """Category, currency and HHI series should match summing every asset entry of each snapshot."""
+    print("\nTesting: Aggregates with duplicates, unnamed assets and category changes...")
+
+    history = create_irregular_history()
+    expected = aggregate_snapshots(history, lambda asset: asset.get("category", "Other"))
+
+    # Built at once, grown row by row, and after a save/load round trip
+    grown = AssetPanel.from_snapshots(history[:1])
+    for snapshot in history[1:]:
+        grown.extend([snapshot])
+    temp_dir = tempfile.mkdtemp()
+    try:
+        AssetPanel.from_snapshots(history).save(os.path.join(temp_dir, PANEL_FILE))
+        loaded = AssetPanel.load(os.path.join(temp_dir, PANEL_FILE))
+    finally:
+        shutil.rmtree(temp_dir)
+
+    for panel in (AssetPanel.from_snapshots(history), grown, loaded):
+        categories = visualization._prepare_category_timeseries(panel)
+        pd.testing.assert_frame_equal(
+            categories.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False
+        )
+
+    # Duplicates and the unnamed asset count: US Stocks was 250 on day one
+    assert categories["US Stocks"].tolist() == [250.0, 200.0, 520.0]
+    assert categories["ETFs"].tolist() == [300.0, 300.0, 0.0], "Past rows keep their own category"
+    assert categories["Bonds"].tolist() == [50.0, 20.0, 0.0]
+
+    # Slices keep only the categories held in the selected rows
+    assert AssetPanel.from_snapshots(history).tail(1).category_names.tolist() == ["US Stocks", "Other"]
+
+    currencies = visualization._create_currency_exposure_chart(grown)
+    expected_currencies = aggregate_snapshots(
+        history, lambda asset: CURRENCY_BY_CATEGORY.get(asset.get("category", "Other"), "Other")
+    )
+    assert [trace.name for trace in currencies.data] == list(expected_currencies.columns[1:])
+    for trace in currencies.data:
+        assert np.allclose(trace.y, expected_currencies[trace.name]), trace.name
+
+    hhi = visualization._create_hhi_trend_chart(grown).data[0].y
+    expected_hhi = [
+        sum((a["current_value_eur"] / s["total_value_eur"]) ** 2 for a in s["assets"]) * 10000
+        for s in history
+    ]
+    assert np.allclose(hhi, expected_hhi)
+
+    print("✓ Test passed: aggregates_match_snapshot_dicts")
+
+
+def test_period_slice_and_sparkline():
+    """Period slices should select the same snapshots as the range query."""
+    print("\nTesting: Period slices and sparkline...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        use_backend(LocalFileBackend(data_dir=temp_dir))
+        history = create_history()
+        storage.save_snapshots(history)
+
+        for period in ("7d", "all"):
+            panel = visualization._load_panel_for_period(period)
+            snapshots = snapshots_for_period(period)
+            assert panel.timestamps.tolist() == [s["timestamp"] for s in snapshots], period
+
+        panel = visualization._load_panel_for_period("7d")
+        view = DailyOverviewView(storage.get_latest_snapshot(), panel, "7d")
+        sparkline = view._create_sparkline()
+        assert "sparkline-container" in sparkline
+        assert "2025-01-04" in sparkline and "2025-01-10" in sparkline and "2025-01-03" not in sparkline
+
+        print("✓ Test passed: period_slice_and_sparkline")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Asset Panel Tests")
+    print("=" * 70)
+
+    test_panel_matches_snapshots()
+    test_save_appends_row_to_persisted_panel()
+    test_stale_panel_rebuilt_after_delete()
+    test_dashboard_series_match_snapshots()
+    test_aggregates_match_snapshot_dicts()
+    test_period_slice_and_sparkline()
+
+    print("\n" + "=" * 70)
+    print("✅ All asset panel tests passed!")
+    print("=" * 70)
@@ -0,0 +1,309 @@
+"""
+Tests for the content-addressed backup store.
+
+Tests that backups share unchanged snapshots, restores are point-in-time
+exact, retention removes unreferenced snapshots, corrupted snapshots are
+detected, and the local, SQLite and facade restore paths work end to end.
+"""
+
+import os
+import tempfile
+import shutil
+
+import agent.storage as storage
+from agent.backends.backup_store import BackupStore
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.storage_backend import compute_snapshot_hash
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp_str, total_value):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": total_value}]
+    }
+
+
+def create_test_history(count):
+    """Create count snapshots on consecutive days."""
+    return [create_test_snapshot(f"2025-01-{day:02d}T10:00:00Z", 1000.0 * day) for day in range(1, count + 1)]
+
+
+def backup_to_store(store, history, **kwargs):
+    """Back up a list of snapshots, recording which hashes were fetched."""
+    fetched = []
+    by_hash = {compute_snapshot_hash(s): s for s in history}
+
+    def fetch(missing):
+        fetched.extend(missing)
+        return [by_hash[h] for h in missing]
+
+    result = store.create_backup([compute_snapshot_hash(s) for s in history], fetch, **kwargs)
+    return result, fetched
+
+
+class FakeClock:
+    """Wall clock advanced by hand."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def count_objects(backup_dir):
+    """Return the number of stored snapshot objects."""
+    objects_dir = os.path.join(backup_dir, "objects")
+    return sum(len(files) for _, _, files in os.walk(objects_dir))
+
+
+# Test cases
+
+def test_backups_share_unchanged_snapshots():
+    """A second backup should only store the snapshots added since the first."""
+    print("\nTesting: Deduplicated backups...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        store = BackupStore(temp_dir, clock=FakeClock())
+        history = create_test_history(10)
+
+        first, fetched = backup_to_store(store, history)
+        assert first["new_objects"] == 10 and len(fetched) == 10
+        assert first["count"] == 10 and first["deleted_count"] == 0
+
+        store._clock.now += 60
+        history.append(create_test_snapshot("2025-01-11T10:00:00Z", 11000.0))
+        second, fetched = backup_to_store(store, history, reason="compact")
+        assert second["new_objects"] == 1
+        assert fetched == [compute_snapshot_hash(history[-1])], "Only the new snapshot is read"
+        assert count_objects(temp_dir) == 11
+
+        assert [b["id"] for b in store.list_backups()] == [second["id"], first["id"]], "Newest first"
+        assert second["id"].endswith("-compact")
+
+        print("✓ Test passed: backups_share_unchanged_snapshots")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_restore_is_point_in_time_exact():
+    """Loading a backup should return the recorded history, in order, key order intact."""
+    print("\nTesting: Point-in-time restore...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        store = BackupStore(temp_dir, compression="gzip", clock=FakeClock())
+        history = create_test_history(3)
+        history[1] = {"total_value_eur": 2000.0, "timestamp": "2025-01-02T10:00:00Z", "assets": []}
+        history.append(dict(history[0]))
+
+        result, _ = backup_to_store(store, history, deleted=[2])
+        assert result["new_objects"] == 3, "Duplicate snapshot stored once"
+        assert result["count"] == 3 and result["deleted_count"] == 1
+
+        restored = store.load_backup(result["id"])
+        assert restored == [history[0], history[1], history[3]]
+        assert list(restored[1]) == ["total_value_eur", "timestamp", "assets"], "Key order preserved"
+        assert store.load_backup(result["id"], include_deleted=True) == history
+
+        try:
+            store.load_backup("20240101-000000-000000-missing")
+            assert False, "Unknown backup should raise"
+        except KeyError:
+            pass
+        try:
+            store.load_backup("../manifests/x")
+            assert False, "Path-like IDs are not backups"
+        except KeyError:
+            pass
+
+        print("✓ Test passed: restore_is_point_in_time_exact")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_retention_removes_unreferenced_snapshots():
+    """Retention keeps the newest backups (and young ones) and sweeps orphaned snapshots."""
+    print("\nTesting: Retention and garbage collection...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        clock = FakeClock()
+        store = BackupStore(temp_dir, keep=2, clock=clock)
+
+        # Three backups of histories that share nothing
+        ids = []
+        for start in (0, 100, 200):
+            history = [create_test_snapshot("2025-01-01T10:00:00Z", float(start + i)) for i in range(3)]
+            ids.append(backup_to_store(store, history)[0]["id"])
+            clock.now += 86400
+        assert [b["id"] for b in store.list_backups()] == ids[:0:-1], "Oldest backup pruned on create"
+        assert count_objects(temp_dir) == 6, "Its snapshots went with it"
+
+        # Age-based retention keeps young backups beyond the count
+        pruned = store.prune(keep=0, keep_days=1.5)
+        assert pruned["backups_removed"] == 1 and pruned["objects_removed"] == 3
+        assert pruned["bytes_freed"] > 0
+        assert [b["id"] for b in store.list_backups()] == [ids[2]]
+
+        pruned = store.prune(keep=0)
+        assert pruned == {"backups_removed": 1, "objects_removed": 3, "bytes_freed": pruned["bytes_freed"]}
+        assert store.list_backups() == [] and count_objects(temp_dir) == 0
+
+        print("✓ Test passed: retention_removes_unreferenced_snapshots")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_corrupted_snapshot_detected():
+    """A stored snapshot that doesn't match its hash should fail to load."""
+    print("\nTesting: Corruption detection...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        store = BackupStore(temp_dir)
+        history = create_test_history(2)
+        result, _ = backup_to_store(store, history)
+
+        path = store._object_path(compute_snapshot_hash(history[1]))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"timestamp": "2025-01-02T10:00:00Z", "total_value_eur": 1.0, "assets": []}')
+
+        try:
+            store.load_backup(result["id"])
+            assert False, "Corrupted snapshot should raise"
+        except ValueError as e:
+            assert "corrupted" in str(e)
+
+        print("✓ Test passed: corrupted_snapshot_detected")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_local_restore_can_be_undone():
+    """Restoring a local backup backs up the current history first."""
+    print("\nTesting: Local restore...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir)
+        for snapshot in create_test_history(4):
+            assert backend.save_snapshot(snapshot)
+        assert backend.delete_snapshot(1)
+        compacted = backend.compact_history()
+        assert compacted["success"]
+
+        after_compaction = backend.get_all_snapshots()
+        assert len(after_compaction) == 3
+
+        result = backend.restore_backup(compacted["backup_id"], include_deleted=True)
+        assert result["success"] and result["restored_snapshots"] == 4
+        assert [s["total_value_eur"] for s in backend.get_all_snapshots()] == [1000.0, 2000.0, 3000.0, 4000.0]
+
+        backups = backend.list_backups()
+        assert len(backups) == 2 and backups[0]["reason"] == "replace"
+        assert backups[0]["count"] == 3, "Pre-restore history backed up"
+        assert backend.restore_backup(backups[0]["id"])["success"]
+        assert backend.get_all_snapshots() == after_compaction
+
+        result = backend.restore_backup("no-such-backup")
+        assert not result["success"] and "not found" in result["error"]
+
+        print("✓ Test passed: local_restore_can_be_undone")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sqlite_backup_reads_only_new_snapshots():
+    """SQLite backups should read only snapshots the store doesn't hold."""
+    print("\nTesting: SQLite incremental backups...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        for snapshot in create_test_history(5):
+            assert backend.save_snapshot(snapshot)
+
+        assert backend.delete_snapshot(0)
+        assert backend.save_snapshot(create_test_snapshot("2025-01-06T10:00:00Z", 6000.0))
+        assert backend.delete_snapshot(0)
+
+        first, second = backend.list_backups()[::-1]
+        assert first["count"] == 4 and second["count"] == 4
+        assert count_objects(os.path.join(temp_dir, "backup")) == 6, "Each snapshot stored once"
+
+        result = backend.restore_backup(first["id"], include_deleted=True)
+        assert result["success"] and result["restored_snapshots"] == 5
+        assert [s["total_value_eur"] for s in backend.get_all_snapshots()] == [1000.0 * d for d in range(1, 6)]
+
+        print("✓ Test passed: sqlite_backup_reads_only_new_snapshots")
+
+    finally:
+        backend.close()
+        shutil.rmtree(temp_dir)
+
+
+def test_restore_backup_facade():
+    """storage.restore_backup should require confirm and refresh cached snapshots."""
+    print("\nTesting: restore_backup facade...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir)
+        storage._storage_backend = backend
+        for snapshot in create_test_history(3):
+            assert backend.save_snapshot(snapshot)
+        assert backend.replace_history(create_test_history(1))
+        assert len(storage.get_all_snapshots()) == 1
+
+        backup_id = storage.list_backups()[0]["id"]
+        result = storage.restore_backup(backup_id)
+        assert not result["success"] and "confirm=True" in result["error"]
+
+        result = storage.restore_backup(backup_id, confirm=True)
+        assert result["success"] and result["restored_snapshots"] == 3
+        assert len(storage.get_all_snapshots()) == 3, "Cache invalidated"
+
+        print("✓ Test passed: restore_backup_facade")
+
+    finally:
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Backup Store Tests")
+    print("=" * 70)
+
+    test_backups_share_unchanged_snapshots()
+    test_restore_is_point_in_time_exact()
+    test_retention_removes_unreferenced_snapshots()
+    test_corrupted_snapshot_detected()
+    test_local_restore_can_be_undone()
+    test_sqlite_backup_reads_only_new_snapshots()
+    test_restore_backup_facade()
+
+    print("\n" + "=" * 70)
+    print("✅ All backup store tests passed!")
+    print("=" * 70)
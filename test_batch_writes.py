@@ -0,0 +1,297 @@
+"""
+Tests for batch snapshot writes and configurable durability.
+
+Tests that save_snapshots stores a batch with one write and one fsync on
+the local, SQLite and hybrid backends (skipping snapshots already stored),
+that "interval" durability defers fsyncs to at most one per interval, and
+that the storage facade validates a whole batch before writing it.
+"""
+
+import os
+import time
+import tempfile
+import shutil
+
+import agent.storage as storage
+from agent.backends.durability import DeferredSync
+from agent.backends.hybrid_storage import HybridStorageBackend
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.config_models import StorageConfig
+
+
+# Test helper functions
+
+def create_test_history(count, asset_count=5):
+    """Create hourly snapshots whose asset values move a little each hour."""
+    return [
+        {
+            "timestamp": f"2025-{1 + i // 672:02d}-{1 + i // 24 % 28:02d}T{i % 24:02d}:00:00Z",
+            "total_value_eur": 1000.0 + i,
+            "assets": [
+                {"name": f"Asset{a}", "quantity": 10, "current_value_eur": 100.0 + a + i * 0.25}
+                for a in range(asset_count)
+            ]
+        }
+        for i in range(count)
+    ]
+
+
+class FsyncCounter:
+    """Replace os.fsync with a counting wrapper while active."""
+
+    def __init__(self):
+        self.calls = 0
+        self._original = os.fsync
+
+    def __enter__(self):
+        def counting_fsync(fd):
+            self.calls += 1
+            return self._original(fd)
+        os.fsync = counting_fsync
+        return self
+
+    def __exit__(self, *exc):
+        os.fsync = self._original
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingPrimary(LocalFileBackend):
+    """Local backend recording batch sizes passed to save_snapshots."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.batches = []
+
+    def save_snapshots(self, snapshots):
+        self.batches.append(len(snapshots))
+        return super().save_snapshots(snapshots)
+
+
+# Test cases
+
+def test_local_batch_is_one_write_and_one_fsync():
+    """A local batch should cost one fsync and read back like one-by-one saves."""
+    print("\nTesting: Local batch write...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        history = create_test_history(2000)
+        for options in ({}, {"compression": "gzip"}, {"delta_keyframe_interval": 20}):
+            data_dir = tempfile.mkdtemp(dir=temp_dir)
+            backend = LocalFileBackend(data_dir=data_dir, **options)
+            assert backend.save_snapshot(history[0])
+
+            started = time.monotonic()
+            with FsyncCounter() as fsyncs:
+                assert backend.save_snapshots(history)
+            elapsed = time.monotonic() - started
+            assert fsyncs.calls == 1, f"{options}: {fsyncs.calls} fsyncs"
+            assert elapsed < 30, f"{options}: bulk import took {elapsed:.1f}s"
+
+            assert backend.get_all_snapshots() == history, options
+            assert backend.get_latest_snapshot() == history[-1], options
+            locations = backend._load_index_state()[2]
+            os.remove(backend.index_path)
+            assert backend._load_index_state()[2] == locations, f"{options}: locations match a rebuild"
+
+            # Replaying (e.g. after an interrupted import) stores nothing twice
+            with FsyncCounter() as fsyncs:
+                assert backend.save_snapshots(history[1500:] + create_test_history(2001)[2000:])
+            assert fsyncs.calls == 1
+            assert backend.get_all_snapshots() == create_test_history(2001), options
+            print(f"  ✓ {options or 'plain'}: 2000 snapshots in {elapsed:.2f}s")
+
+        print("✓ Test passed: local_batch_is_one_write_and_one_fsync")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_failed_batch_leaves_log_unchanged():
+    """A batch that can't be serialized or written should leave nothing behind."""
+    print("\nTesting: Failed batch...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir, delta_keyframe_interval=5)
+        history = create_test_history(10)
+        assert backend.save_snapshots(history[:4])
+        size = os.path.getsize(backend.history_path)
+
+        broken = dict(history[6], note=object())
+        assert not backend.save_snapshots(history[4:6] + [broken])
+        assert os.path.getsize(backend.history_path) == size
+
+        original_fsync = os.fsync
+
+        def failing_fsync(fd):
+            raise OSError("disk full")
+
+        os.fsync = failing_fsync
+        try:
+            assert not backend.save_snapshots(history[4:])
+        finally:
+            os.fsync = original_fsync
+        assert os.path.getsize(backend.history_path) == size, "Log truncated back"
+
+        assert backend.save_snapshots(history)
+        assert LocalFileBackend(data_dir=temp_dir).get_all_snapshots() == history
+
+        print("✓ Test passed: failed_batch_leaves_log_unchanged")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_interval_durability_defers_fsyncs():
+    """With durability "interval", fsyncs should happen at most once per interval."""
+    print("\nTesting: Interval durability...")
+
+    clock = FakeClock()
+    synced = []
+    deferred = DeferredSync("test", lambda: synced.append(clock.now), interval=60.0, clock=clock)
+    deferred.written()
+    deferred.written()
+    assert synced == [1000.0] and deferred.pending, "First write syncs, the next one waits"
+    clock.now += 60
+    deferred.written()
+    assert synced == [1000.0, 1060.0] and not deferred.pending
+    deferred.flush()
+    assert len(synced) == 2, "Nothing pending, nothing to sync"
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir, durability="interval", fsync_interval=0.2)
+        history = create_test_history(50)
+        with FsyncCounter() as fsyncs:
+            for snapshot in history:
+                assert backend.save_snapshot(snapshot)
+            assert fsyncs.calls <= 2, f"{fsyncs.calls} fsyncs for 50 saves"
+            deadline = time.monotonic() + 5
+            while backend._deferred_sync.pending and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert not backend._deferred_sync.pending, "Timer catches up"
+            backend.sync()
+        assert backend.get_all_snapshots() == history
+
+        try:
+            LocalFileBackend(data_dir=temp_dir, durability="never")
+            assert False, "Unknown durability should be rejected"
+        except ValueError:
+            pass
+
+        print("✓ Test passed: interval_durability_defers_fsyncs")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sqlite_and_hybrid_batches():
+    """SQLite should insert a batch in one transaction; hybrid should write and replicate it once."""
+    print("\nTesting: SQLite and hybrid batches...")
+
+    temp_dir = tempfile.mkdtemp()
+    backends = []
+
+    try:
+        history = create_test_history(300)
+        for durability, synchronous in (("batch", 2), ("interval", 1)):
+            db = SQLiteStorageBackend(db_path=os.path.join(temp_dir, f"{durability}.db"), durability=durability)
+            backends.append(db)
+            assert db._conn.execute("PRAGMA synchronous").fetchone()[0] == synchronous
+            assert db.save_snapshots(history[:200])
+            assert db.save_snapshots(history)
+            assert db.get_all_snapshots() == history
+            db.sync()
+
+        primary = CountingPrimary(os.path.join(temp_dir, "primary"))
+        fallback = LocalFileBackend(data_dir=os.path.join(temp_dir, "fallback"))
+        hybrid = HybridStorageBackend(
+            primary=primary, fallback=fallback, journal_path=os.path.join(temp_dir, "pending.jsonl")
+        )
+        with FsyncCounter() as fsyncs:
+            assert hybrid.save_snapshots(history)
+            assert fsyncs.calls <= 3, "Fallback log, journal, (journal rewrite)"
+        assert hybrid.flush(timeout=5.0)
+        assert primary.batches == [300]
+        assert primary.get_all_snapshots() == fallback.get_all_snapshots() == history
+        hybrid.shutdown()
+
+        print("✓ Test passed: sqlite_and_hybrid_batches")
+
+    finally:
+        for backend in backends:
+            backend.close()
+        shutil.rmtree(temp_dir)
+
+
+def test_facade_validates_whole_batch():
+    """storage.save_snapshots should reject a batch with any invalid snapshot before writing."""
+    print("\nTesting: save_snapshots facade...")
+
+    temp_dir = tempfile.mkdtemp()
+    original_config = storage._get_storage_config
+
+    try:
+        storage._get_storage_config = lambda: StorageConfig(
+            backend="local", durability="interval", fsync_interval=5.0, local={"data_dir": temp_dir}
+        )
+        backend = storage._get_storage_backend()
+        assert backend.durability == "interval" and backend._deferred_sync.interval == 5.0
+
+        history = create_test_history(20)
+        try:
+            storage.save_snapshots(history[:5] + [{"timestamp": "2025-01-01T00:00:00Z"}])
+            assert False, "Invalid snapshot should be rejected"
+        except ValueError as e:
+            assert "Snapshot 5" in str(e)
+        assert storage.get_all_snapshots() == []
+
+        storage.save_snapshots(history)
+        assert storage.get_all_snapshots() == history, "Cache invalidated"
+        backend.sync()
+        assert not backend._deferred_sync.pending
+
+        try:
+            StorageConfig(fsync_interval=0)
+            assert False, "Non-positive fsync_interval should be rejected"
+        except ValueError:
+            pass
+
+        print("✓ Test passed: facade_validates_whole_batch")
+
+    finally:
+        storage._get_storage_config = original_config
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Batch Write Tests")
+    print("=" * 70)
+
+    test_local_batch_is_one_write_and_one_fsync()
+    test_failed_batch_leaves_log_unchanged()
+    test_interval_durability_defers_fsyncs()
+    test_sqlite_and_hybrid_batches()
+    test_facade_validates_whole_batch()
+
+    print("\n" + "=" * 70)
+    print("✅ All batch write tests passed!")
+    print("=" * 70)
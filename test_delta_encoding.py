@@ -0,0 +1,221 @@
+"""
+Tests for delta-encoded snapshot storage.
+
+Tests that the delta codec rebuilds snapshots exactly, that the local log
+writes keyframes every K snapshots and diffs in between, and that reads,
+deletes, compaction, range scans and index rebuilds see whole snapshots.
+"""
+
+import os
+import json
+import tempfile
+import shutil
+
+from agent.backends.delta import apply_delta, encode_delta, is_delta
+from agent.backends.local_storage import LocalFileBackend
+from agent.storage_backend import compute_snapshot_hash
+
+
+# Test helper functions
+
+def create_test_snapshot(day, asset_count=40):
+    """Create a snapshot whose asset values move a little every day."""
+    return {
+        "timestamp": f"2025-01-{day:02d}T10:00:00Z",
+        "total_value_eur": 1000.0 * asset_count + day,
+        "assets": [
+            {
+                "name": f"Asset{i}",
+                "ticker": f"TCK{i}",
+                "quantity": 10,
+                "current_value_eur": 1000.0 + i + day * 0.5,
+                "daily_change_pct": round((day * 7 + i) % 11 * 0.1, 2),
+            }
+            for i in range(asset_count)
+        ]
+    }
+
+
+def read_records(temp_dir):
+    """Read the raw records of the history log."""
+    with open(os.path.join(temp_dir, "portfolio_history.jsonl"), "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Test cases
+
+def test_codec_round_trip_is_exact():
+    """Decoding a delta should give back the snapshot, key order and types included."""
+    print("\nTesting: Delta codec round trip...")
+
+    base = create_test_snapshot(1, asset_count=4)
+    cases = []
+
+    changed = create_test_snapshot(2, asset_count=4)
+    cases.append(changed)
+
+    types = create_test_snapshot(2, asset_count=4)
+    types["assets"][0]["quantity"] = 10.0
+    types["assets"][1]["current_value_eur"] = -0.0
+    cases.append(types)
+
+    reshaped = {"total_value_eur": 1.0, "timestamp": "2025-01-03T10:00:00Z", "note": "x"}
+    reshaped["assets"] = [dict(a) for a in reversed(base["assets"][1:])]
+    reshaped["assets"].append({"name": "New", "quantity": 1})
+    reshaped["assets"][0] = {"quantity": 10, "name": reshaped["assets"][0]["name"]}
+    cases.append(reshaped)
+
+    duplicates = create_test_snapshot(2, asset_count=2)
+    duplicates["assets"].append(dict(duplicates["assets"][0], quantity=5))
+    cases.append(duplicates)
+
+    no_assets = {"timestamp": "2025-01-04T10:00:00Z", "total_value_eur": 0.0}
+    cases.append(no_assets)
+
+    for snapshot in cases:
+        delta = encode_delta(base, snapshot)
+        assert is_delta(delta)
+        decoded = apply_delta(base, json.loads(json.dumps(delta)))
+        assert decoded == snapshot
+        assert json.dumps(decoded) == json.dumps(snapshot), "Key order and types preserved"
+        assert compute_snapshot_hash(decoded) == compute_snapshot_hash(snapshot)
+
+    # Unchanged assets cost nothing
+    delta = encode_delta(base, dict(base, timestamp="2025-01-02T10:00:00Z"))
+    assert delta["_delta"] == {"assets": {}}
+
+    assert encode_delta(base, {"total_value_eur": 1.0}) is None, "No timestamp: stored whole"
+    assert apply_delta(None, base) is base
+    try:
+        apply_delta(None, encode_delta(base, changed))
+        assert False, "Delta without base should raise"
+    except ValueError:
+        pass
+
+    print("✓ Test passed: codec_round_trip_is_exact")
+
+
+def test_keyframes_every_k_snapshots():
+    """The log should hold a keyframe every K records and be much smaller."""
+    print("\nTesting: Keyframe interval...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        full_dir = os.path.join(temp_dir, "full")
+        delta_dir = os.path.join(temp_dir, "delta")
+        full = LocalFileBackend(data_dir=full_dir)
+        backend = LocalFileBackend(data_dir=delta_dir, delta_keyframe_interval=10)
+
+        history = [create_test_snapshot(day) for day in range(1, 21)]
+        for snapshot in history:
+            assert full.save_snapshot(snapshot)
+            assert backend.save_snapshot(snapshot)
+            assert backend.get_latest_snapshot() == snapshot
+
+        records = read_records(delta_dir)
+        assert [i for i, r in enumerate(records) if not is_delta(r)] == [0, 10]
+
+        full_size = os.path.getsize(os.path.join(full_dir, "portfolio_history.jsonl"))
+        delta_size = os.path.getsize(os.path.join(delta_dir, "portfolio_history.jsonl"))
+        assert delta_size * 4 < full_size, f"Expected a much smaller log ({delta_size} vs {full_size})"
+
+        assert backend.get_all_snapshots() == history
+        assert [e["hash"] for e in backend.get_snapshot_index()] == [e["hash"] for e in full.get_snapshot_index()]
+
+        # Any setting reads the log
+        assert LocalFileBackend(data_dir=delta_dir).get_all_snapshots() == history
+
+        print(f"  ✓ {full_size} bytes whole vs {delta_size} bytes delta-encoded")
+        print("✓ Test passed: keyframes_every_k_snapshots")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_latest_read_decodes_only_its_chain():
+    """Reading the latest snapshot should not scan the log from the start."""
+    print("\nTesting: Latest snapshot via keyframe chain...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir, compression="gzip", delta_keyframe_interval=3)
+        history = [create_test_snapshot(day, asset_count=5) for day in range(1, 9)]
+        for snapshot in history:
+            assert backend.save_snapshot(snapshot)
+
+        fresh = LocalFileBackend(data_dir=temp_dir, compression="gzip", delta_keyframe_interval=3)
+        fresh._tail_checked = True
+
+        def fail_full_scan(*args, **kwargs):
+            raise AssertionError("Full scan should not be needed")
+
+        fresh._iter_raw_records = fail_full_scan
+        assert fresh.get_latest_snapshot() == history[-1]
+
+        print("✓ Test passed: latest_read_decodes_only_its_chain")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_deletes_ranges_and_compaction():
+    """Deletes, range scans, index rebuilds and compaction should work on delta logs."""
+    print("\nTesting: Deletes and compaction with deltas...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir, delta_keyframe_interval=5)
+        history = [create_test_snapshot(day, asset_count=6) for day in range(1, 8)]
+        for snapshot in history:
+            assert backend.save_snapshot(snapshot)
+
+        # Deleting a keyframe and the latest snapshot leaves the rest readable
+        assert backend.delete_snapshot(0)
+        assert backend.delete_snapshot(5)
+        live = history[1:6]
+        assert backend.get_all_snapshots() == live
+        assert backend.get_latest_snapshot() == history[5]
+
+        # The next save follows a deleted record: stored whole
+        extra = create_test_snapshot(9, asset_count=6)
+        assert backend.save_snapshot(extra)
+        assert not is_delta(read_records(temp_dir)[-1])
+        live.append(extra)
+        assert backend.get_latest_snapshot() == extra
+
+        # Range scans decode skipped deltas only when needed
+        in_range = list(backend.iter_snapshots(start="2025-01-04T00:00:00Z", end="2025-01-05T23:00:00Z"))
+        assert in_range == history[3:5]
+
+        os.remove(os.path.join(temp_dir, "portfolio_history.index.json"))
+        assert [e["hash"] for e in backend.get_snapshot_index()] == [compute_snapshot_hash(s) for s in live]
+
+        result = backend.compact_history()
+        assert result["success"] and result["removed_snapshots"] == 2
+        assert backend.get_all_snapshots() == live
+        assert [i for i, r in enumerate(read_records(temp_dir)) if not is_delta(r)] == [0, 5]
+        assert backend.backups.load_backup(result["backup_id"], include_deleted=True)[0] == history[0]
+
+        print("✓ Test passed: deletes_ranges_and_compaction")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Delta Encoding Tests")
+    print("=" * 70)
+
+    test_codec_round_trip_is_exact()
+    test_keyframes_every_k_snapshots()
+    test_latest_read_decodes_only_its_chain()
+    test_deletes_ranges_and_compaction()
+
+    print("\n" + "=" * 70)
+    print("✅ All delta encoding tests passed!")
+    print("=" * 70)
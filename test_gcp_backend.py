@@ -0,0 +1,880 @@
+"""
+Offline tests for GCPStorageBackend.
+
+Uses a minimal in-memory stand-in for a GCS bucket so backend logic can be
+tested without credentials or network access (see test_gcp_storage.py for
+the live integration tests).
+"""
+
+import json
+import tempfile
+import shutil
+
+from google.api_core import exceptions as gcp_exceptions
+
+from agent.storage_backend import StorageBackend
+from agent.backends.gcp_storage import GCPStorageBackend, iter_json_array
+from agent.backends.health import CircuitBreaker
+from agent.retention import apply_retention
+
+
+# Test helper classes
+
+class FakeBlob:
+    """In-memory blob supporting the subset of the GCS API the backend uses."""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+        self.content_encoding = None
+        self.storage_class = None
+
+    def _stored(self):
+        if self.name not in self.bucket.objects:
+            raise gcp_exceptions.NotFound(f"{self.name} not found")
+        return self.bucket.objects[self.name]
+
+    def exists(self):
+        self.bucket.calls.append(("exists", self.name))
+        return self.name in self.bucket.objects
+
+    def reload(self):
+        self.bucket.calls.append(("reload", self.name))
+        self.generation = self._stored()["generation"]
+
+    def download_as_bytes(self, if_generation_not_match=None, **kwargs):
+        self.bucket.calls.append(("download", self.name))
+        stored = self._stored()
+        self.generation = stored["generation"]
+        if if_generation_not_match == stored["generation"]:
+            raise gcp_exceptions.NotModified("304 Not Modified")
+        self.bucket.bytes_downloaded += len(stored["data"])
+        return stored["data"]
+
+    def download_as_text(self, **kwargs):
+        return self.download_as_bytes(**kwargs).decode("utf-8")
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        self.bucket.calls.append(("upload", self.name))
+        if if_generation_match is not None:
+            current = self.bucket.objects.get(self.name, {}).get("generation", 0)
+            if current != if_generation_match:
+                raise gcp_exceptions.PreconditionFailed("412 Precondition Failed")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket.generation_counter += 1
+        self.bucket.objects[self.name] = {
+            "data": data,
+            "generation": self.bucket.generation_counter,
+            "content_encoding": self.content_encoding,
+            "storage_class": self.storage_class,
+        }
+        self.generation = self.bucket.generation_counter
+
+    def delete(self):
+        self.bucket.calls.append(("delete", self.name))
+        self._stored()
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    """In-memory bucket recording every call made against it."""
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+        self.generation_counter = 0
+        self.bytes_downloaded = 0
+        self.offline = False
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.calls.append(("get_blob", name))
+        if self.offline:
+            raise gcp_exceptions.ServiceUnavailable("503 Service Unavailable")
+        if name not in self.objects:
+            return None
+        blob = FakeBlob(self, name)
+        blob.generation = self.objects[name]["generation"]
+        return blob
+
+    def list_blobs(self, prefix=""):
+        self.calls.append(("list", prefix))
+        return [self.get_blob(name) for name in sorted(self.objects) if name.startswith(prefix)]
+
+    def exists(self):
+        self.calls.append(("bucket_exists", None))
+        if self.offline:
+            raise ConnectionError("network unreachable")
+        return True
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Client returning a single shared fake bucket."""
+
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        return self.fake_bucket
+
+
+def create_backend(client=None, cache_dir=None, layout="monolithic", compression="none"):
+    """Create a GCPStorageBackend wired to a fake bucket."""
+    return GCPStorageBackend(
+        "test-bucket",
+        credentials_dict={},
+        client=client or FakeClient(),
+        cache_dir=cache_dir,
+        layout=layout,
+        compression=compression
+    )
+
+
+def create_test_snapshot(timestamp_str, total_value):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": total_value}]
+    }
+
+
+# Test cases
+
+def test_latest_snapshot_skips_history_download():
+    """get_latest_snapshot should not download the history blob."""
+    print("\nTesting: Latest snapshot read via latest blob...")
+
+    backend = create_backend()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+    assert backend.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+    backend.bucket.calls.clear()
+    latest = backend.get_latest_snapshot()
+
+    assert latest["timestamp"] == "2025-01-02T10:00:00Z"
+    assert ("download", "portfolio_history.json") not in backend.bucket.calls
+
+    print("✓ Test passed: latest_snapshot_skips_history_download")
+
+
+def test_latest_snapshot_follows_delete():
+    """Deleting the last snapshot should update the latest blob."""
+    print("\nTesting: Latest blob after delete...")
+
+    backend = create_backend()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+    assert backend.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+    assert backend.delete_snapshot(1)
+    assert backend.get_latest_snapshot()["timestamp"] == "2025-01-01T10:00:00Z"
+
+    assert backend.delete_snapshot(0)
+    assert backend.get_latest_snapshot() is None
+
+    print("✓ Test passed: latest_snapshot_follows_delete")
+
+
+def test_stale_latest_blob_is_ignored():
+    """A latest blob written for an older generation should not be trusted."""
+    print("\nTesting: Stale latest blob...")
+
+    backend = create_backend()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+    # Another writer replaces the history without updating the latest blob
+    history = [
+        create_test_snapshot("2025-01-01T10:00:00Z", 1000.0),
+        create_test_snapshot("2025-01-05T10:00:00Z", 1500.0),
+    ]
+    backend.bucket.blob("portfolio_history.json").upload_from_string(json.dumps(history))
+
+    latest = backend.get_latest_snapshot()
+    assert latest["timestamp"] == "2025-01-05T10:00:00Z"
+
+    print("✓ Test passed: stale_latest_blob_is_ignored")
+
+
+def test_unchanged_history_downloads_no_payload():
+    """Re-reading an unchanged history should be a single 304 request."""
+    print("\nTesting: Conditional download of unchanged history...")
+
+    backend = create_backend()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+    backend.bucket.calls.clear()
+    backend.bucket.bytes_downloaded = 0
+    snapshots = backend.get_all_snapshots()
+
+    assert len(snapshots) == 1
+    assert backend.bucket.bytes_downloaded == 0, "No payload should be downloaded"
+    assert backend.bucket.calls == [
+        ("download", "portfolio_history.json"),
+        ("download", "portfolio_history.tombstones.json"),
+    ]
+
+    print("✓ Test passed: unchanged_history_downloads_no_payload")
+
+
+def test_changed_history_is_downloaded():
+    """A history changed by another writer should be downloaded in full."""
+    print("\nTesting: Conditional download of changed history...")
+
+    backend = create_backend()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+    other_writer = create_backend(client=backend.client)
+    assert other_writer.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+    snapshots = backend.get_all_snapshots()
+    assert [s["timestamp"] for s in snapshots] == ["2025-01-01T10:00:00Z", "2025-01-02T10:00:00Z"]
+
+    print("✓ Test passed: changed_history_is_downloaded")
+
+
+def test_local_copy_survives_restart():
+    """A new backend instance should reuse the persisted copy."""
+    print("\nTesting: Persistent history cache across restarts...")
+
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        client = FakeClient()
+        backend = create_backend(client=client, cache_dir=cache_dir)
+        assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+        restarted = create_backend(client=client, cache_dir=cache_dir)
+        client.fake_bucket.bytes_downloaded = 0
+        snapshots = restarted.get_all_snapshots()
+
+        assert len(snapshots) == 1
+        assert client.fake_bucket.bytes_downloaded == 0, "Cold start should not re-pull history"
+
+        print("✓ Test passed: local_copy_survives_restart")
+
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_sharded_save_uploads_single_shard():
+    """A sharded save should upload one shard plus the manifest, never the full history."""
+    print("\nTesting: Sharded save...")
+
+    backend = create_backend(layout="sharded")
+    for day in range(1, 4):
+        assert backend.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+    backend.bucket.calls.clear()
+    assert backend.save_snapshot(create_test_snapshot("2025-01-04T10:00:00Z", 4000.0))
+
+    uploads = [name for call, name in backend.bucket.calls if call == "upload"]
+    assert len(uploads) == 2, f"Expected shard + manifest uploads, got {uploads}"
+    assert uploads[0].startswith("snapshots/2025/20250104T100000000000-")
+    assert uploads[1] == "snapshots/manifest.json"
+    assert "portfolio_history.json" not in backend.bucket.objects
+
+    reopened = create_backend(client=backend.client, layout="sharded")
+    snapshots = reopened.get_all_snapshots()
+    assert [s["total_value_eur"] for s in snapshots] == [1000.0, 2000.0, 3000.0, 4000.0]
+
+    print("✓ Test passed: sharded_save_uploads_single_shard")
+
+
+def test_sharded_latest_fetches_one_shard():
+    """Latest snapshot should only download the manifest and the last shard."""
+    print("\nTesting: Sharded latest snapshot...")
+
+    client = FakeClient()
+    writer = create_backend(client=client, layout="sharded")
+    for day in range(1, 4):
+        assert writer.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+    reader = create_backend(client=client, layout="sharded")
+    client.fake_bucket.calls.clear()
+    latest = reader.get_latest_snapshot()
+
+    downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+    assert latest["timestamp"] == "2025-01-03T10:00:00Z"
+    assert len(downloads) == 2 and downloads[0] == "snapshots/manifest.json"
+
+    print("✓ Test passed: sharded_latest_fetches_one_shard")
+
+
+def test_sharded_delete_and_duplicate_timestamps():
+    """Deleting should mark the manifest entry; equal timestamps must not collide."""
+    print("\nTesting: Sharded delete...")
+
+    backend = create_backend(layout="sharded")
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1001.0))
+    assert backend.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+    assert backend.delete_snapshot(1)
+    snapshots = backend.get_all_snapshots()
+    assert [s["total_value_eur"] for s in snapshots] == [1000.0, 1100.0]
+    assert [e["total_value_eur"] for e in backend.get_snapshot_index()] == [1000.0, 1100.0]
+    assert backend.count_tombstones() == 1
+
+    # The shard stays until compaction, which backs it up first
+    shards = [n for n in backend.bucket.objects if n.startswith("snapshots/2025/")]
+    assert len(shards) == 3
+    result = backend.compact_history()
+    assert result["success"] and result["removed_snapshots"] == 1
+    shards = [n for n in backend.bucket.objects if n.startswith("snapshots/2025/")]
+    backups = [n for n in backend.bucket.objects if n.startswith("backup/snapshots/")]
+    assert len(shards) == 2 and len(backups) == 1
+    assert backend.count_tombstones() == 0
+    assert [s["total_value_eur"] for s in backend.get_all_snapshots()] == [1000.0, 1100.0]
+
+    assert not backend.delete_snapshot(5)
+
+    print("✓ Test passed: sharded_delete_and_duplicate_timestamps")
+
+
+def test_migration_from_monolithic_blob():
+    """Existing monolithic history should be migrated to shards with order preserved."""
+    print("\nTesting: Migration to sharded layout...")
+
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        client = FakeClient()
+        legacy = create_backend(client=client)
+        for day in range(1, 6):
+            assert legacy.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+        sharded = create_backend(client=client, cache_dir=cache_dir, layout="sharded")
+        result = sharded.migrate_to_sharded()
+        assert result == {"success": True, "migrated": 5, "already_sharded": False}
+        assert sharded.migrate_to_sharded()["already_sharded"]
+
+        assert sharded.get_all_snapshots() == legacy.get_all_snapshots()
+        assert any(n.startswith("backup/portfolio_history.json.pre-sharding") for n in client.fake_bucket.objects)
+
+        # Shards are immutable, so a restarted reader reuses its local copies
+        restarted = create_backend(client=client, cache_dir=cache_dir, layout="sharded")
+        client.fake_bucket.calls.clear()
+        assert len(restarted.get_all_snapshots()) == 5
+        downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+        assert downloads == ["snapshots/manifest.json"]
+
+        print("✓ Test passed: migration_from_monolithic_blob")
+
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_sharded_layout_migrates_on_first_use():
+    """Switching the layout without running the tool should not hide existing history."""
+    print("\nTesting: Automatic migration on first use...")
+
+    client = FakeClient()
+    legacy = create_backend(client=client)
+    assert legacy.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+    sharded = create_backend(client=client, layout="sharded")
+    assert sharded.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+    snapshots = sharded.get_all_snapshots()
+    assert [s["timestamp"] for s in snapshots] == ["2025-01-01T10:00:00Z", "2025-01-02T10:00:00Z"]
+
+    print("✓ Test passed: sharded_layout_migrates_on_first_use")
+
+
+def test_concurrent_manifest_update_is_retried():
+    """Two writers appending concurrently should both end up in the manifest."""
+    print("\nTesting: Concurrent manifest updates...")
+
+    client = FakeClient()
+    first = create_backend(client=client, layout="sharded")
+    second = create_backend(client=client, layout="sharded")
+
+    assert first.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+    assert second.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+    assert first.save_snapshot(create_test_snapshot("2025-01-03T10:00:00Z", 1200.0))
+
+    snapshots = create_backend(client=client, layout="sharded").get_all_snapshots()
+    assert [s["total_value_eur"] for s in snapshots] == [1000.0, 1100.0, 1200.0]
+
+    print("✓ Test passed: concurrent_manifest_update_is_retried")
+
+
+def test_compressed_uploads_are_tagged_and_readable():
+    """gzip uploads should set Content-Encoding and be readable with either setting."""
+    print("\nTesting: Compressed uploads...")
+
+    client = FakeClient()
+    backend = create_backend(client=client, compression="gzip")
+    snapshot = create_test_snapshot("2025-01-01T10:00:00Z", 1000.0)
+    snapshot["assets"] = [
+        {"name": f"Asset{i}", "quantity": 1, "current_value_eur": 10.0 * i} for i in range(50)
+    ]
+    assert backend.save_snapshot(snapshot)
+    assert backend.save_transactions({"sell_transactions": [], "buy_transactions": [], "metadata": {}})
+
+    stored = client.fake_bucket.objects["portfolio_history.json"]
+    assert stored["content_encoding"] == "gzip"
+    assert stored["data"][:2] == b"\x1f\x8b"
+    assert len(stored["data"]) * 5 < len(json.dumps([snapshot], indent=2))
+    assert client.fake_bucket.objects["transactions.json"]["content_encoding"] == "gzip"
+
+    plain_reader = create_backend(client=client)
+    assert plain_reader.get_all_snapshots() == [snapshot]
+    assert plain_reader.get_transactions()["sell_transactions"] == []
+
+    # Switching back to plain uploads keeps the existing history readable
+    assert plain_reader.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+    assert client.fake_bucket.objects["portfolio_history.json"]["content_encoding"] is None
+    assert len(backend.get_all_snapshots()) == 2
+
+    print("✓ Test passed: compressed_uploads_are_tagged_and_readable")
+
+
+def test_compressed_shards():
+    """Sharded layout should compress each shard."""
+    print("\nTesting: Compressed shards...")
+
+    backend = create_backend(layout="sharded", compression="gzip")
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+
+    shard = next(n for n in backend.bucket.objects if n.startswith("snapshots/2025/"))
+    assert backend.bucket.objects[shard]["content_encoding"] == "gzip"
+
+    reader = create_backend(client=backend.client, layout="sharded")
+    assert reader.get_latest_snapshot()["total_value_eur"] == 1000.0
+
+    print("✓ Test passed: compressed_shards")
+
+
+def test_iter_json_array_handles_chunk_boundaries():
+    """The incremental parser should give json.loads results however the text is split."""
+    print("\nTesting: Incremental JSON array parser...")
+
+    documents = [
+        '[]',
+        '  [ ]  ',
+        '[{"a": [1, 2, {"b": "x,]"}]}, 12345, -1.5e3, true, null, "s\\u00e9"]',
+        json.dumps([create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in range(1, 4)], indent=2),
+    ]
+    for text in documents:
+        for size in (1, 2, 7, len(text)):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            assert list(iter_json_array(chunks)) == json.loads(text), f"Mismatch for {text!r} in chunks of {size}"
+
+    assert list(iter_json_array([])) == []
+    for broken in ('{"a": 1}', '[1, 2', '[{"a": 1}'):
+        try:
+            list(iter_json_array([broken]))
+            assert False, f"{broken!r} should be rejected"
+        except ValueError:
+            pass
+
+    print("✓ Test passed: iter_json_array_handles_chunk_boundaries")
+
+
+def test_iter_snapshots_monolithic_and_compressed():
+    """Streaming a monolithic history should match get_all_snapshots, compressed or not."""
+    print("\nTesting: Streaming monolithic history...")
+
+    for compression in ("none", "gzip"):
+        backend = create_backend(compression=compression)
+        for day in range(1, 5):
+            assert backend.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+        reader = create_backend(client=FakeClient())
+        reader.bucket = backend.bucket
+        assert list(reader.iter_snapshots()) == backend.get_all_snapshots()
+
+        totals = list(reader.iter_snapshots(start="2025-01-03T00:00:00Z", fields=["total_value_eur"]))
+        assert totals == [{"total_value_eur": 3000.0}, {"total_value_eur": 4000.0}]
+
+    assert list(create_backend().iter_snapshots()) == [], "Missing history should stream nothing"
+
+    print("✓ Test passed: iter_snapshots_monolithic_and_compressed")
+
+
+def test_sharded_iter_fetches_only_range():
+    """A sharded range query should only download shards inside the range."""
+    print("\nTesting: Sharded streaming range...")
+
+    client = FakeClient()
+    writer = create_backend(client=client, layout="sharded")
+    for day in range(1, 8):
+        assert writer.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+    reader = create_backend(client=client, layout="sharded")
+    client.fake_bucket.calls.clear()
+    snapshots = list(reader.iter_snapshots(start="2025-01-05T00:00:00Z", end="2025-01-06T23:59:59Z"))
+
+    downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+    assert [s["total_value_eur"] for s in snapshots] == [5000.0, 6000.0]
+    assert len(downloads) == 3 and downloads[0] == "snapshots/manifest.json"
+
+    print("✓ Test passed: sharded_iter_fetches_only_range")
+
+
+def test_point_in_time_reads_one_snapshot():
+    """get_snapshot_at_or_before should fetch one shard, or only the latest blob."""
+    print("\nTesting: Point-in-time reads...")
+
+    client = FakeClient()
+    writer = create_backend(client=client, layout="sharded")
+    for day in range(1, 8):
+        assert writer.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+    reader = create_backend(client=client, layout="sharded")
+    client.fake_bucket.calls.clear()
+    snapshot = reader.get_snapshot_at_or_before("2025-01-04T12:00:00Z")
+
+    downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+    assert snapshot["total_value_eur"] == 4000.0
+    assert len(downloads) == 2 and downloads[0] == "snapshots/manifest.json"
+    assert reader.get_snapshot_at_or_before("2024-12-31T10:00:00Z") is None
+    assert [s["total_value_eur"] for s in reader.get_snapshots_between(end="2025-01-02T10:00:00Z")] == [1000.0, 2000.0]
+
+    monolithic = create_backend()
+    for day in range(1, 4):
+        assert monolithic.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+    monolithic.client.fake_bucket.calls.clear()
+    assert monolithic.get_snapshot_at_or_before("2025-01-05T00:00:00Z")["total_value_eur"] == 3000.0
+    downloads = [name for call, name in monolithic.client.fake_bucket.calls if call == "download"]
+    assert "portfolio_history.json" not in downloads, "Latest snapshot read without the history blob"
+    assert monolithic.get_snapshot_at_or_before("2025-01-02T11:00:00Z")["total_value_eur"] == 2000.0
+
+    print("✓ Test passed: point_in_time_reads_one_snapshot")
+
+
+def test_snapshot_index_avoids_history_download():
+    """The monolithic index blob should answer listings without the history payload."""
+    print("\nTesting: Monolithic snapshot index blob...")
+
+    client = FakeClient()
+    writer = create_backend(client=client)
+    for day in range(1, 4):
+        assert writer.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+    assert writer.delete_snapshot(0)
+
+    reader = create_backend(client=client)
+    client.fake_bucket.calls.clear()
+    index = reader.get_snapshot_index()
+
+    downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+    assert downloads == ["portfolio_history.index.json"]
+    assert [(e["index"], e["total_value_eur"], e["asset_count"]) for e in index] == [(0, 2000.0, 1), (1, 3000.0, 1)]
+
+    # A history written without the index blob is indexed from the history
+    del client.fake_bucket.objects["portfolio_history.index.json"]
+    assert create_backend(client=client).get_snapshot_index() == index
+    assert "portfolio_history.index.json" in client.fake_bucket.objects
+
+    print("✓ Test passed: snapshot_index_avoids_history_download")
+
+
+def test_sharded_snapshot_index_from_manifest():
+    """The sharded index should come from manifest entries alone."""
+    print("\nTesting: Sharded snapshot index...")
+
+    client = FakeClient()
+    writer = create_backend(client=client, layout="sharded")
+    for day in range(1, 4):
+        assert writer.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+    reader = create_backend(client=client, layout="sharded")
+    client.fake_bucket.calls.clear()
+    index = reader.get_snapshot_index()
+
+    downloads = [name for call, name in client.fake_bucket.calls if call == "download"]
+    assert downloads == ["snapshots/manifest.json"]
+    assert [e["total_value_eur"] for e in index] == [1000.0, 2000.0, 3000.0]
+    assert index == StorageBackend.get_snapshot_index(reader), "Should match the index derived from shards"
+
+    print("✓ Test passed: sharded_snapshot_index_from_manifest")
+
+
+def test_save_snapshots_batches_and_is_idempotent():
+    """A batch should cost one history upload, and replaying it none."""
+    print("\nTesting: Batched, idempotent save_snapshots...")
+
+    for layout, history_blob in (("monolithic", "portfolio_history.json"), ("sharded", "snapshots/manifest.json")):
+        client = FakeClient()
+        backend = create_backend(client=client, layout=layout)
+        assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        batch = [create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in range(1, 5)]
+
+        client.fake_bucket.calls.clear()
+        assert backend.save_snapshots(batch)
+        history_uploads = [name for call, name in client.fake_bucket.calls if call == "upload" and name == history_blob]
+        assert len(history_uploads) == 1, f"{layout}: expected one history write, got {len(history_uploads)}"
+        assert [s["total_value_eur"] for s in backend.get_all_snapshots()] == [1000.0, 2000.0, 3000.0, 4000.0]
+
+        # Replaying the same batch stores nothing new
+        assert backend.save_snapshots(batch)
+        assert len(backend.get_all_snapshots()) == 4
+        assert [e["index"] for e in backend.get_snapshot_index()] == [0, 1, 2, 3]
+
+    print("✓ Test passed: save_snapshots_batches_and_is_idempotent")
+
+
+def test_replace_history_reuses_shards():
+    """replace_history should back up monolithic history and upload only new shards."""
+    print("\nTesting: Replace history...")
+
+    for layout in ("monolithic", "sharded"):
+        client = FakeClient()
+        backend = create_backend(client=client, layout=layout)
+        first, third = (create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in (1, 3))
+        assert backend.save_snapshots([first, third])
+
+        second = create_test_snapshot("2025-01-02T10:00:00Z", 2000.0)
+        client.fake_bucket.calls.clear()
+        assert backend.replace_history([first, second])
+
+        uploads = [name for call, name in client.fake_bucket.calls if call == "upload"]
+        if layout == "sharded":
+            assert sum(name.endswith(".json") and name != "snapshots/manifest.json" for name in uploads) == 1
+        else:
+            assert any(name.startswith("backup/portfolio_history.json.bak.") for name in uploads)
+
+        assert [s["total_value_eur"] for s in backend.get_all_snapshots()] == [1000.0, 2000.0]
+        assert backend.get_latest_snapshot() == second
+        assert [e["total_value_eur"] for e in backend.get_snapshot_index()] == [1000.0, 2000.0]
+
+    print("✓ Test passed: replace_history_reuses_shards")
+
+
+def test_monolithic_delete_writes_tombstone():
+    """Deleting should not rewrite the history blob; compaction should, once."""
+    print("\nTesting: Monolithic tombstone deletes...")
+
+    client = FakeClient()
+    backend = create_backend(client=client)
+    assert backend.save_snapshots([create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in range(1, 5)])
+
+    client.fake_bucket.calls.clear()
+    assert backend.delete_snapshot(3)
+    assert backend.delete_snapshot(1)
+    uploads = [name for call, name in client.fake_bucket.calls if call == "upload"]
+    assert "portfolio_history.json" not in uploads, "History blob should be left alone"
+    assert not any(name.startswith("backup/") for name in uploads)
+
+    # Another instance sees the deletes through every read path
+    reader = create_backend(client=client)
+    assert [s["total_value_eur"] for s in reader.get_all_snapshots()] == [1000.0, 3000.0]
+    assert [s["total_value_eur"] for s in reader.iter_snapshots()] == [1000.0, 3000.0]
+    assert [(e["index"], e["total_value_eur"]) for e in reader.get_snapshot_index()] == [(0, 1000.0), (1, 3000.0)]
+    assert reader.get_latest_snapshot()["total_value_eur"] == 3000.0
+    assert reader.count_tombstones() == 2
+    assert isinstance(reader.get_history_version(), tuple)
+
+    # A re-saved snapshot is live again; stale derived blobs are not trusted
+    assert backend.save_snapshots([create_test_snapshot("2025-01-02T10:00:00Z", 2000.0)])
+    assert [s["total_value_eur"] for s in reader.get_all_snapshots()] == [1000.0, 3000.0, 2000.0]
+    assert reader.get_latest_snapshot()["total_value_eur"] == 2000.0
+
+    result = backend.compact_history(keep_backups=1)
+    assert result["success"] and result["removed_snapshots"] == 2
+    assert "portfolio_history.tombstones.json" not in client.fake_bucket.objects
+    assert [s["total_value_eur"] for s in reader.get_all_snapshots()] == [1000.0, 3000.0, 2000.0]
+    assert len(json.loads(client.fake_bucket.objects["portfolio_history.json"]["data"])) == 3
+
+    # Old backups beyond keep_backups are pruned
+    client.fake_bucket.blob("backup/portfolio_history.json.bak.20240101-120000").upload_from_string("[]")
+    result = backend.compact_history(keep_backups=1)
+    assert result["removed_snapshots"] == 0 and result["backups_removed"] == 1
+    backups = [n for n in client.fake_bucket.objects if n.startswith("backup/portfolio_history.json.bak.")]
+    assert len(backups) == 1 and not backups[0].endswith("20240101-120000")
+
+    print("✓ Test passed: monolithic_delete_writes_tombstone")
+
+
+def test_archives_are_cold_per_year_objects():
+    """Archives should be gzip COLDLINE objects per year, merged on every write."""
+    print("\nTesting: Per-year archive objects...")
+
+    client = FakeClient()
+    backend = create_backend(client=client)
+    history = [
+        create_test_snapshot(f"{date}T10:00:00Z", 1000.0 + i)
+        for i, date in enumerate(["2024-12-30", "2024-12-31", "2025-01-01", "2025-01-02"])
+    ]
+
+    result = backend.archive_snapshots(history[:3])
+    assert result == {"success": True, "years": {2024: 2, 2025: 1}}
+    stored = client.fake_bucket.objects["archive/portfolio_history.2024.json.gz"]
+    assert stored["storage_class"] == "COLDLINE"
+    assert stored["content_encoding"] == "gzip" and stored["data"][:2] == b"\x1f\x8b"
+
+    generation = stored["generation"]
+    assert backend.archive_snapshots(history) == {"success": True, "years": {2024: 0, 2025: 1}}
+    assert client.fake_bucket.objects["archive/portfolio_history.2024.json.gz"]["generation"] == generation, "Nothing new: not re-uploaded"
+    assert backend.get_archived_snapshots(2025) == history[2:]
+    assert backend.list_archive_years() == [2024, 2025]
+    assert backend.get_archived_snapshots(2023) == []
+
+    # Retention archives before it rewrites the history
+    assert backend.save_snapshots(history)
+    result = apply_retention(backend, [{"after_days": 0, "keep": "monthly"}], now=1.8e9, dry_run=False)
+    assert result["success"] and result["dropped"] == 2 and result["archived"] == {2024: 0, 2025: 0}
+    assert backend.get_all_snapshots() == [history[1], history[3]]
+
+    print("✓ Test passed: archives_are_cold_per_year_objects")
+
+
+def test_availability_is_cached_for_ttl():
+    """is_available should probe the bucket once per TTL, not on every call."""
+    print("\nTesting: Cached availability probe...")
+
+    client = FakeClient()
+    backend = create_backend(client=client)
+    clock = FakeClock()
+    backend._health._clock = clock
+
+    def probes():
+        return sum(1 for call, _ in client.fake_bucket.calls if call == "bucket_exists")
+
+    assert all(backend.is_available() for _ in range(5))
+    assert probes() == 1
+
+    clock.now += 31
+    assert backend.is_available()
+    assert probes() == 2, "Expired state should be probed again"
+
+    # Successful operations refresh the state without a probe
+    clock.now += 31
+    assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+    assert backend.is_available()
+    assert probes() == 2
+
+    print("✓ Test passed: availability_is_cached_for_ttl")
+
+
+def test_circuit_opens_and_recovers():
+    """Repeated connection failures should stop probing until the reset timeout."""
+    print("\nTesting: Circuit breaker...")
+
+    client = FakeClient()
+    backend = create_backend(client=client)
+    clock = FakeClock()
+    backend._health._clock = clock
+    client.fake_bucket.offline = True
+
+    def probes():
+        return sum(1 for call, _ in client.fake_bucket.calls if call == "bucket_exists")
+
+    # Each expired check probes once and fails; the third failure opens the circuit
+    for _ in range(3):
+        assert not backend.is_available()
+        clock.now += 31
+    assert probes() == 3
+    assert backend.get_health_status()["state"] == "open"
+
+    # While open, no call reaches GCS
+    for _ in range(10):
+        assert not backend.is_available()
+    assert probes() == 3
+    assert backend.get_health_status()["retry_in_seconds"] == 29.0
+
+    # Failed half-open probe reopens the circuit
+    clock.now += 30
+    assert not backend.is_available()
+    assert probes() == 4
+    assert backend.get_health_status()["state"] == "open"
+
+    # Successful half-open probe closes it
+    client.fake_bucket.offline = False
+    clock.now += 61
+    assert backend.is_available()
+    status = backend.get_health_status()
+    assert status["state"] == "closed" and status["consecutive_failures"] == 0
+
+    print("✓ Test passed: circuit_opens_and_recovers")
+
+
+def test_operation_failures_feed_breaker():
+    """Connection errors from real operations count; GCS answers like 404 don't."""
+    print("\nTesting: Passive failure tracking...")
+
+    client = FakeClient()
+    backend = create_backend(client=client)
+    backend._health._clock = FakeClock()
+
+    # Missing objects are answers, not outages
+    assert backend.get_transactions() is None
+    assert backend.get_health_status()["consecutive_failures"] == 0
+
+    client.fake_bucket.offline = True
+    for _ in range(3):
+        backend.get_history_version()
+    assert backend.get_health_status()["state"] == "open"
+
+    calls_before = len(client.fake_bucket.calls)
+    assert not backend.is_available()
+    assert len(client.fake_bucket.calls) == calls_before
+
+    # The breaker on its own: half-open admits a single probe
+    breaker = CircuitBreaker("test", ttl=10, failure_threshold=1, reset_timeout=5, clock=FakeClock())
+    breaker.record_failure()
+    breaker._clock.now += 5
+    admitted = []
+
+    def probe():
+        admitted.append(breaker.is_available(lambda: True))  # concurrent caller
+        return True
+
+    assert breaker.is_available(probe)
+    assert admitted == [False], "Other callers must not probe while half-open"
+
+    print("✓ Test passed: operation_failures_feed_breaker")
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Offline GCP Backend Tests")
+    print("=" * 70)
+
+    test_latest_snapshot_skips_history_download()
+    test_latest_snapshot_follows_delete()
+    test_stale_latest_blob_is_ignored()
+    test_unchanged_history_downloads_no_payload()
+    test_changed_history_is_downloaded()
+    test_local_copy_survives_restart()
+    test_sharded_save_uploads_single_shard()
+    test_sharded_latest_fetches_one_shard()
+    test_sharded_delete_and_duplicate_timestamps()
+    test_migration_from_monolithic_blob()
+    test_sharded_layout_migrates_on_first_use()
+    test_concurrent_manifest_update_is_retried()
+    test_compressed_uploads_are_tagged_and_readable()
+    test_compressed_shards()
+    test_iter_json_array_handles_chunk_boundaries()
+    test_iter_snapshots_monolithic_and_compressed()
+    test_sharded_iter_fetches_only_range()
+    test_point_in_time_reads_one_snapshot()
+    test_snapshot_index_avoids_history_download()
+    test_sharded_snapshot_index_from_manifest()
+    test_save_snapshots_batches_and_is_idempotent()
+    test_replace_history_reuses_shards()
+    test_monolithic_delete_writes_tombstone()
+    test_archives_are_cold_per_year_objects()
+    test_availability_is_cached_for_ttl()
+    test_circuit_opens_and_recovers()
+    test_operation_failures_feed_breaker()
+
+    print("\n" + "=" * 70)
+    print("✅ All offline GCP backend tests passed!")
+    print("=" * 70)
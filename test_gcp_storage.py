@@ -177,6 +177,9 @@ def test_hybrid_backend():
         assert success, "Hybrid save should succeed"
         print("✅ Snapshot saved to hybrid backend")
         
+        # Wait for background replication to GCP
+        assert hybrid.flush(timeout=60), "Replication to GCP should complete"
+        
         # Check sync status
         print("\nChecking sync status...")
         status = hybrid.get_sync_status()
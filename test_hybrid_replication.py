@@ -0,0 +1,250 @@
+"""
+Tests for background replication in the hybrid storage backend.
+
+Tests that saves return before the primary write, reads stay consistent
+while replication is pending, failed writes are retried with backoff,
+flush()/get_sync_status() report the queue correctly, and the queue is
+journaled across restarts and replayed as one batch.
+"""
+
+import os
+import json
+import threading
+import tempfile
+import shutil
+
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.hybrid_storage import HybridStorageBackend
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp_str, total_value):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": total_value}]
+    }
+
+
+class CountingPrimary(LocalFileBackend):
+    """Local backend recording batch sizes passed to save_snapshots."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.batches = []
+
+    def save_snapshots(self, snapshots):
+        self.batches.append(len(snapshots))
+        return super().save_snapshots(snapshots)
+
+
+class ControlledPrimary(LocalFileBackend):
+    """Local backend standing in for GCS, with controllable latency and failures."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+        self.save_attempts = 0
+
+    def save_snapshot(self, snapshot_data):
+        return self._attempt() and super().save_snapshot(snapshot_data)
+
+    def save_snapshots(self, snapshots):
+        return self._attempt() and super().save_snapshots(snapshots)
+
+    def _attempt(self):
+        self.save_attempts += 1
+        self.release.wait()
+        return not self.fail
+
+
+def create_hybrid(temp_dir, **kwargs):
+    """Create a hybrid backend over a controlled primary and a local fallback."""
+    primary = ControlledPrimary(os.path.join(temp_dir, "primary"))
+    fallback = LocalFileBackend(data_dir=os.path.join(temp_dir, "fallback"))
+    return HybridStorageBackend(primary=primary, fallback=fallback, **kwargs), primary, fallback
+
+
+# Test cases
+
+def test_save_returns_before_replication():
+    """Saves should commit locally and replicate in the background."""
+    print("\nTesting: Save returns before primary write...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        hybrid, primary, fallback = create_hybrid(temp_dir)
+        primary.release.clear()  # primary writes block until released
+
+        assert hybrid.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert hybrid.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+        status = hybrid.get_sync_status()
+        assert status["pending_syncs"] == 2 and not status["fully_synced"]
+        assert status["replication_lag_seconds"] >= 0.0
+
+        # Reads see the new snapshots (from fallback) while primary is behind
+        assert hybrid.get_latest_snapshot()["total_value_eur"] == 1100.0
+        assert hybrid.get_history_version()[0] == "fallback"
+
+        primary.release.set()
+        assert hybrid.flush(timeout=5)
+
+        assert [s["total_value_eur"] for s in primary.get_all_snapshots()] == [1000.0, 1100.0]
+        status = hybrid.get_sync_status()
+        assert status["pending_syncs"] == 0 and status["fully_synced"]
+        assert status["last_replicated_at"] is not None
+        assert hybrid.get_history_version()[0] == "primary"
+
+        print("✓ Test passed: save_returns_before_replication")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_failed_replication_is_retried_with_backoff():
+    """Failed primary writes should be retried until they succeed, keeping order."""
+    print("\nTesting: Replication retry with backoff...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        hybrid, primary, fallback = create_hybrid(temp_dir, initial_backoff=0.05, max_backoff=0.2)
+        primary.fail = True
+
+        assert hybrid.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert hybrid.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+        assert not hybrid.flush(timeout=0.5), "Flush should time out while primary fails"
+        status = hybrid.get_sync_status()
+        assert status["pending_syncs"] == 2
+        assert status["replication_failures"] >= 2
+        assert fallback.get_latest_snapshot()["total_value_eur"] == 1100.0
+
+        primary.fail = False
+        assert hybrid.flush(timeout=5)
+        assert [s["total_value_eur"] for s in primary.get_all_snapshots()] == [1000.0, 1100.0]
+        assert hybrid.get_sync_status()["replication_failures"] == 0
+
+        print("✓ Test passed: failed_replication_is_retried_with_backoff")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_queue_is_bounded():
+    """Snapshots beyond max_pending should stay in the fallback only."""
+    print("\nTesting: Bounded replication queue...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        hybrid, primary, fallback = create_hybrid(temp_dir, max_pending=2)
+        primary.release.clear()
+
+        for day in range(1, 5):
+            assert hybrid.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+        status = hybrid.get_sync_status()
+        assert status["pending_syncs"] == 2 and status["dropped_syncs"] == 2
+        assert len(fallback.get_all_snapshots()) == 4
+
+        primary.release.set()
+        assert hybrid.shutdown(timeout=5)
+        assert len(primary.get_all_snapshots()) == 2
+        assert not hybrid.get_sync_status()["fully_synced"], "Dropped snapshots are not synced"
+
+        print("✓ Test passed: queue_is_bounded")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_journal_survives_restart_and_replays_once():
+    """Queued snapshots should be journaled and replayed as one batch after a restart."""
+    print("\nTesting: Durable sync journal...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        journal_path = os.path.join(temp_dir, "pending_sync.jsonl")
+        fallback = LocalFileBackend(data_dir=os.path.join(temp_dir, "fallback"))
+
+        offline = ControlledPrimary(os.path.join(temp_dir, "offline"))
+        offline.fail = True
+        hybrid = HybridStorageBackend(primary=offline, fallback=fallback, journal_path=journal_path)
+        for day in range(1, 4):
+            assert hybrid.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+        assert not hybrid.shutdown(timeout=0.2), "Nothing should replicate while primary fails"
+
+        # Simulate a crash in the middle of appending another record
+        with open(journal_path, "a") as f:
+            f.write('{"hash": "sha256:torn", "snap')
+        with open(journal_path, "r") as f:
+            assert len(f.read().splitlines()) == 4
+
+        # Restart with primary reachable; one snapshot was already replicated
+        primary = CountingPrimary(os.path.join(temp_dir, "primary"))
+        assert primary.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        restarted = HybridStorageBackend(primary=primary, fallback=fallback, journal_path=journal_path)
+        assert restarted.flush(timeout=5)
+
+        assert primary.batches == [3], f"Expected one batch of 3, got {primary.batches}"
+        assert [s["total_value_eur"] for s in primary.get_all_snapshots()] == [1000.0, 2000.0, 3000.0]
+        assert not os.path.exists(journal_path), "Journal should be removed once drained"
+
+        print("✓ Test passed: journal_survives_restart_and_replays_once")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_duplicate_saves_are_queued_once():
+    """Saving identical content twice should journal it once."""
+    print("\nTesting: Hash-keyed replication queue...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        journal_path = os.path.join(temp_dir, "pending_sync.jsonl")
+        hybrid, primary, fallback = create_hybrid(temp_dir, journal_path=journal_path)
+        primary.release.clear()
+
+        snapshot = create_test_snapshot("2025-01-01T10:00:00Z", 1000.0)
+        assert hybrid.save_snapshot(snapshot)
+        assert hybrid.save_snapshot(dict(snapshot))
+
+        assert hybrid.get_sync_status()["pending_syncs"] == 1
+        with open(journal_path, "r") as f:
+            assert [json.loads(line)["hash"] for line in f].count(hybrid.pending_sync[0]["hash"]) == 1
+
+        primary.release.set()
+        assert hybrid.flush(timeout=5)
+        assert len(primary.get_all_snapshots()) == 1
+
+        print("✓ Test passed: duplicate_saves_are_queued_once")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Hybrid Replication Tests")
+    print("=" * 70)
+
+    test_save_returns_before_replication()
+    test_failed_replication_is_retried_with_backoff()
+    test_queue_is_bounded()
+    test_journal_survives_restart_and_replays_once()
+    test_duplicate_saves_are_queued_once()
+
+    print("\n" + "=" * 70)
+    print("✅ All hybrid replication tests passed!")
+    print("=" * 70)
@@ -0,0 +1,236 @@
+"""
+Tests for the shared JSON codec.
+
+Tests that the codec writes compact and pretty JSON byte-for-byte like the
+stdlib encoder did (floats in exponent form aside), that orjson encodes
+None values itself and writes equivalent exponent floats, that values
+orjson can't represent survive either way,
+that content hashes don't depend on the library, and that files written
+by earlier releases still read back the same.
+"""
+
+import json
+import math
+import os
+import tempfile
+import shutil
+
+from agent import json_codec
+from agent.backends.local_storage import LocalFileBackend
+from agent.json_codec import canonical_dumps, dumps, loads
+from agent.storage_backend import compute_snapshot_hash
+from agent.transaction_storage import compute_transaction_hash
+
+
+# Test helper functions
+
+def create_test_snapshot(day):
+    """Create a snapshot with non-ASCII names and assorted number types."""
+    return {
+        "timestamp": f"2025-01-{day:02d}T10:00:00Z",
+        "total_value_eur": 12345.67 + day,
+        "assets": [
+            {"name": "Société Générale", "ticker": "GLE.PA", "quantity": 10, "current_value_eur": 412.5},
+            {"name": "日本株 ETF", "ticker": None, "quantity": 0.125, "current_value_eur": -0.0},
+            {"name": "Bond \"A\"\n", "quantity": 3, "current_value_eur": 99.99, "flags": [True, False, {}]},
+        ]
+    }
+
+
+def libraries():
+    """Return the codec libraries to test: the stdlib, plus orjson if installed."""
+    return [None, json_codec.orjson] if json_codec.orjson is not None else [None]
+
+
+def use_library(library):
+    """Switch the codec to a library (None = stdlib); return the previous one."""
+    previous = json_codec.orjson
+    json_codec.orjson = library
+    return previous
+
+
+# Test cases
+
+def test_output_matches_stdlib_byte_for_byte():
+    """Compact and pretty output should equal the stdlib encoder's, whichever library runs."""
+    print("\nTesting: Byte-for-byte output...")
+
+    data = {"last_updated": "2025-01-01T00:00:00", "snapshot": create_test_snapshot(1), "empty": [], "n": 2**40}
+    legacy_pretty = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    legacy_compact = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    for library in libraries():
+        previous = use_library(library)
+        try:
+            assert dumps(data, pretty=True) == legacy_pretty, f"{library}: pretty"
+            assert dumps(data) == legacy_compact, f"{library}: compact"
+            assert loads(legacy_pretty) == loads(legacy_pretty.decode("utf-8")) == data
+            assert loads(bytearray(legacy_compact)) == data
+        finally:
+            use_library(previous)
+
+    assert len(legacy_compact) < len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    print(f"  ✓ Checked with {[getattr(lib, '__name__', 'json') for lib in libraries()]}")
+    print("✓ Test passed: output_matches_stdlib_byte_for_byte")
+
+
+def test_values_orjson_cannot_represent():
+    """NaN, huge integers, non-string keys and float subclasses should round-trip as with the stdlib."""
+    print("\nTesting: Stdlib fallbacks...")
+
+    class Price(float):
+        pass
+
+    for library in libraries():
+        previous = use_library(library)
+        try:
+            encoded = dumps({"nan": float("nan"), "inf": float("-inf"), "big": 2**70, "price": Price(1.5)})
+            decoded = loads(encoded)
+            assert math.isnan(decoded["nan"]) and decoded["inf"] == float("-inf")
+            assert decoded["big"] == 2**70 and decoded["price"] == 1.5
+            assert loads(dumps({1: "a"})) == {"1": "a"}
+            assert loads(b'{"value": NaN}')["value"] != loads(b'{"value": NaN}')["value"]
+
+            try:
+                dumps({"when": __import__("datetime").datetime(2025, 1, 1)})
+                assert False, f"{library}: datetimes should raise like the stdlib"
+            except TypeError:
+                pass
+            try:
+                loads(b'{"broken": ')
+                assert False, f"{library}: invalid JSON should raise"
+            except json.JSONDecodeError:
+                pass
+        finally:
+            use_library(previous)
+
+    print("✓ Test passed: values_orjson_cannot_represent")
+
+
+def test_orjson_none_and_exponent_floats():
+    """With orjson, None values shouldn't fall back to the stdlib and exponent floats should round-trip."""
+    print("\nTesting: orjson with None values and exponent floats...")
+
+    if json_codec.orjson is None:
+        print("⚠️  orjson not installed, skipping")
+        return
+
+    original_stdlib_dumps = json_codec._stdlib_dumps
+
+    def fail_stdlib_dumps(obj, pretty):
+        raise AssertionError("Encoded twice: orjson output was re-encoded by the stdlib")
+
+    data = {
+        "epoch": None,
+        "offset": None,
+        "note": "null in a string",
+        "assets": [{"name": "Tiny", "ticker": None, "quantity": 1e-7, "current_value_eur": 2.5e-12}],
+        "huge": 1e22,
+        "floats": [1e16, 12345.678, -0.0, 0.1]
+    }
+
+    try:
+        json_codec._stdlib_dumps = fail_stdlib_dumps
+        compact = dumps(data)
+        pretty = dumps(data, pretty=True)
+    finally:
+        json_codec._stdlib_dumps = original_stdlib_dumps
+
+    # Equivalent JSON: same values back, through either parser
+    assert loads(compact) == loads(pretty) == data
+    assert json.loads(compact) == data
+    assert loads(json.dumps(data).encode("utf-8")) == data
+
+    # Not the same bytes for exponent floats
+    assert b"1e-7" in compact and b"1e-07" in json.dumps(data).encode("utf-8")
+
+    # NaN nested next to None still goes through the stdlib
+    decoded = loads(dumps({"ticker": None, "values": [1.0, {"x": float("inf")}]}))
+    assert decoded["ticker"] is None and decoded["values"][1]["x"] == float("inf")
+
+    print("✓ Test passed: orjson_none_and_exponent_floats")
+
+
+def test_hashes_do_not_depend_on_library():
+    """Snapshot and transaction hashes should be those of the stdlib sorted-key encoding."""
+    print("\nTesting: Stable content hashes...")
+
+    snapshot = create_test_snapshot(2)
+    transactions = [{"asset_name": "Société Générale", "date": "2025-01-02T10:00:00", "quantity": 5, "currency": "EUR", "sell_price_per_unit_eur": 1.5}]
+    expected = canonical_dumps(snapshot)
+    assert expected == json.dumps(snapshot, sort_keys=True, ensure_ascii=False)
+
+    hashes = set()
+    for library in libraries():
+        previous = use_library(library)
+        try:
+            hashes.add((compute_snapshot_hash(loads(dumps(snapshot))), compute_transaction_hash(transactions)))
+        finally:
+            use_library(previous)
+    assert len(hashes) == 1
+    assert compute_snapshot_hash(snapshot) in {h for h, _ in hashes}
+
+    print("✓ Test passed: hashes_do_not_depend_on_library")
+
+
+def test_legacy_files_read_back_unchanged():
+    """Logs and transaction files in the old spaced/indented format should still read and append."""
+    print("\nTesting: Files from earlier releases...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        history = [create_test_snapshot(day) for day in range(1, 4)]
+        with open(os.path.join(temp_dir, "portfolio_history.jsonl"), "w", encoding="utf-8") as f:
+            for snapshot in history:
+                f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+        transactions = {
+            "last_updated": "2025-01-03T00:00:00",
+            "sell_transactions": [{"asset_name": "日本株 ETF", "date": "2025-01-02T10:00:00", "quantity": 1}],
+            "buy_transactions": [],
+            "metadata": {"sell_count": 1, "buy_count": 0}
+        }
+        legacy_transactions = json.dumps(transactions, indent=2, ensure_ascii=False).encode("utf-8")
+        with open(os.path.join(temp_dir, "transactions.json"), "wb") as f:
+            f.write(legacy_transactions)
+
+        backend = LocalFileBackend(data_dir=temp_dir)
+        assert backend.get_all_snapshots() == history
+        assert [e["hash"] for e in backend.get_snapshot_index()] == [compute_snapshot_hash(s) for s in history]
+        assert backend.get_transactions() == transactions
+
+        # New records are compact and sit next to the old ones
+        extra = create_test_snapshot(4)
+        assert backend.save_snapshot(extra)
+        with open(os.path.join(temp_dir, "portfolio_history.jsonl"), "rb") as f:
+            last_line = f.read().splitlines()[-1]
+        assert last_line == json.dumps(extra, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        assert LocalFileBackend(data_dir=temp_dir).get_all_snapshots() == history + [extra]
+
+        # Transactions stay human-readable, same bytes as before
+        assert backend.save_transactions(transactions)
+        with open(os.path.join(temp_dir, "transactions.json"), "rb") as f:
+            assert f.read() == legacy_transactions
+
+        print("✓ Test passed: legacy_files_read_back_unchanged")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running JSON Codec Tests")
+    print("=" * 70)
+
+    test_output_matches_stdlib_byte_for_byte()
+    test_values_orjson_cannot_represent()
+    test_orjson_none_and_exponent_floats()
+    test_hashes_do_not_depend_on_library()
+    test_legacy_files_read_back_unchanged()
+
+    print("\n" + "=" * 70)
+    print("✅ All JSON codec tests passed!")
+    print("=" * 70)
@@ -0,0 +1,231 @@
+"""
+Tests for range and point-in-time snapshot queries.
+
+Tests that get_snapshots_between and get_snapshot_at_or_before give the
+same answers on every backend and through the storage facade, that the
+local backend reads only the records it needs via the index sidecar, and
+that the daily analysis finds yesterday's snapshot with a point query.
+"""
+
+import os
+import tempfile
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import agent.storage as storage
+from agent import daily_analysis
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.config_models import StorageConfig
+
+
+# Test helper functions
+
+def create_test_snapshot(day, total_value=None):
+    """Create a snapshot taken at 10:00 UTC on a January 2025 day."""
+    value = 1000.0 * day if total_value is None else total_value
+    return {
+        "timestamp": f"2025-01-{day:02d}T10:00:00Z",
+        "total_value_eur": value,
+        "assets": [
+            {"name": f"Asset{i}", "quantity": 10, "current_value_eur": value / 4 + i}
+            for i in range(4)
+        ]
+    }
+
+
+def create_backends(temp_dir):
+    """Create one backend per local storage flavour."""
+    return {
+        "plain": LocalFileBackend(data_dir=os.path.join(temp_dir, "plain")),
+        "gzip": LocalFileBackend(data_dir=os.path.join(temp_dir, "gzip"), compression="gzip"),
+        "delta": LocalFileBackend(data_dir=os.path.join(temp_dir, "delta"), delta_keyframe_interval=4),
+        "sqlite": SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db")),
+    }
+
+
+def close_backends(backends):
+    """Close backends holding connections."""
+    for backend in backends.values():
+        if isinstance(backend, SQLiteStorageBackend):
+            backend.close()
+
+
+def fail_full_scan(*args, **kwargs):
+    raise AssertionError("Full scan should not be needed")
+
+
+# Test cases
+
+def test_range_and_point_queries_agree_across_backends():
+    """Every backend should return the same ranges and point-in-time snapshots."""
+    print("\nTesting: Range queries across backends...")
+
+    temp_dir = tempfile.mkdtemp()
+    backends = {}
+
+    try:
+        backends = create_backends(temp_dir)
+        history = [create_test_snapshot(day) for day in range(1, 21)]
+
+        for name, backend in backends.items():
+            assert backend.save_snapshots(history), name
+
+            between = backend.get_snapshots_between("2025-01-05T00:00:00Z", "2025-01-09T10:00:00Z")
+            assert between == history[4:9], f"{name}: inclusive bounds"
+            assert backend.get_snapshots_between(start="2025-01-18T10:00:00Z") == history[17:], name
+            assert backend.get_snapshots_between(end=datetime(2025, 1, 2, 10)) == history[:2], f"{name}: naive = UTC"
+            assert backend.get_snapshots_between() == history, name
+            assert backend.get_snapshots_between("2025-02-01T00:00:00Z") == [], name
+
+            assert backend.get_snapshot_at_or_before("2025-01-07T10:00:00Z") == history[6], f"{name}: exact match"
+            assert backend.get_snapshot_at_or_before("2025-01-07T09:59:59Z") == history[5], name
+            assert backend.get_snapshot_at_or_before(datetime(2025, 3, 1, tzinfo=timezone.utc)) == history[-1], name
+            assert backend.get_snapshot_at_or_before("2024-12-31T23:00:00Z") is None, name
+
+            try:
+                backend.get_snapshots_between(start="not a date")
+                assert False, f"{name}: unparseable bound should raise"
+            except ValueError:
+                pass
+
+        print("✓ Test passed: range_and_point_queries_agree_across_backends")
+
+    finally:
+        close_backends(backends)
+        shutil.rmtree(temp_dir)
+
+
+def test_local_queries_read_only_needed_records():
+    """Local range and point queries should not scan the log from the start."""
+    print("\nTesting: Local queries via index locations...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        history = [create_test_snapshot(day) for day in range(1, 21)]
+        for options in ({}, {"compression": "gzip"}, {"delta_keyframe_interval": 4},
+                        {"compression": "gzip", "delta_keyframe_interval": 3}):
+            data_dir = tempfile.mkdtemp(dir=temp_dir)
+            writer = LocalFileBackend(data_dir=data_dir, **options)
+            for snapshot in history:
+                assert writer.save_snapshot(snapshot)
+            assert writer.delete_snapshot(10)
+            live = history[:10] + history[11:]
+
+            reader = LocalFileBackend(data_dir=data_dir, **options)
+            reader._tail_checked = True
+            reader._iter_raw_records = fail_full_scan
+
+            assert reader.get_snapshots_between("2025-01-08T00:00:00Z", "2025-01-14T00:00:00Z") == live[7:12], options
+            assert reader.get_snapshot_at_or_before("2025-01-11T12:00:00Z") == history[9], f"{options}: deleted skipped"
+            assert reader.get_snapshot_at_or_before("2025-01-16T10:00:00Z") == history[15], options
+
+        print("✓ Test passed: local_queries_read_only_needed_records")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_local_queries_without_locations_and_out_of_order():
+    """Old index sidecars and out-of-order history should still give chronological answers."""
+    print("\nTesting: Local query fallbacks...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir, delta_keyframe_interval=3)
+        order = [1, 2, 5, 3, 4, 8, 6, 7]
+        for day in order:
+            assert backend.save_snapshot(create_test_snapshot(day))
+
+        expected = [create_test_snapshot(day) for day in (3, 4, 5, 6)]
+        assert backend.get_snapshots_between("2025-01-03T00:00:00Z", "2025-01-06T23:00:00Z") == expected
+        assert backend.get_snapshot_at_or_before("2025-01-07T00:00:00Z") == create_test_snapshot(6)
+
+        # Duplicate timestamps: the snapshot saved later wins
+        assert backend.save_snapshot(create_test_snapshot(6, total_value=1.0))
+        assert backend.get_snapshot_at_or_before("2025-01-06T10:00:00Z")["total_value_eur"] == 1.0
+
+        # An index written before locations were stored falls back to a scan
+        entries, tombstones, _ = backend._load_index_state()
+        backend._write_snapshot_index(entries, tombstones)
+        assert backend._load_index_state()[2] is None
+        assert backend.get_snapshots_between("2025-01-03T00:00:00Z", "2025-01-05T23:00:00Z") == expected[:3]
+        assert backend.get_snapshot_at_or_before("2025-01-02T12:00:00Z") == create_test_snapshot(2)
+
+        # The next rebuild stores locations again
+        os.remove(os.path.join(temp_dir, "portfolio_history.index.json"))
+        backend.get_snapshot_index()
+        assert backend._load_index_state()[2] is not None
+
+        print("✓ Test passed: local_queries_without_locations_and_out_of_order")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_facade_dashboard_and_daily_analysis():
+    """The facade, the dashboard period loader and the daily analysis should use point/range queries."""
+    print("\nTesting: Facade range queries...")
+
+    temp_dir = tempfile.mkdtemp()
+    original_config = storage._get_storage_config
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir)
+        storage._get_storage_config = lambda: StorageConfig()
+        storage._storage_backend = backend
+
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        history = []
+        for days_ago in (40, 9, 6, 3, 2, 1, 0):
+            for hour in (8, 17):
+                moment = today - timedelta(days=days_ago, hours=-hour)
+                history.append({
+                    "timestamp": moment.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "total_value_eur": 1000.0 - days_ago + hour / 100,
+                    "assets": []
+                })
+        assert backend.save_snapshots(history)
+
+        backend._iter_raw_records = fail_full_scan
+        week_start = datetime.fromisoformat(history[-1]["timestamp"].replace("Z", "+00:00")) - timedelta(days=7)
+        loaded = storage.get_snapshots_between(start=week_start)
+        assert loaded == history[4:]
+
+        # Yesterday's last snapshot, then the most recent older one
+        assert daily_analysis.get_yesterday_snapshot() == history[-3]
+        assert storage.get_snapshot_at_or_before(today - timedelta(days=2)) == history[-7]
+        del backend._iter_raw_records
+
+        assert storage.get_all_snapshots() == history, "Fills the snapshot cache"
+        assert storage.get_snapshots_between(end=history[3]["timestamp"]) == history[:4]
+        assert storage.get_snapshot_at_or_before(history[5]["timestamp"]) == history[5]
+
+        assert backend.delete_snapshot(len(history) - 3)
+        assert daily_analysis.get_yesterday_snapshot() == history[-4], "Stale cache not used"
+
+        print("✓ Test passed: facade_dashboard_and_daily_analysis")
+
+    finally:
+        storage._get_storage_config = original_config
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Range Query Tests")
+    print("=" * 70)
+
+    test_range_and_point_queries_agree_across_backends()
+    test_local_queries_read_only_needed_records()
+    test_local_queries_without_locations_and_out_of_order()
+    test_facade_dashboard_and_daily_analysis()
+
+    print("\n" + "=" * 70)
+    print("✅ All range query tests passed!")
+    print("=" * 70)
@@ -0,0 +1,253 @@
+"""
+Tests for history retention tiers and per-year archives.
+
+Tests that tiers keep the last snapshot of each period, that snapshots
+around transactions survive so validation windows don't change, and that
+applying retention archives full-resolution history before thinning it
+(local, SQLite, hybrid and the storage facade).
+"""
+
+import os
+import tempfile
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import agent.storage as storage
+from agent.backends.hybrid_storage import HybridStorageBackend
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.config_models import RetentionConfig, RetentionTier, StorageConfig
+from agent.retention import apply_retention, plan_retention
+from agent.storage_backend import snapshot_index_entry, timestamp_to_epoch
+
+
+# Test helper functions
+
+START = datetime(2024, 12, 1, tzinfo=timezone.utc)
+NOW = timestamp_to_epoch("2025-02-28T00:00:00Z")
+TIERS = [{"after_days": 14, "keep": "daily"}, {"after_days": 45, "keep": "weekly"}]
+
+
+def create_test_history(days, per_day=3):
+    """Create per_day snapshots a day (at 08:00, 12:00, ...) from 2024-12-01 on."""
+    history = []
+    for day in range(days):
+        for slot in range(per_day):
+            moment = START + timedelta(days=day, hours=8 + 4 * slot)
+            history.append({
+                "timestamp": moment.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "total_value_eur": 1000.0 + day * 10 + slot,
+                "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": 1000.0 + day}]
+            })
+    return history
+
+
+def create_index(history):
+    """Build the snapshot index of a history."""
+    return [snapshot_index_entry(snapshot, i) for i, snapshot in enumerate(history)]
+
+
+def window(history, date):
+    """Return the (previous, current) timestamps validation uses for a transaction date."""
+    epoch = timestamp_to_epoch(date)
+    for previous, current in zip(history, history[1:]):
+        if timestamp_to_epoch(previous["timestamp"]) < epoch <= timestamp_to_epoch(current["timestamp"]):
+            return previous["timestamp"], current["timestamp"]
+    return None
+
+
+# Test cases
+
+def test_tiers_keep_last_snapshot_per_period():
+    """Each tier should keep the last snapshot of each day or ISO week."""
+    print("\nTesting: Retention tiers...")
+
+    history = create_test_history(90)
+    plan = plan_retention(create_index(history), TIERS, NOW)
+    kept = [history[position] for position in plan["keep"]]
+
+    cutoff_daily = NOW - 14 * 86400
+    cutoff_weekly = NOW - 45 * 86400
+    recent = [s for s in history if timestamp_to_epoch(s["timestamp"]) > cutoff_daily]
+    assert all(s in kept for s in recent), "Young snapshots are all kept"
+
+    daily = [s for s in kept if cutoff_weekly < timestamp_to_epoch(s["timestamp"]) <= cutoff_daily]
+    assert all(s["timestamp"].endswith("T16:00:00Z") for s in daily), "Last snapshot of each day"
+    assert len({s["timestamp"][:10] for s in daily}) == len(daily)
+
+    weekly = [s for s in kept if timestamp_to_epoch(s["timestamp"]) <= cutoff_weekly]
+    weeks = [datetime.fromisoformat(s["timestamp"].replace("Z", "+00:00")).isocalendar()[:2] for s in weekly]
+    assert len(set(weeks)) == len(weeks), "One snapshot per ISO week"
+    assert weekly[0]["timestamp"] == "2024-12-01T16:00:00Z", "Sunday ends ISO week 48"
+
+    assert plan["protected"] == 0
+    assert len(plan["keep"]) + len(plan["drop"]) == len(history)
+    assert plan["by_tier"]["all"]["dropped"] == 0
+    assert plan["by_tier"]["weekly after 45d"]["kept"] == len(weekly)
+
+    print(f"  ✓ Kept {len(kept)} of {len(history)} snapshots")
+    print("✓ Test passed: tiers_keep_last_snapshot_per_period")
+
+
+def test_transactions_keep_validation_windows():
+    """Snapshots around a transaction should survive, keeping its validation window."""
+    print("\nTesting: Transaction boundaries...")
+
+    history = create_test_history(90)
+    dates = ["2024-12-10T10:00:00", "2025-01-20T09:30:00", "2024-12-03T08:00:00Z"]
+    plan = plan_retention(create_index(history), TIERS, NOW, transaction_dates=dates + ["not a date"])
+    kept = [history[position] for position in plan["keep"]]
+
+    for date in dates:
+        assert window(kept, date) == window(history, date), f"Window around {date} unchanged"
+    assert window(kept, "2024-12-10T10:00:00") == ("2024-12-10T08:00:00Z", "2024-12-10T12:00:00Z")
+    assert plan["protected"] == 6, "Two snapshots per window, none kept by the tiers"
+
+    print("✓ Test passed: transactions_keep_validation_windows")
+
+
+def test_apply_archives_then_thins():
+    """Applying retention should archive affected years, then rewrite the history once."""
+    print("\nTesting: Apply retention with archives...")
+
+    temp_dir = tempfile.mkdtemp()
+    backends = []
+
+    try:
+        backends = [
+            LocalFileBackend(data_dir=os.path.join(temp_dir, "local")),
+            SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db")),
+        ]
+        for backend in backends:
+            history = create_test_history(90)
+            assert backend.save_snapshots(history)
+
+            result = apply_retention(backend, TIERS, now=NOW)
+            assert result["success"] and result["dry_run"] and result["dropped"] > 0
+            assert backend.get_all_snapshots() == history, "Dry run changes nothing"
+            assert backend.list_archive_years() == []
+
+            result = apply_retention(backend, TIERS, now=NOW, dry_run=False)
+            assert result["success"] and result["archived"] == {2024: 93, 2025: 177}
+            remaining = backend.get_all_snapshots()
+            assert len(remaining) == result["kept"] == len(history) - result["dropped"]
+
+            assert backend.list_archive_years() == [2024, 2025]
+            assert backend.get_archived_snapshots(2024) + backend.get_archived_snapshots(2025) == history
+            assert backend.get_archived_snapshots(2023) == []
+
+            again = apply_retention(backend, TIERS, now=NOW, dry_run=False)
+            assert again["success"] and again["dropped"] == 0 and again["archived"] == {}
+            assert backend.get_all_snapshots() == remaining
+
+            # Archiving what is already archived adds nothing
+            assert backend.archive_snapshots(history) == {"success": True, "years": {2024: 0, 2025: 0}}
+
+        assert os.path.exists(os.path.join(temp_dir, "local", "archive", "portfolio_history.2024.json.gz"))
+        assert os.path.exists(os.path.join(temp_dir, "archive", "portfolio_history.2025.json.gz"))
+
+        print("✓ Test passed: apply_archives_then_thins")
+
+    finally:
+        for backend in backends:
+            if isinstance(backend, SQLiteStorageBackend):
+                backend.close()
+        shutil.rmtree(temp_dir)
+
+
+def test_failed_archive_drops_nothing():
+    """If archiving fails, the history should be left alone."""
+    print("\nTesting: Failed archive...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir)
+        history = create_test_history(60)
+        assert backend.save_snapshots(history)
+
+        with open(os.path.join(temp_dir, "archive"), "w") as f:
+            f.write("not a directory")
+
+        result = apply_retention(backend, TIERS, now=NOW, dry_run=False)
+        assert not result["success"] and "Archiving failed" in result["error"]
+        assert backend.get_all_snapshots() == history
+
+        print("✓ Test passed: failed_archive_drops_nothing")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_retention_facade_with_hybrid_storage():
+    """storage.apply_retention should use config tiers and transactions, thinning both sides."""
+    print("\nTesting: apply_retention facade...")
+
+    temp_dir = tempfile.mkdtemp()
+    original_config = storage._get_storage_config
+
+    try:
+        primary = LocalFileBackend(data_dir=os.path.join(temp_dir, "primary"))
+        fallback = LocalFileBackend(data_dir=os.path.join(temp_dir, "fallback"))
+        hybrid = HybridStorageBackend(primary=primary, fallback=fallback)
+        storage._storage_backend = hybrid
+
+        storage._get_storage_config = lambda: StorageConfig()
+        assert storage.apply_retention_if_due() is None, "No tiers: retention disabled"
+        assert not storage.apply_retention()["success"]
+
+        storage._get_storage_config = lambda: StorageConfig(
+            retention=RetentionConfig(tiers=[RetentionTier(**tier) for tier in TIERS])
+        )
+        history = create_test_history(400, per_day=1)
+        assert fallback.save_snapshots(history) and primary.save_snapshots(history)
+        assert hybrid.save_transactions({
+            "last_updated": "2025-01-01T00:00:00",
+            "sell_transactions": [{"asset_name": "Asset0", "date": "2024-12-10T10:00:00", "quantity": 1}],
+            "buy_transactions": [],
+            "metadata": {}
+        })
+
+        plan = storage.apply_retention()
+        assert plan["success"] and plan["dry_run"] and plan["protected"] == 2
+
+        result = storage.apply_retention_if_due()
+        assert result["success"] and not result["dry_run"] and result["dropped"] == plan["dropped"]
+        thinned = storage.get_all_snapshots()
+        assert len(thinned) == len(history) - plan["dropped"], "Cache invalidated"
+        assert primary.get_all_snapshots() == fallback.get_all_snapshots() == thinned
+        assert window(thinned, "2024-12-10T10:00:00") == window(history, "2024-12-10T10:00:00")
+        assert hybrid.list_archive_years() == [2024, 2025, 2026]
+        assert primary.list_archive_years() == fallback.list_archive_years()
+        hybrid.shutdown()
+
+        try:
+            StorageConfig(retention={"tiers": [{"after_days": 30, "keep": "weekly"}, {"after_days": 90, "keep": "daily"}]})
+            assert False, "Finer tier after a coarser one should be rejected"
+        except ValueError:
+            pass
+
+        print("✓ Test passed: retention_facade_with_hybrid_storage")
+
+    finally:
+        storage._get_storage_config = original_config
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Retention Tests")
+    print("=" * 70)
+
+    test_tiers_keep_last_snapshot_per_period()
+    test_transactions_keep_validation_windows()
+    test_apply_archives_then_thins()
+    test_failed_archive_drops_nothing()
+    test_retention_facade_with_hybrid_storage()
+
+    print("\n" + "=" * 70)
+    print("✅ All retention tests passed!")
+    print("=" * 70)
@@ -1,7 +1,7 @@
 """
 Tests for snapshot deletion functionality.
 
-Tests deletion by index, backup creation, and error handling.
+Tests deletion by index, compaction (backups and pruning), and error handling.
 """
 
 import os
@@ -10,7 +10,10 @@ import tempfile
 import shutil
 from datetime import datetime, timezone
 
+import agent.storage as storage
+from agent.config_models import StorageConfig
 from agent.backends.local_storage import LocalFileBackend
+from agent.backends.hybrid_storage import HybridStorageBackend
 
 
 # Test helper functions
@@ -65,8 +68,7 @@ def test_delete_snapshot_by_valid_index():
         print(f"  ✓ Deletion succeeded")
         
         # Verify snapshot was deleted
-        with open(history_path, "r") as f:
-            updated_history = json.load(f)
+        updated_history = backend.get_all_snapshots()
         
         assert len(updated_history) == 4, f"Should have 4 snapshots, got {len(updated_history)}"
         print(f"  ✓ History now has {len(updated_history)} snapshots")
@@ -76,12 +78,18 @@ def test_delete_snapshot_by_valid_index():
         assert "2025-01-03T10:00:00Z" not in timestamps, "Deleted snapshot should be gone"
         print(f"  ✓ Correct snapshot deleted (2025-01-03)")
         
-        # Verify backup was created in backup/ folder
-        backup_dir = os.path.join(temp_dir, "backup")
-        assert os.path.exists(backup_dir), "Backup directory should exist"
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith("portfolio_history.json.bak")]
-        assert len(backup_files) > 0, "Backup file should exist"
-        print(f"  ✓ Backup created: backup/{backup_files[0]}")
+        # Verify the delete only appended a tombstone; compaction creates the backup
+        assert backend.list_backups() == [], "Delete should not back up the whole log"
+        assert backend.count_tombstones() == 1
+
+        result = backend.compact_history()
+        assert result["success"] and result["removed_snapshots"] == 1
+        backups = backend.list_backups()
+        assert len(backups) == 1, "Compaction should create one backup"
+        assert backups[0]["id"] == result["backup_id"] and backups[0]["deleted_count"] == 1
+        assert backend.count_tombstones() == 0
+        assert [s["timestamp"] for s in backend.get_all_snapshots()] == timestamps
+        print(f"  ✓ Backup created on compaction: {backups[0]['id']}")
         
         print("✓ Test passed: delete_snapshot_by_valid_index")
         
@@ -109,8 +117,7 @@ def test_delete_first_snapshot():
         
         assert success, "Deletion should succeed"
         
-        with open(history_path, "r") as f:
-            updated_history = json.load(f)
+        updated_history = backend.get_all_snapshots()
         
         assert len(updated_history) == 2, "Should have 2 snapshots remaining"
         assert updated_history[0]["timestamp"] == "2025-01-02T10:00:00Z", "First snapshot should now be 2025-01-02"
@@ -140,8 +147,7 @@ def test_delete_last_snapshot():
         
         assert success, "Deletion should succeed"
         
-        with open(history_path, "r") as f:
-            updated_history = json.load(f)
+        updated_history = backend.get_all_snapshots()
         
         assert len(updated_history) == 2, "Should have 2 snapshots remaining"
         assert updated_history[-1]["timestamp"] == "2025-01-02T10:00:00Z", "Last snapshot should now be 2025-01-02"
@@ -171,8 +177,7 @@ def test_delete_only_snapshot():
         
         assert success, "Deletion should succeed"
         
-        with open(history_path, "r") as f:
-            updated_history = json.load(f)
+        updated_history = backend.get_all_snapshots()
         
         assert len(updated_history) == 0, "History should be empty"
         assert updated_history == [], "History should be an empty list"
@@ -203,8 +208,7 @@ def test_delete_invalid_index_negative():
         assert not success, "Deletion should fail with negative index"
         
         # Verify history unchanged
-        with open(history_path, "r") as f:
-            unchanged_history = json.load(f)
+        unchanged_history = backend.get_all_snapshots()
         
         assert len(unchanged_history) == 3, "History should be unchanged"
         
@@ -234,8 +238,7 @@ def test_delete_invalid_index_out_of_range():
         assert not success, "Deletion should fail with out-of-range index"
         
         # Verify history unchanged
-        with open(history_path, "r") as f:
-            unchanged_history = json.load(f)
+        unchanged_history = backend.get_all_snapshots()
         
         assert len(unchanged_history) == 3, "History should be unchanged"
         
@@ -312,67 +315,114 @@ def test_backup_contains_original_snapshot():
         # Delete middle snapshot
         success = backend.delete_snapshot(1)
         assert success, "Deletion should succeed"
+        assert backend.compact_history()["success"]
         
-        # Find backup file in backup/ folder
-        backup_dir = os.path.join(temp_dir, "backup")
-        assert os.path.exists(backup_dir), "Backup directory should exist"
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith("portfolio_history.json.bak")]
-        assert len(backup_files) > 0, "Backup should exist"
-        
-        backup_path = os.path.join(backup_dir, backup_files[0])
+        # Find the backup in the backup store
+        assert os.path.exists(os.path.join(temp_dir, "backup")), "Backup directory should exist"
+        backups = backend.list_backups()
+        assert len(backups) > 0, "Backup should exist"
         
-        # Load backup
-        with open(backup_path, "r") as f:
-            backup_history = json.load(f)
+        # Load backup including the snapshot it was taken to drop
+        backup_history = backend.backups.load_backup(backups[0]["id"], include_deleted=True)
         
         # Verify backup has the deleted snapshot
         assert len(backup_history) == 3, "Backup should have original 3 snapshots"
         assert backup_history[1] == snapshot_to_delete, "Backup should contain deleted snapshot"
+        assert len(backend.backups.load_backup(backups[0]["id"])) == 2, "Deleted snapshot is marked"
         
-        print(f"  ✓ Backup verified: backup/{backup_files[0]}")
+        print(f"  ✓ Backup verified: {backups[0]['id']}")
         print("✓ Test passed: backup_contains_original_snapshot")
         
     finally:
         shutil.rmtree(temp_dir)
 
 
-def test_multiple_deletions_create_multiple_backups():
-    """Test that multiple deletions create separate timestamped backups."""
-    print("\nTesting: Multiple deletions create multiple backups...")
+def test_compaction_prunes_old_backups():
+    """Test that compaction backs up once and keeps only the most recent backups."""
+    print("\nTesting: Compaction prunes old backups...")
     
     temp_dir = tempfile.mkdtemp()
     
     try:
         backend = LocalFileBackend(data_dir=temp_dir)
-        history = create_test_history(5)
-        
-        history_path = os.path.join(temp_dir, "portfolio_history.json")
-        with open(history_path, "w") as f:
-            json.dump(history, f, indent=2)
-        
-        # Delete first snapshot
-        success1 = backend.delete_snapshot(0)
-        assert success1, "First deletion should succeed"
-        
-        import time
-        time.sleep(0.1)  # Small delay to ensure different timestamp
+        for snapshot in create_test_history(5):
+            assert backend.save_snapshot(snapshot)
         
-        # Delete another snapshot (now at index 0 since we deleted the first)
-        success2 = backend.delete_snapshot(0)
-        assert success2, "Second deletion should succeed"
-        
-        # Check backup files in backup/ folder
+        # Backups left behind by earlier compactions
         backup_dir = os.path.join(temp_dir, "backup")
-        assert os.path.exists(backup_dir), "Backup directory should exist"
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith("portfolio_history.json.bak")]
-        
-        # Should have 2 backup files (one per deletion)
-        assert len(backup_files) >= 1, f"Should have at least 1 backup, found {len(backup_files)}"
-        print(f"  ✓ Created {len(backup_files)} backup(s)")
+        for day in range(1, 4):
+            old_backup = os.path.join(backup_dir, f"portfolio_history.jsonl.bak.2024010{day}-120000")
+            with open(old_backup, "w") as f:
+                f.write("{}\n")
+            os.utime(old_backup, (day * 1000, day * 1000))
+        
+        # Two deletes, one compaction
+        assert backend.delete_snapshot(0), "First deletion should succeed"
+        assert backend.delete_snapshot(0), "Second deletion should succeed"
+        result = backend.compact_history(keep_backups=2)
+        assert result["success"]
+        assert result["removed_snapshots"] == 2
+        assert result["backups_removed"] == 2
+        assert result["bytes_after"] < result["bytes_before"]
+        
+        backup_files = sorted(f for f in os.listdir(backup_dir) if f.startswith("portfolio_history.jsonl.bak"))
+        assert backup_files == ["portfolio_history.jsonl.bak.20240103-120000"], "Newest old backup kept"
+        assert len(backend.list_backups()) == 1, "New backup goes to the backup store"
+        assert len(backend.get_all_snapshots()) == 3
+        
+        # Nothing to compact: no new backup
+        result = backend.compact_history(keep_backups=2)
+        assert result["success"] and result["removed_snapshots"] == 0
+        assert result["backups_removed"] == 0
+        print(f"  ✓ Kept {len(backup_files)} backup(s)")
+        
+        print("✓ Test passed: compaction_prunes_old_backups")
         
-        print("✓ Test passed: multiple_deletions_create_multiple_backups")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_hybrid_compaction_when_due():
+    """Deletes should reach both sides as tombstones; compaction runs once enough are pending."""
+    print("\nTesting: Hybrid compaction when due...")
+    
+    temp_dir = tempfile.mkdtemp()
+    original_config = storage._get_storage_config
+    
+    try:
+        primary = LocalFileBackend(data_dir=os.path.join(temp_dir, "primary"))
+        fallback = LocalFileBackend(data_dir=os.path.join(temp_dir, "fallback"))
+        hybrid = HybridStorageBackend(primary=primary, fallback=fallback)
+        storage._storage_backend = hybrid
+        storage._get_storage_config = lambda: StorageConfig(compact_after_deletes=2, keep_backups=1)
+        
+        for snapshot in create_test_history(4):
+            assert hybrid.save_snapshot(snapshot)
+        assert hybrid.flush(timeout=5.0)
+        
+        assert storage.delete_snapshot(1, confirm=True)["success"]
+        assert hybrid.count_tombstones() == 1
+        assert storage.compact_history_if_due() is None, "Below the threshold"
+        
+        assert storage.delete_snapshot(1, confirm=True)["success"]
+        assert storage.get_storage_status()["pending_deletes"] == 2
+        result = storage.compact_history_if_due()
+        assert result["success"] and result["removed_snapshots"] == 4, "Both sides compacted"
+        assert primary.count_tombstones() == 0 and fallback.count_tombstones() == 0
+        assert len(primary.get_all_snapshots()) == 2 and len(fallback.get_all_snapshots()) == 2
+        
+        # Explicit compaction with nothing pending
+        result = storage.compact_history()
+        assert result["success"] and result["removed_snapshots"] == 0
+        assert not storage.compact_history(keep_backups=-1)["success"]
+        hybrid.shutdown()
+        
+        print("✓ Test passed: hybrid_compaction_when_due")
         
     finally:
+        storage._get_storage_config = original_config
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
         shutil.rmtree(temp_dir)
 
 
@@ -391,7 +441,8 @@ if __name__ == "__main__":
     test_delete_from_empty_history()
     test_delete_from_nonexistent_file()
     test_backup_contains_original_snapshot()
-    test_multiple_deletions_create_multiple_backups()
+    test_compaction_prunes_old_backups()
+    test_hybrid_compaction_when_due()
     
     print("\n" + "=" * 70)
     print("✅ All snapshot deletion tests passed!")
@@ -0,0 +1,213 @@
+"""
+Tests for the shared snapshot diff.
+
+Tests that SnapshotDiff classifies assets and computes quantity and value
+changes in snapshot order, that validation, comparison and the Raycast
+winners/losers view give the same results from one shared diff, and that
+a weekly run diffs each snapshot pair only once.
+"""
+
+from agent import analysis, raycast_tools, storage
+from agent.timestamp_index import TimestampIndex
+from agent.buy_validation import detect_buys, validate_buys_have_transactions
+from agent.sell_validation import detect_sells, validate_sells_have_transactions
+from agent.snapshot_diff import SnapshotDiff
+
+
+# Test helper functions
+
+def create_asset(name, quantity, value, category="US Stocks", purchase_price=None):
+    """Create an asset dict."""
+    return {
+        "name": name,
+        "quantity": quantity,
+        "category": category,
+        "purchase_price_total_eur": value * 0.8 if purchase_price is None else purchase_price,
+        "current_value_eur": value
+    }
+
+
+def create_snapshot(timestamp, assets):
+    """Create a snapshot from assets."""
+    return {
+        "timestamp": timestamp,
+        "total_value_eur": sum(asset["current_value_eur"] for asset in assets),
+        "assets": assets
+    }
+
+
+def create_week():
+    """Create two snapshots a week apart with held, bought, sold, new and closed positions."""
+    previous = create_snapshot("2025-01-01T10:00:00Z", [
+        create_asset("Apple", 100, 15000.0),
+        create_asset("Bank", 50, 2500.0),
+        create_asset("Chips", 20, 4000.0),
+        create_asset("Pension Fund", 1, 9000.0, category="Pension"),
+        create_asset("Oil", 30, 3000.0),
+        create_asset("Dull", 10, 1000.0),
+    ])
+    current = create_snapshot("2025-01-08T10:00:00Z", [
+        create_asset("Chips", 25, 5500.0),
+        create_asset("Apple", 60, 9600.0),
+        create_asset("Bank", 50, 2400.0),
+        create_asset("Pension Fund", 1, 9100.0, category="Pension"),
+        create_asset("Dull", 10, 1000.0),
+        create_asset("Zinc", 40, 800.0),
+    ])
+    sells = [
+        {"date": "2025-01-03T10:00:00Z", "asset_name": "Apple", "quantity": 40, "total_value_eur": 6300.0},
+        {"date": "2025-01-04T10:00:00Z", "asset_name": "Oil", "quantity": 30, "total_value_eur": 3150.0},
+    ]
+    buys = [
+        {"date": "2025-01-05T10:00:00Z", "asset_name": "Chips", "quantity": 5, "total_value_eur": 1050.0},
+        {"date": "2025-01-06T10:00:00Z", "asset_name": "Zinc", "quantity": 40, "total_value_eur": 780.0},
+    ]
+    return current, previous, sells, buys
+
+
+# Test cases
+
+def test_diff_classifies_and_measures_changes():
+    """Held, new and sold names should be in snapshot order with their quantity/value changes."""
+    print("\nTesting: Snapshot diff...")
+
+    current, previous, _, _ = create_week()
+    diff = SnapshotDiff.compute(current, previous)
+
+    assert diff.held_names == ["Chips", "Apple", "Bank", "Pension Fund", "Dull"]
+    assert diff.new_names == ["Zinc"]
+    assert diff.sold_names == ["Oil"]
+    assert set(diff.changes) == set(diff.held_names + diff.new_names + diff.sold_names)
+
+    apple = diff.changes["Apple"]
+    assert apple.status == "held" and apple.quantity_change == -40 and apple.value_change == -5400.0
+    assert diff.changes["Zinc"].status == "new" and diff.quantity_change("Zinc") == 40
+    assert diff.changes["Oil"].status == "sold" and diff.value_change("Oil") == -3000.0
+    assert diff.quantity_change("Missing") == 0.0 and diff.value_change("Missing") == 0.0
+
+    # Missing fields count as zero; a duplicated name uses its last entry
+    sparse = SnapshotDiff.compute(
+        {"assets": [{"name": "A"}, {"name": "B", "quantity": 1}, {"name": "B", "quantity": 3}]},
+        {"assets": [{"name": "A", "quantity": 2, "current_value_eur": 5.0}]}
+    )
+    assert sparse.changes["A"].quantity_change == -2 and sparse.changes["A"].value_change == -5.0
+    assert sparse.changes["B"].current_quantity == 3
+
+    assert SnapshotDiff.of(current, previous, diff) is diff
+    assert SnapshotDiff.of(previous, current, diff) is not diff, "A diff of other snapshots is not reused"
+
+    print("✓ Test passed: diff_classifies_and_measures_changes")
+
+
+def test_consumers_agree_with_and_without_shared_diff():
+    """Detection, validation and comparison should give the same results from a shared diff."""
+    print("\nTesting: Shared diff consumers...")
+
+    current, previous, sells, buys = create_week()
+    diff = SnapshotDiff.compute(current, previous)
+
+    assert detect_sells(current, previous, diff=diff) == detect_sells(current, previous)
+    assert [s.asset_name for s in detect_sells(current, previous, diff=diff)] == ["Apple", "Oil"]
+    detected_buys = detect_buys(current, previous, diff=diff)
+    assert detected_buys == detect_buys(current, previous)
+    assert [(b.asset_name, b.is_new_position) for b in detected_buys] == [("Chips", False), ("Zinc", True)]
+
+    report = analysis.compare_snapshots(current, previous, sells, buys, diff=diff)
+    assert report == analysis.compare_snapshots(current, previous, sells, buys)
+
+    assert [mover["name"] for mover in report["top_movers"]] == ["Apple", "Chips", "Pension Fund"]
+    assert report["top_movers"][0]["change_eur"] == 1000.0, "Price-only change for a partial sell"
+    assert report["bottom_movers"] == [{"name": "Bank", "change_eur": -100.0}]
+    changes = {change["name"]: change for change in report["quantity_changes"]}
+    assert [change["name"] for change in report["quantity_changes"]] == ["Chips", "Apple"]
+    assert changes["Apple"]["partial_sell_gain_loss_eur"] == 6300.0 - 12000.0 * 40 / 100
+    assert changes["Chips"]["explicit_purchase_value_eur"] == 1050.0
+    assert report["new_positions"][0]["purchase_value_eur"] == 780.0
+    assert report["sold_positions"][0]["realized_gain_loss_eur"] == 3150.0 - 2400.0
+
+    print("✓ Test passed: consumers_agree_with_and_without_shared_diff")
+
+
+def test_weekly_flow_diffs_once():
+    """Validating and comparing with a shared diff should compute it exactly once."""
+    print("\nTesting: One diff per snapshot pair...")
+
+    current, previous, sells, buys = create_week()
+    computed = []
+    original = SnapshotDiff.compute.__func__
+
+    def counting_compute(cls, current_snapshot, previous_snapshot):
+        computed.append((current_snapshot["timestamp"], previous_snapshot["timestamp"]))
+        return original(cls, current_snapshot, previous_snapshot)
+
+    SnapshotDiff.compute = classmethod(counting_compute)
+    try:
+        diff = SnapshotDiff.compute(current, previous)
+        validate_sells_have_transactions(current, previous, sells, diff=diff)
+        validate_buys_have_transactions(current, previous, buys, diff=diff)
+        analysis.compare_snapshots(current, previous, sells, buys, diff=diff)
+        assert len(computed) == 1, computed
+
+        validate_sells_have_transactions(current, previous, sells)
+        assert len(computed) == 2, "Computed on demand without a shared diff"
+    finally:
+        SnapshotDiff.compute = classmethod(original)
+
+    print("✓ Test passed: weekly_flow_diffs_once")
+
+
+def test_raycast_winners_losers():
+    """The Raycast winners/losers view should enrich movers from the diff."""
+    print("\nTesting: Raycast winners/losers...")
+
+    current, previous, sells, buys = create_week()
+    original_index = storage.get_timestamp_index
+    original_transactions = storage.get_transactions
+
+    try:
+        storage.get_timestamp_index = lambda: TimestampIndex([previous, current])
+        storage.get_transactions = lambda: {"sell_transactions": sells, "buy_transactions": buys}
+
+        result = raycast_tools.get_winners_losers_json(limit=5)
+        assert result["success"], result
+        data = result["data"]
+        assert data["comparison_period"]["days"] == 7
+        assert [w["name"] for w in data["winners"]] == ["Apple", "Chips", "Pension Fund"]
+        assert data["winners"][1] == {
+            "name": "Chips",
+            "change_eur": 400.0,
+            "change_pct": 10.0,
+            "current_value_eur": 5500.0,
+            "previous_value_eur": 4000.0,
+            "category": "US Stocks"
+        }
+        assert data["losers"] == [{
+            "name": "Bank",
+            "change_eur": -100.0,
+            "change_pct": -4.0,
+            "current_value_eur": 2400.0,
+            "previous_value_eur": 2500.0,
+            "category": "US Stocks"
+        }]
+
+        print("✓ Test passed: raycast_winners_losers")
+
+    finally:
+        storage.get_timestamp_index = original_index
+        storage.get_transactions = original_transactions
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Snapshot Diff Tests")
+    print("=" * 70)
+
+    test_diff_classifies_and_measures_changes()
+    test_consumers_agree_with_and_without_shared_diff()
+    test_weekly_flow_diffs_once()
+    test_raycast_winners_losers()
+
+    print("\n" + "=" * 70)
+    print("✅ All snapshot diff tests passed!")
+    print("=" * 70)
@@ -0,0 +1,271 @@
+"""
+Tests for the SQLite storage backend.
+
+Tests round trips, index-based deletion, range and per-asset queries,
+version tokens, and use as the hybrid fallback.
+"""
+
+import os
+import sqlite3
+import tempfile
+import shutil
+
+from agent.storage_backend import StorageBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.backends.hybrid_storage import HybridStorageBackend
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp_str, total_value, asset_count=3):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [
+            {"name": f"Asset{i}", "quantity": 10 + i, "current_value_eur": total_value / asset_count, "category": "Tech"}
+            for i in range(asset_count)
+        ]
+    }
+
+
+class UnavailableBackend(SQLiteStorageBackend):
+    """Backend that always reports itself unavailable (stands in for GCS offline)."""
+
+    def is_available(self):
+        return False
+
+
+# Test cases
+
+def test_round_trip_preserves_snapshots():
+    """Saved snapshots should read back unchanged and in order."""
+    print("\nTesting: SQLite round trip...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        saved = [create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in range(1, 4)]
+        saved.append({"timestamp": "2025-01-04T10:00:00Z", "total_value_eur": 0.0, "assets": []})
+        for snapshot in saved:
+            assert backend.save_snapshot(snapshot)
+
+        assert backend.get_all_snapshots() == saved
+        assert backend.get_latest_snapshot() == saved[-1]
+        assert list(backend.get_all_snapshots()[0]) == ["timestamp", "total_value_eur", "assets"]
+
+        with sqlite3.connect(backend.db_path) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("SELECT COUNT(*) FROM snapshot_assets").fetchone()[0] == 9
+
+        print("✓ Test passed: round_trip_preserves_snapshots")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_delete_snapshot_by_index():
+    """delete_snapshot should remove the row and its assets and back up the history."""
+    print("\nTesting: SQLite delete by index...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        for day in range(1, 4):
+            assert backend.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+        version_before = backend.get_history_version()
+        assert backend.delete_snapshot(1)
+        assert backend.get_history_version() != version_before
+
+        snapshots = backend.get_all_snapshots()
+        assert [s["timestamp"] for s in snapshots] == ["2025-01-01T10:00:00Z", "2025-01-03T10:00:00Z"]
+        assert len(backend.get_asset_history("Asset0")) == 2, "Deleted snapshot's assets should be gone"
+
+        backups = backend.list_backups()
+        assert len(backups) == 1 and backups[0]["reason"] == "delete"
+        assert backups[0]["count"] == 2 and backups[0]["deleted_count"] == 1
+        restored = backend.backups.load_backup(backups[0]["id"], include_deleted=True)
+        assert [s["total_value_eur"] for s in restored] == [1000.0, 2000.0, 3000.0]
+
+        assert not backend.delete_snapshot(5)
+        assert not backend.delete_snapshot(-1)
+
+        # Compaction vacuums and keeps only the most recent backups
+        stale = os.path.join(temp_dir, "backup", "history.db.deleted.20240101-120000.json")
+        with open(stale, "w") as f:
+            f.write("{}")
+        os.utime(stale, (1000, 1000))
+        result = backend.compact_history(keep_backups=1)
+        assert result["success"] and result["removed_snapshots"] == 0
+        assert result["backups_removed"] == 1 and result["snapshots"] == 2
+        assert not os.path.exists(stale), "Legacy backup beyond keep_backups removed"
+        assert backend.list_backups() == backups
+
+        print("✓ Test passed: delete_snapshot_by_index")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_range_and_asset_queries():
+    """Range queries should compare instants, not strings; asset queries return one asset."""
+    print("\nTesting: Range and per-asset queries...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        assert backend.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert backend.save_snapshot(create_test_snapshot("2025-01-02T12:00:00+02:00", 1100.0))
+        assert backend.save_snapshot(create_test_snapshot("2025-01-03T10:00:00", 1200.0))
+
+        in_range = backend.get_snapshots_between("2025-01-02T00:00:00Z", "2025-01-02T23:59:59Z")
+        assert [s["total_value_eur"] for s in in_range] == [1100.0]
+
+        everything = backend.get_snapshots_between("2024-12-31T00:00:00Z", "2025-01-03T10:00:00Z")
+        assert len(everything) == 3
+
+        history = backend.get_asset_history("Asset2")
+        assert [h["timestamp"] for h in history] == [
+            "2025-01-01T10:00:00Z",
+            "2025-01-02T12:00:00+02:00",
+            "2025-01-03T10:00:00",
+        ]
+        assert all(h["name"] == "Asset2" and h["quantity"] == 12 for h in history)
+        assert backend.get_asset_history("Unknown") == []
+
+        print("✓ Test passed: range_and_asset_queries")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_transactions_round_trip():
+    """Transactions should be stored and replaced as one object."""
+    print("\nTesting: SQLite transactions...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        assert backend.get_transactions() is None
+
+        first = {"sell_transactions": [], "buy_transactions": [], "metadata": {"sell_count": 0}}
+        second = {"sell_transactions": [{"asset_name": "A"}], "buy_transactions": [], "metadata": {"sell_count": 1}}
+        assert backend.save_transactions(first)
+        assert backend.save_transactions(second)
+        assert backend.get_transactions() == second
+
+        print("✓ Test passed: transactions_round_trip")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sqlite_as_hybrid_fallback():
+    """SQLite should work as the fallback under the hybrid backend."""
+    print("\nTesting: SQLite as hybrid fallback...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        primary = UnavailableBackend(db_path=os.path.join(temp_dir, "primary.db"))
+        fallback = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "fallback.db"))
+        hybrid = HybridStorageBackend(primary=primary, fallback=fallback)
+
+        assert hybrid.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert hybrid.get_latest_snapshot()["total_value_eur"] == 1000.0
+        assert len(hybrid.get_all_snapshots()) == 1
+        assert primary.count_snapshots() == 0
+
+        print("✓ Test passed: sqlite_as_hybrid_fallback")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_iter_snapshots_pages_and_projects():
+    """iter_snapshots should page through rows and skip assets unless requested."""
+    print("\nTesting: SQLite streaming iteration...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        saved = [
+            create_test_snapshot(f"2025-01-{day:02d}T10:00:00Z", 1000.0 + day, asset_count=1)
+            for day in range(1, 29)
+        ]
+        backend.import_snapshots(saved * 5)  # more rows than one page
+
+        assert list(backend.iter_snapshots()) == backend.get_all_snapshots()
+
+        totals = list(backend.iter_snapshots(
+            start="2025-01-27T00:00:00Z",
+            fields=["timestamp", "total_value_eur"]
+        ))
+        assert len(totals) == 10
+        assert totals[0] == {"timestamp": "2025-01-27T10:00:00Z", "total_value_eur": 1027.0}
+
+        with_assets = next(backend.iter_snapshots(end="2025-01-01T10:00:00Z", fields=["assets"]))
+        assert with_assets == {"assets": saved[0]["assets"]}
+
+        print("✓ Test passed: iter_snapshots_pages_and_projects")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_snapshot_index_and_backfill():
+    """The index should come from table columns, backfilled for older databases."""
+    print("\nTesting: SQLite snapshot index...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        db_path = os.path.join(temp_dir, "history.db")
+        backend = SQLiteStorageBackend(db_path=db_path)
+        for day in range(1, 4):
+            assert backend.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day, asset_count=day))
+
+        index = backend.get_snapshot_index()
+        assert [(e["index"], e["total_value_eur"], e["asset_count"]) for e in index] == [
+            (0, 1000.0, 1), (1, 2000.0, 2), (2, 3000.0, 3)
+        ]
+        assert index == StorageBackend.get_snapshot_index(backend), "Should match the index derived from snapshots"
+        backend.close()
+
+        # Simulate a database written before the index columns existed
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE snapshots SET asset_count = NULL, content_hash = NULL")
+        reopened = SQLiteStorageBackend(db_path=db_path)
+        version = reopened.get_history_version()
+        assert reopened.get_snapshot_index() == index
+        assert reopened.get_history_version() == version, "Backfill must not change the revision"
+
+        print("✓ Test passed: snapshot_index_and_backfill")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running SQLite Storage Tests")
+    print("=" * 70)
+
+    test_round_trip_preserves_snapshots()
+    test_delete_snapshot_by_index()
+    test_range_and_asset_queries()
+    test_transactions_round_trip()
+    test_sqlite_as_hybrid_fallback()
+    test_iter_snapshots_pages_and_projects()
+    test_snapshot_index_and_backfill()
+
+    print("\n" + "=" * 70)
+    print("✅ All SQLite storage tests passed!")
+    print("=" * 70)
@@ -0,0 +1,177 @@
+"""
+Tests for the process-wide snapshot cache in the storage module.
+
+Tests cache hits, invalidation on writes, and version-based validation
+against changes made outside the storage facade.
+"""
+
+import os
+import json
+import tempfile
+import shutil
+
+import agent.storage as storage
+from agent.backends.local_storage import LocalFileBackend
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp_str, total_value):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": total_value}]
+    }
+
+
+class CountingBackend(LocalFileBackend):
+    """Local backend that counts full history reads."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.full_reads = 0
+
+    def get_all_snapshots(self):
+        self.full_reads += 1
+        return super().get_all_snapshots()
+
+
+def use_backend(backend):
+    """Point the storage facade at a backend with an empty cache."""
+    storage._storage_backend = backend
+    storage.invalidate_snapshot_cache()
+    storage._cache_stats.update({"hits": 0, "misses": 0, "invalidations": 0})
+
+
+# Test cases
+
+def test_repeated_reads_hit_cache():
+    """Repeated reads should decode the history only once."""
+    print("\nTesting: Repeated reads hit the cache...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        storage.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        storage.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+
+        first = storage.get_all_snapshots()
+        second = storage.get_all_snapshots()
+        latest = storage.get_latest_snapshot()
+
+        assert backend.full_reads == 1, f"Expected 1 full read, got {backend.full_reads}"
+        assert first == second and len(first) == 2
+        assert latest is first[-1], "Latest should be served from the cache"
+
+        stats = storage.get_snapshot_cache_stats()
+        assert stats["hits"] == 2 and stats["cached_snapshots"] == 2
+
+        print("✓ Test passed: repeated_reads_hit_cache")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+def test_save_and_delete_invalidate_cache():
+    """Writes through the facade should invalidate cached snapshots."""
+    print("\nTesting: Save and delete invalidate the cache...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        storage.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert len(storage.get_all_snapshots()) == 1
+
+        storage.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0))
+        assert len(storage.get_all_snapshots()) == 2
+
+        result = storage.delete_snapshot(index=1, confirm=True)
+        assert result["success"]
+        snapshots = storage.get_all_snapshots()
+        assert [s["timestamp"] for s in snapshots] == ["2025-01-02T10:00:00Z"]
+
+        assert storage.get_snapshot_cache_stats()["invalidations"] >= 2
+
+        print("✓ Test passed: save_and_delete_invalidate_cache")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+def test_external_change_detected_by_version():
+    """A change made outside the facade should be picked up via the version token."""
+    print("\nTesting: External change detected...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        storage.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert len(storage.get_all_snapshots()) == 1
+
+        # Another process appends a snapshot directly to the log
+        with open(os.path.join(temp_dir, "portfolio_history.jsonl"), "a") as f:
+            f.write(json.dumps(create_test_snapshot("2025-01-02T10:00:00Z", 1100.0)) + "\n")
+
+        assert len(storage.get_all_snapshots()) == 2
+        assert storage.get_latest_snapshot()["timestamp"] == "2025-01-02T10:00:00Z"
+
+        print("✓ Test passed: external_change_detected_by_version")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+def test_iter_snapshots_streams_without_full_read():
+    """iter_snapshots should use the cache when current and otherwise stream from the backend."""
+    print("\nTesting: Facade streaming iteration...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = CountingBackend(temp_dir)
+        use_backend(backend)
+        for day in range(1, 4):
+            storage.save_snapshot(create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day))
+
+        streamed = list(storage.iter_snapshots(start="2025-01-02T00:00:00Z", fields=["timestamp"]))
+        assert streamed == [{"timestamp": "2025-01-02T10:00:00Z"}, {"timestamp": "2025-01-03T10:00:00Z"}]
+        assert backend.full_reads == 0, "Streaming should not load the whole history"
+        assert [s["index"] for s in storage.list_snapshots()] == [1, 2, 3]
+        assert backend.full_reads == 0
+
+        storage.get_all_snapshots()
+        cached = list(storage.iter_snapshots(end="2025-01-01T23:59:59Z"))
+        assert backend.full_reads == 1
+        assert cached == [create_test_snapshot("2025-01-01T10:00:00Z", 1000.0)]
+
+        print("✓ Test passed: iter_snapshots_streams_without_full_read")
+
+    finally:
+        storage._storage_backend = None
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Storage Cache Tests")
+    print("=" * 70)
+
+    test_repeated_reads_hit_cache()
+    test_save_and_delete_invalidate_cache()
+    test_external_change_detected_by_version()
+    test_iter_snapshots_streams_without_full_read()
+
+    print("\n" + "=" * 70)
+    print("✅ All storage cache tests passed!")
+    print("=" * 70)
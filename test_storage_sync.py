@@ -0,0 +1,220 @@
+"""
+Tests for reconciliation between primary and fallback storage.
+
+Tests that only missing snapshots are transferred, deletes that reached one
+side are resolved by push/pull, divergent snapshots are reported, dry runs
+change nothing, and the storage facade wires it to the hybrid backend.
+"""
+
+import os
+import tempfile
+import shutil
+
+import agent.storage as storage
+from agent.storage_sync import plan_reconciliation, reconcile_backends
+from agent.backends.local_storage import LocalFileBackend
+from agent.backends.sqlite_storage import SQLiteStorageBackend
+from agent.backends.hybrid_storage import HybridStorageBackend
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp_str, total_value):
+    """Create a test snapshot."""
+    return {
+        "timestamp": timestamp_str,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Asset0", "quantity": 1, "current_value_eur": total_value}]
+    }
+
+
+def create_backends(temp_dir):
+    """Create a local primary and a SQLite fallback in temp_dir."""
+    primary = LocalFileBackend(data_dir=os.path.join(temp_dir, "primary"))
+    fallback = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+    return primary, fallback
+
+
+def totals(backend):
+    """Return the total values of a backend's snapshots, in history order."""
+    return [s["total_value_eur"] for s in backend.get_all_snapshots()]
+
+
+class RecordingBackend(LocalFileBackend):
+    """Local backend recording which write method reconciliation used."""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir=data_dir)
+        self.writes = []
+
+    def save_snapshots(self, snapshots):
+        self.writes.append(("append", len(snapshots)))
+        return super().save_snapshots(snapshots)
+
+    def replace_history(self, snapshots):
+        self.writes.append(("replace", len(snapshots)))
+        return super().replace_history(snapshots)
+
+
+# Test cases
+
+def test_missing_snapshots_copied_both_ways():
+    """Each side should receive only the snapshots it lacks, in chronological order."""
+    print("\nTesting: Two-way reconciliation...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        primary = RecordingBackend(os.path.join(temp_dir, "primary"))
+        fallback = SQLiteStorageBackend(db_path=os.path.join(temp_dir, "history.db"))
+        shared = [create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day) for day in (1, 3)]
+        for snapshot in shared:
+            assert primary.save_snapshot(snapshot)
+            assert fallback.save_snapshot(snapshot)
+
+        # Offline save only reached the fallback; an older one only the primary
+        assert fallback.save_snapshot(create_test_snapshot("2025-01-04T10:00:00Z", 4000.0))
+        assert primary.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 2000.0))
+
+        result = reconcile_backends(primary, fallback, direction="both")
+        assert result["success"]
+        assert result["in_sync_count"] == 2
+        assert result["transferred"]["to_primary"] == 1
+        assert result["transferred"]["to_fallback"] == 1
+        assert result["transferred"]["bytes"] > 0
+
+        assert primary.writes == [("append", 1)], "Newer snapshots should be appended"
+        assert totals(primary) == [1000.0, 3000.0, 2000.0, 4000.0]
+        assert totals(fallback) == [1000.0, 2000.0, 3000.0, 4000.0], "Older snapshot inserted in order"
+
+        # Nothing left to do
+        again = reconcile_backends(primary, fallback)
+        assert again["in_sync_count"] == 4
+        assert not again["to_primary"] and not again["to_fallback"]
+
+        print("✓ Test passed: missing_snapshots_copied_both_ways")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_one_sided_delete_resolved_by_direction():
+    """push and pull should mirror one side, including its deletes."""
+    print("\nTesting: One-sided delete...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        primary, fallback = create_backends(temp_dir)
+        for day in range(1, 4):
+            snapshot = create_test_snapshot(f"2025-01-0{day}T10:00:00Z", 1000.0 * day)
+            assert primary.save_snapshot(snapshot)
+            assert fallback.save_snapshot(snapshot)
+
+        # Delete reached the fallback only
+        assert fallback.delete_snapshot(1)
+
+        plan = plan_reconciliation(primary.get_snapshot_index(), fallback.get_snapshot_index(), "both")
+        assert [e["total_value_eur"] for e in plan["to_fallback"]] == [2000.0], "Union would restore it"
+
+        result = reconcile_backends(primary, fallback, direction="push")
+        assert result["success"]
+        assert result["transferred"]["removed_from_primary"] == 1
+        assert totals(primary) == [1000.0, 3000.0]
+        assert totals(fallback) == [1000.0, 3000.0]
+
+        # Pull restores from the primary side instead
+        assert primary.save_snapshot(create_test_snapshot("2025-01-05T10:00:00Z", 5000.0))
+        assert fallback.delete_snapshot(0)
+        result = reconcile_backends(primary, fallback, direction="pull")
+        assert result["transferred"]["to_fallback"] == 2
+        assert totals(fallback) == [1000.0, 3000.0, 5000.0]
+
+        print("✓ Test passed: one_sided_delete_resolved_by_direction")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_divergent_snapshots_and_dry_run():
+    """Differing snapshots at one timestamp are reported; dry runs change nothing."""
+    print("\nTesting: Divergent snapshots and dry run...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        primary, fallback = create_backends(temp_dir)
+        assert primary.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        assert fallback.save_snapshot(create_test_snapshot("2025-01-01T11:00:00+01:00", 1001.0))
+        assert fallback.save_snapshot(create_test_snapshot("2025-01-02T10:00:00Z", 2000.0))
+
+        version = (primary.get_history_version(), fallback.get_history_version())
+        result = reconcile_backends(primary, fallback, direction="both", dry_run=True)
+        assert result["dry_run"] and result["success"]
+        assert len(result["divergent"]) == 1, "Same instant in different time zones"
+        assert result["divergent"][0]["timestamp"] == "2025-01-01T10:00:00Z"
+        assert [e["total_value_eur"] for e in result["to_primary"]] == [2000.0]
+        assert result["to_fallback"] == []
+        assert (primary.get_history_version(), fallback.get_history_version()) == version
+        assert result["transferred"]["to_primary"] == 0
+
+        result = reconcile_backends(primary, fallback, direction="both")
+        assert totals(primary) == [1000.0, 2000.0], "Divergent snapshot left alone"
+
+        result = reconcile_backends(primary, fallback, direction="pull")
+        assert totals(fallback) == [1000.0, 2000.0], "Pull keeps the primary's version"
+
+        print("✓ Test passed: divergent_snapshots_and_dry_run")
+
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sync_storage_facade():
+    """storage.sync_storage should require hybrid storage and default to a dry run."""
+    print("\nTesting: sync_storage facade...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        primary, fallback = create_backends(temp_dir)
+        storage._storage_backend = fallback
+        result = storage.sync_storage()
+        assert not result["success"] and "hybrid" in result["error"]
+
+        hybrid = HybridStorageBackend(primary=primary, fallback=fallback)
+        storage._storage_backend = hybrid
+        assert not storage.sync_storage(direction="sideways")["success"]
+
+        assert fallback.save_snapshot(create_test_snapshot("2025-01-01T10:00:00Z", 1000.0))
+        result = storage.sync_storage()
+        assert result["dry_run"] and len(result["to_primary"]) == 1
+        assert primary.get_all_snapshots() == []
+
+        result = storage.sync_storage(direction="both", dry_run=False)
+        assert result["success"] and result["transferred"]["to_primary"] == 1
+        assert totals(primary) == [1000.0]
+        hybrid.shutdown()
+
+        print("✓ Test passed: sync_storage_facade")
+
+    finally:
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Storage Sync Tests")
+    print("=" * 70)
+
+    test_missing_snapshots_copied_both_ways()
+    test_one_sided_delete_resolved_by_direction()
+    test_divergent_snapshots_and_dry_run()
+    test_sync_storage_facade()
+
+    print("\n" + "=" * 70)
+    print("✅ All storage sync tests passed!")
+    print("=" * 70)
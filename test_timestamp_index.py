@@ -0,0 +1,221 @@
+"""
+Tests for the snapshot timestamp index.
+
+Tests that bisect lookups give the same answers as the linear scans they
+replace (ties, out-of-order and undated snapshots included), that the
+storage facade builds the index once per history version, that stored
+epochs are used without parsing timestamps, and that the daily analysis
+is served by it.
+"""
+
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import agent.storage as storage
+import agent.storage_backend as storage_backend
+from agent import analysis, daily_analysis
+from agent.backends.local_storage import LocalFileBackend
+from agent.storage_backend import chronological, latest_at_or_before, select_snapshots
+from agent.timestamp_index import TimestampIndex
+
+
+# Test helper functions
+
+def create_test_snapshot(timestamp, total_value=1000.0):
+    """Create a one-asset snapshot."""
+    return {
+        "timestamp": timestamp,
+        "total_value_eur": total_value,
+        "assets": [{"name": "Apple", "quantity": 10, "current_value_eur": total_value}]
+    }
+
+
+def create_history():
+    """Create a history with a tie, an out-of-order save and an undated snapshot."""
+    return [
+        create_test_snapshot("2025-01-01T10:00:00Z", 100.0),
+        create_test_snapshot("2025-01-03T10:00:00Z", 300.0),
+        create_test_snapshot("2025-01-02T10:00:00+00:00", 200.0),
+        create_test_snapshot("2025-01-03T10:00:00Z", 301.0),
+        create_test_snapshot("not a timestamp", 0.0),
+        create_test_snapshot("2025-01-05T10:00:00Z", 500.0),
+    ]
+
+
+class CountingIndex(TimestampIndex):
+    """Timestamp index that counts how often it is built."""
+
+    builds = 0
+
+    def __init__(self, snapshots):
+        CountingIndex.builds += 1
+        super().__init__(snapshots)
+
+
+def use_backend(backend):
+    """Point the storage facade at a backend with empty caches."""
+    storage._storage_backend = backend
+    storage.invalidate_snapshot_cache()
+
+
+# Test cases
+
+def test_lookups_match_linear_scans():
+    """Bisect lookups should match latest_at_or_before and select_snapshots."""
+    print("\nTesting: Index lookups match linear scans...")
+
+    history = create_history()
+    index = TimestampIndex(history)
+    assert len(index) == len(history)
+
+    probes = [
+        "2024-12-31T00:00:00Z", "2025-01-01T10:00:00Z", "2025-01-02T09:59:59Z",
+        "2025-01-03T10:00:00Z", "2025-01-04T00:00:00Z", "2025-02-01T00:00:00Z",
+    ]
+    for probe in probes:
+        expected = latest_at_or_before(history, storage_backend.bound_to_epoch(probe))
+        assert index.snapshot_at_or_before(probe) is expected, probe
+
+    # The later of two equal timestamps wins
+    assert index.snapshot_at_or_before("2025-01-03T12:00:00Z")["total_value_eur"] == 301.0
+
+    windows = [(None, None), ("2025-01-02T10:00:00Z", None), (None, "2025-01-03T10:00:00Z"),
+               ("2025-01-02T00:00:00Z", "2025-01-04T00:00:00Z"), ("2025-01-06T00:00:00Z", None)]
+    for start, end in windows:
+        expected = chronological(select_snapshots(history, start, end))
+        assert index.snapshot_in_window(start, end) == expected, (start, end)
+
+    # Datetimes (naive = UTC) and POSIX seconds are accepted too
+    day_two = datetime(2025, 1, 2, 10)
+    assert index.snapshot_at_or_before(day_two)["total_value_eur"] == 200.0
+    assert index.snapshot_at_or_before(day_two.replace(tzinfo=timezone.utc).timestamp())["total_value_eur"] == 200.0
+
+    assert [s["total_value_eur"] for s in index.latest(2)] == [301.0, 500.0]
+    assert index.latest(0) == []
+
+    try:
+        index.snapshot_at_or_before("yesterday")
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+
+    print("✓ Test passed: lookups_match_linear_scans")
+
+
+def test_stored_epoch_preferred():
+    """Snapshots carrying an epoch should be indexed without parsing their timestamp."""
+    print("\nTesting: Stored epoch preferred...")
+
+    snapshot = analysis.create_portfolio_snapshot(
+        [{"name": "Apple", "quantity": 1, "current_value_eur": 10.0, "category": "US Stocks"}]
+    )
+    assert list(snapshot)[:2] == ["timestamp", "epoch"], "Local log needs the timestamp first"
+    assert abs(snapshot["epoch"] - storage_backend.timestamp_to_epoch(snapshot["timestamp"])) < 1e-3
+
+    history = [dict(create_test_snapshot("2025-01-0%dT10:00:00Z" % day), epoch=float(day)) for day in (1, 2, 3)]
+    original_parse = storage_backend.timestamp_to_epoch
+
+    def fail_parse(timestamp):
+        raise AssertionError("Timestamp parsed despite stored epoch")
+
+    try:
+        storage_backend.timestamp_to_epoch = fail_parse
+        index = TimestampIndex(history)
+        assert index.snapshot_at_or_before(2.5) is history[1]
+        assert index.snapshot_in_window(2.0, 3.0) == history[1:]
+    finally:
+        storage_backend.timestamp_to_epoch = original_parse
+
+    # Snapshots saved before epochs were recorded fall back to the timestamp
+    assert storage_backend.snapshot_epoch({"timestamp": "1970-01-01T00:00:10Z"}) == 10.0
+    assert storage_backend.snapshot_epoch({"timestamp": "bad", "epoch": True}) is None
+
+    print("✓ Test passed: stored_epoch_preferred")
+
+
+def test_index_built_once_per_version():
+    """The facade should reuse the index until the history changes."""
+    print("\nTesting: Index built once per history version...")
+
+    temp_dir = tempfile.mkdtemp()
+    original_index = storage.TimestampIndex
+
+    try:
+        use_backend(LocalFileBackend(data_dir=temp_dir))
+        storage.TimestampIndex = CountingIndex
+        CountingIndex.builds = 0
+
+        history = [create_test_snapshot(f"2025-01-{day:02d}T10:00:00Z", 100.0 * day) for day in range(1, 11)]
+        storage.save_snapshots(history)
+
+        index = storage.get_timestamp_index()
+        assert len(index) == len(history)
+        assert storage.get_snapshot_at_or_before("2025-01-04T12:00:00Z") == history[3]
+        assert storage.get_snapshots_between("2025-01-08T00:00:00Z") == history[7:]
+        assert storage.get_timestamp_index() is index
+        assert CountingIndex.builds == 1, f"Expected one build, got {CountingIndex.builds}"
+
+        # A save is a new history version
+        extra = create_test_snapshot("2025-01-11T10:00:00Z", 1100.0)
+        storage.save_snapshot(extra)
+        assert storage.get_timestamp_index().latest(1) == [extra]
+        assert CountingIndex.builds == 2
+
+        print("✓ Test passed: index_built_once_per_version")
+
+    finally:
+        storage.TimestampIndex = original_index
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+def test_yesterday_snapshot_from_index():
+    """The daily analysis should find yesterday's snapshot in the cached index."""
+    print("\nTesting: Yesterday snapshot from the index...")
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        backend = LocalFileBackend(data_dir=temp_dir)
+        use_backend(backend)
+
+        today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+        history = [
+            create_test_snapshot((today - timedelta(days=days)).isoformat(), 1000.0 - days)
+            for days in (5, 4, 3, 2)
+        ]
+        storage.save_snapshots(history)
+        assert storage.get_all_snapshots() == history, "Fills the snapshot cache"
+
+        def fail_backend_lookup(*args, **kwargs):
+            raise AssertionError("Cached history should be searched through the index")
+
+        backend.get_snapshot_at_or_before = fail_backend_lookup
+        # No snapshot from yesterday: the most recent older one is used
+        assert daily_analysis.get_yesterday_snapshot() == history[-1]
+        del backend.get_snapshot_at_or_before
+
+        print("✓ Test passed: yesterday_snapshot_from_index")
+
+    finally:
+        storage._storage_backend = None
+        storage.invalidate_snapshot_cache()
+        shutil.rmtree(temp_dir)
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Timestamp Index Tests")
+    print("=" * 70)
+
+    test_lookups_match_linear_scans()
+    test_stored_epoch_preferred()
+    test_index_built_once_per_version()
+    test_yesterday_snapshot_from_index()
+
+    print("\n" + "=" * 70)
+    print("✅ All timestamp index tests passed!")
+    print("=" * 70)
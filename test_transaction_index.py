@@ -0,0 +1,199 @@
+"""
+Tests for the transaction lookup index.
+
+Tests that TransactionIndex finds the same transactions as a linear scan
+(exclusive start, inclusive end, exact names, original order), and that
+comparisons and validations parse each transaction date only once however
+many assets changed.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from agent import analysis, storage_backend, transaction_index
+from agent.buy_validation import find_matching_buy_transactions, validate_buys_have_transactions
+from agent.sell_validation import find_matching_transactions, validate_sells_have_transactions
+from agent.transaction_index import TransactionIndex, snapshot_period
+
+
+# Test helper functions
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def create_transactions(count, asset_count, seed=7, start=START):
+    """Create transactions for a few assets on random hours of the month after start."""
+    rng = random.Random(seed)
+    return [
+        {
+            "date": (start + timedelta(hours=rng.randrange(31 * 24))).isoformat(),
+            "asset_name": f"Asset{rng.randrange(asset_count)}",
+            "quantity": float(rng.randrange(1, 20)),
+            "total_value_eur": float(rng.randrange(100, 2000)),
+        }
+        for _ in range(count)
+    ]
+
+
+def linear_scan(transactions, asset_name, previous_date, current_date):
+    """Reference implementation: the scan the index replaces."""
+    prev_dt = datetime.fromisoformat(previous_date.replace("Z", "+00:00"))
+    curr_dt = datetime.fromisoformat(current_date.replace("Z", "+00:00"))
+    return [
+        txn for txn in transactions
+        if txn.get("asset_name") == asset_name
+        and txn.get("date")
+        and prev_dt < datetime.fromisoformat(txn["date"].replace("Z", "+00:00")) <= curr_dt
+    ]
+
+
+def create_snapshot(timestamp, quantities):
+    """Create a snapshot holding the given quantity of each asset."""
+    return {
+        "timestamp": timestamp,
+        "total_value_eur": sum(quantities.values()) * 10.0,
+        "assets": [
+            {"name": name, "quantity": qty, "category": "Stocks",
+             "current_value_eur": qty * 10.0, "purchase_price_total_eur": qty * 8.0}
+            for name, qty in quantities.items()
+        ]
+    }
+
+
+# Test cases
+
+def test_matches_linear_scan():
+    """Lookups should return exactly what the linear scan returned, in the same order."""
+    print("\nTesting: Index vs linear scan...")
+
+    transactions = create_transactions(3000, 40)
+    index = TransactionIndex(transactions)
+    assert len(index) == 3000
+
+    rng = random.Random(11)
+    for _ in range(500):
+        name = f"Asset{rng.randrange(42)}"
+        first = START + timedelta(hours=rng.randrange(-24, 32 * 24))
+        second = first + timedelta(hours=rng.randrange(0, 10 * 24))
+        previous_date = first.strftime("%Y-%m-%dT%H:%M:%SZ")
+        current_date = second.strftime("%Y-%m-%dT%H:%M:%SZ")
+        expected = linear_scan(transactions, name, previous_date, current_date)
+        assert index.find(name, previous_date, current_date) == expected
+        assert analysis.find_matching_transactions_for_sell(index, name, previous_date, current_date) == expected
+        assert find_matching_buy_transactions(index, name, previous_date, current_date) == expected
+
+    # Bounds sitting exactly on transaction dates: start exclusive, end inclusive
+    on_date = [txn for txn in transactions if txn["asset_name"] == "Asset3"][:3]
+    for txn in on_date:
+        assert txn not in index.find("Asset3", txn["date"], "2025-02-01T00:00:00Z")
+        assert txn in index.find("Asset3", "2024-12-31T00:00:00Z", txn["date"])
+
+    print("✓ Test passed: matches_linear_scan")
+
+
+def test_skips_bad_dates_and_names_are_exact():
+    """Undated and unparseable transactions are skipped; names match case-sensitively."""
+    print("\nTesting: Bad dates and exact names...")
+
+    transactions = [
+        {"date": "2025-01-05T10:00:00", "asset_name": "Apple", "quantity": 1},
+        {"date": "not a date", "asset_name": "Apple", "quantity": 2},
+        {"asset_name": "Apple", "quantity": 3},
+        {"date": "2025-01-04T10:00:00+00:00", "asset_name": "Apple", "quantity": 4},
+        {"date": "2025-01-05T10:00:00", "asset_name": "apple", "quantity": 5},
+        {"date": "2025-01-05T09:00:00", "quantity": 6},
+    ]
+    index = TransactionIndex(transactions)
+    assert len(index) == 4
+
+    matched = find_matching_transactions(transactions, "Apple", "2025-01-01T00:00:00Z", "2025-01-31T00:00:00Z")
+    assert [txn["quantity"] for txn in matched] == [1, 4], "Original order kept"
+    assert index.find("Google", "2025-01-01T00:00:00Z", "2025-01-31T00:00:00Z") == []
+    assert index.find("Apple", "2025-01-31T00:00:00Z", "2025-01-01T00:00:00Z") == []
+    assert TransactionIndex.of(index) is index
+
+    # Bounds already converted to epochs give the same matches
+    bounds = snapshot_period({"timestamp": "2025-01-01T00:00:00Z"}, {"timestamp": "2025-01-31T00:00:00Z", "epoch": 1738281600.0})
+    assert bounds == (1735689600.0, 1738281600.0)
+    assert index.find("Apple", *bounds) == matched
+    assert snapshot_period({"timestamp": "yesterday"}, {"timestamp": "2025-01-31T00:00:00Z"})[0] == "yesterday"
+
+    # Bounds are only parsed for assets with transactions
+    assert index.find("Google", "yesterday", "2025-01-31T00:00:00Z") == []
+
+    try:
+        index.find("Apple", "yesterday", "2025-01-31T00:00:00Z")
+        assert False, "Unparseable period bound should raise"
+    except ValueError:
+        pass
+
+    print("✓ Test passed: skips_bad_dates_and_names_are_exact")
+
+
+def test_each_date_parsed_once():
+    """Comparing and validating many changed assets should parse each transaction date once."""
+    print("\nTesting: Dates parsed once per run...")
+
+    asset_count = 200
+    previous = create_snapshot("2025-01-01T00:00:00Z", {f"Asset{i}": 100.0 for i in range(asset_count)})
+    current = create_snapshot(
+        "2025-01-08T00:00:00Z",
+        {f"Asset{i}": 100.0 + (10.0 if i % 2 else -10.0) for i in range(asset_count)}
+    )
+    sells = [
+        {"date": "2025-01-03T12:00:00Z", "asset_name": f"Asset{i}", "quantity": 10.0, "total_value_eur": 120.0}
+        for i in range(0, asset_count, 2)
+    ]
+    buys = [
+        {"date": "2025-01-04T12:00:00Z", "asset_name": f"Asset{i}", "quantity": 10.0, "total_value_eur": 90.0}
+        for i in range(1, asset_count, 2)
+    ]
+    noise = create_transactions(2000, asset_count, start=START + timedelta(days=10))  # After the period
+
+    parses = []
+    original = transaction_index.timestamp_to_epoch
+
+    def counting_timestamp_to_epoch(timestamp):
+        parses.append(timestamp)
+        return original(timestamp)
+
+    transaction_index.timestamp_to_epoch = counting_timestamp_to_epoch
+    storage_backend.timestamp_to_epoch = counting_timestamp_to_epoch
+    try:
+        sell_index = TransactionIndex(sells + noise)
+        buy_index = TransactionIndex(buys + noise, "buy transaction")
+        built = len(parses)
+        assert built == 2 * len(noise) + len(sells) + len(buys)
+
+        validate_sells_have_transactions(current, previous, sell_index)
+        validate_buys_have_transactions(current, previous, buy_index)
+        report = analysis.compare_snapshots(current, previous, sell_index, buy_index)
+        # Period bounds are converted once per comparison or validation, not per asset
+        lookups = len(parses) - built
+        assert lookups <= 2 * 3, f"{lookups} parses for lookups"
+    finally:
+        transaction_index.timestamp_to_epoch = original
+        storage_backend.timestamp_to_epoch = original
+
+    assert len(report["quantity_changes"]) == asset_count
+    sale = next(change for change in report["quantity_changes"] if change["name"] == "Asset0")
+    expected = linear_scan(sells + noise, "Asset0", previous["timestamp"], current["timestamp"])
+    assert sale["num_transactions"] == len(expected)
+    assert analysis.compare_snapshots(current, previous, sells + noise, buys + noise) == report, "Lists still accepted"
+
+    print("✓ Test passed: each_date_parsed_once")
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Transaction Index Tests")
+    print("=" * 70)
+
+    test_matches_linear_scan()
+    test_skips_bad_dates_and_names_are_exact()
+    test_each_date_parsed_once()
+
+    print("\n" + "=" * 70)
+    print("✅ All transaction index tests passed!")
+    print("=" * 70)
@@ -0,0 +1,197 @@
+"""
+Parity tests for the batch snapshot comparison.
+
+Tests that the AssetPanel-based batch functions in agent.snapshot_arrays
+give, for every consecutive pair of a history, the same value changes,
+movers and daily changes as compare_snapshots and calculate_daily_changes
+do pair by pair, including rounding on half-cent boundaries, zero
+quantities, new, sold and re-bought positions, and empty cash.
+"""
+
+import random
+
+import numpy as np
+
+from agent import analysis, daily_analysis
+from agent.asset_panel import AssetPanel
+from agent.snapshot_arrays import (
+    consecutive_daily_changes,
+    consecutive_movers,
+    consecutive_value_changes,
+    round_like_python,
+)
+
+
+# Test helper functions
+
+def create_history(rng, length, asset_count, tie_values=False):
+    """Create a random history: prices drift, positions are bought, sold and re-bought."""
+    universe = [f"Asset{i:04d}" for i in range(asset_count)]
+    held = {}
+    history = []
+    for day in range(length):
+        for name in universe:
+            asset = held.get(name)
+            fate = rng.random()
+            if asset is None:
+                if day == 0 or fate < 0.1:  # Bought
+                    held[name] = {
+                        "name": name,
+                        "quantity": rng.choice([0, 0.005, 1, 10, 37.5, 100, rng.uniform(0, 500)]),
+                        "current_value_eur": round(rng.uniform(-50, 20000), rng.choice([0, 2, 3, 6])),
+                        "category": rng.choice(["Stocks", "ETF", "Cash", "Pension"]),
+                    }
+                continue
+            if fate < 0.08:  # Sold
+                del held[name]
+                continue
+            quantity = asset["quantity"]
+            step = rng.choice([0, 0, 0, 0.004, -1.5, 5, -quantity, rng.uniform(-20, 20)])
+            value = asset["current_value_eur"]
+            if tie_values:
+                value = value + rng.choice([-10.0, -0.005, 0.0, 0.005, 10.0])
+            else:
+                value = round(value * rng.uniform(0.9, 1.1) + rng.choice([0, 0.005, 0.015]), rng.choice([2, 3]))
+            held[name] = {**asset, "quantity": max(0, quantity + step), "current_value_eur": value}
+
+        assets = [dict(asset) for asset in held.values()]
+        rng.shuffle(assets)
+        assets.append({"name": "Empty Cash", "quantity": 0, "current_value_eur": 0.0})
+        history.append({
+            "timestamp": f"2025-01-{day + 1:02d}T10:00:00Z",
+            "total_value_eur": sum(asset["current_value_eur"] for asset in assets),
+            "assets": assets,
+        })
+    return history
+
+
+def assert_same_movers(actual, expected):
+    """Movers should agree exactly, except which of several tied assets come first."""
+    assert [m["change_eur"] for m in actual] == [m["change_eur"] for m in expected]
+    assert all(type(m["change_eur"]) is float for m in actual)
+    cutoff = expected[-1]["change_eur"] if expected else None
+    for value in {m["change_eur"] for m in expected} - {cutoff}:
+        assert ({m["name"] for m in actual if m["change_eur"] == value}
+                == {m["name"] for m in expected if m["change_eur"] == value})
+
+
+# Test cases
+
+def test_rounding_matches_python_round():
+    """round_like_python should agree with round() element for element."""
+    print("\nTesting: Rounding parity...")
+
+    rng = random.Random(3)
+    values = [0.125, 1.005, 2.675, -2.675, 0.285, 1.015, -0.004, -0.005, 0.0, -0.0, 5e-324,
+              1e15 + 0.125, 123456789.125, -987654.305, float("inf"), float("-inf")]
+    values += [round(rng.uniform(-1e6, 1e6), rng.choice([2, 3, 4])) + rng.choice([0, 0.005, -0.005]) for _ in range(20000)]
+    values += [k / 1000 for k in range(-5000, 5000)]
+
+    rounded = round_like_python(np.array(values, dtype=np.float64)).tolist()
+    expected = [round(v, 2) for v in values]
+    mismatches = [(v, r, e) for v, r, e in zip(values, rounded, expected) if r != e]
+    assert not mismatches, mismatches[:5]
+    assert round_like_python(np.array([0.0125, 1.23456]), 3).tolist() == [round(0.0125, 3), round(1.23456, 3)]
+
+    # Matrices round element-wise and keep NaN
+    matrix = round_like_python(np.array([[1.005, np.nan], [2.675, -0.285]]))
+    assert np.isnan(matrix[0, 1])
+    assert [matrix[0, 0], matrix[1, 0], matrix[1, 1]] == [round(1.005, 2), round(2.675, 2), round(-0.285, 2)]
+
+    print("✓ Test passed: rounding_matches_python_round")
+
+
+def test_value_changes_and_movers_parity():
+    """Batch changes and movers should match compare_snapshots for every pair."""
+    print("\nTesting: Batch movers parity...")
+
+    rng = random.Random(17)
+    for trial in range(12):
+        history = create_history(rng, rng.choice([1, 2, 6, 15]), rng.choice([0, 1, 3, 8, 40, 150]),
+                                 tie_values=trial % 2 == 0)
+        panel = AssetPanel.from_snapshots(history)
+        changes = consecutive_value_changes(panel)
+        movers = consecutive_movers(panel)
+        assert changes.shape == (len(history) - 1, len(panel.names))
+        assert len(movers) == len(history) - 1
+
+        names = panel.names.tolist()
+        for pair, (top_movers, bottom_movers) in enumerate(movers):
+            previous, current = history[pair], history[pair + 1]
+            report = analysis.compare_snapshots(current, previous, [], [])
+            assert_same_movers(top_movers, report["top_movers"])
+            assert_same_movers(bottom_movers, report["bottom_movers"])
+
+            held = {a["name"] for a in current["assets"]} & {a["name"] for a in previous["assets"]}
+            row = changes[pair]
+            assert {names[c] for c in np.flatnonzero(~np.isnan(row))} == held, f"Trial {trial}, pair {pair}"
+
+    print("✓ Test passed: value_changes_and_movers_parity")
+
+
+def test_movers_tie_order():
+    """Tied movers should be listed in column order, which matches a loop over the same order."""
+    print("\nTesting: Batch movers tie order...")
+
+    assets = [{"name": f"T{i}", "quantity": 1, "current_value_eur": 100.0} for i in range(12)]
+    moved = [{**asset, "current_value_eur": 110.0 if i % 3 else 90.0} for i, asset in enumerate(assets)]
+    history = [
+        {"timestamp": "2025-01-01T00:00:00Z", "total_value_eur": 1200.0, "assets": assets},
+        {"timestamp": "2025-01-02T00:00:00Z", "total_value_eur": 1240.0, "assets": moved},
+    ]
+
+    [(top_movers, bottom_movers)] = consecutive_movers(AssetPanel.from_snapshots(history))
+    assert [m["name"] for m in top_movers] == ["T1", "T2", "T4", "T5", "T7"]
+    assert [m["name"] for m in bottom_movers] == ["T0", "T3", "T6", "T9"]
+
+    report = analysis.compare_snapshots(history[1], history[0], [], [])
+    assert (top_movers, bottom_movers) == (report["top_movers"], report["bottom_movers"])
+
+    # Fewer assets than movers, and no pairs at all
+    [(top_movers, bottom_movers)] = consecutive_movers(AssetPanel.from_snapshots(history), count=20)
+    assert len(top_movers) == 8 and len(bottom_movers) == 4
+    assert consecutive_movers(AssetPanel.from_snapshots(history[:1])) == []
+    assert consecutive_movers(AssetPanel.empty()) == []
+
+    print("✓ Test passed: movers_tie_order")
+
+
+def test_daily_changes_parity():
+    """Batch daily changes should match calculate_daily_changes for every pair."""
+    print("\nTesting: Batch daily changes parity...")
+
+    rng = random.Random(29)
+    for trial in range(12):
+        history = create_history(rng, rng.choice([1, 2, 6, 15]), rng.choice([0, 1, 5, 50, 150]),
+                                 tie_values=trial % 3 == 0)
+        panel = AssetPanel.from_snapshots(history)
+        change_eur, change_pct = consecutive_daily_changes(panel)
+        assert change_eur.shape == change_pct.shape == (len(history) - 1, len(panel.names))
+
+        names = panel.names.tolist()
+        for pair in range(len(history) - 1):
+            daily = daily_analysis.calculate_daily_changes(history[pair + 1], history[pair])
+            assert "error" not in daily, daily.get("error")
+            expected = {c["name"]: (c["change_eur"], c["change_pct"]) for c in daily["asset_changes"]}
+            kept = np.flatnonzero(~np.isnan(change_eur[pair]))
+            actual = {names[c]: (change_eur[pair, c], change_pct[pair, c]) for c in kept}
+            assert actual == expected, f"Trial {trial}, pair {pair}"
+            assert "Empty Cash" not in actual
+
+    print("✓ Test passed: daily_changes_parity")
+
+
+# Run all tests
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Batch Comparison Tests")
+    print("=" * 70)
+
+    test_rounding_matches_python_round()
+    test_value_changes_and_movers_parity()
+    test_movers_tie_order()
+    test_daily_changes_parity()
+
+    print("\n" + "=" * 70)
+    print("✅ All batch comparison tests passed!")
+    print("=" * 70)